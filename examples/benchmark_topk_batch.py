@@ -0,0 +1,65 @@
+"""
+# Example: Compare the backends of `bm25s.selection.topk_batch`
+
+This script measures the time per query of the batched top-k selection for the numpy,
+jax and numba backends, for several values of k and number of documents. It was used to
+choose the rule applied by `topk_batch(..., backend="auto")`: numba when
+num_docs >= 1000 * k, numpy otherwise.
+
+To run this example, you need to install the following dependencies:
+
+```bash
+pip install bm25s[core] jax[cpu]
+```
+
+Then, run this script with:
+
+```bash
+python examples/benchmark_topk_batch.py
+```
+"""
+
+import json
+import time
+
+import numpy as np
+
+from bm25s.selection import JAX_IS_AVAILABLE, topk_batch
+
+
+def time_backend(scores_2d, k, backend, n_repeats=3):
+    # the first call is used to compile (numba, jax) and is not measured
+    topk_batch(scores_2d, k, backend=backend)
+
+    start = time.perf_counter()
+    for _ in range(n_repeats):
+        topk_batch(scores_2d, k, backend=backend)
+    elapsed = time.perf_counter() - start
+
+    return elapsed / n_repeats / scores_2d.shape[0] * 1000
+
+
+def main(num_docs_list=(10_000, 100_000, 1_000_000), k_list=(10, 100, 1000), max_block_bytes=2**26, seed=0):
+    rng = np.random.default_rng(seed)
+    backends = ["numpy", "numba"] + (["jax"] if JAX_IS_AVAILABLE else [])
+
+    results = []
+    for num_docs in num_docs_list:
+        n_queries = max(1, min(64, max_block_bytes // (num_docs * 4)))
+        scores_2d = rng.random((n_queries, num_docs), dtype=np.float32)
+
+        for k in k_list:
+            ms_per_query = {backend: time_backend(scores_2d, k, backend) for backend in backends}
+            fastest = min(ms_per_query, key=ms_per_query.get)
+            results.append(
+                {"num_docs": num_docs, "k": k, "n_queries": n_queries, "ms_per_query": ms_per_query, "fastest": fastest}
+            )
+
+            timings = " ".join(f"{b}={t:.3f}ms" for b, t in ms_per_query.items())
+            print(f"num_docs={num_docs:>9} k={k:>5} | {timings} | fastest: {fastest}")
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -68,11 +68,11 @@ def main():
     # Test with smaller k value
     print("\n=== Testing top-k with k=1 ===")
     try:
-        top_scores, top_indices = bm25._get_top_k_results(
-            ["python"], k=1, weight_mask=weight_mask
+        results = bm25.retrieve(
+            [["python"]], k=1, weight_mask=weight_mask, show_progress=False
         )
-        print(f"Top scores: {top_scores}")
-        print(f"Top indices: {top_indices}")
+        print(f"Top scores: {results.scores[0]}")
+        print(f"Top indices: {results.documents[0]}")
     except Exception as e:
         print(f"Error in top-k selection: {e}")
 
@@ -1,7 +1,9 @@
 from .version import __version__, VERSION_INFO, RELEASE_DATE, RELEASE_NOTES
 from concurrent.futures import ThreadPoolExecutor
-from collections import Counter
+from collections import Counter, deque
 from functools import partial
+import itertools
+import math
 
 import os
 import logging
@@ -12,6 +14,7 @@ from typing import Any, Tuple, Dict, Iterable, List, NamedTuple, Union, Optional
 import numpy as np
 
 from .utils import json_functions as json_functions
+from .utils.profiling import profile_stage
 from .filtering import MetadataFilter, validate_metadata
 
 try:
@@ -24,6 +27,11 @@ try:
 except ImportError:
     _retrieve_numba_functional = None
 
+try:
+    from .numba.index_utils import _build_index_numba_functional
+except ImportError:
+    _build_index_numba_functional = None
+
 
 def _faketqdm(iterable, *args, **kwargs):
     return iterable
@@ -39,28 +47,32 @@ else:
         tqdm = _faketqdm
 
 
-from . import selection, utils, stopwords, scoring, tokenization
+from . import selection, utils, stopwords, scoring, tokenization, container
 from .tokenization import tokenize
 from .scoring import (
     _select_tfc_scorer,
     _select_idf_scorer,
     _build_scores_and_indices_for_matrix,
-    _calculate_doc_freqs,
+    _calculate_doc_freqs_array,
     _build_idf_array,
     _build_nonoccurrence_array,
 )
-from .tokenization import Tokenizer, Tokenized
+from .tokenization import Tokenizer, Tokenized, FrozenTokenizer
 from .janome import tokenize as tokenize_ja
 
 logger = logging.getLogger("bm25s")
 logger.setLevel(logging.DEBUG)
 
+# Maximum size in bytes of the block of scores computed at once by the numpy retrieval path
+QUERY_BLOCK_MAX_BYTES = 2**26
+
 
 class Results(NamedTuple):
     """
     NamedTuple with fields: documents, scores, and optionally metadata. The `documents` field contains the
     retrieved documents or indices, while the `scores` field contains the scores of the
     retrieved documents or indices, and `metadata` contains the metadata for filtered results.
+    With `retrieve(..., dense=True)`, `counts` contains the number of results of each query.
     
     文書、スコア、およびオプションでメタデータのフィールドを持つNamedTupleです。`documents`フィールドは取得された
     文書またはインデックスを含み、`scores`フィールドは取得された文書またはインデックスのスコアを含み、
@@ -70,6 +82,7 @@ class Results(NamedTuple):
     documents: np.ndarray
     scores: np.ndarray
     metadata: Optional[List[Dict[str, Any]]] = None
+    counts: Optional[np.ndarray] = None
 
     def __len__(self):
         return len(self.documents)
@@ -87,7 +100,46 @@ class Results(NamedTuple):
             metadata = []
             for r in results:
                 metadata.extend(r.metadata)
-        return cls(documents=documents, scores=scores, metadata=metadata)
+        counts = None
+        if all(r.counts is not None for r in results):
+            counts = np.concatenate([r.counts for r in results], axis=0)
+        return cls(documents=documents, scores=scores, metadata=metadata, counts=counts)
+
+    @classmethod
+    def merge_topk(
+        cls,
+        results: List["Results"],
+        k: int = None,
+        offsets: List[int] = None,
+        dedupe: bool = False,
+        tie_break: str = "source",
+        backend: str = "auto",
+    ) -> "Results":
+        """
+        Merge the results of the same queries retrieved from several indexes (e.g. shards or
+        time slices) into the top-k of each query, see `bm25s.selection.merge_topk`. The
+        documents must be indices (retrieved without a corpus); `offsets` maps the indices of
+        each index to a global index. The merged results are dense: missing results have the
+        index -1 and the score -inf, and `counts` holds the number of results of each query.
+        複数のインデックスから取得した同じクエリの結果を、クエリごとの上位k件にマージします。
+        """
+        for r in results:
+            documents = np.asarray(r.documents)
+            if documents.dtype == object:
+                documents = np.concatenate([np.asarray(row) for row in documents] or [np.zeros(0, dtype=np.int64)])
+            if not np.issubdtype(documents.dtype, np.integer):
+                raise ValueError("`Results.merge_topk` requires document indices: retrieve the results with `corpus=False`.")
+
+        scores, documents = selection.merge_topk(
+            [r.scores for r in results],
+            [r.documents for r in results],
+            k=k,
+            offsets=offsets,
+            dedupe=dedupe,
+            tie_break=tie_break,
+            backend=backend,
+        )
+        return cls(documents=documents, scores=scores, counts=(documents >= 0).sum(axis=1))
 
 
 def get_unique_tokens(
@@ -101,6 +153,21 @@ def get_unique_tokens(
     return unique_tokens
 
 
+def _iter_batches(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if len(batch) == 0:
+            return
+        yield batch
+
+
+def _profiler_kwargs(profiler):
+    # the profiler is only passed when it is set, so that subclasses overriding the
+    # `build_index_from_*` methods without a `profiler` argument keep working
+    return {} if profiler is None else {"profiler": profiler}
+
+
 def is_list_of_list_of_type(obj, type_=int):
     if not isinstance(obj, list):
         return False
@@ -195,7 +262,8 @@ class BM25:
             only requires numpy and scipy as dependencies. You can also select `backend="numba"`
             to use the numba backend, which requires the numba library. If you select `backend="auto"`,
             the function will use the numba backend if it is available, otherwise it will use the numpy
-            backend.
+            backend. The numba backend is also used to build the index in `index`, in which case scipy
+            is not needed.
         
         use_log_normalization : bool
             If True, the term frequency will be normalized using the log function.
@@ -265,6 +333,7 @@ class BM25:
         num_docs: int,
         query_tokens_ids: np.ndarray,
         dtype: np.dtype,
+        query_tokens_weights: np.ndarray = None,
     ) -> np.ndarray:
         """
         This internal static function calculates the relevance scores for a given query,
@@ -286,6 +355,8 @@ class BM25:
             Array of token IDs to score.
         dtype (np.dtype)
             Data type for score calculation.
+        query_tokens_weights (np.ndarray, optional)
+            Weight of each token ID, by which the scores of its posting list are multiplied.
 
         Returns
         -------
@@ -303,7 +374,10 @@ class BM25:
         scores = np.zeros(num_docs, dtype=dtype)
         for i in range(len(query_tokens_ids)):
             start, end = indptr_starts[i], indptr_ends[i]
-            np.add.at(scores, indices[start:end], data[start:end])
+            if query_tokens_weights is None:
+                np.add.at(scores, indices[start:end], data[start:end])
+            else:
+                np.add.at(scores, indices[start:end], query_tokens_weights[i] * data[start:end])
 
             # # The following code is slower with numpy, but faster after JIT compilation
             # for j in range(start, end):
@@ -317,6 +391,7 @@ class BM25:
         corpus_token_ids: List[List[int]],
         show_progress=True,
         leave_progress=False,
+        profiler=None,
     ):
         """
         Low-level function to build the BM25 index from token IDs, used by the `index` method,
@@ -333,7 +408,22 @@ class BM25:
 
         leave_progress : bool
             If True, the progress bars will remain after the function completes.
+
+        profiler : bm25s.utils.profiling.Profiler, optional
+            If provided, the time of each step is recorded ("index.doc_freqs", "index.idf",
+            "index.scores", "index.csc", or "index.numba" with the numba backend).
+
+        Note
+        ----
+        If the backend is "numba", the index is built with the parallel kernels in
+        `bm25s.numba.index_utils` instead of numpy and scipy.
         """
+        if self.backend == "numba":
+            with profile_stage(profiler, "index.numba"):
+                return self._build_index_from_ids_numba(
+                    unique_token_ids=unique_token_ids, corpus_token_ids=corpus_token_ids
+                )
+
         import scipy.sparse as sp
 
         avg_doc_len = np.array([len(doc_ids) for doc_ids in corpus_token_ids]).mean()
@@ -341,61 +431,64 @@ class BM25:
         n_vocab = len(unique_token_ids)
 
         # Step 1: Calculate the number of documents containing each token
-        doc_frequencies = _calculate_doc_freqs(
-            corpus_tokens=corpus_token_ids,
-            unique_tokens=unique_token_ids,
-            show_progress=show_progress,
-            leave_progress=leave_progress,
-        )
+        with profile_stage(profiler, "index.doc_freqs"):
+            doc_frequencies = _calculate_doc_freqs_array(
+                corpus_token_ids=corpus_token_ids,
+                n_vocab=n_vocab,
+                int_dtype=self.int_dtype,
+            )
 
-        # preliminary: if the method is one of BM25L or BM25+, we need to calculate the non-occurrence array
-        if self.method in self.methods_requiring_nonoccurrence:
-            self.nonoccurrence_array = _build_nonoccurrence_array(
+        with profile_stage(profiler, "index.idf"):
+            # preliminary: if the method is one of BM25L or BM25+, we need to calculate the non-occurrence array
+            if self.method in self.methods_requiring_nonoccurrence:
+                self.nonoccurrence_array = _build_nonoccurrence_array(
+                    doc_frequencies=doc_frequencies,
+                    n_docs=n_docs,
+                    compute_idf_fn=_select_idf_scorer(self.idf_method),
+                    calculate_tfc_fn=_select_tfc_scorer(self.method),
+                    l_d=avg_doc_len,
+                    l_avg=avg_doc_len,
+                    k1=self.k1,
+                    b=self.b,
+                    delta=self.delta,
+                    dtype=self.dtype,
+                )
+            else:
+                self.nonoccurrence_array = None
+
+            # Step 2: Calculate the idf for each token using the document frequencies
+            idf_array = _build_idf_array(
                 doc_frequencies=doc_frequencies,
                 n_docs=n_docs,
                 compute_idf_fn=_select_idf_scorer(self.idf_method),
-                calculate_tfc_fn=_select_tfc_scorer(self.method),
-                l_d=avg_doc_len,
-                l_avg=avg_doc_len,
+                dtype=self.dtype,
+            )
+
+        # Step 3 Calculate the BM25 scores for each token in each document
+        with profile_stage(profiler, "index.scores"):
+            scores_flat, doc_idx, vocab_idx = _build_scores_and_indices_for_matrix(
+                corpus_token_ids=corpus_token_ids,
+                idf_array=idf_array,
+                avg_doc_len=avg_doc_len,
+                doc_frequencies=doc_frequencies,
                 k1=self.k1,
                 b=self.b,
                 delta=self.delta,
+                show_progress=show_progress,
+                leave_progress=leave_progress,
                 dtype=self.dtype,
+                int_dtype=self.int_dtype,
+                method=self.method,
+                nonoccurrence_array=self.nonoccurrence_array,
             )
-        else:
-            self.nonoccurrence_array = None
-
-        # Step 2: Calculate the idf for each token using the document frequencies
-        idf_array = _build_idf_array(
-            doc_frequencies=doc_frequencies,
-            n_docs=n_docs,
-            compute_idf_fn=_select_idf_scorer(self.idf_method),
-            dtype=self.dtype,
-        )
-
-        # Step 3 Calculate the BM25 scores for each token in each document
-        scores_flat, doc_idx, vocab_idx = _build_scores_and_indices_for_matrix(
-            corpus_token_ids=corpus_token_ids,
-            idf_array=idf_array,
-            avg_doc_len=avg_doc_len,
-            doc_frequencies=doc_frequencies,
-            k1=self.k1,
-            b=self.b,
-            delta=self.delta,
-            show_progress=show_progress,
-            leave_progress=leave_progress,
-            dtype=self.dtype,
-            int_dtype=self.int_dtype,
-            method=self.method,
-            nonoccurrence_array=self.nonoccurrence_array,
-        )
 
         # Now, we build the sparse matrix
-        score_matrix = sp.csc_matrix(
-            (scores_flat, (doc_idx, vocab_idx)),
-            shape=(n_docs, n_vocab),
-            dtype=self.dtype,
-        )
+        with profile_stage(profiler, "index.csc"):
+            score_matrix = sp.csc_matrix(
+                (scores_flat, (doc_idx, vocab_idx)),
+                shape=(n_docs, n_vocab),
+                dtype=self.dtype,
+            )
         data = score_matrix.data
         indices = score_matrix.indices
         indptr = score_matrix.indptr
@@ -408,41 +501,187 @@ class BM25:
         }
         return scores
 
+    def _build_index_from_ids_numba(self, unique_token_ids, corpus_token_ids):
+        if _build_index_numba_functional is None:
+            raise ImportError(
+                "Numba is not installed. Please install numba with `pip install numba` to use the numba backend."
+            )
+
+        doc_lengths = np.fromiter(
+            (len(doc_ids) for doc_ids in corpus_token_ids), dtype=np.int64, count=len(corpus_token_ids)
+        )
+        doc_pointers = np.zeros(len(doc_lengths) + 1, dtype=np.int64)
+        np.cumsum(doc_lengths, out=doc_pointers[1:])
+        token_ids_flat = np.fromiter(
+            itertools.chain.from_iterable(corpus_token_ids), dtype=np.int64, count=int(doc_pointers[-1])
+        )
+
+        scores, self.nonoccurrence_array = _build_index_numba_functional(
+            token_ids_flat=token_ids_flat,
+            doc_pointers=doc_pointers,
+            n_vocab=len(unique_token_ids),
+            method=self.method,
+            idf_method=self.idf_method,
+            k1=self.k1,
+            b=self.b,
+            delta=self.delta,
+            dtype=self.dtype,
+            int_dtype=self.int_dtype,
+        )
+        return scores
+
     def build_index_from_tokens(
-        self, corpus_tokens, show_progress=True, leave_progress=False
+        self, corpus_tokens, show_progress=True, leave_progress=False, profiler=None
     ):
         """
         Low-level function to build the BM25 index from tokens, used by the `index` method.
         You can override this function if you want to build the index in a different way.
         """
-        unique_tokens = get_unique_tokens(
-            corpus_tokens,
-            show_progress=show_progress,
-            leave_progress=leave_progress,
-            desc="BM25S Create Vocab",
-        )
-        vocab_dict = {token: i for i, token in enumerate(unique_tokens)}
-        unique_token_ids = [vocab_dict[token] for token in unique_tokens]
-
-        corpus_token_ids = [
-            [vocab_dict[token] for token in tokens]
-            for tokens in tqdm(
+        with profile_stage(profiler, "index.vocab"):
+            unique_tokens = get_unique_tokens(
                 corpus_tokens,
-                desc="BM25S Convert tokens to indices",
-                leave=leave_progress,
-                disable=not show_progress,
+                show_progress=show_progress,
+                leave_progress=leave_progress,
+                desc="BM25S Create Vocab",
             )
-        ]
+            vocab_dict = {token: i for i, token in enumerate(unique_tokens)}
+            unique_token_ids = [vocab_dict[token] for token in unique_tokens]
+
+            corpus_token_ids = [
+                [vocab_dict[token] for token in tokens]
+                for tokens in tqdm(
+                    corpus_tokens,
+                    desc="BM25S Convert tokens to indices",
+                    leave=leave_progress,
+                    disable=not show_progress,
+                )
+            ]
 
         scores = self.build_index_from_ids(
             unique_token_ids=unique_token_ids,
             corpus_token_ids=corpus_token_ids,
             show_progress=show_progress,
             leave_progress=leave_progress,
+            **_profiler_kwargs(profiler),
         )
 
         return scores, vocab_dict
 
+    def build_index_from_counts(
+        self,
+        doc_indices: np.ndarray,
+        voc_indices: np.ndarray,
+        tf_array: np.ndarray,
+        doc_lengths: np.ndarray,
+        n_vocab: int,
+        doc_frequencies: np.ndarray = None,
+        total_docs: int = None,
+        avg_doc_len: float = None,
+    ):
+        """
+        Low-level function to build the BM25 index from term counts, used by the `index_texts` method.
+        Each position of `doc_indices`, `voc_indices` and `tf_array` describes one unique (document, token)
+        pair and the number of times the token occurs in the document. `doc_lengths` contains the number
+        of tokens of each document.
+
+        Parameters
+        ----------
+        doc_indices : np.ndarray
+            Document index of each (document, token) pair.
+
+        voc_indices : np.ndarray
+            Token ID of each (document, token) pair.
+
+        tf_array : np.ndarray
+            Term frequency of each (document, token) pair.
+
+        doc_lengths : np.ndarray
+            Number of tokens in each document.
+
+        n_vocab : int
+            Size of the vocabulary, i.e. one more than the largest token ID.
+
+        doc_frequencies : np.ndarray, optional
+            Number of documents containing each token, used for the idf. Defaults to the
+            document frequencies of the given counts.
+
+        total_docs : int, optional
+            Number of documents used for the idf. Defaults to `len(doc_lengths)`.
+
+        avg_doc_len : float, optional
+            Average document length used for the length normalization. Defaults to the mean
+            of `doc_lengths`.
+
+        Note
+        ----
+        The last three parameters are the statistics of the whole collection. They are given
+        when the documents are a part of a larger collection (see `bm25s.sharded.ShardedBM25`),
+        so that the scores are the same as if the whole collection had been indexed at once.
+        """
+        doc_lengths = np.asarray(doc_lengths)
+        n_docs = len(doc_lengths)
+        if total_docs is None:
+            total_docs = n_docs
+        if avg_doc_len is None:
+            avg_doc_len = doc_lengths.mean()
+
+        # Each (doc, term) pair is unique, so the document frequency of a term is the
+        # number of pairs in which it appears
+        if doc_frequencies is None:
+            doc_frequencies = np.bincount(voc_indices, minlength=n_vocab)
+
+        if self.method in self.methods_requiring_nonoccurrence:
+            self.nonoccurrence_array = _build_nonoccurrence_array(
+                doc_frequencies=doc_frequencies,
+                n_docs=total_docs,
+                compute_idf_fn=_select_idf_scorer(self.idf_method),
+                calculate_tfc_fn=_select_tfc_scorer(self.method),
+                l_d=avg_doc_len,
+                l_avg=avg_doc_len,
+                k1=self.k1,
+                b=self.b,
+                delta=self.delta,
+                dtype=self.dtype,
+            )
+        else:
+            self.nonoccurrence_array = None
+
+        idf_array = _build_idf_array(
+            doc_frequencies=doc_frequencies,
+            n_docs=total_docs,
+            compute_idf_fn=_select_idf_scorer(self.idf_method),
+            dtype=self.dtype,
+        )
+
+        calculate_tfc = _select_tfc_scorer(self.method)
+        tfc = calculate_tfc(
+            tf_array=np.asarray(tf_array, dtype=self.dtype),
+            l_d=doc_lengths[doc_indices],
+            l_avg=avg_doc_len,
+            k1=self.k1,
+            b=self.b,
+            delta=self.delta,
+        )
+        scores_flat = (idf_array[voc_indices] * tfc).astype(self.dtype)
+        if self.nonoccurrence_array is not None:
+            scores_flat -= self.nonoccurrence_array[voc_indices]
+
+        data, indices, indptr = scoring._build_csc_arrays(
+            scores_flat=scores_flat,
+            doc_indices=doc_indices,
+            voc_indices=voc_indices,
+            n_vocab=n_vocab,
+            int_dtype=self.int_dtype,
+        )
+
+        scores = {
+            "data": data,
+            "indices": indices,
+            "indptr": indptr,
+            "num_docs": n_docs,
+        }
+        return scores
+
     def index(
         self,
         corpus: Union[Iterable, Tuple, tokenization.Tokenized],
@@ -450,6 +689,7 @@ class BM25:
         show_progress=True,
         leave_progress=False,
         metadata=None,
+        profiler=None,
     ):
         """
         Given a `corpus` of documents, create the BM25 index. The `corpus` can be either:
@@ -491,13 +731,21 @@ class BM25:
             If provided, enables metadata-based filtering during retrieval.
             コーパス内の各文書に対するメタデータ辞書のリストです。
             提供された場合、検索時にメタデータベースフィルタリングが可能になります。
+
+        profiler : bm25s.utils.profiling.Profiler, optional
+            If provided, the time of each step of the indexing is recorded (see
+            `build_index_from_ids`), as well as the number of documents, postings and bytes of
+            the index.
         """
         inferred_corpus_obj = self._infer_corpus_object(corpus)
 
         if inferred_corpus_obj == "tokens":
             logger.debug(msg="Building index from tokens")
             scores, vocab_dict = self.build_index_from_tokens(
-                corpus, leave_progress=leave_progress, show_progress=show_progress
+                corpus,
+                leave_progress=leave_progress,
+                show_progress=show_progress,
+                **_profiler_kwargs(profiler),
             )
         else:
             if inferred_corpus_obj == "tuple":
@@ -518,8 +766,30 @@ class BM25:
                 corpus_token_ids=corpus_token_ids,
                 leave_progress=leave_progress,
                 show_progress=show_progress,
+                **_profiler_kwargs(profiler),
+            )
+
+        with profile_stage(profiler, "index.set_index"):
+            self._set_index(
+                scores=scores,
+                vocab_dict=vocab_dict,
+                create_empty_token=create_empty_token,
+                metadata=metadata,
+            )
+
+        if profiler is not None:
+            profiler.add("index.documents", scores["num_docs"])
+            profiler.add("index.postings", len(scores["data"]))
+            profiler.add(
+                "index.bytes",
+                sum(scores[name].nbytes for name in ("data", "indices", "indptr")),
             )
 
+    def _set_index(self, scores, vocab_dict, create_empty_token=True, metadata=None):
+        """
+        Assign the scores and the vocabulary built by one of the `index` methods to the
+        BM25 object, and update the lookup structures used during retrieval.
+        """
         if create_empty_token:
             if all(isinstance(token, int) for token in vocab_dict):
                 # if all tokens are integers, we don't need to add an empty token
@@ -543,6 +813,129 @@ class BM25:
             else:
                 raise ValueError("Invalid metadata format provided during indexing")
 
+    def index_texts(
+        self,
+        texts: Iterable[str],
+        tokenizer: tokenization.Tokenizer,
+        n_jobs: int = 1,
+        chunksize: int = 10_000,
+        create_empty_token=True,
+        show_progress=True,
+        leave_progress=False,
+        metadata=None,
+    ):
+        """
+        Tokenize and index raw texts in a single streaming pass. The texts are tokenized in chunks
+        with `tokenizer.streaming_tokenize`, and each chunk is immediately reduced to its
+        (document, token, term frequency) counts, so the token lists of the whole corpus are never
+        kept in memory. The resulting index is the same as calling `index` on the output of
+        `tokenizer.tokenize(texts, return_as="tuple")`.
+
+        テキストをチャンク単位でトークン化し、そのまま文書頻度とポスティングの集計に流し込むことで、
+        コーパス全体のトークンリストを保持せずにインデックスを構築します。
+
+        Parameters
+        ----------
+        texts : Iterable[str]
+            The texts to index. This can be a list or any iterable, such as a generator over a file.
+
+        tokenizer : bm25s.tokenization.Tokenizer
+            The tokenizer used to split the texts. Its vocabulary is updated with the new tokens, so
+            it can be used to tokenize queries afterwards (e.g. with `update_vocab=False`).
+
+        n_jobs : int
+            Number of threads used to count the tokens of a chunk while the next chunk is being tokenized.
+            If -1, it will use all available CPUs. If 0 or 1, the chunks are processed sequentially.
+
+        chunksize : int
+            Number of texts tokenized before their counts are accumulated.
+
+        create_empty_token : bool
+            If True, it will create an empty token, "",  in the vocabulary if it is not already present.
+
+        show_progress : bool
+            If True, a progress bar will be shown. If False, no progress bar will be shown.
+
+        leave_progress : bool
+            If True, the progress bars will remain after the function completes.
+
+        metadata : List[Dict[str, Any]], optional
+            List of metadata dictionaries, one for each document in the corpus.
+        """
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+        if chunksize < 1:
+            raise ValueError("`chunksize` must be a positive integer.")
+
+        total = len(texts) if hasattr(texts, "__len__") else None
+        stream = tokenizer.streaming_tokenize(texts, update_vocab=True)
+        stream = tqdm(
+            stream,
+            desc="BM25S Tokenize and Count",
+            total=total,
+            leave=leave_progress,
+            disable=not show_progress,
+        )
+
+        count_fn = partial(scoring._count_doc_term_pairs, int_dtype=self.int_dtype)
+        executor = ThreadPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+
+        counts = []
+        doc_lengths = []
+        flat_ids, chunk_lengths = [], []
+        n_docs = 0
+
+        def submit_chunk():
+            args = (flat_ids, chunk_lengths, n_docs - len(chunk_lengths))
+            if executor is None:
+                counts.append(count_fn(*args))
+            else:
+                counts.append(executor.submit(count_fn, *args))
+
+        try:
+            for doc_ids in stream:
+                flat_ids.extend(doc_ids)
+                chunk_lengths.append(len(doc_ids))
+                n_docs += 1
+
+                if len(chunk_lengths) >= chunksize:
+                    submit_chunk()
+                    doc_lengths.extend(chunk_lengths)
+                    flat_ids, chunk_lengths = [], []
+
+            if len(chunk_lengths) > 0:
+                submit_chunk()
+                doc_lengths.extend(chunk_lengths)
+
+            if executor is not None:
+                counts = [future.result() for future in counts]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        if n_docs == 0:
+            raise ValueError("Cannot build an index from an empty list of texts.")
+
+        vocab_dict = dict(tokenizer.get_vocab_dict())
+        n_vocab = max(vocab_dict.values()) + 1
+
+        doc_indices, voc_indices, tf_array = (np.concatenate(arrs) for arrs in zip(*counts))
+
+        scores = self.build_index_from_counts(
+            doc_indices=doc_indices,
+            voc_indices=voc_indices,
+            tf_array=tf_array,
+            doc_lengths=np.array(doc_lengths),
+            n_vocab=n_vocab,
+        )
+
+        self._set_index(
+            scores=scores,
+            vocab_dict=vocab_dict,
+            create_empty_token=create_empty_token,
+            metadata=metadata,
+        )
+
     def get_tokens_ids(self, query_tokens: List[str]) -> List[int]:
         """
         For a given list of tokens, return the list of token IDs, leaving out tokens
@@ -552,9 +945,105 @@ class BM25:
             self.vocab_dict[token] for token in query_tokens if token in self.vocab_dict
         ]
 
+    def _get_weighted_query_ids(self, query_tokens, query_weights=None):
+        """
+        Convert weighted queries to token IDs and weights, leaving out the tokens that are not
+        in the vocabulary (with their weights). Each query is either a dictionary mapping its
+        tokens (str, or token IDs as int) to their weights, or a list of tokens whose weights are
+        given by the list at the same position in `query_weights`.
+
+        Returns the list of token IDs (list of int) and the list of weights (np.ndarray of type
+        `self.dtype`) of each query.
+        """
+        if query_weights is None:
+            if not all(isinstance(query, dict) for query in query_tokens):
+                raise ValueError(
+                    "Weighted queries must be dictionaries mapping tokens to weights, or lists of "
+                    "tokens with the weights passed as `query_weights`."
+                )
+            query_weights = [list(query.values()) for query in query_tokens]
+            query_tokens = [list(query.keys()) for query in query_tokens]
+        elif len(query_weights) != len(query_tokens):
+            raise ValueError(
+                f"Found {len(query_weights)} lists of weights for {len(query_tokens)} queries."
+            )
+
+        query_tokens_ids, query_tokens_weights = [], []
+        for tokens, weights in zip(query_tokens, query_weights):
+            if isinstance(tokens, dict):
+                raise ValueError(
+                    "The weights of a query given as a dictionary cannot also be passed as `query_weights`."
+                )
+            tokens = np.asarray(tokens).tolist()
+            weights = np.asarray(weights, dtype=self.dtype).ravel()
+            if len(tokens) != len(weights):
+                raise ValueError(
+                    f"A query has {len(tokens)} tokens but {len(weights)} weights."
+                )
+
+            if len(tokens) > 0 and isinstance(tokens[0], str):
+                ids = [self.vocab_dict.get(token, -1) for token in tokens]
+            else:
+                if getattr(self, "unique_token_ids_set", None) is None:
+                    raise ValueError(
+                        "The unique_token_ids_set attribute is not found. Please run the `index` method first, or make sure"
+                        "run retriever.load(load_vocab=True) before calling retrieve on token IDs (int)."
+                    )
+                ids = [token if token in self.unique_token_ids_set else -1 for token in tokens]
+
+            keep = [i for i, token_id in enumerate(ids) if token_id >= 0]
+            query_tokens_ids.append([ids[i] for i in keep])
+            query_tokens_weights.append(weights[keep])
+
+        return query_tokens_ids, query_tokens_weights
+
     def get_scores_from_ids(
-        self, query_tokens_ids: List[int], weight_mask=None
+        self,
+        query_tokens_ids: Union[List[int], Dict[int, float]],
+        weight_mask=None,
+        query_term_mode: str = "weighted",
+        query_tokens_weights=None,
     ) -> np.ndarray:
+        """
+        Compute the BM25 scores of all the documents for a single query given as a list of
+        token IDs.
+
+        The repeated token IDs are collapsed before scoring, so that the posting list of each
+        token is read once (see `query_term_mode`).
+
+        Parameters
+        ----------
+        query_tokens_ids : List[int] or Dict[int, float]
+            The token IDs of the query, or a dictionary mapping the token IDs of the query to
+            their weights.
+
+        weight_mask : np.ndarray, optional
+            Weight of each document, by which its score is multiplied.
+
+        query_term_mode : str
+            How the repeated tokens of the query are scored. If "weighted", a token that appears
+            n times in the query contributes n times its score, as if each occurrence was scored
+            separately. If "set", each distinct token contributes its score once.
+
+        query_tokens_weights : List[float] or np.ndarray, optional
+            The weight of each token of `query_tokens_ids`, by which its score (including the
+            non-occurrence score of bm25l and bm25+) is multiplied, e.g. to boost a field or to
+            down-weight expansion terms. A repeated token gets the sum of its weights ("weighted")
+            or the largest of them ("set").
+
+        Returns
+        -------
+        np.ndarray
+            The score of each document, of shape (num_docs,).
+        """
+        if isinstance(query_tokens_ids, dict):
+            if query_tokens_weights is not None:
+                raise ValueError(
+                    "The weights of a query given as a dictionary cannot also be passed as `query_tokens_weights`."
+                )
+            query_tokens_weights = list(query_tokens_ids.values())
+            query_tokens_ids = list(query_tokens_ids.keys())
+
         data = self.scores["data"]
         indices = self.scores["indices"]
         indptr = self.scores["indptr"]
@@ -563,6 +1052,12 @@ class BM25:
         dtype = np.dtype(self.dtype)
         int_dtype = np.dtype(self.int_dtype)
         query_tokens_ids: np.ndarray = np.asarray(query_tokens_ids, dtype=int_dtype)
+        if query_tokens_weights is not None:
+            query_tokens_weights = np.asarray(query_tokens_weights, dtype=dtype).ravel()
+            if len(query_tokens_weights) != len(query_tokens_ids):
+                raise ValueError(
+                    f"The query has {len(query_tokens_ids)} tokens but {len(query_tokens_weights)} weights."
+                )
 
         max_token_id = int(query_tokens_ids.max(initial=0))
 
@@ -572,6 +1067,14 @@ class BM25:
                 "This likely means that the query contains tokens that are not in the index."
             )
 
+        query_tokens_ids, _, query_tokens_weights = scoring._dedupe_query_tokens(
+            query_tokens_ids,
+            [0, len(query_tokens_ids)],
+            query_tokens_weights,
+            mode=query_term_mode,
+            dtype=dtype,
+        )
+
         scores = self._compute_relevance_from_scores(
             data=data,
             indptr=indptr,
@@ -579,6 +1082,7 @@ class BM25:
             num_docs=num_docs,
             query_tokens_ids=query_tokens_ids,
             dtype=dtype,
+            query_tokens_weights=query_tokens_weights,
         )
 
         if weight_mask is not None:
@@ -586,16 +1090,33 @@ class BM25:
             scores *= weight_mask
 
         # if there's a non-occurrence array, we need to add the non-occurrence score
-        # back to the scores
+        # back to the scores, with the same weights as the tokens
         if self.nonoccurrence_array is not None:
-            nonoccurrence_scores = self.nonoccurrence_array[query_tokens_ids].sum()
+            nonoccurrence_scores = (
+                self.nonoccurrence_array[query_tokens_ids] * query_tokens_weights
+            ).sum()
             scores += nonoccurrence_scores
 
         return scores
 
     def get_scores(
-        self, query_tokens_single: List[str], weight_mask=None
+        self,
+        query_tokens_single: Union[List[str], Dict[str, float]],
+        weight_mask=None,
+        query_term_mode: str = "weighted",
+        query_tokens_weights=None,
     ) -> np.ndarray:
+        if isinstance(query_tokens_single, dict) or query_tokens_weights is not None:
+            # weighted query: the tokens and their weights are converted together
+            query_weights = None if query_tokens_weights is None else [query_tokens_weights]
+            ids, weights = self._get_weighted_query_ids([query_tokens_single], query_weights)
+            return self.get_scores_from_ids(
+                ids[0],
+                weight_mask=weight_mask,
+                query_term_mode=query_term_mode,
+                query_tokens_weights=weights[0],
+            )
+
         if not isinstance(query_tokens_single, list):
             raise ValueError("The query_tokens must be a list of tokens.")
 
@@ -609,70 +1130,152 @@ class BM25:
                 "The query_tokens must be a list of tokens or a list of token IDs."
             )
 
-        return self.get_scores_from_ids(query_tokens_ids, weight_mask=weight_mask)
+        return self.get_scores_from_ids(
+            query_tokens_ids, weight_mask=weight_mask, query_term_mode=query_term_mode
+        )
 
-    def _get_top_k_results(
+    def _get_query_block_size(self, chunksize, n_queries: int = 0, n_threads: int = 0):
+        """
+        Number of queries scored together in the numpy retrieval path: at most `chunksize`,
+        and small enough for the block of scores to stay under `QUERY_BLOCK_MAX_BYTES`. With
+        `n_threads` > 0, the `n_queries` queries are also split into at least `n_threads` blocks,
+        so that every thread gets some work.
+        """
+        row_bytes = max(1, self.scores["num_docs"] * np.dtype(self.dtype).itemsize)
+        max_rows = max(1, QUERY_BLOCK_MAX_BYTES // row_bytes)
+        block_size = min(chunksize or 1, max_rows)
+        if n_threads > 0 and n_queries > 0:
+            block_size = min(block_size, math.ceil(n_queries / n_threads))
+        return max(1, block_size)
+
+    def _get_top_k_results_batch(
         self,
-        query_tokens_single: List[str],
+        query_tokens_batch: List[List[str]],
         k: int = 1000,
         backend="auto",
         sorted: bool = False,
         weight_mask: np.ndarray = None,
+        profiler=None,
+        fill_missing: bool = False,
+        query_term_mode: str = "weighted",
+        query_weights_batch: List[np.ndarray] = None,
+        parallel: bool = True,
     ):
         """
-        This function is used to retrieve the top-k results for a single query.
-        Since it's a hidden function, the user should not call it directly and
-        may change in the future. Please use the `retrieve` function instead.
+        This function is used to retrieve the top-k results for a block of queries. The
+        scores of all queries are stacked into a (n_queries, num_docs) array, and the top-k
+        selection is done with a single call to `selection.topk_batch`. Since it's a hidden
+        function, the user should not call it directly and may change in the future. Please
+        use the `retrieve` function instead.
+
+        If `fill_missing` is True, the results excluded by the weight mask are marked as missing
+        (see `selection.fill_missing_batch`) and the number of results of each query is returned
+        as a third array.
+
+        If `query_weights_batch` is given, the queries are lists of token IDs and
+        `query_weights_batch[i]` holds the weights of the tokens of the i-th query.
+
+        `parallel` is passed to `selection.topk_batch`, and must be False when the blocks are
+        processed in several threads.
         """
-        if len(query_tokens_single) == 0:
-            logger.info(
-                msg="The query is empty. This will result in a zero score for all documents."
+        with profile_stage(profiler, "retrieve.scoring"):
+            scores_2d = np.zeros(
+                (len(query_tokens_batch), self.scores["num_docs"]), dtype=self.dtype
             )
-            scores_q = np.zeros(self.scores["num_docs"], dtype=self.dtype)
-        else:
-            scores_q = self.get_scores(query_tokens_single, weight_mask=weight_mask)
+            for i, query_tokens_single in enumerate(query_tokens_batch):
+                if len(query_tokens_single) == 0:
+                    logger.info(
+                        msg="The query is empty. This will result in a zero score for all documents."
+                    )
+                    continue
+                if query_weights_batch is not None:
+                    scores_2d[i] = self.get_scores_from_ids(
+                        query_tokens_single,
+                        weight_mask=weight_mask,
+                        query_term_mode=query_term_mode,
+                        query_tokens_weights=query_weights_batch[i],
+                    )
+                    continue
+                scores_2d[i] = self.get_scores(
+                    query_tokens_single, weight_mask=weight_mask, query_term_mode=query_term_mode
+                )
+
+        if profiler is not None:
+            self._record_postings(
+                profiler,
+                [
+                    self.get_tokens_ids(q) if len(q) > 0 and isinstance(q[0], str) else q
+                    for q in query_tokens_batch
+                ],
+            )
+            profiler.add("retrieve.candidates", np.count_nonzero(scores_2d))
 
         # Dynamic k adjustment for filtering
         # フィルタリング用のk動的調整
-        if weight_mask is not None:
-            # Count available documents (non-zero weight mask)
-            # 利用可能な文書数をカウント（ゼロでないweight mask）
+        if weight_mask is not None and not fill_missing:
             available_docs = np.sum(weight_mask > 0)
             if available_docs < k:
                 logger.warning(f"Requested k={k} but only {available_docs} documents match filter conditions. Adjusting k to {available_docs}.")
                 k = max(1, available_docs)  # Ensure k is at least 1
 
         if backend.startswith("numba"):
-            if selection_jit is None:
-                raise ImportError(
-                    "Numba is not installed. Please install numba to use the numba backend."
-                )
-            topk_scores, topk_indices = selection_jit.topk(
-                scores_q, k=k, sorted=sorted, backend=backend
-            )
-        else:
-            topk_scores, topk_indices = selection.topk(
-                scores_q, k=k, sorted=sorted, backend=backend
+            backend = "numba"
+
+        # Zero-score results of filtered queries are removed by `retrieve`
+        with profile_stage(profiler, "retrieve.topk"):
+            topk_scores, topk_indices = selection.topk_batch(
+                scores_2d, k=k, sorted=sorted, backend=backend, parallel=parallel
             )
+            if fill_missing:
+                return selection.fill_missing_batch(topk_scores, topk_indices, sorted=sorted)
+            return topk_scores, topk_indices
 
-        # Filter out zero-score results when weight mask is applied
-        # weight mask が適用された場合、ゼロスコア結果を除外
-        if weight_mask is not None:
-            non_zero_mask = topk_scores > 0
-            if np.any(non_zero_mask):
-                topk_scores = topk_scores[non_zero_mask]
-                topk_indices = topk_indices[non_zero_mask]
-            else:
-                # If all scores are zero, return empty arrays
-                # すべてのスコアがゼロの場合、空の配列を返す
-                topk_scores = np.array([], dtype=self.dtype)
-                topk_indices = np.array([], dtype=self.int_dtype)
+    @staticmethod
+    def _get_documents(corpus, indices):
+        """
+        Replace the retrieved indices with the corresponding entries of `corpus`. `indices` is
+        either a 2D array, or an object array of 1D arrays when the results were filtered.
+        Missing results (index -1, see `retrieve(..., dense=True)`) are replaced with None.
+        """
+        if corpus is None:
+            return indices
+
+        if indices.dtype != object and indices.size > 0 and indices.min() < 0:
+            retrieved_docs = np.full(indices.shape, None, dtype=object)
+            found = indices >= 0
+            retrieved_docs[found] = BM25._get_documents(corpus, indices[found])
+            return retrieved_docs
+
+        # if it is a JsonlCorpus object, we do not need to convert it to a list
+        supports_array_indexing = isinstance(
+            corpus, (utils.corpus.JsonlCorpus, utils.corpus.CompressedCorpus)
+        ) or (
+            isinstance(corpus, np.ndarray) and corpus.ndim == 1
+        )
+
+        # Handle object arrays (from filtering)
+        # オブジェクト配列を処理（フィルタリングから）
+        if indices.dtype == object:
+            retrieved_docs = []
+            for query_indices in indices:
+                if supports_array_indexing:
+                    query_docs = corpus[np.asarray(query_indices, dtype=np.int64)]
+                else:
+                    query_docs = np.array([corpus[i] for i in query_indices])
+                retrieved_docs.append(query_docs)
+            retrieved_docs = np.array(retrieved_docs, dtype=object)
+        elif supports_array_indexing:
+            retrieved_docs = corpus[indices]
+        else:
+            index_flat = indices.flatten().tolist()
+            results = [corpus[i] for i in index_flat]
+            retrieved_docs = np.array(results).reshape(indices.shape)
 
-        return topk_scores, topk_indices
+        return retrieved_docs
 
     def retrieve(
         self,
-        query_tokens: Union[List[List[str]], tokenization.Tokenized],
+        query_tokens: Union[List[List[str]], List[Dict[str, float]], tokenization.Tokenized],
         corpus: List[Any] = None,
         k: int = 10,
         sorted: bool = True,
@@ -685,21 +1288,31 @@ class BM25:
         weight_mask: np.ndarray = None,
         filter: Dict[str, Any] = None,
         return_metadata: bool = False,
+        profiler=None,
+        lazy: bool = False,
+        fields: List[str] = None,
+        dense: bool = False,
+        query_term_mode: str = "weighted",
+        query_weights: List[List[float]] = None,
     ):
         """
         Retrieve the top-k documents for each query (tokenized).
 
         Parameters
         ----------
-        query_tokens : List[List[str]] or bm25s.tokenization.Tokenized
+        query_tokens : List[List[str]] or List[Dict[str, float]] or bm25s.tokenization.Tokenized
             List of list of tokens for each query. If a Tokenized object is provided,
-            it will be converted to a list of list of tokens.
+            it will be converted to a list of list of tokens. Weighted queries are given as
+            dictionaries mapping the tokens (or token IDs) of each query to their weights, e.g.
+            `[{"cat": 2.0, "feline": 0.5}]`, or with `query_weights`.
 
         corpus : List[str] or np.ndarray
             List of "documents" or a numpy array of documents. If provided, the function
             will return the documents instead of the indices. You do not have to provide
             the original documents (for example, you can provide the unique IDs of the
             documents here and then retrieve the actual documents from another source).
+            If not provided, `self.corpus` is used when available. If False, the indices
+            are returned even if `self.corpus` is set.
 
         k : int
             Number of documents to retrieve for each query.
@@ -729,11 +1342,14 @@ class BM25:
             If 0, it will run the jobs sequentially, without using multiprocessing.
 
         chunksize : int
-            Number of batches to process in each job in the multiprocessing pool.
+            Number of queries that are scored together and passed to the top-k selection as a
+            single block (see `bm25s.selection.topk_batch`). The block is made smaller if its
+            scores would take more than `bm25s.QUERY_BLOCK_MAX_BYTES` bytes.
 
         backend_selection : str
-            The backend to use for the top-k retrieval. Choose from "auto", "numpy", "jax".
-            If "auto", it will use JAX if it is available, otherwise it will use numpy.
+            The backend to use for the top-k retrieval. Choose from "auto", "numpy", "jax", "numba".
+            If "auto", the backend is chosen by `bm25s.selection.topk_batch` based on k and the
+            number of documents.
 
         weight_mask : np.ndarray
             A weight mask to filter the documents. If provided, the scores for the masked
@@ -748,6 +1364,42 @@ class BM25:
             If True and metadata is available, return metadata for the retrieved documents.
             Trueでメタデータがある場合、取得された文書のメタデータを返します。
 
+        profiler : bm25s.utils.profiling.Profiler, optional
+            If provided, the time spent in each stage of the retrieval ("retrieve.tokens_to_ids",
+            "retrieve.metadata_filter", "retrieve.scoring", "retrieve.topk", "retrieve.numba",
+            "retrieve.filter_results", "retrieve.corpus_lookup", "retrieve.metadata") is recorded,
+            as well as the number of queries, postings and bytes of postings read, and candidate
+            documents (numpy backend only).
+
+        lazy : bool
+            If True, the documents are returned as a `bm25s.utils.corpus.LazyDocuments` view,
+            which fetches the documents from the corpus only when they are accessed (e.g.
+            `results.documents[0, :3]`), instead of fetching all the k documents of every query.
+            Ignored if there is no corpus.
+
+        fields : List[str], optional
+            If provided, each document (a dictionary) is reduced to these fields, e.g.
+            `fields=["title"]`.
+
+        dense : bool
+            If True, the results excluded by `filter` or `weight_mask` do not make the results
+            ragged: `documents` and `scores` keep the shape (n_queries, k), the missing results
+            come last with the index -1 (None if a corpus is given) and the score -inf, and the
+            number of results of each query is returned in `Results.counts`. If False, the results
+            of filtered queries are object arrays of 1D arrays of varying lengths.
+
+        query_term_mode : str
+            How the repeated tokens of a query are scored. If "weighted", a token that appears n
+            times in the query contributes n times its score (the default, same scores as
+            scoring each occurrence). If "set", each distinct token contributes its score once.
+            In both cases, the posting list of a token is read once per query.
+
+        query_weights : List[List[float]], optional
+            The weight of each token of each query (same shape as `query_tokens`), by which the
+            score of the token is multiplied, e.g. to boost the tokens of a field or down-weight
+            expansion terms. The non-occurrence scores of bm25l and bm25+ use the same weights.
+            Unweighted queries are the same as queries with a weight of 1 for each token.
+
         Returns
         -------
         Results or np.ndarray
@@ -772,74 +1424,37 @@ class BM25:
         if n_threads == -1:
             n_threads = os.cpu_count()
 
-        # if it's a list of list of tokens ids (int), we remove any integer not in the vocab_dict
-        if is_list_of_list_of_type(query_tokens, type_=int):
-            if not hasattr(self, "unique_token_ids_set") or self.unique_token_ids_set is None:
-                raise ValueError(
-                    "The unique_token_ids_set attribute is not found. Please run the `index` method first, or make sure"
-                    "run retriever.load(load_vocab=True) before calling retrieve on list of list of token IDs (int)."
-                )
-            query_tokens_filtered = []
-            for query in query_tokens:
-                query_filtered = [
-                    token_id
-                    for token_id in query
-                    if token_id in self.unique_token_ids_set
-                ]
-                if len(query_filtered) == 0:
-                    if "" not in self.vocab_dict:
-                        raise ValueError(
-                            "The query does not contain any tokens that are in the vocabulary. "
-                            "Please provide a query that contains at least one token that is in the vocabulary. "
-                            "Alternatively, you can set `create_empty_token=True` when calling `index` to add an empty token to the vocabulary. "
-                            "You can also manually add an empty token to the vocabulary by setting `retriever.vocab_dict[''] = max(retriever.vocab_dict.values()) + 1`. "
-                            "Then, run `retriever.unique_token_ids_set = set(retriever.vocab_dict.values())` to update the unique token IDs."
-                        )
-                    query_filtered = [self.vocab_dict[""]]
-
-                query_tokens_filtered.append(query_filtered)
-
-            query_tokens = query_tokens_filtered
-
-        if isinstance(query_tokens, tuple) and not _is_tuple_of_list_of_tokens(
-            query_tokens
-        ):
-            if len(query_tokens) != 2:
-                msg = (
-                    "Expected a list of string or a tuple of two elements: the first element is the "
-                    "list of unique token IDs, "
-                    "and the second element is the list of token IDs for each document."
-                    f"Found {len(query_tokens)} elements instead."
-                )
-                raise ValueError(msg)
+        with profile_stage(profiler, "retrieve.tokens_to_ids"):
+            weighted = query_weights is not None or (
+                isinstance(query_tokens, list)
+                and len(query_tokens) > 0
+                and isinstance(query_tokens[0], dict)
+            )
+            if weighted:
+                # the token IDs are not filtered here, so that they stay aligned with the weights
+                query_tokens = self._normalize_query_tokens(query_tokens, filter_ids=False)
+                query_tokens, query_weights = self._get_weighted_query_ids(query_tokens, query_weights)
             else:
-                ids, vocab = query_tokens
-                if not isinstance(ids, Iterable):
-                    raise ValueError(
-                        "The first element of the tuple passed to retrieve must be an iterable."
-                    )
-                if not isinstance(vocab, dict):
-                    raise ValueError(
-                        "The second element of the tuple passed to retrieve must be a dictionary."
-                    )
-                query_tokens = tokenization.Tokenized(ids=ids, vocab=vocab)
+                query_tokens = self._normalize_query_tokens(query_tokens)
 
-        if isinstance(query_tokens, tokenization.Tokenized):
-            query_tokens = tokenization.convert_tokenized_to_string_list(query_tokens)
+        if profiler is not None:
+            profiler.add("retrieve.queries", len(query_tokens))
+
+        if corpus is False:
+            corpus = None
+        elif corpus is None:
+            corpus = self.corpus
 
-        corpus = corpus if corpus is not None else self.corpus
-        
         # Apply metadata filtering if filter conditions are provided
         # フィルタ条件が提供された場合、メタデータフィルタリングを適用します
         if filter is not None:
-            if self.metadata_filter is None:
-                raise ValueError("No metadata available for filtering. Please provide metadata during initialization or indexing.")
-            
-            # Get filtered document indices
-            # フィルタリングされた文書インデックスを取得します
-            filtered_indices = self.metadata_filter.apply_filter(filter)
-            
-            if len(filtered_indices) == 0:
+            with profile_stage(profiler, "retrieve.metadata_filter"):
+                filter_weight_mask = self._get_filter_weight_mask(filter)
+
+            if filter_weight_mask is None and dense:
+                logger.warning("No documents match the provided filter conditions")
+                filter_weight_mask = np.zeros(self.scores["num_docs"], dtype=self.dtype)
+            elif filter_weight_mask is None:
                 logger.warning("No documents match the provided filter conditions")
                 # Return empty results with correct structure for multiple queries
                 # 複数クエリ用の正しい構造で空の結果を返します
@@ -857,13 +1472,7 @@ class BM25:
                     return empty_results
                 else:
                     return np.array([], dtype=self.int_dtype)
-            
-            # Create weight mask from filtered indices
-            # フィルタリングされたインデックスからウェイトマスクを作成します
-            filter_weight_mask = self.metadata_filter.create_weight_mask(
-                filtered_indices, self.scores["num_docs"]
-            )
-            
+
             # Combine with existing weight_mask if provided
             # 既存のweight_maskと組み合わせます（提供されている場合）
             if weight_mask is not None:
@@ -885,6 +1494,10 @@ class BM25:
                     "The length of the weight_mask must be the same as the length of the corpus."
                 )
 
+        # the results excluded by the weight mask are marked as missing by the top-k kernels
+        fill_missing = dense and weight_mask is not None
+        counts = None
+
         if self.backend == "numba":
             if _retrieve_numba_functional is None:
                 raise ImportError(
@@ -895,195 +1508,404 @@ class BM25:
                 "numba" if backend_selection == "auto" else backend_selection
             )
             # if is list of list of int
-            if is_list_of_list_of_type(query_tokens, type_=int):
-                query_tokens_ids = query_tokens
-            elif is_list_of_list_of_type(query_tokens, type_=str):
-                query_tokens_ids = [self.get_tokens_ids(q) for q in query_tokens]
-            else:
-                raise ValueError(
-                    "The query_tokens must be a list of list of tokens (str for stemmed words, int for token ids matching corpus) or a tuple of two lists: the first list is the list of unique token IDs, and the second list is the list of token IDs for each document."
-                )
+            with profile_stage(profiler, "retrieve.tokens_to_ids"):
+                if weighted or is_list_of_list_of_type(query_tokens, type_=int):
+                    query_tokens_ids = query_tokens
+                elif is_list_of_list_of_type(query_tokens, type_=str):
+                    query_tokens_ids = [self.get_tokens_ids(q) for q in query_tokens]
+                else:
+                    raise ValueError(
+                        "The query_tokens must be a list of list of tokens (str for stemmed words, int for token ids matching corpus) or a tuple of two lists: the first list is the list of unique token IDs, and the second list is the list of token IDs for each document."
+                    )
 
-            res = _retrieve_numba_functional(
-                query_tokens_ids=query_tokens_ids,
-                scores=self.scores,
-                corpus=corpus,
-                k=k,
-                sorted=sorted,
-                return_as=return_as,
-                show_progress=show_progress,
-                leave_progress=leave_progress,
-                n_threads=n_threads,
-                chunksize=None,  # chunksize is ignored in the numba backend
-                backend_selection=backend_selection,  # backend_selection is ignored in the numba backend
-                dtype=self.dtype,
-                int_dtype=self.int_dtype,
-                nonoccurrence_array=self.nonoccurrence_array,
-                weight_mask=weight_mask,  # Pass weight_mask to numba backend
+            if profiler is not None:
+                self._record_postings(profiler, query_tokens_ids)
+
+            # the documents are looked up below, after the filtering of the results
+            with profile_stage(profiler, "retrieve.numba"):
+                out = _retrieve_numba_functional(
+                    query_tokens_ids=query_tokens_ids,
+                    scores=self.scores,
+                    corpus=None,
+                    k=k,
+                    sorted=sorted,
+                    return_as="tuple",
+                    show_progress=show_progress,
+                    leave_progress=leave_progress,
+                    n_threads=n_threads,
+                    chunksize=None,  # chunksize is ignored in the numba backend
+                    backend_selection=backend_selection,  # backend_selection is ignored in the numba backend
+                    dtype=self.dtype,
+                    int_dtype=self.int_dtype,
+                    nonoccurrence_array=self.nonoccurrence_array,
+                    weight_mask=weight_mask,  # Pass weight_mask to numba backend
+                    fill_missing=fill_missing,
+                    query_term_mode=query_term_mode,
+                    query_tokens_weights=query_weights,
+                )
+            if fill_missing:
+                indices, scores, counts = out
+            else:
+                indices, scores = out
+        else:
+            # Queries are scored and passed to the top-k selection in blocks, so that the selection
+            # is done with a single call per block. The block size is bounded by the memory taken by
+            # the (block_size, num_docs) array of scores.
+            block_size = self._get_query_block_size(
+                chunksize, n_queries=len(query_tokens), n_threads=n_threads
             )
+            block_starts = range(0, len(query_tokens), block_size)
+
+            tqdm_kwargs = {
+                "total": len(block_starts),
+                "desc": "BM25S Retrieve",
+                "leave": leave_progress,
+                "disable": not show_progress,
+            }
+            def topk_fn(start):
+                end = start + block_size
+                return self._get_top_k_results_batch(
+                    query_tokens[start:end],
+                    k=k,
+                    sorted=sorted,
+                    backend=backend_selection,
+                    weight_mask=weight_mask,
+                    profiler=profiler,
+                    fill_missing=fill_missing,
+                    query_term_mode=query_term_mode,
+                    query_weights_batch=None if query_weights is None else query_weights[start:end],
+                    # numba's thread pool must not be nested in the threads of the executor
+                    parallel=n_threads == 0,
+                )
 
-            if return_as == "tuple":
-                docs, scores = res[0], res[1]
-                
-                # Improved filtering for numba results
-                # numba結果の改善されたフィルタリング
-                if filter is not None or weight_mask is not None:
-                    filtered_docs = []
-                    filtered_scores = []
-                    
-                    for query_docs, query_scores in zip(docs, scores):
-                        # Keep only non-zero scores (filtered documents)
-                        # スコア0でないもののみを保持（フィルタリングされた文書）
-                        if len(query_scores) > 0:
-                            non_zero_mask = query_scores > 0
-                            if np.any(non_zero_mask):
-                                filtered_query_docs = query_docs[non_zero_mask]
-                                filtered_query_scores = query_scores[non_zero_mask]
-                            else:
-                                # No matching documents for this query
-                                # このクエリに一致する文書なし
-                                filtered_query_docs = np.array([], dtype=self.int_dtype)
-                                filtered_query_scores = np.array([], dtype=self.dtype)
-                        else:
-                            # Empty results for this query
-                            # このクエリの結果は空
-                            filtered_query_docs = np.array([], dtype=self.int_dtype)
-                            filtered_query_scores = np.array([], dtype=self.dtype)
-                        
-                        filtered_docs.append(filtered_query_docs)
-                        filtered_scores.append(filtered_query_scores)
-                    
-                    docs = np.array(filtered_docs, dtype=object)
-                    scores = np.array(filtered_scores, dtype=object)
-                
-                # Prepare metadata for numba results if requested
-                # numba結果に対してメタデータを準備します（要求された場合）
-                result_metadata = None
-                if return_metadata and self.metadata is not None:
-                    result_metadata = []
-                    for query_indices in docs:  # docs now contains filtered indices
-                        query_metadata = []
-                        if isinstance(query_indices, np.ndarray) and len(query_indices) > 0:
-                            for doc_idx in query_indices:
-                                if doc_idx < len(self.metadata):
-                                    query_metadata.append(self.metadata[doc_idx])
-                                else:
-                                    query_metadata.append({})
-                        result_metadata.append(query_metadata)
-                return Results(documents=docs, scores=scores, metadata=result_metadata)
+            if n_threads == 0:
+                # Use a simple map function to retrieve the results
+                out = list(tqdm(map(topk_fn, block_starts), **tqdm_kwargs))
             else:
-                return res
+                # Use concurrent.futures.ThreadPoolExecutor to parallelize the computation
+                with ThreadPoolExecutor(max_workers=n_threads) as executor:
+                    process_map = executor.map(topk_fn, block_starts)
+                    out = list(tqdm(process_map, **tqdm_kwargs))
+
+            scores = np.concatenate([block[0] for block in out], axis=0)
+            indices = np.concatenate([block[1] for block in out], axis=0)
+            if fill_missing:
+                counts = np.concatenate([block[2] for block in out], axis=0)
+
+        if dense and counts is None:
+            counts = np.full(len(indices), indices.shape[1], dtype=np.int64)
+
+        # Keep only the documents with a non-zero score when a filter or weight mask is used
+        # フィルタまたはウェイトマスク使用時はスコア0でない文書のみを保持します
+        if (filter is not None or weight_mask is not None) and not dense:
+            with profile_stage(profiler, "retrieve.filter_results"):
+                scores, indices = self._filter_zero_scores(scores, indices)
+
+        with profile_stage(profiler, "retrieve.corpus_lookup"):
+            if corpus is not None and (lazy or fields is not None):
+                retrieved_docs = utils.corpus.LazyDocuments(corpus, indices, fields=fields)
+                if not lazy:
+                    retrieved_docs = retrieved_docs.materialize()
+            else:
+                retrieved_docs = self._get_documents(corpus, indices)
 
-        tqdm_kwargs = {
-            "total": len(query_tokens),
-            "desc": "BM25S Retrieve",
-            "leave": leave_progress,
-            "disable": not show_progress,
-        }
-        topk_fn = partial(
-            self._get_top_k_results,
-            k=k,
-            sorted=sorted,
-            backend=backend_selection,
-            weight_mask=weight_mask,
-        )
+        # Prepare metadata for results if requested
+        # 要求された場合、結果用のメタデータを準備します
+        result_metadata = None
+        if return_metadata and self.metadata is not None:
+            with profile_stage(profiler, "retrieve.metadata"):
+                result_metadata = self._get_results_metadata(indices)
 
-        if n_threads == 0:
-            # Use a simple map function to retrieve the results
-            out = tqdm(map(topk_fn, query_tokens), **tqdm_kwargs)
+        if return_as == "tuple":
+            return Results(documents=retrieved_docs, scores=scores, metadata=result_metadata, counts=counts)
+        elif return_as == "documents":
+            return retrieved_docs
         else:
-            # Use concurrent.futures.ProcessPoolExecutor to parallelize the computation
-            with ThreadPoolExecutor(max_workers=n_threads) as executor:
-                process_map = executor.map(
-                    topk_fn,
-                    query_tokens,
-                    chunksize=chunksize,
+            raise ValueError("`return_as` must be either 'tuple' or 'documents'")
+
+    def _normalize_query_tokens(self, query_tokens, filter_ids: bool = True):
+        """
+        Convert the query tokens passed to `retrieve` to a list of list of tokens (str) or of
+        token IDs (int), removing the token IDs that are not in the vocabulary (unless
+        `filter_ids` is False, e.g. for weighted queries).
+        """
+        # if it's a list of list of tokens ids (int), we remove any integer not in the vocab_dict
+        if filter_ids and is_list_of_list_of_type(query_tokens, type_=int):
+            if not hasattr(self, "unique_token_ids_set") or self.unique_token_ids_set is None:
+                raise ValueError(
+                    "The unique_token_ids_set attribute is not found. Please run the `index` method first, or make sure"
+                    "run retriever.load(load_vocab=True) before calling retrieve on list of list of token IDs (int)."
+                )
+            query_tokens_filtered = []
+            for query in query_tokens:
+                query_filtered = [
+                    token_id
+                    for token_id in query
+                    if token_id in self.unique_token_ids_set
+                ]
+                if len(query_filtered) == 0:
+                    if "" not in self.vocab_dict:
+                        raise ValueError(
+                            "The query does not contain any tokens that are in the vocabulary. "
+                            "Please provide a query that contains at least one token that is in the vocabulary. "
+                            "Alternatively, you can set `create_empty_token=True` when calling `index` to add an empty token to the vocabulary. "
+                            "You can also manually add an empty token to the vocabulary by setting `retriever.vocab_dict[''] = max(retriever.vocab_dict.values()) + 1`. "
+                            "Then, run `retriever.unique_token_ids_set = set(retriever.vocab_dict.values())` to update the unique token IDs."
+                        )
+                    query_filtered = [self.vocab_dict[""]]
+
+                query_tokens_filtered.append(query_filtered)
+
+            query_tokens = query_tokens_filtered
+
+        if isinstance(query_tokens, tuple) and not _is_tuple_of_list_of_tokens(
+            query_tokens
+        ):
+            if len(query_tokens) != 2:
+                msg = (
+                    "Expected a list of string or a tuple of two elements: the first element is the "
+                    "list of unique token IDs, "
+                    "and the second element is the list of token IDs for each document."
+                    f"Found {len(query_tokens)} elements instead."
                 )
-                out = list(tqdm(process_map, **tqdm_kwargs))
+                raise ValueError(msg)
+            else:
+                ids, vocab = query_tokens
+                if not isinstance(ids, Iterable):
+                    raise ValueError(
+                        "The first element of the tuple passed to retrieve must be an iterable."
+                    )
+                if not isinstance(vocab, dict):
+                    raise ValueError(
+                        "The second element of the tuple passed to retrieve must be a dictionary."
+                    )
+                query_tokens = tokenization.Tokenized(ids=ids, vocab=vocab)
 
-        scores, indices = zip(*out)
-        scores, indices = np.array(scores), np.array(indices)
-        
-        # Improved filtering for non-numba results
-        # 非numba結果の改善されたフィルタリング
-        if filter is not None or weight_mask is not None:
-            filtered_scores = []
-            filtered_indices = []
-            
-            for query_scores, query_indices in zip(scores, indices):
-                # Keep only non-zero scores (filtered documents)
-                # スコア0でないもののみを保持（フィルタリングされた文書）
-                if len(query_scores) > 0:
-                    non_zero_mask = query_scores > 0
-                    if np.any(non_zero_mask):
-                        filtered_query_scores = query_scores[non_zero_mask]
-                        filtered_query_indices = query_indices[non_zero_mask]
-                    else:
-                        # No matching documents for this query
-                        # このクエリに一致する文書なし
-                        filtered_query_scores = np.array([], dtype=self.dtype)
-                        filtered_query_indices = np.array([], dtype=self.int_dtype)
+        if isinstance(query_tokens, tokenization.Tokenized):
+            query_tokens = tokenization.convert_tokenized_to_string_list(query_tokens)
+
+        return query_tokens
+
+    def _get_filter_weight_mask(self, filter: Dict[str, Any]):
+        """
+        Return the weight mask selecting the documents that match the metadata `filter`, or
+        None if no document matches.
+        """
+        if self.metadata_filter is None:
+            raise ValueError("No metadata available for filtering. Please provide metadata during initialization or indexing.")
+
+        # Get filtered document indices
+        # フィルタリングされた文書インデックスを取得します
+        filtered_indices = self.metadata_filter.apply_filter(filter)
+        if len(filtered_indices) == 0:
+            return None
+
+        # Create weight mask from filtered indices
+        # フィルタリングされたインデックスからウェイトマスクを作成します
+        return self.metadata_filter.create_weight_mask(
+            filtered_indices, self.scores["num_docs"]
+        )
+
+    def _filter_zero_scores(self, scores, indices):
+        """
+        Remove the results with a score of 0 (documents excluded by a filter or weight mask).
+        The results become object arrays, with one array of scores and indices per query.
+        """
+        filtered_scores = []
+        filtered_indices = []
+
+        for query_scores, query_indices in zip(scores, indices):
+            # Keep only non-zero scores (filtered documents)
+            # スコア0でないもののみを保持（フィルタリングされた文書）
+            if len(query_scores) > 0:
+                non_zero_mask = query_scores > 0
+                if np.any(non_zero_mask):
+                    filtered_query_scores = query_scores[non_zero_mask]
+                    filtered_query_indices = query_indices[non_zero_mask]
                 else:
-                    # Empty results for this query
-                    # このクエリの結果は空
+                    # No matching documents for this query
+                    # このクエリに一致する文書なし
                     filtered_query_scores = np.array([], dtype=self.dtype)
                     filtered_query_indices = np.array([], dtype=self.int_dtype)
-                
-                filtered_scores.append(filtered_query_scores)
-                filtered_indices.append(filtered_query_indices)
-            
-            scores = np.array(filtered_scores, dtype=object)
-            indices = np.array(filtered_indices, dtype=object)
+            else:
+                # Empty results for this query
+                # このクエリの結果は空
+                filtered_query_scores = np.array([], dtype=self.dtype)
+                filtered_query_indices = np.array([], dtype=self.int_dtype)
+
+            filtered_scores.append(filtered_query_scores)
+            filtered_indices.append(filtered_query_indices)
+
+        return np.array(filtered_scores, dtype=object), np.array(filtered_indices, dtype=object)
+
+    def _get_results_metadata(self, indices):
+        result_metadata = []
+        for query_indices in indices:
+            query_metadata = []
+            # Handle object arrays (from filtering) and empty results
+            # オブジェクト配列（フィルタリングから）と空の結果を処理
+            if isinstance(query_indices, np.ndarray) and len(query_indices) > 0:
+                for doc_idx in query_indices:
+                    if doc_idx < 0:
+                        # missing result of dense results
+                        query_metadata.append(None)
+                    elif doc_idx < len(self.metadata):
+                        query_metadata.append(self.metadata[doc_idx])
+                    else:
+                        query_metadata.append({})
+            # query_metadata will be empty list for queries with no results
+            # 結果のないクエリに対してはquery_metadataは空のリストになります
+            result_metadata.append(query_metadata)
+        return result_metadata
+
+    def _record_postings(self, profiler, query_tokens_ids):
+        """
+        Add the number of postings read for the given queries (lists of token IDs) to the
+        profiler counters, as well as the number of bytes of the data, indices and indptr
+        arrays they take. The posting list of a token repeated in a query is read once.
+        """
+        indptr = self.scores["indptr"]
+        token_ids = np.fromiter(
+            itertools.chain.from_iterable(query_tokens_ids), dtype=np.int64
+        )
+        query_pointers = np.cumsum([0] + [len(q) for q in query_tokens_ids], dtype=np.int64)
+        token_ids, _, _ = scoring._dedupe_query_tokens(token_ids, query_pointers)
+        token_ids = token_ids[token_ids < len(indptr) - 1]
+        postings = int((indptr[token_ids + 1] - indptr[token_ids]).sum())
+        bytes_per_posting = self.scores["data"].itemsize + self.scores["indices"].itemsize
+
+        profiler.add("retrieve.postings", postings)
+        profiler.add(
+            "retrieve.bytes_read",
+            postings * bytes_per_posting + 2 * len(token_ids) * indptr.itemsize,
+        )
+
+
+    def retrieve_iter(
+        self,
+        queries: Iterable,
+        batch_size: int = 256,
+        tokenizer=None,
+        corpus: List[Any] = None,
+        k: int = 10,
+        prefetch: int = 2,
+        **kwargs,
+    ):
+        """
+        Retrieve the top-k documents for a stream of queries. The queries are read from
+        `queries` (any iterable, e.g. a generator over a file) in batches of `batch_size`,
+        and a `Results` object is yielded for each batch, in the order of the queries.
 
+        Only `prefetch` batches are read ahead, so the memory used does not depend on the
+        total number of queries. While a batch is scored, the next batches are tokenized and
+        the documents of the previous batch are fetched from the corpus in a background thread.
+
+        Parameters
+        ----------
+        queries : Iterable
+            The queries to retrieve documents for. If `tokenizer` is None, each query must be
+            a list of tokens (str) or token IDs (int), as accepted by `retrieve`. Otherwise,
+            each query is a string that is tokenized with `tokenizer`.
+
+        batch_size : int
+            Number of queries in each batch (the last batch may be smaller).
+
+        tokenizer : bm25s.tokenization.Tokenizer, FrozenTokenizer or callable, optional
+            Tokenizer used to convert the string queries of a batch into tokens. A `Tokenizer`
+            is frozen once (see `Tokenizer.freeze`), so that its vocabulary is not modified
+            by the queries. Any other callable is called on the list of strings of each batch
+            and must return an input accepted by `retrieve`.
+
+        corpus : List[str] or np.ndarray
+            The documents to return instead of the indices. If not provided, `self.corpus`
+            is used when available.
+
+        k : int
+            Number of documents to retrieve for each query.
+
+        prefetch : int
+            Number of batches that are read and tokenized ahead of the batch being scored.
+
+        **kwargs
+            Other arguments passed to `retrieve` (e.g. `n_threads`, `backend_selection`,
+            `weight_mask`, `filter`, `return_metadata`, `lazy`, `fields`). `show_progress`
+            defaults to False.
+
+        Yields
+        ------
+        Results
+            The results of each batch, as returned by `retrieve(..., return_as="tuple")`.
+            They can be combined with `Results.merge`.
+        """
+        if batch_size < 1:
+            raise ValueError("`batch_size` must be a positive integer.")
+        if prefetch < 1:
+            raise ValueError("`prefetch` must be a positive integer.")
+        if "return_as" in kwargs:
+            raise ValueError("`retrieve_iter` always yields `Results` objects, `return_as` cannot be set.")
+
+        kwargs.setdefault("show_progress", False)
         corpus = corpus if corpus is not None else self.corpus
+        # the documents are looked up here rather than by `retrieve`, see `fetch_documents`
+        lazy = kwargs.pop("lazy", False)
+        fields = kwargs.pop("fields", None)
 
-        if corpus is None:
-            retrieved_docs = indices
-        else:
-            # if it is a JsonlCorpus object, we do not need to convert it to a list
-            if isinstance(corpus, utils.corpus.JsonlCorpus):
-                retrieved_docs = corpus[indices]
-            elif isinstance(corpus, np.ndarray) and corpus.ndim == 1:
-                retrieved_docs = corpus[indices]
+        if isinstance(tokenizer, tokenization.Tokenizer):
+            tokenizer = tokenizer.freeze()
+
+        def prepare(batch):
+            if tokenizer is not None:
+                return tokenizer(batch)
+            if isinstance(batch[0], str):
+                raise ValueError(
+                    "The queries are strings, but no tokenizer was provided. Please pass a "
+                    "`tokenizer` to `retrieve_iter`, or tokenize the queries beforehand."
+                )
+            return batch
+
+        def fetch_documents(results):
+            # same lookup as the "retrieve.corpus_lookup" stage of `retrieve`
+            if lazy or fields is not None:
+                documents = utils.corpus.LazyDocuments(corpus, results.documents, fields=fields)
+                if not lazy:
+                    documents = documents.materialize()
             else:
-                # Handle object arrays (from filtering)
-                # オブジェクト配列を処理（フィルタリングから）
-                if indices.dtype == object:
-                    retrieved_docs = []
-                    for query_indices in indices:
-                        query_docs = [corpus[i] for i in query_indices]
-                        retrieved_docs.append(np.array(query_docs))
-                    retrieved_docs = np.array(retrieved_docs, dtype=object)
-                else:
-                    index_flat = indices.flatten().tolist()
-                    results = [corpus[i] for i in index_flat]
-                    retrieved_docs = np.array(results).reshape(indices.shape)
+                documents = self._get_documents(corpus, results.documents)
+            return Results(
+                documents=documents, scores=results.scores, metadata=results.metadata, counts=results.counts
+            )
 
-        # Prepare metadata for results if requested
-        # 要求された場合、結果用のメタデータを準備します
-        result_metadata = None
-        if return_metadata and self.metadata is not None:
-            result_metadata = []
-            for query_indices in indices:
-                query_metadata = []
-                # Handle object arrays (from filtering) and empty results
-                # オブジェクト配列（フィルタリングから）と空の結果を処理
-                if isinstance(query_indices, np.ndarray) and len(query_indices) > 0:
-                    for doc_idx in query_indices:
-                        if doc_idx < len(self.metadata):
-                            query_metadata.append(self.metadata[doc_idx])
-                        else:
-                            query_metadata.append({})
-                # query_metadata will be empty list for queries with no results
-                # 結果のないクエリに対してはquery_metadataは空のリストになります
-                result_metadata.append(query_metadata)
+        batches = _iter_batches(queries, batch_size)
 
-        if return_as == "tuple":
-            return Results(documents=retrieved_docs, scores=scores, metadata=result_metadata)
-        elif return_as == "documents":
-            return retrieved_docs
-        else:
-            raise ValueError("`return_as` must be either 'tuple' or 'documents'")
+        # one worker tokenizes the upcoming batches, the other fetches the documents of the
+        # last scored batch; the scoring itself happens in the calling thread
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            pending = deque(
+                executor.submit(prepare, batch)
+                for batch in itertools.islice(batches, prefetch)
+            )
+            previous = None
+
+            while len(pending) > 0:
+                query_tokens = pending.popleft().result()
+                next_batch = next(batches, None)
+                if next_batch is not None:
+                    pending.append(executor.submit(prepare, next_batch))
+
+                results = self.retrieve(
+                    query_tokens, corpus=False, k=k, return_as="tuple", **kwargs
+                )
+
+                if corpus is None:
+                    yield results
+                    continue
+
+                if previous is not None:
+                    yield previous.result()
+                previous = executor.submit(fetch_documents, results)
+
+            if previous is not None:
+                yield previous.result()
 
     def save(
         self,
@@ -1097,6 +1919,8 @@ class BM25:
         nnoc_name="nonoccurrence_array.index.npy",
         corpus_name="corpus.jsonl",
         allow_pickle=False,
+        corpus_compression=None,
+        docs_per_block=64,
     ):
         """
         Save the BM25S index to the `save_dir` directory. This will save the scores array,
@@ -1134,6 +1958,15 @@ class BM25:
         allow_pickle : bool
             If True, the arrays will be saved using pickle. If False, the arrays will be saved
             in a more efficient format, but they will not be readable by older versions of numpy.
+
+        corpus_compression : str
+            If None, the corpus is saved as JSON lines to `corpus_name`. Otherwise, it is saved
+            to a block-compressed file with the ".blocks" extension (e.g. "corpus.blocks"),
+            compressed with this codec ("zlib", "lzma" or "zstd"), see
+            `bm25s.utils.corpus.save_compressed_corpus`.
+
+        docs_per_block : int
+            Number of documents per compressed block, if `corpus_compression` is set.
         """
         # Save the self.vocab_dict and self.score_matrix to the save_dir
         save_dir = Path(save_dir)
@@ -1178,7 +2011,17 @@ class BM25:
 
         corpus = corpus if corpus is not None else self.corpus
 
-        if corpus is not None:
+        if corpus is not None and corpus_compression is not None:
+            documents = (
+                {"id": i, "text": doc} if isinstance(doc, str) else doc for i, doc in enumerate(corpus)
+            )
+            utils.corpus.save_compressed_corpus(
+                documents,
+                save_dir / utils.corpus.change_extension(corpus_name, ".blocks"),
+                codec=corpus_compression,
+                docs_per_block=docs_per_block,
+            )
+        elif corpus is not None:
             with open(save_dir / corpus_name, "wt", encoding="utf-8") as f:
                 # if it's not an iterable, we skip
                 if not isinstance(corpus, Iterable):
@@ -1311,7 +2154,9 @@ class BM25:
             The name of the file that contains the corpus.
 
         load_corpus : bool
-            If True, the corpus will be loaded from the `corpus_name` file.
+            If True, the corpus will be loaded from the `corpus_name` file, or from the
+            block-compressed file saved with `save(..., corpus_compression=...)` (read lazily
+            with `bm25s.utils.corpus.CompressedCorpus` if `mmap=True`).
 
         mmap : bool
             Whether to use Memory-map for the np.load function. If false, the arrays will be loaded into memory.
@@ -1379,6 +2224,12 @@ class BM25:
 
                 bm25_obj.corpus = corpus
 
+            # otherwise, if a block-compressed corpus exists, load it
+            compressed_file = save_dir / utils.corpus.change_extension(corpus_name, ".blocks")
+            if not os.path.exists(corpus_file) and os.path.exists(compressed_file):
+                corpus = utils.corpus.CompressedCorpus(compressed_file)
+                bm25_obj.corpus = corpus if mmap is True else list(corpus)
+
         # if the method is one of BM25L or BM25+, we need to load the non-occurrence array
         # if it does not exist, we raise an error
         if bm25_obj.method in bm25_obj.methods_requiring_nonoccurrence:
@@ -1394,6 +2245,50 @@ class BM25:
 
         return bm25_obj
 
+    def save_container(self, path, corpus=None, metadata=None):
+        """
+        Save the index to a single file, with the arrays, vocabulary, parameters, metadata and
+        corpus in aligned sections (see `bm25s.container` for the layout). The file is written
+        to a temporary file and renamed, so that an interrupted save never leaves a partial index.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file.
+
+        corpus : List[Dict]
+            The corpus of documents. If None, `self.corpus` is saved when it is set.
+
+        metadata : List[Dict[str, Any]]
+            The metadata of the documents. If None, `self.metadata` is saved when it is set.
+        """
+        container.save_container(self, path, corpus=corpus, metadata=metadata)
+
+    @classmethod
+    def load_container(cls, path, mmap=True, load_corpus=False, load_metadata=True):
+        """
+        Load an index saved with `save_container`.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file.
+
+        mmap : bool
+            If True, the file is memory-mapped once and the arrays and the corpus are read
+            from the mapping without copies. If False, the file is read into memory.
+
+        load_corpus : bool
+            If True and the file contains a corpus, it is loaded as a read-only corpus whose
+            documents are decoded on access.
+
+        load_metadata : bool
+            If True and the file contains metadata, it is loaded and the metadata filter is built.
+        """
+        return container.load_container(
+            cls, path, mmap_file=mmap, load_corpus=load_corpus, load_metadata=load_metadata
+        )
+
     def activate_numba_scorer(self):
         """
         Activate the Numba scorer for the BM25 index. This will apply the Numba JIT
@@ -1422,4 +2317,25 @@ class BM25:
             _compute_relevance_from_scores_jit_ready
         )
 
-__all__ = ['Tokenizer', 'Tokenized', 'tokenize_ja']
+    def memory_report(self) -> Dict[str, Any]:
+        """
+        Break down the memory used by the index: the score arrays (`data`, `indices`, `indptr`,
+        resident or memory-mapped), `vocab_dict`, `unique_token_ids_set`, `nonoccurrence_array`,
+        `metadata`, `metadata_filter.field_indices` and the corpus, with the bytes that could be
+        saved by loading with mmap, quantizing the arrays or using a compact vocabulary.
+
+        To estimate the memory of a saved index without loading it, use
+        `bm25s.utils.memory.saved_index_memory_report(save_dir, mmap=...)`.
+
+        Returns
+        -------
+        Dict[str, Any]
+            A dictionary with the keys "components" (bytes and details of each component),
+            "total_bytes", "resident_bytes", "mapped_bytes", "num_docs" and "recommendations"
+            (sorted by decreasing savings).
+        """
+        return utils.memory.index_memory_report(self)
+
+from .merge import merge_indexes, save_term_statistics
+
+__all__ = ['Tokenizer', 'Tokenized', 'FrozenTokenizer', 'tokenize_ja']
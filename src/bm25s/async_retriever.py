@@ -0,0 +1,301 @@
+"""
+Asyncio front end for `BM25.retrieve`. Concurrent `await search(query)` calls are collected
+into micro-batches, which are retrieved with a single `retrieve` call in a worker thread, so
+that an async web app keeps the efficiency of batched retrieval.
+
+Example:
+
+```python
+async with AsyncRetriever(retriever, tokenizer=tokenizer, max_wait_ms=2) as searcher:
+    results = await asyncio.gather(*(searcher.search(q, k=10) for q in queries))
+```
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+from typing import Any, Dict, List, NamedTuple
+
+from . import BM25, Results
+from .tokenization import Tokenizer
+
+
+class _Request(NamedTuple):
+    query: Any
+    k: int
+    filter: Dict[str, Any]
+    future: asyncio.Future
+
+
+def _filter_key(filter):
+    if filter is None:
+        return None
+    try:
+        return json.dumps(filter, sort_keys=True)
+    except TypeError:
+        return repr(filter)
+
+
+class AsyncRetriever:
+    """
+    Wrap a `BM25` retriever to serve single queries from asyncio code with request
+    micro-batching.
+
+    A batch is sent to the retriever as soon as it holds `max_batch_size` queries, or
+    `max_wait_ms` milliseconds after its first query arrived, whichever comes first. Batches
+    are processed one at a time in a worker thread: while a batch is being retrieved, the next
+    one is collected, and it keeps growing (up to `max_batch_size`) until the worker thread is
+    free.
+
+    Parameters
+    ----------
+    retriever : BM25
+        An indexed (or loaded) retriever.
+
+    tokenizer : bm25s.tokenization.Tokenizer, FrozenTokenizer or callable, optional
+        Tokenizer used to convert string queries; it is called once per batch, in the worker
+        thread. A `Tokenizer` is frozen (see `Tokenizer.freeze`). If None, the queries passed
+        to `search` must already be tokenized.
+
+    corpus : List[Any] or np.ndarray, optional
+        Documents returned instead of the indices. Defaults to `retriever.corpus`.
+
+    k : int
+        Default number of documents returned by `search`.
+
+    max_batch_size : int
+        Maximum number of queries retrieved together.
+
+    max_wait_ms : float
+        Maximum time the first query of a batch waits for other queries to arrive.
+
+    max_queue_size : int
+        Maximum number of queries waiting to be batched. When the queue is full, `search`
+        waits until there is space in the queue. If 0, the queue is unbounded.
+
+    **retrieve_kwargs
+        Other arguments passed to `BM25.retrieve` (e.g. `n_threads`, `backend_selection`).
+    """
+
+    def __init__(
+        self,
+        retriever: BM25,
+        tokenizer=None,
+        corpus: List[Any] = None,
+        k: int = 10,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 2.0,
+        max_queue_size: int = 1024,
+        **retrieve_kwargs,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("`max_batch_size` must be a positive integer.")
+        if max_wait_ms < 0:
+            raise ValueError("`max_wait_ms` must be non-negative.")
+        if "return_as" in retrieve_kwargs:
+            raise ValueError("`AsyncRetriever` always returns `Results` objects, `return_as` cannot be set.")
+        if "filter" in retrieve_kwargs:
+            raise ValueError("The filter is set per query: pass `filter` to `search` instead.")
+
+        if isinstance(tokenizer, Tokenizer):
+            tokenizer = tokenizer.freeze()
+
+        self.retriever = retriever
+        self.tokenizer = tokenizer
+        self.corpus = corpus
+        self.k = k
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_size = max_queue_size
+        self.retrieve_kwargs = retrieve_kwargs
+        self.retrieve_kwargs.setdefault("show_progress", False)
+
+        self.num_batches = 0
+        self.num_queries = 0
+
+        self._queue = None
+        self._worker = None
+        self._executor = None
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """
+        Number of batches and queries retrieved so far, and the mean batch size.
+        """
+        return {
+            "num_batches": self.num_batches,
+            "num_queries": self.num_queries,
+            "mean_batch_size": self.num_queries / max(self.num_batches, 1),
+        }
+
+    async def start(self):
+        """
+        Start the batching task on the running event loop. It is called by `search` if needed.
+        """
+        if self._worker is not None:
+            return
+
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bm25s-async")
+        self._worker = asyncio.ensure_future(self._run())
+
+    async def close(self):
+        """
+        Wait for the queued queries to be retrieved, then stop the batching task and the
+        worker thread.
+        """
+        if self._worker is None:
+            return
+
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+
+        self._executor.shutdown(wait=True)
+        self._queue = None
+        self._worker = None
+        self._executor = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def search(self, query, k: int = None, filter: Dict[str, Any] = None) -> Results:
+        """
+        Retrieve the top-k documents for a single query.
+
+        Parameters
+        ----------
+        query : str or List[str] or List[int]
+            The query, as a string if a tokenizer was given, otherwise as a list of tokens.
+
+        k : int, optional
+            Number of documents to retrieve. Defaults to the `k` given to the constructor.
+
+        filter : Dict[str, Any], optional
+            Metadata filter conditions, see `BM25.retrieve`. Queries with different filters
+            are retrieved with separate `retrieve` calls.
+
+        Returns
+        -------
+        Results
+            The results of the query, with 1D `documents` and `scores` arrays, and the list of
+            metadata of the documents if `return_metadata=True` was given to the constructor.
+        """
+        await self.start()
+
+        k = self.k if k is None else k
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Request(query=query, k=k, filter=filter, future=future))
+
+        return await future
+
+    async def _run(self):
+        # the batch being retrieved in the worker thread, while the next one is collected
+        pending = None
+        try:
+            while True:
+                batch = await self._collect(pending)
+                if pending is not None:
+                    await pending
+                pending = asyncio.ensure_future(self._process_batch(batch))
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def _collect(self, pending) -> List[_Request]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_ms / 1000
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout > 0:
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    continue
+            elif pending is not None and not pending.done():
+                # the worker thread is still busy: keep collecting until it is free
+                get = asyncio.ensure_future(self._queue.get())
+                await asyncio.wait({get, pending}, return_when=asyncio.FIRST_COMPLETED)
+                if get.done() or not get.cancel():
+                    batch.append(get.result())
+            else:
+                break
+
+        return batch
+
+    async def _process_batch(self, batch: List[_Request]):
+        try:
+            await self._process(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _process(self, batch: List[_Request]):
+        # queries that were cancelled while waiting in the queue are not retrieved
+        batch = [request for request in batch if not request.future.done()]
+        if len(batch) == 0:
+            return
+
+        # the filter is applied to the whole retrieve call, so each filter gets its own group
+        groups = {}
+        for request in batch:
+            groups.setdefault(_filter_key(request.filter), []).append(request)
+
+        loop = asyncio.get_running_loop()
+        for requests in groups.values():
+            try:
+                results = await loop.run_in_executor(self._executor, self._retrieve, requests)
+            except Exception as e:
+                for request in requests:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+
+            for request, result in zip(requests, results):
+                if not request.future.done():
+                    request.future.set_result(result)
+
+        self.num_batches += 1
+        self.num_queries += len(batch)
+
+    def _retrieve(self, requests: List[_Request]) -> List[Results]:
+        queries = [request.query for request in requests]
+        query_tokens = self.tokenizer(queries) if self.tokenizer is not None else queries
+        k = max(request.k for request in requests)
+
+        results = self.retriever.retrieve(
+            query_tokens,
+            corpus=self.corpus,
+            k=k,
+            return_as="tuple",
+            filter=requests[0].filter,
+            **self.retrieve_kwargs,
+        )
+
+        out = []
+        for i, request in enumerate(requests):
+            metadata = None
+            if results.metadata is not None:
+                metadata = results.metadata[i][: request.k]
+            out.append(
+                Results(
+                    documents=results.documents[i][: request.k],
+                    scores=results.scores[i][: request.k],
+                    metadata=metadata,
+                )
+            )
+
+        return out
@@ -0,0 +1,9 @@
+"""
+Offline benchmarks for BM25S. `bm25s.bench.synthetic` generates synthetic corpora and queries,
+and `bm25s.bench.suite` (also available as `python -m bm25s.bench`) measures each stage of the
+pipeline on them. `bm25s.bench.beir` (`python -m bm25s.bench.beir`) evaluates BM25S end to end
+on BEIR datasets downloaded beforehand.
+"""
+
+from .synthetic import SyntheticCorpus, generate_corpus, generate_queries, iter_texts, make_vocabulary
+from .suite import run_benchmark
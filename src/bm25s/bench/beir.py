@@ -0,0 +1,378 @@
+"""
+End-to-end evaluation of BM25S on BEIR datasets that are already downloaded (see
+`bm25s.utils.beir.download_dataset`); no network access is needed. For each dataset, the
+pipeline is:
+
+- load the corpus, queries and qrels (`bm25s.utils.beir.load_corpus_columns`, ...)
+- tokenize the corpus, in parallel processes if `n_jobs > 1`
+- count the (document, token) pairs of the corpus, in parallel threads
+- for each combination of method, k1 and b: build the index from the counts, retrieve the
+  top-k documents of the queries, and evaluate them (`bm25s.utils.evaluation`)
+
+The corpus is tokenized and counted once, and the counts are reused by all the combinations of
+the sweep. The time and the peak memory of each stage, and the metrics of each combination,
+are written to JSON. Run it with:
+
+```bash
+python -m bm25s.bench.beir --datasets scifact nfcorpus --save-dir datasets \
+    --method lucene bm25+ --k1 0.9 1.2 1.5 --b 0.4 0.75 --output results.json
+```
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import itertools
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .. import BM25, scoring
+from ..tokenization import Tokenized, tokenize
+from ..utils.beir import load_corpus_columns, load_qrels_arrays, load_queries_columns
+from ..utils.benchmark import get_max_memory_usage
+from ..utils.evaluation import evaluate_results, qrels_to_matrix
+from .suite import NUMBA_IS_AVAILABLE, get_environment
+
+try:
+    import Stemmer
+except ImportError:
+    Stemmer = None
+
+
+def _get_stemmer(language):
+    if language is None:
+        return None
+    if Stemmer is None:
+        raise ImportError("PyStemmer is not installed. Please install it with `pip install PyStemmer`, or set `stemmer=None`.")
+    return Stemmer.Stemmer(language)
+
+
+def _tokenize_chunk(texts, stopwords, stemmer_language):
+    return tokenize(texts, stopwords=stopwords, stemmer=_get_stemmer(stemmer_language), show_progress=False)
+
+
+def tokenize_corpus(texts: List[str], stopwords="en", stemmer=None, n_jobs=1, chunksize=50_000) -> Tokenized:
+    """
+    Tokenize `texts` with `bm25s.tokenize`. If `n_jobs > 1`, chunks of `chunksize` texts are
+    tokenized in separate processes, and their vocabularies are merged. `stemmer` is the
+    language of a PyStemmer stemmer (e.g. "english"), since stemmers cannot be sent to other
+    processes.
+    """
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+    if n_jobs <= 1 or len(texts) <= chunksize:
+        return _tokenize_chunk(texts, stopwords, stemmer)
+
+    chunks = [texts[i : i + chunksize] for i in range(0, len(texts), chunksize)]
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=n_jobs, mp_context=context) as executor:
+        parts = list(executor.map(_tokenize_chunk, chunks, itertools.repeat(stopwords), itertools.repeat(stemmer)))
+
+    vocab = {}
+    ids = []
+    for part in parts:
+        # token ID of the chunk -> token ID of the merged vocabulary
+        mapping = [0] * len(part.vocab)
+        for token, token_id in part.vocab.items():
+            mapping[token_id] = vocab.setdefault(token, len(vocab))
+        ids.extend([mapping[t] for t in doc] for doc in part.ids)
+    return Tokenized(ids=ids, vocab=vocab)
+
+
+def count_corpus(corpus_ids: List[List[int]], n_jobs=1, chunksize=100_000, int_dtype="int32"):
+    """
+    Count the (document, token) pairs of a tokenized corpus, by chunks of documents counted in
+    parallel threads. Returns the arrays of `BM25.build_index_from_counts`: doc_indices,
+    voc_indices, tf_array and doc_lengths.
+    """
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+
+    def count_chunk(start):
+        docs = corpus_ids[start : start + chunksize]
+        doc_lengths = np.fromiter((len(doc) for doc in docs), dtype=np.int64, count=len(docs))
+        flat = np.fromiter(itertools.chain.from_iterable(docs), dtype=np.int64, count=int(doc_lengths.sum()))
+        return scoring._count_doc_term_pairs(flat, doc_lengths, doc_offset=start, int_dtype=int_dtype), doc_lengths
+
+    starts = range(0, len(corpus_ids), chunksize)
+    if n_jobs > 1:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            chunks = list(executor.map(count_chunk, starts))
+    else:
+        chunks = [count_chunk(start) for start in starts]
+
+    doc_indices, voc_indices, tf_array = (np.concatenate(arrs) for arrs in zip(*(counts for counts, _ in chunks)))
+    doc_lengths = np.concatenate([lengths for _, lengths in chunks])
+    return doc_indices, voc_indices, tf_array, doc_lengths
+
+
+def drop_identical_ids(indices: np.ndarray, scores: np.ndarray, query_doc_indices: np.ndarray, k: int):
+    """
+    Remove the document with the same ID as its query from the results of each query (as
+    `bm25s.utils.beir.evaluate` does by default), then keep the first k results. The results
+    of the queries without such a document lose their last result instead.
+    """
+    same = indices == query_doc_indices[:, None]
+    order = np.argsort(same, axis=1, kind="stable")
+    indices = np.where(np.take_along_axis(same, order, axis=1), -1, np.take_along_axis(indices, order, axis=1))
+    scores = np.take_along_axis(scores, order, axis=1)
+    return indices[:, :k], scores[:, :k]
+
+
+class _Stages:
+    """Time and peak memory of the stages of a run."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, fn, *args, **kwargs):
+        start = time.perf_counter()
+        out = fn(*args, **kwargs)
+        self.stages[name] = {
+            "time_s": time.perf_counter() - start,
+            "max_memory_gb": get_max_memory_usage("GB"),
+        }
+        return out
+
+
+def run_beir(
+    dataset: str,
+    save_dir: str = "./datasets",
+    split: str = None,
+    methods: List[str] = ("lucene",),
+    k1_values: List[float] = (1.5,),
+    b_values: List[float] = (0.75,),
+    k_values: List[int] = (1, 10, 100),
+    backend: str = None,
+    stopwords="en",
+    stemmer: str = None,
+    n_jobs: int = 1,
+    n_threads: int = 0,
+    ignore_identical_ids: bool = True,
+) -> Dict[str, Any]:
+    """
+    Evaluate BM25S on a BEIR dataset stored in `save_dir/dataset`, for all the combinations of
+    `methods`, `k1_values` and `b_values`, and return the times, memory and metrics as a
+    JSON-serializable dictionary.
+
+    Parameters
+    ----------
+    dataset : str
+        Name of the dataset, e.g. "scifact". It must have been downloaded to `save_dir`.
+
+    save_dir : str
+        Directory containing the datasets.
+
+    split : str
+        Split of the qrels. Defaults to "dev" for msmarco and "test" otherwise.
+
+    methods, k1_values, b_values : List
+        The parameters of `BM25` swept by the run.
+
+    k_values : List[int]
+        Cutoffs of the metrics. The largest one is the number of documents retrieved per query.
+
+    backend : str
+        Retrieval backend, "numpy" or "numba". Defaults to "numba" if it is installed.
+
+    stopwords : str or List[str]
+        Passed to `bm25s.tokenize`, for the corpus and the queries.
+
+    stemmer : str
+        Language of a PyStemmer stemmer, e.g. "english". No stemming if None.
+
+    n_jobs : int
+        Number of processes used to load and tokenize the corpus, and of threads used to count it.
+
+    n_threads : int
+        Passed to `retrieve`.
+
+    ignore_identical_ids : bool
+        If True, the document with the same ID as the query is not counted among the results.
+    """
+    if split is None:
+        split = "dev" if dataset == "msmarco" else "test"
+    if backend is None:
+        backend = "numba" if NUMBA_IS_AVAILABLE else "numpy"
+    k_values = sorted(set(k_values))
+    k = k_values[-1]
+
+    if not (Path(save_dir) / dataset).exists():
+        raise FileNotFoundError(
+            f"Dataset {dataset} not found in {save_dir}. Download it first, e.g. with "
+            f"`bm25s.utils.beir.download_dataset('{dataset}', save_dir='{save_dir}')`."
+        )
+
+    stages = _Stages()
+
+    def load():
+        corpus = load_corpus_columns(dataset, save_dir=save_dir, n_jobs=n_jobs, show_progress=False)
+        queries = load_queries_columns(dataset, save_dir=save_dir, show_progress=False)
+        qrels = load_qrels_arrays(dataset, split=split, save_dir=save_dir)
+        return corpus, queries, qrels
+
+    corpus, queries, (qrels_qids, qrels_dids, qrels_scores) = stages.run("load", load)
+    texts = [f"{title or ''} {text or ''}" for title, text in zip(corpus["title"], corpus["text"])]
+    doc_ids = corpus["ids"]
+    del corpus
+
+    # only the queries with relevance judgments are evaluated
+    judged = set(qrels_qids.tolist())
+    keep = [i for i, qid in enumerate(queries["ids"].tolist()) if qid in judged]
+    query_ids = queries["ids"][keep].tolist()
+    query_texts = [queries["text"][i] for i in keep]
+
+    corpus_tokens = stages.run(
+        "tokenize", tokenize_corpus, texts, stopwords=stopwords, stemmer=stemmer, n_jobs=n_jobs
+    )
+    del texts
+    query_tokens = tokenize(
+        query_texts, stopwords=stopwords, stemmer=_get_stemmer(stemmer), return_ids=False, show_progress=False
+    )
+
+    doc_indices, voc_indices, tf_array, doc_lengths = stages.run("count", count_corpus, corpus_tokens.ids, n_jobs=n_jobs)
+    vocab_dict = dict(corpus_tokens.vocab)
+    n_vocab = max(vocab_dict.values()) + 1
+    del corpus_tokens
+
+    doc_index = {did: i for i, did in enumerate(doc_ids.tolist())}
+    qrels = qrels_to_matrix(zip(qrels_qids.tolist(), qrels_dids.tolist(), qrels_scores.tolist()), query_ids, doc_index)
+    query_doc_indices = np.array([doc_index.get(qid, -1) for qid in query_ids], dtype=np.int64)
+
+    runs = []
+    for method, k1, b in itertools.product(methods, k1_values, b_values):
+        run_stages = _Stages()
+        retriever = BM25(method=method, k1=k1, b=b, backend=backend)
+
+        def build_index():
+            scores = retriever.build_index_from_counts(
+                doc_indices=doc_indices,
+                voc_indices=voc_indices,
+                tf_array=tf_array,
+                doc_lengths=doc_lengths,
+                n_vocab=n_vocab,
+            )
+            retriever._set_index(scores=scores, vocab_dict=dict(vocab_dict))
+
+        run_stages.run("index", build_index)
+
+        retrieve_k = min(k + 1 if ignore_identical_ids else k, len(doc_ids))
+        results = run_stages.run(
+            "retrieve",
+            retriever.retrieve,
+            query_tokens,
+            k=retrieve_k,
+            n_threads=n_threads,
+            show_progress=False,
+        )
+        indices, scores = results.documents, results.scores
+        if ignore_identical_ids:
+            indices, scores = drop_identical_ids(indices, scores, query_doc_indices, k)
+
+        metrics = run_stages.run("evaluate", evaluate_results, indices, qrels, k_values=k_values)
+        run_stages.stages["retrieve"]["qps"] = len(query_ids) / max(run_stages.stages["retrieve"]["time_s"], 1e-9)
+        runs.append(
+            {
+                "method": method,
+                "k1": k1,
+                "b": b,
+                "stages": run_stages.stages,
+                "index_bytes": int(sum(retriever.scores[key].nbytes for key in ("data", "indices", "indptr"))),
+                "metrics": metrics,
+            }
+        )
+        del retriever, results
+
+    return {
+        "dataset": dataset,
+        "split": split,
+        "config": {
+            "backend": backend,
+            "stopwords": stopwords,
+            "stemmer": stemmer,
+            "k_values": k_values,
+            "n_jobs": n_jobs,
+            "n_threads": n_threads,
+            "ignore_identical_ids": ignore_identical_ids,
+        },
+        "n_docs": len(doc_ids),
+        "n_queries": len(query_ids),
+        "n_vocab": n_vocab,
+        "stages": stages.stages,
+        "runs": runs,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bm25s.bench.beir",
+        description="Evaluate BM25S on BEIR datasets downloaded beforehand, sweeping the BM25 parameters.",
+    )
+    parser.add_argument("--datasets", nargs="+", required=True)
+    parser.add_argument("--save-dir", default="./datasets")
+    parser.add_argument("--split", default=None)
+    parser.add_argument("--method", nargs="+", default=["lucene"])
+    parser.add_argument("--k1", type=float, nargs="+", default=[1.5])
+    parser.add_argument("--b", type=float, nargs="+", default=[0.75])
+    parser.add_argument("--k-values", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--backend", default=None, choices=["numpy", "numba"])
+    parser.add_argument("--stopwords", default="en", help='Stopwords of `bm25s.tokenize`, "none" for no stopwords.')
+    parser.add_argument("--stemmer", default=None, help='Language of the PyStemmer stemmer, e.g. "english".')
+    parser.add_argument("--n-jobs", type=int, default=1)
+    parser.add_argument("--n-threads", type=int, default=0)
+    parser.add_argument("--keep-identical-ids", action="store_true", help="Do not remove the document with the ID of the query.")
+    parser.add_argument("--label", default=None, help="Free-form label stored with the results, e.g. a commit hash.")
+    parser.add_argument("--output", default=None, help="Path of the JSON file to write the results to.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    results = []
+    for dataset in args.datasets:
+        print(f"[bm25s.bench.beir] dataset={dataset}", file=sys.stderr)
+        result = run_beir(
+            dataset,
+            save_dir=args.save_dir,
+            split=args.split,
+            methods=args.method,
+            k1_values=args.k1,
+            b_values=args.b,
+            k_values=args.k_values,
+            backend=args.backend,
+            stopwords=None if args.stopwords == "none" else args.stopwords,
+            stemmer=args.stemmer,
+            n_jobs=args.n_jobs,
+            n_threads=args.n_threads,
+            ignore_identical_ids=not args.keep_identical_ids,
+        )
+        cutoff = 10 if 10 in result["config"]["k_values"] else result["config"]["k_values"][-1]
+        for run in result["runs"]:
+            print(
+                f"  {run['method']:<8} k1={run['k1']:<5} b={run['b']:<5} "
+                f"NDCG@{cutoff}={run['metrics'][f'NDCG@{cutoff}']:.4f}  "
+                f"{run['stages']['retrieve']['qps']:.1f} QPS",
+                file=sys.stderr,
+            )
+        results.append(result)
+
+    output = {"label": args.label, "environment": get_environment(), "datasets": results}
+    text = json.dumps(output, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+    return output
+
+
+if __name__ == "__main__":
+    main()
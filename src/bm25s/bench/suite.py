@@ -0,0 +1,349 @@
+"""
+Offline benchmark suite on synthetic corpora (see `bm25s.bench.synthetic`). It measures the
+time of each stage of a BM25S pipeline and writes the results to JSON, so that runs can be
+compared across commits:
+
+- tokenization (`bm25s.tokenize`)
+- indexing, with the numpy and numba backends
+- saving, and loading with and without mmap
+- retrieval throughput (QPS) and per-query latency percentiles, for the numpy, numba and
+  jax top-k backends, with and without a metadata filter
+
+Run it with:
+
+```bash
+python -m bm25s.bench --n-docs 10000 100000 --language en ja --output results.json
+```
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .. import BM25, __version__, tokenize
+from ..filtering import MetadataFilter
+from ..selection import JAX_IS_AVAILABLE
+from ..utils.benchmark import Timer, get_max_memory_usage
+from .synthetic import generate_corpus, generate_queries
+
+try:
+    import numba
+
+    NUMBA_IS_AVAILABLE = True
+except ImportError:
+    NUMBA_IS_AVAILABLE = False
+
+# The Japanese-like corpus is pre-segmented with spaces, so it is tokenized with the default
+# splitter; `stopwords="japanese"` would instead run the janome morphological analyzer.
+STOPWORDS = {"en": "en", "ja": None}
+
+
+def available_backends() -> List[str]:
+    """
+    Retrieval backends that can run in this environment.
+    """
+    backends = ["numpy"]
+    if NUMBA_IS_AVAILABLE:
+        backends.append("numba")
+    if JAX_IS_AVAILABLE:
+        backends.append("jax")
+    return backends
+
+
+def get_environment() -> Dict[str, Any]:
+    env = {
+        "bm25s_version": __version__,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+    if NUMBA_IS_AVAILABLE:
+        env["numba"] = numba.__version__
+    return env
+
+
+def latency_percentiles(latencies_s) -> Dict[str, float]:
+    latencies_ms = np.asarray(latencies_s, dtype=np.float64) * 1000
+    p50, p90, p99 = np.percentile(latencies_ms, [50, 90, 99])
+    return {
+        "mean": float(latencies_ms.mean()),
+        "p50": float(p50),
+        "p90": float(p90),
+        "p99": float(p99),
+        "max": float(latencies_ms.max()),
+    }
+
+
+def _make_retriever(index_dir, backend, mmap=False):
+    if backend == "numba":
+        retriever = BM25.load(index_dir, mmap=mmap)
+        retriever.backend = "numba"
+        return retriever, "auto"
+    return BM25.load(index_dir, mmap=mmap), backend
+
+
+def benchmark_retrieve(
+    retriever: BM25,
+    query_tokens,
+    backend_selection: str,
+    k: int = 10,
+    filter: Dict[str, Any] = None,
+    n_latency_queries: int = 200,
+    n_threads: int = 0,
+) -> Dict[str, Any]:
+    """
+    Measure the throughput of a single `retrieve` call on all queries, and the latency of
+    `retrieve` called on one query at a time. A first call, not measured, compiles the numba
+    and jax functions.
+    """
+    kwargs = dict(k=k, backend_selection=backend_selection, filter=filter, show_progress=False, n_threads=n_threads)
+    retriever.retrieve(query_tokens[:2], **kwargs)
+
+    start = time.perf_counter()
+    retriever.retrieve(query_tokens, **kwargs)
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    for query in query_tokens[:n_latency_queries]:
+        start = time.perf_counter()
+        retriever.retrieve([query], **kwargs)
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "n_queries": len(query_tokens),
+        "batch_time_s": elapsed,
+        "qps": len(query_tokens) / elapsed,
+        "latency_ms": latency_percentiles(latencies),
+    }
+
+
+def run_benchmark(
+    n_docs: int = 10_000,
+    n_queries: int = 1000,
+    language: str = "en",
+    vocab_size: int = 50_000,
+    mean_length: float = 60.0,
+    k: int = 10,
+    backends: List[str] = None,
+    n_latency_queries: int = 200,
+    n_threads: int = 0,
+    seed: int = 0,
+    tmp_dir: str = None,
+) -> Dict[str, Any]:
+    """
+    Run all the stages of the benchmark on one synthetic corpus, and return the results as a
+    JSON-serializable dictionary.
+
+    Parameters
+    ----------
+    n_docs : int
+        Number of documents of the synthetic corpus.
+
+    n_queries : int
+        Number of queries used to measure the retrieval throughput.
+
+    language : str
+        "en" or "ja", see `bm25s.bench.synthetic.generate_corpus`.
+
+    vocab_size : int
+        Number of distinct words of the synthetic corpus.
+
+    mean_length : float
+        Mean number of words per document.
+
+    k : int
+        Number of documents retrieved per query.
+
+    backends : List[str]
+        Retrieval backends to benchmark, among "numpy", "numba" and "jax". Defaults to all the
+        available backends. The numba indexing backend is benchmarked if "numba" is included.
+
+    n_latency_queries : int
+        Number of queries retrieved one at a time to measure the latency.
+
+    n_threads : int
+        Passed to `retrieve`.
+
+    seed : int
+        Random seed of the corpus and queries.
+
+    tmp_dir : str
+        Directory where the index is saved. Defaults to a temporary directory, which is removed
+        at the end.
+    """
+    backends = available_backends() if backends is None else list(backends)
+    for backend in backends:
+        if backend not in available_backends():
+            raise ValueError(f"Backend {backend} is not available. Available backends: {available_backends()}")
+
+    timer = Timer("[bm25s.bench]")
+    results = {
+        "config": {
+            "n_docs": n_docs,
+            "n_queries": n_queries,
+            "language": language,
+            "vocab_size": vocab_size,
+            "mean_length": mean_length,
+            "k": k,
+            "backends": backends,
+            "n_threads": n_threads,
+            "seed": seed,
+        },
+    }
+
+    t = timer.start("generate")
+    corpus = generate_corpus(
+        n_docs, vocab_size=vocab_size, language=language, mean_length=mean_length, seed=seed
+    )
+    queries = generate_queries(n_queries, corpus.vocabulary, seed=seed + 10)
+    results["generate_s"] = timer.stop(t)
+
+    stopwords = STOPWORDS[language]
+    t = timer.start("tokenize")
+    corpus_tokens = tokenize(corpus.texts, stopwords=stopwords, show_progress=False)
+    tokenize_s = timer.stop(t)
+    n_tokens = int(sum(len(doc) for doc in corpus_tokens.ids))
+    results["tokenize"] = {
+        "time_s": tokenize_s,
+        "docs_per_s": n_docs / tokenize_s,
+        "n_tokens": n_tokens,
+        "vocab_size": len(corpus_tokens.vocab),
+    }
+
+    query_tokens = tokenize(queries, stopwords=stopwords, return_ids=False, show_progress=False)
+    metadata = corpus.metadata
+    del corpus
+
+    results["index"] = {}
+    index_backends = ["numpy"] + (["numba"] if "numba" in backends else [])
+    retriever = None
+    for index_backend in index_backends:
+        if index_backend == "numba":
+            # compile the numba kernels before measuring
+            warmup_tokens = tokenize(["warm up the kernels"], stopwords=None, show_progress=False)
+            BM25(backend="numba").index(warmup_tokens, show_progress=False)
+
+        retriever = BM25(backend=index_backend)
+        gc.collect()
+        t = timer.start(f"index_{index_backend}")
+        retriever.index(corpus_tokens, show_progress=False)
+        index_s = timer.stop(t)
+        results["index"][index_backend] = {"time_s": index_s, "docs_per_s": n_docs / index_s}
+
+    retriever.backend = "numpy"
+    del corpus_tokens
+
+    cleanup = tmp_dir is None
+    index_dir = tempfile.mkdtemp() if tmp_dir is None else tmp_dir
+    try:
+        t = timer.start("save")
+        retriever.save(index_dir)
+        results["save"] = {"time_s": timer.stop(t)}
+        results["index_size_bytes"] = sum(
+            os.path.getsize(os.path.join(index_dir, f)) for f in os.listdir(index_dir)
+        )
+        del retriever
+
+        results["load"] = {}
+        for mmap in [False, True]:
+            name = "mmap" if mmap else "in_memory"
+            t = timer.start(f"load_{name}")
+            BM25.load(index_dir, mmap=mmap)
+            results["load"][name] = {"time_s": timer.stop(t)}
+
+        results["retrieve"] = {}
+        category_filter = {"category": 0}
+        for backend in backends:
+            for mmap in [False, True]:
+                retriever, backend_selection = _make_retriever(index_dir, backend, mmap=mmap)
+                retriever.metadata = metadata
+                retriever.metadata_filter = MetadataFilter(metadata)
+                for use_filter in [False, True]:
+                    name = f"{backend}{'_mmap' if mmap else ''}{'_filter' if use_filter else ''}"
+                    results["retrieve"][name] = benchmark_retrieve(
+                        retriever,
+                        query_tokens,
+                        backend_selection=backend_selection,
+                        k=k,
+                        filter=category_filter if use_filter else None,
+                        n_latency_queries=n_latency_queries,
+                        n_threads=n_threads,
+                    )
+                del retriever
+    finally:
+        if cleanup:
+            shutil.rmtree(index_dir, ignore_errors=True)
+
+    results["max_memory_gb"] = get_max_memory_usage("GB")
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bm25s.bench", description="Run the BM25S benchmark suite on synthetic corpora."
+    )
+    parser.add_argument("--n-docs", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--n-queries", type=int, default=1000)
+    parser.add_argument("--language", nargs="+", default=["en"], choices=["en", "ja"])
+    parser.add_argument("--vocab-size", type=int, default=50_000)
+    parser.add_argument("--mean-length", type=float, default=60.0)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--backends", nargs="+", default=None, choices=["numpy", "numba", "jax"])
+    parser.add_argument("--n-latency-queries", type=int, default=200)
+    parser.add_argument("--n-threads", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--label", default=None, help="Free-form label stored with the results, e.g. a commit hash.")
+    parser.add_argument("--output", default=None, help="Path of the JSON file to write the results to.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    runs = []
+    for language in args.language:
+        for n_docs in args.n_docs:
+            print(f"[bm25s.bench] language={language} n_docs={n_docs}", file=sys.stderr)
+            run = run_benchmark(
+                n_docs=n_docs,
+                n_queries=args.n_queries,
+                language=language,
+                vocab_size=args.vocab_size,
+                mean_length=args.mean_length,
+                k=args.k,
+                backends=args.backends,
+                n_latency_queries=args.n_latency_queries,
+                n_threads=args.n_threads,
+                seed=args.seed,
+            )
+            for name, r in run["retrieve"].items():
+                print(
+                    f"  {name:<22} {r['qps']:>10.1f} QPS  p50={r['latency_ms']['p50']:.3f}ms  p99={r['latency_ms']['p99']:.3f}ms",
+                    file=sys.stderr,
+                )
+            runs.append(run)
+
+    output = {"label": args.label, "environment": get_environment(), "runs": runs}
+    text = json.dumps(output, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+    return output
+
+
+if __name__ == "__main__":
+    main()
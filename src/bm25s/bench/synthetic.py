@@ -0,0 +1,246 @@
+"""
+Synthetic corpus and query generator for offline benchmarks.
+
+Words are drawn from a Zipfian distribution over a generated vocabulary, and document lengths
+follow a log-normal distribution, which gives posting lists and document length statistics
+close to the ones of real collections. Two languages are supported:
+
+- "en": English-like words made of random syllables, separated by spaces.
+- "ja": Japanese-like words made of kanji, hiragana and katakana, with particles between
+  words. By default, the words are separated by spaces (as in the output of a Japanese
+  morphological analyzer); with `segmented=False`, they are concatenated without spaces.
+
+合成コーパスとクエリを生成します。語彙はZipf分布に従い、文書長は対数正規分布に従います。
+"""
+
+from typing import Any, Dict, Iterator, List, NamedTuple
+
+import numpy as np
+
+_EN_ONSETS = ["", "b", "c", "d", "f", "g", "h", "k", "l", "m", "n", "p", "r", "s", "t", "v", "w", "z", "st", "tr", "ch", "sh"]
+_EN_VOWELS = ["a", "e", "i", "o", "u", "ai", "ea", "ou"]
+_EN_CODAS = ["", "", "n", "r", "s", "t", "l", "m", "ng", "ck"]
+
+_HIRAGANA = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+_KATAKANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+_KANJI = "日本語学校先生時間会社電話仕事名前友達家族天気映画音楽料理旅行自動車新聞経済政治文化技術情報研究開発世界社会問題"
+_JA_PARTICLES = ["の", "は", "が", "を", "に", "で", "と", "も"]
+
+
+class SyntheticCorpus(NamedTuple):
+    """
+    A generated corpus: the texts, the metadata of each document (a `category` between 0 and
+    `n_categories - 1`, usable with metadata filters), and the vocabulary the words were
+    drawn from, sorted by decreasing frequency.
+    """
+
+    texts: List[str]
+    metadata: List[Dict[str, Any]]
+    vocabulary: List[str]
+
+
+def _make_en_word(rng: np.random.Generator) -> str:
+    n_syllables = rng.integers(1, 4)
+    return "".join(
+        _EN_ONSETS[rng.integers(len(_EN_ONSETS))]
+        + _EN_VOWELS[rng.integers(len(_EN_VOWELS))]
+        + _EN_CODAS[rng.integers(len(_EN_CODAS))]
+        for _ in range(n_syllables)
+    )
+
+
+def _make_ja_word(rng: np.random.Generator) -> str:
+    kind = rng.random()
+    if kind < 0.5:
+        # kanji compound, optionally followed by hiragana (okurigana)
+        word = "".join(_KANJI[i] for i in rng.integers(len(_KANJI), size=rng.integers(1, 4)))
+        if rng.random() < 0.3:
+            word += "".join(_HIRAGANA[i] for i in rng.integers(len(_HIRAGANA), size=rng.integers(1, 3)))
+    elif kind < 0.8:
+        word = "".join(_KATAKANA[i] for i in rng.integers(len(_KATAKANA), size=rng.integers(2, 6)))
+    else:
+        word = "".join(_HIRAGANA[i] for i in rng.integers(len(_HIRAGANA), size=rng.integers(2, 5)))
+    return word
+
+
+def make_vocabulary(vocab_size: int, language: str = "en", seed: int = 0) -> List[str]:
+    """
+    Generate `vocab_size` unique words. Shorter words tend to come first, so that the most
+    frequent words of the Zipfian distribution are also the shortest, as in natural text.
+    """
+    if language == "en":
+        make_word = _make_en_word
+    elif language == "ja":
+        make_word = _make_ja_word
+    else:
+        raise ValueError(f"Unknown language: {language}. Choose from 'en' or 'ja'.")
+
+    rng = np.random.default_rng(seed)
+    words = set()
+    vocabulary = []
+    n_attempts = 0
+    while len(vocabulary) < vocab_size:
+        word = make_word(rng)
+        n_attempts += 1
+        if len(word) < 2 or word in words:
+            if n_attempts > 100 * vocab_size:
+                raise ValueError(f"Could not generate {vocab_size} unique words, try a smaller vocabulary.")
+            continue
+        words.add(word)
+        vocabulary.append(word)
+
+    vocabulary.sort(key=len)
+    return vocabulary
+
+
+def zipf_cdf(vocab_size: int, exponent: float = 1.07, offset: float = 2.7) -> np.ndarray:
+    """
+    Cumulative distribution of the Zipf-Mandelbrot law, where the probability of the word of
+    rank r is proportional to 1 / (r + offset) ** exponent.
+    """
+    ranks = np.arange(1, vocab_size + 1, dtype=np.float64)
+    weights = 1.0 / (ranks + offset) ** exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def sample_doc_lengths(
+    n_docs: int, rng: np.random.Generator, mean_length: float = 60.0, sigma: float = 0.7, max_length: int = 2000
+) -> np.ndarray:
+    """
+    Sample document lengths (in words) from a log-normal distribution with the given mean.
+    """
+    mu = np.log(mean_length) - sigma**2 / 2
+    lengths = rng.lognormal(mu, sigma, size=n_docs)
+    return np.clip(np.rint(lengths), 1, max_length).astype(np.int64)
+
+
+def _join_words(words: List[str], language: str, segmented: bool, rng: np.random.Generator) -> str:
+    if language == "en":
+        return " ".join(words)
+
+    # insert a particle after about half of the words, and end the sentence with a period
+    particles = rng.integers(len(_JA_PARTICLES), size=len(words))
+    use_particle = rng.random(len(words)) < 0.5
+    parts = []
+    for word, p, use in zip(words, particles, use_particle):
+        parts.append(word)
+        if use:
+            parts.append(_JA_PARTICLES[p])
+    sep = " " if segmented else ""
+    return sep.join(parts) + "。"
+
+
+def iter_texts(
+    n_docs: int,
+    vocabulary: List[str],
+    language: str = "en",
+    mean_length: float = 60.0,
+    exponent: float = 1.07,
+    segmented: bool = True,
+    chunksize: int = 10_000,
+    seed: int = 0,
+) -> Iterator[str]:
+    """
+    Generate the texts of `n_docs` documents, `chunksize` documents at a time, so that corpora
+    with millions of documents can be streamed without being held in memory.
+    """
+    rng = np.random.default_rng(seed)
+    cdf = zipf_cdf(len(vocabulary), exponent=exponent)
+    vocabulary = np.asarray(vocabulary, dtype=object)
+
+    for start in range(0, n_docs, chunksize):
+        lengths = sample_doc_lengths(min(chunksize, n_docs - start), rng, mean_length=mean_length)
+        word_ids = np.searchsorted(cdf, rng.random(lengths.sum()), side="right")
+        words = vocabulary[np.minimum(word_ids, len(vocabulary) - 1)]
+
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        for i in range(len(lengths)):
+            yield _join_words(words[offsets[i] : offsets[i + 1]].tolist(), language, segmented, rng)
+
+
+def generate_corpus(
+    n_docs: int,
+    vocab_size: int = 50_000,
+    language: str = "en",
+    mean_length: float = 60.0,
+    exponent: float = 1.07,
+    n_categories: int = 10,
+    segmented: bool = True,
+    seed: int = 0,
+) -> SyntheticCorpus:
+    """
+    Generate a corpus of `n_docs` documents. The output only depends on the arguments, so the
+    same corpus can be regenerated to compare results across commits.
+
+    Parameters
+    ----------
+    n_docs : int
+        Number of documents.
+
+    vocab_size : int
+        Number of distinct words the documents are drawn from.
+
+    language : str
+        "en" for English-like text, "ja" for Japanese-like text.
+
+    mean_length : float
+        Mean number of words per document.
+
+    exponent : float
+        Exponent of the Zipfian distribution of the words.
+
+    n_categories : int
+        Number of values of the `category` metadata field, assigned uniformly at random.
+
+    segmented : bool
+        For "ja", whether the words are separated by spaces.
+
+    seed : int
+        Random seed.
+    """
+    vocabulary = make_vocabulary(vocab_size, language=language, seed=seed)
+    texts = list(
+        iter_texts(
+            n_docs,
+            vocabulary,
+            language=language,
+            mean_length=mean_length,
+            exponent=exponent,
+            segmented=segmented,
+            seed=seed + 1,
+        )
+    )
+    categories = np.random.default_rng(seed + 2).integers(n_categories, size=n_docs)
+    metadata = [{"category": int(c)} for c in categories]
+
+    return SyntheticCorpus(texts=texts, metadata=metadata, vocabulary=vocabulary)
+
+
+def generate_queries(
+    n_queries: int,
+    vocabulary: List[str],
+    mean_length: float = 3.0,
+    exponent: float = 1.07,
+    skip_top: int = 50,
+    seed: int = 0,
+) -> List[str]:
+    """
+    Generate queries of 1 + Poisson(mean_length - 1) words. The words follow the same Zipfian
+    distribution as the documents, without the `skip_top` most frequent words (which play
+    the role of stopwords and rarely appear in real queries). The words are separated by
+    spaces, for both languages.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = vocabulary[skip_top:] if len(vocabulary) > skip_top else vocabulary
+    cdf = zipf_cdf(len(vocabulary), exponent=exponent)
+
+    lengths = 1 + rng.poisson(max(mean_length - 1, 0), size=n_queries)
+    word_ids = np.minimum(np.searchsorted(cdf, rng.random(lengths.sum()), side="right"), len(vocabulary) - 1)
+
+    queries = []
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    for i in range(n_queries):
+        queries.append(" ".join(vocabulary[j] for j in word_ids[offsets[i] : offsets[i + 1]]))
+
+    return queries
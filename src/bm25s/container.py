@@ -0,0 +1,292 @@
+"""
+Single-file index format. `BM25.save_container` writes the whole index (score arrays,
+non-occurrence array, vocabulary, parameters, metadata and corpus) to one file, and
+`BM25.load_container` reads it back, with all the arrays read zero-copy from a single mmap.
+
+Layout of the file (all integers are little-endian):
+
+```
+offset 0    magic            8 bytes, b"BM25SIDX"
+offset 8    format version   uint32
+offset 12   flags            uint32 (reserved, 0)
+offset 16   table length     uint64, length of the section table in bytes
+offset 24   section table    UTF-8 JSON
+            padding to a multiple of ALIGNMENT bytes
+            sections, each starting at a multiple of ALIGNMENT bytes
+```
+
+The section table holds the format version, the bm25s version and parameters of the index,
+the size of the file (to detect truncated copies), and for each section its name, kind
+("array", "json" or "jsonl"), offset (relative to the end of the padded table), length in
+bytes, and the dtype and shape of arrays. Readers must ignore the sections they do not know,
+and refuse files with a format version newer than `FORMAT_VERSION`.
+
+The file is written to a temporary file in the same directory, then renamed, so a reader never
+sees a partially written index.
+"""
+
+import mmap
+import os
+from pathlib import Path
+import stat
+import struct
+import tempfile
+from typing import Any, Dict, List
+
+import numpy as np
+
+from .utils import json_functions
+from .utils.corpus import documents_array
+
+MAGIC = b"BM25SIDX"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+_PREAMBLE = struct.Struct("<8sIIQ")
+
+
+def _align(n: int) -> int:
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+
+class ContainerCorpus:
+    """
+    Read-only corpus stored in a section of an index container: the documents are JSON lines,
+    decoded on access, and `offsets[i]` is the position of the i-th line in the section.
+    Indexing follows `bm25s.utils.corpus.JsonlCorpus`.
+    """
+
+    def __init__(self, buffer, start: int, offsets: np.ndarray):
+        self.buffer = buffer
+        self.start = start
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _get(self, i: int):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Document index out of range")
+        begin = self.start + int(self.offsets[i])
+        end = self.start + int(self.offsets[i + 1])
+        return json_functions.loads(bytes(self.buffer[begin:end]))
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self._get(int(index))
+        if isinstance(index, slice):
+            return [self._get(i) for i in range(*index.indices(len(self)))]
+        if isinstance(index, (list, tuple)):
+            return [self._get(i) for i in index]
+        if isinstance(index, np.ndarray):
+            return documents_array([self._get(i) for i in index.flatten().tolist()], index.shape)
+
+        raise TypeError("Invalid index type")
+
+
+def _corpus_lines(corpus) -> List[bytes]:
+    # same representation of the documents as `BM25.save`
+    lines = []
+    for i, doc in enumerate(corpus):
+        if isinstance(doc, str):
+            doc = {"id": i, "text": doc}
+        lines.append(json_functions.dumps(doc, ensure_ascii=False).encode("utf-8") + b"\n")
+    return lines
+
+
+def _default_file_mode(path: Path) -> int:
+    # `tempfile.mkstemp` creates the file with mode 0600: the saved file gets the mode of the
+    # file it replaces, or the mode of a newly created file
+    if path.exists():
+        return stat.S_IMODE(path.stat().st_mode)
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def save_container(retriever, path, corpus=None, metadata=None):
+    """
+    Write the index of `retriever` to the single file `path`, atomically. See
+    `BM25.save_container`.
+    """
+    path = Path(path)
+    if corpus is None:
+        corpus = retriever.corpus
+    if metadata is None:
+        metadata = retriever.metadata
+
+    sections = []  # (table entry, payload)
+
+    def add_array(name, arr):
+        arr = np.asarray(arr)
+        arr = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder("<"))
+        entry = {"name": name, "kind": "array", "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        sections.append((entry, arr))
+
+    def add_bytes(name, kind, payload):
+        sections.append(({"name": name, "kind": kind}, payload))
+
+    for name in ("data", "indices", "indptr"):
+        add_array(name, retriever.scores[name])
+    if retriever.nonoccurrence_array is not None:
+        add_array("nonoccurrence_array", retriever.nonoccurrence_array)
+    add_bytes("vocab", "json", json_functions.dumps(retriever.vocab_dict, ensure_ascii=False).encode("utf-8"))
+    if metadata is not None:
+        add_bytes("metadata", "json", json_functions.dumps(list(metadata), ensure_ascii=False).encode("utf-8"))
+    if corpus is not None:
+        lines = _corpus_lines(corpus)
+        offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+        np.cumsum([len(line) for line in lines], out=offsets[1:])
+        add_bytes("corpus", "jsonl", b"".join(lines))
+        add_array("corpus_offsets", offsets)
+
+    offset = 0
+    for entry, payload in sections:
+        entry["offset"] = offset
+        entry["length"] = int(payload.nbytes) if isinstance(payload, np.ndarray) else len(payload)
+        offset = _align(offset + entry["length"])
+
+    from . import __version__
+
+    params = dict(
+        k1=retriever.k1,
+        b=retriever.b,
+        delta=retriever.delta,
+        method=retriever.method,
+        idf_method=retriever.idf_method,
+        dtype=retriever.dtype,
+        int_dtype=retriever.int_dtype,
+        backend=retriever.backend,
+    )
+    table = {
+        "format_version": FORMAT_VERSION,
+        "version": __version__,
+        "params": params,
+        "num_docs": int(retriever.scores["num_docs"]),
+        "sections": [entry for entry, _ in sections],
+    }
+    # the size of the file depends on the length of the table, which contains it: the length
+    # of the table is computed with a placeholder of the same width
+    table["file_size"] = 0
+    table_length = len(json_functions.dumps(table).encode("utf-8")) + 20
+    data_start = _align(_PREAMBLE.size + table_length)
+    table["file_size"] = data_start + (sections[-1][0]["offset"] + sections[-1][0]["length"])
+    table_bytes = json_functions.dumps(table).encode("utf-8").ljust(table_length)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, table_length))
+            f.write(table_bytes)
+            for entry, payload in sections:
+                f.write(b"\0" * (data_start + entry["offset"] - f.tell()))
+                f.write(payload.tobytes() if isinstance(payload, np.ndarray) else payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, _default_file_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_container_table(path) -> Dict[str, Any]:
+    """
+    Read and validate the header and section table of a container, without reading the
+    sections. The offsets of the returned sections are absolute.
+    """
+    with open(path, "rb") as f:
+        return _read_table(f.read(_PREAMBLE.size), f, os.fstat(f.fileno()).st_size)
+
+
+def _read_table(preamble: bytes, f, file_size: int) -> Dict[str, Any]:
+    if len(preamble) < _PREAMBLE.size:
+        raise ValueError("The file is too small to be a BM25S index container.")
+    magic, version, _, table_length = _PREAMBLE.unpack(preamble)
+    if magic != MAGIC:
+        raise ValueError("The file is not a BM25S index container.")
+    if version > FORMAT_VERSION:
+        raise ValueError(
+            f"The index container has format version {version}, but this version of bm25s only "
+            f"supports versions up to {FORMAT_VERSION}. Please upgrade bm25s."
+        )
+
+    table = json_functions.loads(f.read(table_length))
+    if file_size != table["file_size"]:
+        raise ValueError(
+            f"The index container is truncated or corrupted: expected {table['file_size']} bytes, found {file_size}."
+        )
+
+    data_start = _align(_PREAMBLE.size + table_length)
+    for entry in table["sections"]:
+        entry["offset"] += data_start
+    table["sections"] = {entry["name"]: entry for entry in table["sections"]}
+    return table
+
+
+def load_container(cls, path, mmap_file: bool = True, load_corpus: bool = False, load_metadata: bool = True):
+    """
+    Load an index written by `save_container` as an instance of `cls` (a subclass of `BM25`).
+    See `BM25.load_container`.
+    """
+    with open(path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        table = _read_table(f.read(_PREAMBLE.size), f, file_size)
+        if mmap_file:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            f.seek(0)
+            buffer = bytearray(file_size)
+            f.readinto(buffer)
+
+    sections = table["sections"]
+
+    def read_array(name):
+        entry = sections[name]
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        arr = np.frombuffer(buffer, dtype=dtype, count=count, offset=entry["offset"])
+        return arr.reshape(entry["shape"])
+
+    def read_bytes(name):
+        entry = sections[name]
+        return bytes(buffer[entry["offset"] : entry["offset"] + entry["length"]])
+
+    for name in ("data", "indices", "indptr", "vocab"):
+        if name not in sections:
+            raise ValueError(f"The index container has no '{name}' section.")
+
+    bm25_obj = cls(**table["params"])
+    bm25_obj._original_version = table.get("version")
+    bm25_obj.scores = {
+        "data": read_array("data"),
+        "indices": read_array("indices"),
+        "indptr": read_array("indptr"),
+        "num_docs": table["num_docs"],
+    }
+    bm25_obj.vocab_dict = json_functions.loads(read_bytes("vocab"))
+    bm25_obj.unique_token_ids_set = set(bm25_obj.vocab_dict.values())
+
+    if bm25_obj.method in bm25_obj.methods_requiring_nonoccurrence:
+        if "nonoccurrence_array" not in sections:
+            raise ValueError("The index container has no 'nonoccurrence_array' section.")
+        bm25_obj.nonoccurrence_array = read_array("nonoccurrence_array")
+    else:
+        bm25_obj.nonoccurrence_array = None
+
+    if load_metadata and "metadata" in sections:
+        bm25_obj._set_index(
+            bm25_obj.scores,
+            bm25_obj.vocab_dict,
+            create_empty_token=False,
+            metadata=json_functions.loads(read_bytes("metadata")),
+        )
+
+    if load_corpus and "corpus" in sections:
+        bm25_obj.corpus = ContainerCorpus(buffer, sections["corpus"]["offset"], read_array("corpus_offsets"))
+
+    return bm25_obj
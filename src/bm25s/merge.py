@@ -0,0 +1,429 @@
+"""
+Merge BM25 indices saved with `BM25.save` into a single index, without re-tokenizing or
+re-indexing the documents:
+
+```python
+import bm25s
+
+bm25s.merge_indexes(["index_2024_01_01", "index_2024_01_02"], "index_merged")
+retriever = bm25s.BM25.load("index_merged", load_corpus=True)
+```
+
+The vocabularies are merged (the token IDs of the first index are kept, the new tokens of the
+other indices are appended), the document frequencies and the idf are recomputed on the merged
+collection, and the stored scores are rescaled. There are two ways to rescale the scores:
+
+- Exact: if every index directory contains the raw term frequencies and document lengths
+  (`tf.csc.index.npy` and `doc_lengths.index.npy`, written by `save_term_statistics`), the
+  scores are recomputed from them with the idf and average document length of the merged
+  collection. The merged index is then the same as an index built on all the documents.
+- Approximate: otherwise, each score is multiplied by the ratio between the new and the old idf
+  of its token. The idf is exact, but the length normalization keeps the average document
+  length of the index the document comes from. Scores whose old idf is 0 (possible with
+  `idf_method="robertson"`) cannot be rescaled and stay at 0.
+
+The postings are copied one index at a time, in chunks of `chunksize` postings, directly into
+memory-mapped output arrays, so the memory used does not grow with the size of the indices
+(apart from the vocabularies). The corpora are merged when all the indices have one: the
+`corpus.jsonl` files are concatenated, and if one of the corpora is block-compressed
+(`corpus.blocks`, saved with `corpus_compression`), all the documents are written to a
+block-compressed corpus with the codec and block size of the first one. The metadata files
+(`metadata.jsonl`, written for each shard by `ShardedBM25.save`) are concatenated in the same
+way, so the merged directory can be loaded with its metadata as a single-shard index.
+"""
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+from . import scoring
+from .utils import corpus as corpus_utils
+from .utils import json_functions
+
+logger = logging.getLogger("bm25s")
+
+DATA_NAME = "data.csc.index.npy"
+INDICES_NAME = "indices.csc.index.npy"
+INDPTR_NAME = "indptr.csc.index.npy"
+VOCAB_NAME = "vocab.index.json"
+PARAMS_NAME = "params.index.json"
+NNOC_NAME = "nonoccurrence_array.index.npy"
+CORPUS_NAME = "corpus.jsonl"
+CORPUS_BLOCKS_NAME = "corpus.blocks"
+METADATA_NAME = "metadata.jsonl"
+TF_NAME = "tf.csc.index.npy"
+DOC_LENGTHS_NAME = "doc_lengths.index.npy"
+
+# parameters that must be the same in all the merged indices
+_SCORING_PARAMS = ("k1", "b", "delta", "method", "idf_method", "dtype")
+
+
+def _load_params(index_dir: Path) -> Dict[str, Any]:
+    with open(index_dir / PARAMS_NAME, "r") as f:
+        return json_functions.loads(f.read())
+
+
+def _load_vocab(index_dir: Path) -> Dict[str, int]:
+    with open(index_dir / VOCAB_NAME, "r", encoding="utf-8") as f:
+        return json_functions.loads(f.read())
+
+
+def _compute_idf(doc_frequencies, n_docs, params):
+    return scoring._build_idf_array(
+        doc_frequencies=doc_frequencies,
+        n_docs=n_docs,
+        compute_idf_fn=scoring._select_idf_scorer(params["idf_method"]),
+        dtype=np.float64,
+    )
+
+
+def save_term_statistics(save_dir, corpus_tokens, vocab_dict: Dict[str, int] = None):
+    """
+    Save the raw term frequencies and document lengths of an index saved with `BM25.save`, so
+    that it can be merged exactly with `merge_indexes`. The term frequencies are aligned with
+    the `data` array of the index.
+
+    Parameters
+    ----------
+    save_dir : str
+        The directory of the saved index.
+
+    corpus_tokens : List[List[str]] or List[List[int]] or bm25s.tokenization.Tokenized
+        The tokenized corpus that was indexed: tokens (str), which are mapped to IDs with the
+        vocabulary of the index, or the token IDs of the index.
+
+    vocab_dict : Dict[str, int]
+        The vocabulary of the index. If None, it is loaded from `save_dir`.
+    """
+    save_dir = Path(save_dir)
+    indptr = np.load(save_dir / INDPTR_NAME, mmap_mode="r")
+    n_vocab = len(indptr) - 1
+
+    corpus_token_ids = getattr(corpus_tokens, "ids", corpus_tokens)
+    if any(len(doc) > 0 and isinstance(doc[0], str) for doc in corpus_token_ids[:10]):
+        vocab_dict = _load_vocab(save_dir) if vocab_dict is None else vocab_dict
+        corpus_token_ids = [[vocab_dict[token] for token in doc] for doc in corpus_token_ids]
+
+    doc_lengths = np.fromiter((len(doc) for doc in corpus_token_ids), dtype=np.int64, count=len(corpus_token_ids))
+    flat_ids = np.fromiter(
+        (token_id for doc in corpus_token_ids for token_id in doc), dtype=np.int64, count=int(doc_lengths.sum())
+    )
+    doc_indices, voc_indices, tf = scoring._count_doc_term_pairs(flat_ids, doc_lengths, int_dtype="int64")
+
+    # same order as the postings of the CSC arrays: by token, then by document
+    order = np.lexsort((doc_indices, voc_indices))
+    if len(order) != int(indptr[-1]) or int(voc_indices.max(initial=0)) >= max(n_vocab, 1):
+        raise ValueError("The tokens do not match the saved index: the number of postings or the vocabulary differ.")
+
+    np.save(save_dir / TF_NAME, tf[order].astype(np.int32))
+    np.save(save_dir / DOC_LENGTHS_NAME, doc_lengths.astype(np.int32))
+
+
+def merge_indexes(
+    index_dirs: List[Union[str, Path]],
+    out_dir: Union[str, Path],
+    exact: bool = None,
+    chunksize: int = 1_000_000,
+    merge_corpus: bool = True,
+    show_progress: bool = False,
+) -> Dict[str, Any]:
+    """
+    Merge indices saved with `BM25.save` into a new index saved in `out_dir`. The documents of
+    `index_dirs[i]` come after those of `index_dirs[i - 1]` in the merged index.
+
+    Parameters
+    ----------
+    index_dirs : List[str]
+        Directories of the indices to merge. They must have been built with the same BM25
+        parameters (k1, b, delta, method, idf_method, dtype).
+
+    out_dir : str
+        Directory where the merged index is saved.
+
+    exact : bool
+        If True, recompute the scores from the raw term frequencies and document lengths, which
+        must be present in all the directories (see `save_term_statistics`). If False, rescale
+        the scores by the ratio of the idf. If None, the exact merge is used when possible.
+
+    chunksize : int
+        Number of postings copied at a time.
+
+    merge_corpus : bool
+        If True, merge the corpora (`corpus.jsonl` or `corpus.blocks`) and the metadata
+        (`metadata.jsonl`) of the indices. A ValueError is raised if only some of the indices
+        have a corpus, or only some have metadata.
+
+    show_progress : bool
+        If True, a progress bar is shown while the corpora are indexed.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The number of documents, the size of the vocabulary and the number of postings of the
+        merged index, and whether the merge was exact.
+    """
+    index_dirs = [Path(d) for d in index_dirs]
+    out_dir = Path(out_dir)
+    if len(index_dirs) == 0:
+        raise ValueError("At least one index directory must be provided.")
+
+    params_list = [_load_params(d) for d in index_dirs]
+    params = dict(params_list[0])
+    for d, p in zip(index_dirs[1:], params_list[1:]):
+        different = [name for name in _SCORING_PARAMS if p.get(name) != params.get(name)]
+        if different:
+            raise ValueError(f"The index in {d} was built with different parameters: {different}")
+
+    has_stats = all((d / TF_NAME).exists() and (d / DOC_LENGTHS_NAME).exists() for d in index_dirs)
+    if exact is None:
+        exact = has_stats
+    elif exact and not has_stats:
+        raise FileNotFoundError(
+            f"The exact merge requires {TF_NAME} and {DOC_LENGTHS_NAME} in all the index directories, see `save_term_statistics`."
+        )
+
+    corpus_paths, metadata_paths = [], []
+    if merge_corpus:
+        corpus_paths = _find_files(index_dirs, (CORPUS_NAME, CORPUS_BLOCKS_NAME), "a corpus")
+        metadata_paths = _find_files(index_dirs, (METADATA_NAME,), "metadata")
+
+    # Pass 1: merge the vocabularies and sum the document frequencies. The document frequency
+    # of a token is its number of postings.
+    vocab = {}
+    token_maps = []
+    old_dfs = []
+    num_docs = []
+    empty_token = False
+    for d in index_dirs:
+        indptr = np.load(d / INDPTR_NAME, mmap_mode="r")
+        n_cols = len(indptr) - 1
+        token_map = np.full(n_cols, -1, dtype=np.int64)
+        for token, token_id in _load_vocab(d).items():
+            if token_id >= n_cols:
+                # tokens without postings, such as the empty token added by `BM25.index`
+                empty_token = empty_token or token == ""
+                continue
+            token_map[token_id] = vocab.setdefault(token, len(vocab))
+        df = np.diff(np.asarray(indptr, dtype=np.int64))
+        if np.any((token_map < 0) & (df > 0)):
+            raise ValueError(f"The vocabulary of the index in {d} does not cover all its postings.")
+        token_maps.append(token_map)
+        old_dfs.append(df)
+        num_docs.append(int(_load_params(d)["num_docs"]))
+
+    n_vocab = len(vocab)
+    if empty_token and "" not in vocab:
+        vocab[""] = n_vocab
+
+    doc_frequencies = np.zeros(n_vocab, dtype=np.int64)
+    for token_map, df in zip(token_maps, old_dfs):
+        mapped = token_map >= 0
+        np.add.at(doc_frequencies, token_map[mapped], df[mapped])
+
+    total_docs = sum(num_docs)
+    num_postings = int(doc_frequencies.sum())
+    new_idf = _compute_idf(doc_frequencies, total_docs, params)
+
+    avg_doc_len = 1.0
+    doc_lengths = None
+    if exact:
+        doc_lengths = [np.load(d / DOC_LENGTHS_NAME, mmap_mode="r") for d in index_dirs]
+        avg_doc_len = sum(float(np.sum(l, dtype=np.int64)) for l in doc_lengths) / total_docs
+
+    nonoccurrence_array = None
+    if params["method"] in ("bm25l", "bm25+"):
+        nonoccurrence_array = scoring._build_nonoccurrence_array(
+            doc_frequencies=doc_frequencies,
+            n_docs=total_docs,
+            compute_idf_fn=scoring._select_idf_scorer(params["idf_method"]),
+            calculate_tfc_fn=scoring._select_tfc_scorer(params["method"]),
+            l_d=avg_doc_len,
+            l_avg=avg_doc_len,
+            k1=params["k1"],
+            b=params["b"],
+            delta=params["delta"],
+            dtype=np.float64,
+        )
+
+    # Pass 2: copy the postings of each index to their position in the merged arrays. The
+    # postings of a token are sorted by document, and the documents of an index come after
+    # those of the previous indices, so the postings of each index are appended after those
+    # already copied for the same token.
+    out_dir.mkdir(parents=True, exist_ok=True)
+    int_dtype = np.int32 if total_docs < 2**31 else np.int64
+    indptr_dtype = np.int32 if num_postings < 2**31 else np.int64
+    new_indptr = np.zeros(n_vocab + 1, dtype=indptr_dtype)
+    np.cumsum(doc_frequencies, out=new_indptr[1:])
+    np.save(out_dir / INDPTR_NAME, new_indptr)
+
+    data_out = np.lib.format.open_memmap(out_dir / DATA_NAME, mode="w+", dtype=params["dtype"], shape=(num_postings,))
+    indices_out = np.lib.format.open_memmap(out_dir / INDICES_NAME, mode="w+", dtype=int_dtype, shape=(num_postings,))
+    tf_out = None
+    if exact:
+        tf_out = np.lib.format.open_memmap(out_dir / TF_NAME, mode="w+", dtype=np.int32, shape=(num_postings,))
+
+    tfc_fn = scoring._select_tfc_scorer(params["method"])
+    cursor = new_indptr[:-1].astype(np.int64)
+    doc_offset = 0
+    for i, d in enumerate(index_dirs):
+        indptr = np.load(d / INDPTR_NAME, mmap_mode="r")
+        data = np.load(d / DATA_NAME, mmap_mode="r")
+        indices = np.load(d / INDICES_NAME, mmap_mode="r")
+        tf = np.load(d / TF_NAME, mmap_mode="r") if exact else None
+        token_map = token_maps[i]
+        old_idf = None if exact else _compute_idf(old_dfs[i], num_docs[i], params)
+
+        for start in range(0, len(data), chunksize):
+            end = min(start + chunksize, len(data))
+            positions = np.arange(start, end, dtype=np.int64)
+            old_ids = np.searchsorted(indptr, positions, side="right") - 1
+            new_ids = token_map[old_ids]
+            dest = cursor[new_ids] + (positions - indptr[old_ids])
+            doc_ids = np.asarray(indices[start:end], dtype=np.int64)
+
+            if exact:
+                chunk_tf = np.asarray(tf[start:end])
+                tfc = tfc_fn(
+                    tf_array=chunk_tf.astype(params["dtype"]),
+                    l_d=doc_lengths[i][doc_ids],
+                    l_avg=avg_doc_len,
+                    k1=params["k1"],
+                    b=params["b"],
+                    delta=params["delta"],
+                )
+                scores = (new_idf[new_ids].astype(params["dtype"]) * tfc).astype(params["dtype"])
+                if nonoccurrence_array is not None:
+                    scores -= nonoccurrence_array[new_ids].astype(params["dtype"])
+                tf_out[dest] = chunk_tf
+            else:
+                ratio = np.divide(
+                    new_idf[new_ids],
+                    old_idf[old_ids],
+                    out=np.zeros(len(new_ids), dtype=np.float64),
+                    where=old_idf[old_ids] != 0,
+                )
+                scores = np.asarray(data[start:end], dtype=np.float64) * ratio
+
+            data_out[dest] = scores
+            indices_out[dest] = doc_ids + doc_offset
+
+        mapped = token_map >= 0
+        cursor[token_map[mapped]] += old_dfs[i][mapped]
+        doc_offset += num_docs[i]
+
+    data_out.flush()
+    indices_out.flush()
+    del data_out, indices_out
+    if exact:
+        tf_out.flush()
+        del tf_out
+        np.save(out_dir / DOC_LENGTHS_NAME, np.concatenate([np.asarray(l, dtype=np.int32) for l in doc_lengths]))
+
+    if nonoccurrence_array is not None:
+        np.save(out_dir / NNOC_NAME, nonoccurrence_array.astype(params["dtype"]))
+
+    with open(out_dir / VOCAB_NAME, "wt", encoding="utf-8") as f:
+        f.write(json_functions.dumps(vocab, ensure_ascii=False))
+
+    params["num_docs"] = total_docs
+    params["int_dtype"] = np.dtype(int_dtype).name
+    with open(out_dir / PARAMS_NAME, "w") as f:
+        f.write(json_functions.dumps(params, indent=4))
+
+    if corpus_paths:
+        _merge_corpora(corpus_paths, out_dir, num_docs, show_progress=show_progress)
+    if metadata_paths:
+        counts = _concatenate_lines(metadata_paths, out_dir / METADATA_NAME)
+        _warn_counts(metadata_paths, counts, num_docs)
+
+    return {"num_docs": total_docs, "n_vocab": n_vocab, "num_postings": num_postings, "exact": exact}
+
+
+def _find_files(index_dirs, names, description) -> List[Path]:
+    """
+    Return the first of `names` found in each index (for the corpus, `corpus.jsonl` first, as
+    in `BM25.load`), or an empty list if none of the indices has one.
+    """
+    paths = []
+    for d in index_dirs:
+        for name in names:
+            if (d / name).exists():
+                paths.append(d / name)
+                break
+        else:
+            paths.append(None)
+
+    if all(p is None for p in paths):
+        return []
+    missing = [str(d) for d, p in zip(index_dirs, paths) if p is None]
+    if missing:
+        raise ValueError(
+            f"Only some of the indices have {description} (missing in {missing}). "
+            "Use `merge_corpus=False` to merge the indices without their corpora and metadata."
+        )
+    return paths
+
+
+def _iter_corpus(path: Path):
+    if path.name == CORPUS_BLOCKS_NAME:
+        corpus = corpus_utils.CompressedCorpus(str(path))
+        try:
+            yield from corpus
+        finally:
+            corpus.close()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json_functions.loads(line)
+
+
+def _concatenate_lines(paths, out_path) -> List[int]:
+    """
+    Concatenate the JSON lines files `paths` into `out_path`, and return their numbers of lines.
+    """
+    counts = []
+    with open(out_path, "wt", encoding="utf-8") as out:
+        for path in paths:
+            count = 0
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    out.write(line if line.endswith("\n") else line + "\n")
+                    count += 1
+            counts.append(count)
+    return counts
+
+
+def _warn_counts(paths, counts, num_docs):
+    for path, count, n in zip(paths, counts, num_docs):
+        if count != n:
+            logger.warning(f"{path} has {count} entries, but the index has {n} documents.")
+
+
+def _merge_corpora(paths, out_dir, num_docs, show_progress=False):
+    """
+    Concatenate the `corpus.jsonl` files of the indices line by line or, if one of them is
+    block-compressed, write all the documents to `corpus.blocks`.
+    """
+    blocks = [p for p in paths if p.name == CORPUS_BLOCKS_NAME]
+    if blocks:
+        counts = []
+
+        def _counted(path):
+            count = 0
+            for count, doc in enumerate(_iter_corpus(path), start=1):
+                yield doc
+            counts.append(count)
+
+        first = corpus_utils.CompressedCorpus(str(blocks[0]))
+        codec, docs_per_block = first.codec, first.docs_per_block
+        first.close()
+        docs = (doc for path in paths for doc in _counted(path))
+        corpus_utils.save_compressed_corpus(docs, out_dir / CORPUS_BLOCKS_NAME, codec=codec, docs_per_block=docs_per_block)
+    else:
+        counts = _concatenate_lines(paths, out_dir / CORPUS_NAME)
+        mmindex = corpus_utils.find_newline_positions(out_dir / CORPUS_NAME, show_progress=show_progress)
+        corpus_utils.save_mmindex(mmindex, path=out_dir / CORPUS_NAME)
+
+    _warn_counts(paths, counts, num_docs)
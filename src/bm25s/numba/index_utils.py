@@ -0,0 +1,223 @@
+"""
+Numba kernels used to build the BM25 index from flat token IDs. They mirror the numpy
+implementation in `bm25s.scoring` (`_count_doc_term_pairs`, the `_score_tfc_*` functions and
+`_build_csc_arrays`), but run in parallel over documents and do not need scipy.
+"""
+
+import math
+
+import numpy as np
+from numba import njit, prange
+
+from ..scoring import _build_idf_array, _build_nonoccurrence_array, _select_idf_scorer, _select_tfc_scorer
+
+# The lucene tfc is the same as the robertson tfc, see `scoring._score_tfc_lucene`
+TFC_METHOD_IDS = {"robertson": 0, "lucene": 0, "atire": 1, "bm25l": 2, "bm25+": 3}
+
+
+@njit()
+def _score_tfc_jitted(method_id, tf, l_d, l_avg, k1, b, delta, use_log_normalization):
+    if use_log_normalization:
+        l_d = math.log(1 + l_d)
+        l_avg = math.log(1 + l_avg)
+
+    if method_id == 0:
+        return tf / (k1 * ((1 - b) + b * (l_d / l_avg)) + tf)
+    elif method_id == 1:
+        return (tf * (k1 + 1)) / (tf + k1 * (1 - b + b * (l_d / l_avg)))
+    elif method_id == 2:
+        c = tf / (1 - b + b * (l_d / l_avg))
+        return ((k1 + 1) * (c + delta)) / (k1 + c + delta)
+    else:
+        num = (k1 + 1) * tf
+        den = k1 * (1 - b + b * (l_d / l_avg)) + tf
+        return (num / den) + delta
+
+
+@njit(parallel=True)
+def _count_doc_term_pairs_jitted(token_ids_flat, doc_pointers):
+    """
+    For each document, sort its token IDs and run-length encode them to get the unique tokens
+    and their term frequencies. Returns the per-document number of unique tokens, and the
+    (token, tf) pairs stored at the document's position in `token_ids_flat` (unique tokens
+    always fit in the space taken by the document's tokens).
+    """
+    n_docs = len(doc_pointers) - 1
+    voc_buffer = np.empty(len(token_ids_flat), dtype=token_ids_flat.dtype)
+    tf_buffer = np.empty(len(token_ids_flat), dtype=np.int64)
+    n_unique = np.zeros(n_docs, dtype=np.int64)
+
+    for d in prange(n_docs):
+        start, end = doc_pointers[d], doc_pointers[d + 1]
+        if end == start:
+            continue
+
+        doc_tokens = np.sort(token_ids_flat[start:end])
+        pos = start
+        voc_buffer[pos] = doc_tokens[0]
+        tf_buffer[pos] = 1
+        for j in range(1, end - start):
+            if doc_tokens[j] == voc_buffer[pos]:
+                tf_buffer[pos] += 1
+            else:
+                pos += 1
+                voc_buffer[pos] = doc_tokens[j]
+                tf_buffer[pos] = 1
+        n_unique[d] = pos - start + 1
+
+    return voc_buffer, tf_buffer, n_unique
+
+
+@njit()
+def _doc_freqs_jitted(voc_buffer, n_unique, doc_pointers, n_vocab):
+    doc_frequencies = np.zeros(n_vocab, dtype=np.int64)
+    for d in range(len(doc_pointers) - 1):
+        start = doc_pointers[d]
+        for j in range(start, start + n_unique[d]):
+            doc_frequencies[voc_buffer[j]] += 1
+
+    return doc_frequencies
+
+
+@njit(parallel=True)
+def _build_csc_jitted(
+    voc_buffer,
+    tf_buffer,
+    n_unique,
+    doc_pointers,
+    doc_frequencies,
+    idf_array,
+    nonoccurrence_array,
+    use_nonoccurrence,
+    method_id,
+    k1,
+    b,
+    delta,
+    use_log_normalization,
+    data_dtype,
+    int_dtype,
+):
+    n_docs = len(doc_pointers) - 1
+    n_vocab = len(doc_frequencies)
+    doc_lengths = (doc_pointers[1:] - doc_pointers[:-1]).astype(np.float64)
+    avg_doc_len = doc_lengths.mean()
+
+    # Step 1: the document frequencies give the size of each column of the CSC matrix
+    indptr = np.zeros(n_vocab + 1, dtype=int_dtype)
+    indptr[1:] = np.cumsum(doc_frequencies)
+
+    # Step 2: compute the score of every (doc, token) pair in parallel
+    scores_buffer = np.empty(len(voc_buffer), dtype=data_dtype)
+    for d in prange(n_docs):
+        start = doc_pointers[d]
+        l_d = doc_lengths[d]
+        for j in range(start, start + n_unique[d]):
+            token = voc_buffer[j]
+            tfc = _score_tfc_jitted(
+                method_id, tf_buffer[j], l_d, avg_doc_len, k1, b, delta, use_log_normalization
+            )
+            score = idf_array[token] * tfc
+            if use_nonoccurrence:
+                score -= nonoccurrence_array[token]
+            scores_buffer[j] = score
+
+    # Step 3: scatter the pairs into their columns. Documents are visited in order, so the
+    # row indices of each column are sorted, as in scipy's CSC format.
+    data = np.empty(indptr[-1], dtype=data_dtype)
+    indices = np.empty(indptr[-1], dtype=int_dtype)
+    next_pos = indptr[:-1].copy()
+    for d in range(n_docs):
+        start = doc_pointers[d]
+        for j in range(start, start + n_unique[d]):
+            token = voc_buffer[j]
+            pos = next_pos[token]
+            data[pos] = scores_buffer[j]
+            indices[pos] = d
+            next_pos[token] = pos + 1
+
+    return data, indices, indptr
+
+
+def _build_index_numba_functional(
+    token_ids_flat,
+    doc_pointers,
+    n_vocab,
+    method="lucene",
+    idf_method=None,
+    k1=1.5,
+    b=0.75,
+    delta=0.5,
+    dtype="float32",
+    int_dtype="int32",
+    use_log_normalization=False,
+):
+    """
+    Build the BM25 index from a flat array of token IDs, where the tokens of the i-th document
+    are `token_ids_flat[doc_pointers[i]:doc_pointers[i + 1]]`. Returns the `scores` dictionary
+    expected by `BM25` and the non-occurrence array (None unless the method is bm25l or bm25+).
+    """
+    if method not in TFC_METHOD_IDS:
+        # raise the same error as the numpy implementation
+        _select_tfc_scorer(method)
+
+    idf_method = idf_method if idf_method is not None else method
+    token_ids_flat = np.ascontiguousarray(token_ids_flat, dtype=np.int64)
+    doc_pointers = np.ascontiguousarray(doc_pointers, dtype=np.int64)
+    n_docs = len(doc_pointers) - 1
+
+    voc_buffer, tf_buffer, n_unique = _count_doc_term_pairs_jitted(token_ids_flat, doc_pointers)
+
+    doc_frequencies = _doc_freqs_jitted(voc_buffer, n_unique, doc_pointers, n_vocab)
+
+    idf_array = _build_idf_array(
+        doc_frequencies,
+        n_docs=n_docs,
+        compute_idf_fn=_select_idf_scorer(idf_method),
+        dtype=dtype,
+    )
+
+    avg_doc_len = (doc_pointers[-1] - doc_pointers[0]) / n_docs
+    if method in ("bm25l", "bm25+"):
+        nonoccurrence_array = _build_nonoccurrence_array(
+            doc_frequencies=doc_frequencies,
+            n_docs=n_docs,
+            compute_idf_fn=_select_idf_scorer(idf_method),
+            calculate_tfc_fn=_select_tfc_scorer(method),
+            l_d=avg_doc_len,
+            l_avg=avg_doc_len,
+            k1=k1,
+            b=b,
+            delta=delta,
+            dtype=dtype,
+        )
+        use_nonoccurrence = True
+    else:
+        nonoccurrence_array = np.zeros(1, dtype=dtype)
+        use_nonoccurrence = False
+
+    data, indices, indptr = _build_csc_jitted(
+        voc_buffer=voc_buffer,
+        tf_buffer=tf_buffer,
+        n_unique=n_unique,
+        doc_pointers=doc_pointers,
+        doc_frequencies=doc_frequencies,
+        idf_array=idf_array,
+        nonoccurrence_array=nonoccurrence_array,
+        use_nonoccurrence=use_nonoccurrence,
+        method_id=TFC_METHOD_IDS[method],
+        k1=float(k1),
+        b=float(b),
+        delta=float(delta),
+        use_log_normalization=use_log_normalization,
+        data_dtype=np.dtype(dtype),
+        int_dtype=np.dtype(int_dtype),
+    )
+
+    scores = {
+        "data": data,
+        "indices": indices,
+        "indptr": indptr,
+        "num_docs": n_docs,
+    }
+
+    return scores, (nonoccurrence_array if use_nonoccurrence else None)
@@ -5,7 +5,7 @@ from typing import List, Tuple, Any
 import logging
 
 from .. import utils
-from ..scoring import _compute_relevance_from_scores_jit_ready
+from ..scoring import _compute_relevance_from_scores_jit_ready, _dedupe_query_tokens
 from .selection import _numba_sorted_top_k
 
 _compute_relevance_from_scores_jit_ready = njit()(_compute_relevance_from_scores_jit_ready)
@@ -14,6 +14,7 @@ _compute_relevance_from_scores_jit_ready = njit()(_compute_relevance_from_scores
 def _retrieve_internal_jitted_parallel(
     query_tokens_ids_flat: np.ndarray,
     query_pointers: np.ndarray,
+    query_tokens_weights_flat: np.ndarray,
     k: int,
     sorted: bool,
     dtype: np.dtype,
@@ -24,14 +25,17 @@ def _retrieve_internal_jitted_parallel(
     num_docs: int,
     nonoccurrence_array: np.ndarray = None,
     weight_mask: np.ndarray = None,
+    fill_missing: bool = False,
 ):
     N = len(query_pointers) - 1
 
     topk_scores = np.zeros((N, k), dtype=dtype)
     topk_indices = np.zeros((N, k), dtype=int_dtype)
+    counts = np.full(N, k, dtype=np.int64)
 
     for i in prange(N):
         query_tokens_single = query_tokens_ids_flat[query_pointers[i] : query_pointers[i + 1]]
+        query_weights_single = query_tokens_weights_flat[query_pointers[i] : query_pointers[i + 1]]
 
         # query_tokens_single = np.asarray(query_tokens_single, dtype=int_dtype)
         scores_single = _compute_relevance_from_scores_jit_ready(
@@ -41,12 +45,13 @@ def _retrieve_internal_jitted_parallel(
             indices=indices,
             num_docs=num_docs,
             dtype=dtype,
+            query_tokens_weights=query_weights_single,
         )
 
         # if there's a non-occurrence array, we need to add the non-occurrence score
-        # back to the scores
+        # back to the scores, with the same weights as the tokens
         if nonoccurrence_array is not None:
-            nonoccurrence_scores = nonoccurrence_array[query_tokens_single].sum()
+            nonoccurrence_scores = (nonoccurrence_array[query_tokens_single] * query_weights_single).sum()
             scores_single += nonoccurrence_scores
 
         if weight_mask is not None:
@@ -55,10 +60,24 @@ def _retrieve_internal_jitted_parallel(
         topk_scores_sing, topk_indices_sing = _numba_sorted_top_k(
             scores_single, k=k, sorted=sorted
         )
-        topk_scores[i] = topk_scores_sing
-        topk_indices[i] = topk_indices_sing
+        if fill_missing:
+            # the documents with a score of 0 were excluded by the weight mask: the results kept
+            # come first, and the remaining slots get the index -1 and the score -inf
+            n_kept = 0
+            for j in range(k):
+                if topk_scores_sing[j] > 0:
+                    topk_scores[i, n_kept] = topk_scores_sing[j]
+                    topk_indices[i, n_kept] = topk_indices_sing[j]
+                    n_kept += 1
+            for j in range(n_kept, k):
+                topk_scores[i, j] = -np.inf
+                topk_indices[i, j] = -1
+            counts[i] = n_kept
+        else:
+            topk_scores[i] = topk_scores_sing
+            topk_indices[i] = topk_indices_sing
 
-    return topk_scores, topk_indices
+    return topk_scores, topk_indices, counts
 
 
 def _retrieve_numba_functional(
@@ -77,6 +96,9 @@ def _retrieve_numba_functional(
     dtype="float32",
     int_dtype="int32",
     weight_mask=None,
+    fill_missing=False,
+    query_term_mode="weighted",
+    query_tokens_weights=None,
 ):  
     from numba import get_num_threads, set_num_threads, njit
 
@@ -110,8 +132,9 @@ def _retrieve_numba_functional(
 
     # Dynamic k adjustment for filtering in numba backend
     # numba backendでのフィルタリング用動的k調整
+    # (with `fill_missing`, the results keep k slots and the missing ones are marked instead)
     original_k = k
-    if weight_mask is not None:
+    if weight_mask is not None and not fill_missing:
         available_docs = np.sum(weight_mask > 0)
         if available_docs < k:
             logging.warning(f"Requested k={k} but only {available_docs} documents match filter conditions. Adjusting k to {available_docs}.")
@@ -121,10 +144,25 @@ def _retrieve_numba_functional(
     # pointers to the start of each query to be used to find the boundaries of each query
     query_pointers = np.cumsum([0] + [len(q) for q in query_tokens_ids], dtype=int_dtype)
     query_tokens_ids_flat = np.concatenate(query_tokens_ids).astype(int_dtype)
+    if query_tokens_weights is not None:
+        query_tokens_weights_flat = np.concatenate(query_tokens_weights).astype(dtype)
+    else:
+        query_tokens_weights_flat = None
+
+    # the repeated tokens of each query are collapsed into (token, weight) pairs, so that
+    # each posting list is read once per query
+    query_tokens_ids_flat, query_pointers, query_tokens_weights_flat = _dedupe_query_tokens(
+        query_tokens_ids_flat,
+        query_pointers,
+        query_tokens_weights_flat,
+        mode=query_term_mode,
+        dtype=dtype,
+    )
 
-    retrieved_scores, retrieved_indices = _retrieve_internal_jitted_parallel(
+    retrieved_scores, retrieved_indices, counts = _retrieve_internal_jitted_parallel(
         query_pointers=query_pointers,
         query_tokens_ids_flat=query_tokens_ids_flat,
+        query_tokens_weights_flat=query_tokens_weights_flat,
         k=k,
         sorted=sorted,
         dtype=np.dtype(dtype),
@@ -135,6 +173,7 @@ def _retrieve_numba_functional(
         num_docs=scores["num_docs"],
         nonoccurrence_array=nonoccurrence_array,
         weight_mask=weight_mask,
+        fill_missing=fill_missing,
     )
 
     # reset the number of threads
@@ -154,6 +193,8 @@ def _retrieve_numba_functional(
             retrieved_docs = np.array(results).reshape(retrieved_indices.shape)
 
     if return_as == "tuple":
+        if fill_missing:
+            return retrieved_docs, retrieved_scores, counts
         return retrieved_docs, retrieved_scores
     elif return_as == "documents":
         return retrieved_docs
@@ -7,7 +7,7 @@ numba_sorted_top_k was created based on numba_unsorted_top_k, but modified to us
 """
 
 import numpy as np
-from numba import njit
+from numba import njit, prange
 
 
 @njit()
@@ -92,7 +92,7 @@ def _numba_sorted_top_k(array: np.ndarray, k: int, sorted=True):
     # Handle edge case where k is 0 or array is empty
     # k が 0 または配列が空の場合のエッジケースを処理
     if k == 0 or n == 0:
-        return np.array([], dtype=array.dtype), np.array([], dtype=np.int32)
+        return np.zeros(0, dtype=array.dtype), np.zeros(0, dtype=np.int32)
 
     values = np.zeros(k, dtype=array.dtype)  # aka scores
     indices = np.zeros(k, dtype=np.int32)
@@ -129,6 +129,100 @@ def _numba_sorted_top_k(array: np.ndarray, k: int, sorted=True):
     return values, indices
 
 
+def _sorted_top_k_batch(scores_2d: np.ndarray, k: int, sorted=True):
+    n_queries, n = scores_2d.shape
+    if k > n:
+        k = n
+
+    topk_scores = np.zeros((n_queries, k), dtype=scores_2d.dtype)
+    topk_indices = np.zeros((n_queries, k), dtype=np.int32)
+
+    for i in prange(n_queries):
+        values, indices = _numba_sorted_top_k(scores_2d[i], k, sorted)
+        topk_scores[i] = values
+        topk_indices[i] = indices
+
+    return topk_scores, topk_indices
+
+
+_numba_sorted_top_k_batch = njit(parallel=True)(_sorted_top_k_batch)
+# without numba's thread pool, for callers that already run in several Python threads
+_numba_sorted_top_k_batch_serial = njit()(_sorted_top_k_batch)
+
+
+@njit(parallel=True)
+def _numba_merge_topk(scores, indices, k, dedupe, tie_by_index):
+    # `scores` and `indices` hold the candidates of all the sources side by side; the missing
+    # candidates have a negative index
+    n_queries, m = scores.shape
+    merged_scores = np.full((n_queries, k), -np.inf, dtype=scores.dtype)
+    merged_indices = np.full((n_queries, k), -1, dtype=indices.dtype)
+
+    for q in prange(n_queries):
+        s = scores[q].copy()
+        idx = indices[q]
+        for j in range(m):
+            if idx[j] < 0:
+                s[j] = -np.inf
+
+        if dedupe:
+            # keep the best candidate of each document (the first one on equal scores)
+            order = np.argsort(idx, kind="mergesort")
+            best = -1
+            for t in range(m):
+                j = order[t]
+                if idx[j] < 0:
+                    continue
+                if best >= 0 and idx[best] == idx[j]:
+                    if s[j] > s[best]:
+                        s[best] = -np.inf
+                        best = j
+                    else:
+                        s[j] = -np.inf
+                else:
+                    best = j
+
+        if tie_by_index:
+            order = np.argsort(idx, kind="mergesort")
+        else:
+            order = np.arange(m)
+        ranked = order[np.argsort(-s[order], kind="mergesort")]
+
+        for t in range(min(k, m)):
+            j = ranked[t]
+            if s[j] == -np.inf:
+                break
+            merged_scores[q, t] = s[j]
+            merged_indices[q, t] = idx[j]
+
+    return merged_scores, merged_indices
+
+
+def merge_topk(scores, indices, k, dedupe=False, tie_break="source"):
+    """
+    Numba version of `bm25s.selection.merge_topk`, on the candidates of all the sources
+    concatenated along the last axis (missing candidates have a negative index). Queries are
+    processed in parallel.
+    """
+    return _numba_merge_topk(
+        np.ascontiguousarray(scores), np.ascontiguousarray(indices), k, dedupe, tie_break == "index"
+    )
+
+
+def topk_batch(scores_2d, k, backend="numba", sorted=True, parallel=True):
+    """
+    Retrieve the top-k results for each row of a 2-dimensional array of scores, with
+    shape (n_queries, num_docs), using a heap per row. Rows are processed in parallel,
+    unless `parallel` is False (e.g. when called from several Python threads, to avoid
+    nesting numba's thread pool in them).
+    """
+    if backend not in ["numba"]:
+        raise ValueError("Invalid backend. Only 'numba' is supported.")
+
+    kernel = _numba_sorted_top_k_batch if parallel else _numba_sorted_top_k_batch_serial
+    return kernel(np.ascontiguousarray(scores_2d), k, sorted)
+
+
 def topk(query_scores, k, backend="numba", sorted=True):
     """
     This function is used to retrieve the top-k results for a single query. It will only work
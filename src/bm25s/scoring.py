@@ -1,4 +1,5 @@
 from collections import Counter
+import itertools
 import math
 
 import numpy as np
@@ -18,6 +19,9 @@ def _calculate_doc_freqs(
     Document Frequency, aka DF, is the number of documents that contain a specific token.
     This function return a dictionary with the document frequency of each token, which is
     why it is called `doc_frequencies`.
+
+    This per-document version is no longer used to build the index: it is kept as the
+    reference implementation that the tests compare `_calculate_doc_freqs_array` against.
     """
     unique_tokens = set(unique_tokens)
 
@@ -43,23 +47,74 @@ def _calculate_doc_freqs(
     return doc_frequencies
 
 
+def _calculate_doc_freqs_array(
+    corpus_token_ids, n_vocab, int_dtype="int32", chunksize=100_000
+) -> np.ndarray:
+    """
+    Vectorized version of `_calculate_doc_freqs` for a corpus of integer token IDs. The token IDs
+    are flattened chunk by chunk, duplicated (doc, token) pairs are removed with `np.unique`, and
+    the document frequencies are counted with `np.bincount`. Returns an array of length `n_vocab`,
+    where the i-th element is the number of documents containing the token with ID i.
+    """
+    doc_frequencies = np.zeros(n_vocab, dtype=np.int64)
+
+    for start in range(0, len(corpus_token_ids), chunksize):
+        chunk = corpus_token_ids[start : start + chunksize]
+        doc_lengths = np.fromiter((len(doc) for doc in chunk), dtype=np.int64, count=len(chunk))
+        token_ids_flat = np.fromiter(
+            itertools.chain.from_iterable(chunk), dtype=np.int64, count=int(doc_lengths.sum())
+        )
+        _, voc_indices, _ = _count_doc_term_pairs(
+            token_ids_flat, doc_lengths, int_dtype=int_dtype
+        )
+        counts = np.bincount(voc_indices, minlength=n_vocab)
+        if len(counts) > len(doc_frequencies):
+            counts[: len(doc_frequencies)] += doc_frequencies
+            doc_frequencies = counts
+        else:
+            doc_frequencies += counts
+
+    return doc_frequencies
+
+
+def _as_doc_freqs_array(doc_frequencies) -> np.ndarray:
+    """
+    Accept document frequencies either as an array indexed by token ID, or as a dictionary
+    mapping token IDs to document frequencies, and return them as an array.
+    """
+    if isinstance(doc_frequencies, dict):
+        n_vocab = max(doc_frequencies.keys(), default=-1) + 1
+        df_array = np.zeros(n_vocab, dtype=np.int64)
+        df_array[list(doc_frequencies.keys())] = list(doc_frequencies.values())
+        return df_array
+
+    return np.asarray(doc_frequencies)
+
+
 def _build_idf_array(
-    doc_frequencies: dict,
+    doc_frequencies,
     n_docs: int,
     compute_idf_fn: callable = None,
     dtype="float32",
 ) -> np.ndarray:
-    n_vocab = len(doc_frequencies)
-    idf_array = np.zeros(n_vocab, dtype=dtype)
+    """
+    Compute the idf of every token in a single vectorized call of `compute_idf_fn`. The
+    `doc_frequencies` can be an array indexed by token ID or a dictionary {token_id: df}.
+    """
+    df_array = _as_doc_freqs_array(doc_frequencies)
+    with np.errstate(divide="ignore"):
+        idf_array = compute_idf_fn(df_array.astype(np.float64), N=n_docs)
 
-    for token_id, df in doc_frequencies.items():
-        idf_array[token_id] = compute_idf_fn(df, N=n_docs)
+    # the ATIRE and BM25+ idf are infinite for tokens that occur in no document (e.g. the empty
+    # token added to the vocabulary): such tokens match nothing, so they get an idf of 0 (and no
+    # non-occurrence score)
+    idf_array = np.where(np.isfinite(idf_array), idf_array, 0.0)
 
-    return idf_array
+    return np.asarray(idf_array, dtype=dtype)
 
 
 def _build_nonoccurrence_array(
-    doc_frequencies: dict,
+    doc_frequencies,
     n_docs: int,
     compute_idf_fn: callable,
     calculate_tfc_fn: callable,
@@ -82,19 +137,18 @@ def _build_nonoccurrence_array(
     The `compute_idf_fn` is the function to calculate the idf score for a token that does not occur
     in the document. The `calculate_tfc_fn` is the function to calculate the term frequency component
     of the BM25 score, which is used to calculate the final score for tokens that do not occur in the
-    document.
+    document. Since the term frequency is always 0, the tfc is the same for every token, and the
+    array is simply the idf array scaled by that constant.
     """
-    n_vocab = len(doc_frequencies)
-    nonoccurrence_array = np.zeros(n_vocab, dtype=dtype)
+    idf_array = _build_idf_array(
+        doc_frequencies, n_docs=n_docs, compute_idf_fn=compute_idf_fn, dtype=np.float64
+    )
+    tfc = calculate_tfc_fn(
+        tf_array=0, l_d=l_d, l_avg=l_avg, k1=k1, b=b, delta=delta, use_log_normalization=use_log_normalization
+    )
+    nonoccurrence_array = idf_array * tfc
 
-    for token_id, df in doc_frequencies.items():
-        idf = compute_idf_fn(df, N=n_docs)
-        tfc = calculate_tfc_fn(
-            tf_array=0, l_d=l_d, l_avg=l_avg, k1=k1, b=b, delta=delta, use_log_normalization=use_log_normalization
-        )
-        nonoccurrence_array[token_id] = idf * tfc
-
-    return nonoccurrence_array
+    return nonoccurrence_array.astype(dtype)
 
 
 def _score_tfc_robertson(tf_array, l_d, l_avg, k1, b, delta=None, use_log_normalization=False):
@@ -175,10 +229,10 @@ def _score_idf_robertson(df, N, allow_negative=False):
     Implementation: https://cs.uwaterloo.ca/~jimmylin/publications/Kamphuis_etal_ECIR2020_preprint.pdf
     """
     inner = (N - df + 0.5) / (df + 0.5)
-    if not allow_negative and inner < 1:
-        inner = 1
+    if not allow_negative:
+        inner = np.maximum(inner, 1)
 
-    return math.log(inner)
+    return np.log(inner)
 
 
 def _score_idf_lucene(df, N):
@@ -186,7 +240,7 @@ def _score_idf_lucene(df, N):
     Computes the inverse document frequency component of the BM25 score using Lucene variant (accurate)
     Implementation: https://cs.uwaterloo.ca/~jimmylin/publications/Kamphuis_etal_ECIR2020_preprint.pdf
     """
-    return math.log(1 + (N - df + 0.5) / (df + 0.5))
+    return np.log(1 + (N - df + 0.5) / (df + 0.5))
 
 
 def _score_idf_atire(df, N):
@@ -194,7 +248,7 @@ def _score_idf_atire(df, N):
     Computes the inverse document frequency component of the BM25 score using ATIRE variant
     Implementation: https://cs.uwaterloo.ca/~jimmylin/publications/Kamphuis_etal_ECIR2020_preprint.pdf
     """
-    return math.log(N / df)
+    return np.log(N / df)
 
 
 def _score_idf_bm25l(df, N):
@@ -202,7 +256,7 @@ def _score_idf_bm25l(df, N):
     Computes the inverse document frequency component of the BM25 score using BM25L variant
     Implementation: https://cs.uwaterloo.ca/~jimmylin/publications/Kamphuis_etal_ECIR2020_preprint.pdf
     """
-    return math.log((N + 1) / (df + 0.5))
+    return np.log((N + 1) / (df + 0.5))
 
 
 def _score_idf_bm25plus(df, N):
@@ -210,7 +264,7 @@ def _score_idf_bm25plus(df, N):
     Computes the inverse document frequency component of the BM25 score using BM25+ variant
     Implementation: https://cs.uwaterloo.ca/~jimmylin/publications/Kamphuis_etal_ECIR2020_preprint.pdf
     """
-    return math.log((N + 1) / df)
+    return np.log((N + 1) / df)
 
 
 def _select_idf_scorer(method) -> callable:
@@ -253,7 +307,7 @@ def _build_scores_and_indices_for_matrix(
     leave_progress=False,
     use_log_normalization=False,
 ):
-    array_size = sum(doc_frequencies.values())
+    array_size = int(_as_doc_freqs_array(doc_frequencies).sum())
 
     # We create 3 arrays to store the scores, document indices, and vocabulary indices
     # The length is at most n_tokens, remaining elements will be truncated at the end
@@ -310,6 +364,51 @@ def _build_scores_and_indices_for_matrix(
     return scores, doc_indices, voc_indices
 
 
+def _count_doc_term_pairs(token_ids_flat, doc_lengths, doc_offset=0, int_dtype="int32"):
+    """
+    Count the term frequencies of a chunk of documents given as a flat array of token IDs,
+    where `doc_lengths[i]` is the number of tokens of the i-th document of the chunk. Returns
+    three aligned arrays (doc_indices, voc_indices, tf) with one entry per unique (doc, term)
+    pair. `doc_offset` is added to the document indices, so chunks can be processed independently.
+    """
+    token_ids_flat = np.asarray(token_ids_flat, dtype=np.int64)
+    doc_lengths = np.asarray(doc_lengths, dtype=np.int64)
+
+    if len(token_ids_flat) == 0:
+        empty = np.array([], dtype=int_dtype)
+        return empty, empty.copy(), np.array([], dtype=np.int64)
+
+    local_doc_ids = np.repeat(np.arange(len(doc_lengths), dtype=np.int64), doc_lengths)
+
+    # Combine (doc, term) into a single key, so that a single np.unique call both
+    # deduplicates the pairs and counts their occurrences (the term frequencies)
+    n_terms = int(token_ids_flat.max()) + 1
+    keys = local_doc_ids * n_terms + token_ids_flat
+    unique_keys, tf = np.unique(keys, return_counts=True)
+
+    doc_indices = (unique_keys // n_terms + doc_offset).astype(int_dtype)
+    voc_indices = (unique_keys % n_terms).astype(int_dtype)
+
+    return doc_indices, voc_indices, tf
+
+
+def _build_csc_arrays(scores_flat, doc_indices, voc_indices, n_vocab, int_dtype="int32"):
+    """
+    Arrange the (doc, term, score) triplets into the data, indices and indptr arrays of a
+    CSC matrix of shape (n_docs, n_vocab), with rows (documents) sorted within each column.
+    This is equivalent to `scipy.sparse.csc_matrix((scores, (doc, term)))` for unique pairs.
+    """
+    order = np.lexsort((doc_indices, voc_indices))
+    data = scores_flat[order]
+    indices = np.asarray(doc_indices[order], dtype=int_dtype)
+
+    col_counts = np.bincount(voc_indices, minlength=n_vocab)
+    indptr = np.zeros(n_vocab + 1, dtype=int_dtype)
+    np.cumsum(col_counts, out=indptr[1:])
+
+    return data, indices, indptr
+
+
 def _compute_relevance_from_scores_legacy(
     data, indptr, indices, num_docs, query_tokens_ids, dtype
 ):
@@ -343,6 +442,66 @@ def _compute_relevance_from_scores_legacy(
 
     return scores
 
+QUERY_TERM_MODES = ("weighted", "set")
+
+
+def _dedupe_query_tokens(
+    query_tokens_ids_flat: np.ndarray,
+    query_pointers: np.ndarray,
+    query_tokens_weights_flat: np.ndarray = None,
+    mode: str = "weighted",
+    dtype="float32",
+):
+    """
+    Collapse the repeated token IDs of each query into (token ID, weight) pairs, so that the
+    posting list of a token is read once per query instead of once per occurrence. The queries
+    are given as a flat array of token IDs, with `query_pointers[i]:query_pointers[i + 1]`
+    the tokens of the i-th query (as in the numba backend).
+
+    With mode="weighted", the weight of a token is the sum of the weights of its occurrences
+    (its number of occurrences if `query_tokens_weights_flat` is None), which gives the same
+    scores as scoring the repeated tokens. With mode="set", each distinct token of a query
+    counts once, with the largest of the weights of its occurrences (1 if no weights are given).
+
+    Returns the flat array of distinct token IDs (sorted within each query), the pointers to the
+    start of each query and the flat array of weights (of type `dtype`).
+    """
+    if mode not in QUERY_TERM_MODES:
+        raise ValueError(
+            f"Invalid query term mode '{mode}', expected one of {QUERY_TERM_MODES}."
+        )
+
+    query_tokens_ids_flat = np.asarray(query_tokens_ids_flat)
+    query_pointers = np.asarray(query_pointers, dtype=np.int64)
+    n_queries = len(query_pointers) - 1
+    query_of = np.repeat(np.arange(n_queries), np.diff(query_pointers))
+
+    order = np.lexsort((query_tokens_ids_flat, query_of))
+    ids_sorted = query_tokens_ids_flat[order]
+    query_sorted = query_of[order]
+
+    first = np.ones(len(ids_sorted), dtype=bool)
+    first[1:] = (ids_sorted[1:] != ids_sorted[:-1]) | (query_sorted[1:] != query_sorted[:-1])
+    starts = np.flatnonzero(first)
+
+    if query_tokens_weights_flat is None:
+        if mode == "set":
+            weights = np.ones(len(starts), dtype=dtype)
+        else:
+            weights = np.diff(np.append(starts, len(ids_sorted))).astype(dtype)
+    elif len(starts) == 0:
+        weights = np.zeros(0, dtype=dtype)
+    else:
+        weights_sorted = np.asarray(query_tokens_weights_flat, dtype=dtype)[order]
+        reduce = np.maximum if mode == "set" else np.add
+        weights = reduce.reduceat(weights_sorted, starts)
+
+    pointers = np.zeros(n_queries + 1, dtype=query_pointers.dtype)
+    np.cumsum(np.bincount(query_sorted[starts], minlength=n_queries), out=pointers[1:])
+
+    return ids_sorted[starts], pointers, weights
+
+
 def _compute_relevance_from_scores_jit_ready(
     data: np.ndarray,
     indptr: np.ndarray,
@@ -350,11 +509,14 @@ def _compute_relevance_from_scores_jit_ready(
     num_docs: int,
     query_tokens_ids: np.ndarray,
     dtype: np.dtype,
+    query_tokens_weights: np.ndarray = None,
 ) -> np.ndarray:
     """
     This internal static function calculates the relevance scores for a given query,
     by using the BM25 scores that have been precomputed in the BM25 eager index.
     This version is ready for JIT compilation with numba, but is slow if not compiled.
+    If `query_tokens_weights` is given, the scores of the i-th token are multiplied by
+    its weight (see `_dedupe_query_tokens`).
     """
     indptr_starts = indptr[query_tokens_ids]
     indptr_ends = indptr[query_tokens_ids + 1]
@@ -363,7 +525,12 @@ def _compute_relevance_from_scores_jit_ready(
     for i in range(len(query_tokens_ids)):
         start, end = indptr_starts[i], indptr_ends[i]
         # The following code is slower with numpy, but faster after JIT compilation
-        for j in range(start, end):
-            scores[indices[j]] += data[j]
+        if query_tokens_weights is None:
+            for j in range(start, end):
+                scores[indices[j]] += data[j]
+        else:
+            weight = query_tokens_weights[i]
+            for j in range(start, end):
+                scores[indices[j]] += weight * data[j]
 
-    return scores
\ No newline at end of file
+    return scores
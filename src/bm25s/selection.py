@@ -1,3 +1,5 @@
+import os
+
 import numpy as np
 
 try:
@@ -55,6 +57,115 @@ def _topk_jax(query_scores, k):
     return topk_scores, topk_indices
 
 
+def _topk_numpy_batch(scores_2d, k, sorted):
+    n_queries, n = scores_2d.shape
+    k = min(k, n)
+    if k == 0 or n_queries == 0:
+        return (
+            np.zeros((n_queries, 0), dtype=scores_2d.dtype),
+            np.zeros((n_queries, 0), dtype=np.int32),
+        )
+
+    # Same as `_topk_numpy`, but the partition and the sort are done along the last axis,
+    # so a whole block of queries is handled by a single numpy call
+    partitioned_ind = np.argpartition(scores_2d, -k, axis=1)[:, -k:]
+    partitioned_scores = np.take_along_axis(scores_2d, partitioned_ind, axis=1)
+
+    if sorted:
+        sorted_trunc_ind = np.flip(np.argsort(partitioned_scores, axis=1), axis=1)
+        ind = np.take_along_axis(partitioned_ind, sorted_trunc_ind, axis=1)
+        topk_scores = np.take_along_axis(partitioned_scores, sorted_trunc_ind, axis=1)
+    else:
+        ind = partitioned_ind
+        topk_scores = partitioned_scores
+
+    return topk_scores, ind
+
+
+def _topk_jax_batch(scores_2d, k):
+    k = min(k, scores_2d.shape[1])
+    topk_scores, topk_indices = jax.lax.top_k(scores_2d, k)
+    topk_scores = np.asarray(topk_scores)
+    topk_indices = np.asarray(topk_indices)
+
+    return topk_scores, topk_indices
+
+
+# Minimum ratio num_docs / k for which the numba heap is faster than numpy's argpartition,
+# measured with examples/benchmark_topk_batch.py
+NUMBA_TOPK_MIN_DOCS_PER_K = 1000
+
+
+def _numba_is_available():
+    try:
+        from .numba import selection  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _select_topk_batch_backend(k, num_docs):
+    if num_docs >= NUMBA_TOPK_MIN_DOCS_PER_K * k and _numba_is_available():
+        return "numba"
+    return "numpy"
+
+
+def topk_batch(scores_2d, k, backend="auto", sorted=True, parallel=True):
+    """
+    This function is used to retrieve the top-k results for a block of queries at once. It works
+    on a 2-dimensional array of scores with shape (n_queries, num_docs), and returns two arrays of
+    shape (n_queries, k) with the scores and the indices of the top-k documents of each query.
+
+    If backend="auto", the backend is chosen from the shape of the problem, following the results of
+    `examples/benchmark_topk_batch.py`: the numba heap is the fastest when k is small compared to the
+    number of documents (num_docs >= 1000 * k), and numpy's argpartition is the fastest otherwise.
+    JAX was never the fastest on CPU in this benchmark, so it is only used if selected explicitly.
+
+    If `parallel` is False, the numba backend processes the rows serially instead of with numba's
+    thread pool: this must be used when `topk_batch` is called from several Python threads.
+    """
+    scores_2d = np.asarray(scores_2d)
+    if scores_2d.ndim != 2:
+        raise ValueError("scores_2d must be a 2-dimensional array of shape (n_queries, num_docs).")
+
+    if backend == "auto":
+        backend = _select_topk_batch_backend(k, num_docs=scores_2d.shape[1])
+
+    if backend not in ["numpy", "jax", "numba"]:
+        raise ValueError("Invalid backend. Please choose from 'numpy', 'jax' or 'numba'.")
+    elif backend == "jax":
+        if not JAX_IS_AVAILABLE:
+            raise ImportError("JAX is not available. Please install JAX with `pip install jax[cpu]` to use this backend.")
+        return _topk_jax_batch(scores_2d, k)
+    elif backend == "numba":
+        try:
+            from .numba.selection import topk_batch as topk_batch_numba
+        except ImportError:
+            raise ImportError("Numba is not installed. Please install numba with `pip install numba` to use this backend.")
+        return topk_batch_numba(scores_2d, k, sorted=sorted, parallel=parallel)
+    else:
+        return _topk_numpy_batch(scores_2d, k, sorted)
+
+
+def fill_missing_batch(topk_scores, topk_indices, sorted=True):
+    """
+    Mark the results of `topk_batch` with a score of 0 or less (documents excluded by a filter or
+    weight mask) as missing: their index is set to -1 and their score to -inf, after the results
+    that are kept. Returns the scores, the indices, and the number of results kept for each query.
+    """
+    valid = topk_scores > 0
+    if not sorted:
+        # move the missing results to the end of each row, keeping the order of the others
+        order = np.argsort(~valid, axis=1, kind="stable")
+        valid = np.take_along_axis(valid, order, axis=1)
+        topk_scores = np.take_along_axis(topk_scores, order, axis=1)
+        topk_indices = np.take_along_axis(topk_indices, order, axis=1)
+
+    scores = np.where(valid, topk_scores, -np.inf).astype(topk_scores.dtype, copy=False)
+    indices = np.where(valid, topk_indices, -1).astype(topk_indices.dtype, copy=False)
+    return scores, indices, valid.sum(axis=1)
+
+
 def topk(query_scores, k, backend="auto", sorted=True):
     """
     This function is used to retrieve the top-k results for a single query. It will only work
@@ -72,3 +183,154 @@ def topk(query_scores, k, backend="auto", sorted=True):
         return _topk_jax(query_scores, k)
     else:
         return _topk_numpy(query_scores, k, sorted)
+
+
+MERGE_TIE_BREAKS = ("source", "index")
+
+# Number of candidates (n_queries * number of results of all the sources) from which the numba
+# kernel is used by `merge_topk(backend="auto")` on machines with several CPUs. On a single CPU,
+# the vectorized numpy merge is as fast as the numba kernel, which also needs to be compiled.
+NUMBA_MERGE_MIN_CANDIDATES = 1_000_000
+
+
+def _as_rows(rows):
+    # a 2D array, or an object array with one array per query (ragged results)
+    if isinstance(rows, np.ndarray):
+        return rows
+    rows = list(rows)
+    if len(set(len(row) for row in rows)) <= 1:
+        return np.asarray(rows)
+    out = np.empty(len(rows), dtype=object)
+    for i, row in enumerate(rows):
+        out[i] = row
+    return out
+
+
+def _pad_results(scores, indices):
+    # object arrays of ragged results (filtered retrieval) are padded with -1 and -inf
+    indices = _as_rows(indices)
+    scores = _as_rows(scores)
+    if indices.dtype != object and scores.dtype != object:
+        return scores.reshape(len(scores), -1), indices.astype(np.int64).reshape(len(indices), -1)
+
+    score_rows = [np.asarray(np.asarray(row).tolist()) for row in scores]
+    width = max((len(row) for row in score_rows), default=0)
+    dtype = np.result_type(np.float32, *[row.dtype for row in score_rows if len(row) > 0])
+    padded_scores = np.full((len(indices), width), -np.inf, dtype=dtype)
+    padded_indices = np.full((len(indices), width), -1, dtype=np.int64)
+    for i, (row_scores, row_indices) in enumerate(zip(score_rows, indices)):
+        padded_scores[i, : len(row_scores)] = row_scores
+        padded_indices[i, : len(row_scores)] = np.asarray(row_indices).tolist()
+    return padded_scores, padded_indices
+
+
+def _merge_topk_numpy(scores, indices, k, dedupe, tie_break):
+    n_queries, m = scores.shape
+    scores = np.where(indices < 0, -np.inf, scores)
+    positions = np.broadcast_to(np.arange(m), scores.shape)
+
+    if dedupe and m > 1:
+        # sort the candidates by document, best score first (then by position), and drop the
+        # candidates following one of the same document
+        order = np.lexsort((positions, -scores, indices), axis=-1)
+        sorted_indices = np.take_along_axis(indices, order, axis=1)
+        duplicate = np.zeros(scores.shape, dtype=bool)
+        duplicate[:, 1:] = (sorted_indices[:, 1:] == sorted_indices[:, :-1]) & (sorted_indices[:, 1:] >= 0)
+        np.put_along_axis(scores, order, np.where(duplicate, -np.inf, np.take_along_axis(scores, order, axis=1)), axis=1)
+
+    tie_key = positions if tie_break == "source" else indices
+    order = np.lexsort((positions, tie_key, -scores), axis=-1)[:, :k]
+    merged_scores = np.take_along_axis(scores, order, axis=1)
+    merged_indices = np.where(np.isneginf(merged_scores), -1, np.take_along_axis(indices, order, axis=1))
+
+    if merged_scores.shape[1] < k:
+        pad = k - merged_scores.shape[1]
+        merged_scores = np.pad(merged_scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+        merged_indices = np.pad(merged_indices, ((0, 0), (0, pad)), constant_values=-1)
+    return merged_scores, merged_indices
+
+
+def merge_topk(
+    scores_list,
+    indices_list,
+    k=None,
+    offsets=None,
+    dedupe=False,
+    tie_break="source",
+    backend="auto",
+):
+    """
+    Merge the top-k results of the same queries coming from several sources (indexes, shards
+    or time slices) into the global top-k of each query, for all queries at once.
+
+    Parameters
+    ----------
+    scores_list : List[np.ndarray]
+        The scores of each source, of shape (n_queries, k_source). Object arrays of ragged
+        results (filtered retrieval) are accepted.
+
+    indices_list : List[np.ndarray]
+        The document indices of each source, with the same shapes. Missing results are marked
+        with a negative index (see `BM25.retrieve(..., dense=True)`).
+
+    k : int
+        Number of results to keep per query. Defaults to the largest k_source.
+
+    offsets : List[int]
+        If given, `offsets[i]` is added to the (non-missing) indices of the i-th source, e.g.
+        the index of the first document of each shard.
+
+    dedupe : bool
+        If True, a document returned by several sources is kept once, with its best score.
+
+    tie_break : str
+        Order of the results with equal scores: "source" keeps the order of the sources, then
+        the order of the results within each source (like a heap merge of the sources);
+        "index" puts the smallest document index first.
+
+    backend : str
+        "numpy", "numba" (queries processed in parallel), or "auto" to use numba for large
+        batches on machines with several CPUs, when it is installed.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        The merged scores and indices, of shape (n_queries, k), in decreasing order of score.
+        If a query has fewer than k results, the missing ones have the index -1 and the score
+        -inf.
+    """
+    if len(scores_list) == 0 or len(scores_list) != len(indices_list):
+        raise ValueError("`scores_list` and `indices_list` must be non-empty lists of the same length.")
+    if tie_break not in MERGE_TIE_BREAKS:
+        raise ValueError(f"Invalid tie_break. Please choose from {MERGE_TIE_BREAKS}.")
+    if offsets is not None and len(offsets) != len(scores_list):
+        raise ValueError("`offsets` must have one offset per source.")
+
+    padded = [_pad_results(s, i) for s, i in zip(scores_list, indices_list)]
+    if len(set(s.shape[0] for s, _ in padded)) > 1:
+        raise ValueError("All the sources must have results for the same number of queries.")
+    if offsets is not None:
+        padded = [(s, np.where(i >= 0, i + int(offset), i)) for (s, i), offset in zip(padded, offsets)]
+    if k is None:
+        k = max(s.shape[1] for s, _ in padded)
+
+    dtype = np.result_type(*[s.dtype for s, _ in padded])
+    scores = np.concatenate([s.astype(dtype, copy=False) for s, _ in padded], axis=1)
+    indices = np.concatenate([i for _, i in padded], axis=1)
+
+    if backend == "auto":
+        use_numba = (
+            scores.size >= NUMBA_MERGE_MIN_CANDIDATES and (os.cpu_count() or 1) > 1 and _numba_is_available()
+        )
+        backend = "numba" if use_numba else "numpy"
+
+    if backend == "numba":
+        try:
+            from .numba.selection import merge_topk as merge_topk_numba
+        except ImportError:
+            raise ImportError("Numba is not installed. Please install numba with `pip install numba` to use this backend.")
+        return merge_topk_numba(scores, indices, k, dedupe=dedupe, tie_break=tie_break)
+    elif backend == "numpy":
+        return _merge_topk_numpy(scores, indices, k, dedupe, tie_break)
+    else:
+        raise ValueError("Invalid backend. Please choose from 'auto', 'numpy' or 'numba'.")
@@ -0,0 +1,378 @@
+"""
+Local HTTP search server for a saved BM25S index, based on the standard library only.
+
+Start the server with:
+
+```bash
+python -m bm25s.serve path/to/index --port 8000 --mmap --stopwords en
+```
+
+Then query it with JSON requests:
+
+```bash
+curl -X POST localhost:8000/search -d '{"query": "a cat that purrs", "k": 5}'
+curl -X POST localhost:8000/batch_search -d '{"queries": ["cats", "dogs"], "k": 5}'
+curl -X POST localhost:8000/filtered_search -d '{"query": "cats", "filter": {"category": "pets"}}'
+curl localhost:8000/stats
+```
+
+Concurrent requests are grouped into micro-batches by `bm25s.async_retriever.AsyncRetriever`,
+so that they are retrieved with a single `retrieve` call. If the index directory contains a
+`corpus.jsonl` file, the documents are returned instead of their indices (with `--mmap`, the
+corpus is read through `bm25s.utils.corpus.JsonlCorpus`). Metadata used by the filtered
+search is read from a JSONL file with one object per document (by default, `metadata.jsonl`
+in the index directory).
+"""
+
+import argparse
+import asyncio
+from collections import deque
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from . import BM25, tokenize
+from .async_retriever import AsyncRetriever
+from .filtering import MetadataFilter, validate_metadata
+from .utils import json_functions
+
+try:
+    import Stemmer
+except ImportError:
+    Stemmer = None
+
+logger = logging.getLogger("bm25s.serve")
+
+
+class LatencyStats:
+    """
+    Thread-safe request counters and latency percentiles, computed over the most recent
+    `window` requests.
+    """
+
+    def __init__(self, window: int = 10_000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._timestamps = deque(maxlen=window)
+        self.start_time = time.time()
+        self.num_requests = 0
+        self.num_queries = 0
+        self.num_errors = 0
+        self.requests_per_endpoint = {}
+
+    def record(self, endpoint: str, latency: float, num_queries: int = 1, error: bool = False):
+        with self._lock:
+            self._latencies.append(latency)
+            self._timestamps.append(time.time())
+            self.num_requests += 1
+            self.num_queries += num_queries
+            self.num_errors += int(error)
+            self.requests_per_endpoint[endpoint] = self.requests_per_endpoint.get(endpoint, 0) + 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies_ms = np.array(self._latencies, dtype=np.float64) * 1000
+            timestamps = list(self._timestamps)
+            stats = {
+                "uptime_s": time.time() - self.start_time,
+                "num_requests": self.num_requests,
+                "num_queries": self.num_queries,
+                "num_errors": self.num_errors,
+                "requests_per_endpoint": dict(self.requests_per_endpoint),
+            }
+
+        stats["qps"] = stats["num_queries"] / max(stats["uptime_s"], 1e-9)
+
+        # throughput of the recent requests, over the time they span
+        if len(timestamps) > 1 and timestamps[-1] > timestamps[0]:
+            stats["recent_rps"] = (len(timestamps) - 1) / (timestamps[-1] - timestamps[0])
+        else:
+            stats["recent_rps"] = 0.0
+
+        if len(latencies_ms) > 0:
+            p50, p90, p99 = np.percentile(latencies_ms, [50, 90, 99])
+            stats["latency_ms"] = {
+                "mean": float(latencies_ms.mean()),
+                "p50": float(p50),
+                "p90": float(p90),
+                "p99": float(p99),
+                "max": float(latencies_ms.max()),
+            }
+        else:
+            stats["latency_ms"] = None
+
+        return stats
+
+
+def _to_json_results(results) -> Dict[str, Any]:
+    out = {
+        "documents": np.asarray(results.documents).tolist(),
+        "scores": np.asarray(results.scores, dtype=np.float64).tolist(),
+    }
+    if results.metadata is not None:
+        out["metadata"] = results.metadata
+    return out
+
+
+class SearchApp:
+    """
+    Serve a `BM25` retriever to the threads of the HTTP server. An asyncio event loop runs in
+    a background thread and micro-batches the queries with an `AsyncRetriever`; the `search`
+    and `batch_search` methods block the calling thread until the results are ready.
+
+    Parameters
+    ----------
+    retriever : BM25
+        The retriever used to answer the queries.
+
+    tokenizer : callable
+        Called on a list of strings, returns an input accepted by `BM25.retrieve`.
+
+    k : int
+        Default number of documents returned per query.
+
+    max_k : int
+        Maximum number of documents a request can ask for.
+
+    **async_kwargs
+        Other arguments passed to `AsyncRetriever` (e.g. `max_batch_size`, `max_wait_ms`,
+        `max_queue_size`, `n_threads`).
+    """
+
+    def __init__(self, retriever: BM25, tokenizer, k: int = 10, max_k: int = 1000, **async_kwargs):
+        self.retriever = retriever
+        self.k = k
+        self.max_k = max_k
+        self.stats = LatencyStats()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="bm25s-serve-loop", daemon=True)
+        self._thread.start()
+
+        self.searcher = AsyncRetriever(retriever, tokenizer=tokenizer, k=k, **async_kwargs)
+        self._run(self.searcher.start())
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def _check_k(self, k):
+        k = self.k if k is None else k
+        if not isinstance(k, int) or k < 1 or k > self.max_k:
+            raise ValueError(f"`k` must be an integer between 1 and {self.max_k}.")
+        return min(k, self.retriever.scores["num_docs"])
+
+    def search(self, query: str, k: int = None, filter: Dict[str, Any] = None) -> Dict[str, Any]:
+        if not isinstance(query, str):
+            raise ValueError("`query` must be a string.")
+        if filter is not None and not isinstance(filter, dict):
+            raise ValueError("`filter` must be an object.")
+
+        results = self._run(self.searcher.search(query, k=self._check_k(k), filter=filter))
+        return _to_json_results(results)
+
+    def batch_search(self, queries: List[str], k: int = None, filter: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+            raise ValueError("`queries` must be a list of strings.")
+        if filter is not None and not isinstance(filter, dict):
+            raise ValueError("`filter` must be an object.")
+
+        k = self._check_k(k)
+
+        async def gather():
+            return await asyncio.gather(*(self.searcher.search(q, k=k, filter=filter) for q in queries))
+
+        return [_to_json_results(results) for results in self._run(gather())]
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.stats.to_dict()
+        stats["batching"] = self.searcher.stats
+        stats["num_docs"] = int(self.retriever.scores["num_docs"])
+        return stats
+
+    def close(self):
+        self._run(self.searcher.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+class SearchRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON endpoints of the search server. The `SearchApp` is read from `self.server.app`.
+    """
+
+    server_version = "bm25s"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, status: int, body):
+        data = json_functions.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json_functions.loads(self.rfile.read(length)) if length > 0 else {}
+        if not isinstance(body, dict):
+            raise ValueError("The request body must be a JSON object.")
+        return body
+
+    def do_GET(self):
+        app: SearchApp = self.server.app
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send_json(200, app.get_stats())
+        else:
+            self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+
+    def do_POST(self):
+        app: SearchApp = self.server.app
+        start = time.perf_counter()
+        num_queries = 1
+        error = False
+
+        try:
+            body = self._read_json()
+            if self.path == "/search":
+                out = app.search(body.get("query"), k=body.get("k"), filter=body.get("filter"))
+            elif self.path == "/filtered_search":
+                if body.get("filter") is None:
+                    raise ValueError("`filter` is required by /filtered_search.")
+                out = app.search(body.get("query"), k=body.get("k"), filter=body.get("filter"))
+            elif self.path == "/batch_search":
+                queries = body.get("queries")
+                num_queries = len(queries) if isinstance(queries, list) else 0
+                out = {"results": app.batch_search(queries, k=body.get("k"), filter=body.get("filter"))}
+            else:
+                self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+                return
+            status = 200
+        except ValueError as e:
+            out, status, error = {"error": str(e)}, 400, True
+        except Exception as e:
+            logger.exception("Error while processing %s", self.path)
+            out, status, error = {"error": str(e)}, 500, True
+
+        self._send_json(status, out)
+        app.stats.record(self.path, time.perf_counter() - start, num_queries=num_queries, error=error)
+
+
+def load_metadata(path) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json_functions.loads(line) for line in f if line.strip()]
+
+
+def load_app(
+    index_dir,
+    mmap: bool = False,
+    load_corpus: bool = True,
+    metadata_path=None,
+    stopwords=None,
+    stemmer_language: str = None,
+    **app_kwargs,
+) -> SearchApp:
+    """
+    Load a saved index directory and create the `SearchApp` serving it. The queries are
+    tokenized with `bm25s.tokenize`, so `stopwords` and `stemmer_language` should match the
+    ones used to tokenize the corpus.
+    """
+    retriever = BM25.load(index_dir, load_corpus=load_corpus, mmap=mmap)
+
+    if metadata_path is None and os.path.exists(Path(index_dir) / "metadata.jsonl"):
+        metadata_path = Path(index_dir) / "metadata.jsonl"
+
+    if metadata_path is not None:
+        metadata = load_metadata(metadata_path)
+        if len(metadata) != retriever.scores["num_docs"]:
+            raise ValueError(
+                f"The metadata file has {len(metadata)} entries, but the index has {retriever.scores['num_docs']} documents."
+            )
+        if validate_metadata(metadata):
+            retriever.metadata = metadata
+            retriever.metadata_filter = MetadataFilter(metadata)
+
+    stemmer = None
+    if stemmer_language is not None:
+        if Stemmer is None:
+            raise ImportError("Please install PyStemmer to use a stemmer: `pip install PyStemmer`.")
+        stemmer = Stemmer.Stemmer(stemmer_language)
+
+    tokenizer = partial(
+        tokenize, stopwords=stopwords, stemmer=stemmer, return_ids=False, show_progress=False
+    )
+
+    return SearchApp(retriever, tokenizer=tokenizer, **app_kwargs)
+
+
+def make_server(app: SearchApp, host: str = "127.0.0.1", port: int = 8000) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), SearchRequestHandler)
+    server.daemon_threads = True
+    server.app = app
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bm25s.serve", description="Serve a saved BM25S index over HTTP."
+    )
+    parser.add_argument("index_dir", help="Directory of the index saved with `BM25.save`.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--mmap", action="store_true", help="Memory-map the index and the corpus.")
+    parser.add_argument("--no-corpus", action="store_true", help="Return document indices instead of documents.")
+    parser.add_argument("--metadata", default=None, help="JSONL file with the metadata of each document.")
+    parser.add_argument("--stopwords", default=None, help="Stopwords used to tokenize the queries, e.g. 'en'.")
+    parser.add_argument("--stemmer", default=None, help="PyStemmer language used to stem the queries, e.g. 'english'.")
+    parser.add_argument("--k", type=int, default=10, help="Default number of results per query.")
+    parser.add_argument("--max-k", type=int, default=1000)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--max-queue-size", type=int, default=1024)
+    parser.add_argument("--n-threads", type=int, default=0, help="Threads used by `retrieve` for each batch.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    app = load_app(
+        args.index_dir,
+        mmap=args.mmap,
+        load_corpus=not args.no_corpus,
+        metadata_path=args.metadata,
+        stopwords=args.stopwords,
+        stemmer_language=args.stemmer,
+        k=args.k,
+        max_k=args.max_k,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_queue_size=args.max_queue_size,
+        n_threads=args.n_threads,
+    )
+    server = make_server(app, host=args.host, port=args.port)
+    logger.info("Serving %s on http://%s:%d", args.index_dir, args.host, server.server_address[1])
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        app.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,546 @@
+"""
+Sharded BM25 index. `ShardedBM25` splits the documents into contiguous partitions, each indexed
+by its own `BM25` object (a shard) with the document frequencies, number of documents and
+average document length of the whole collection, so that the scores are the same as those of
+a single index. Each shard has its own int32 `indices` and `indptr` arrays, so the number of
+postings of the collection is not limited to 2^31.
+
+At retrieval time, the queries are sent to all the shards in parallel (threads, or processes
+that load the shards from their directories), and the per-shard top-k results are merged with
+`selection.merge_topk`, which merges the results of all the queries at once.
+
+```python
+import bm25s
+from bm25s.sharded import ShardedBM25
+
+corpus_tokens = bm25s.tokenize(corpus, return_ids=False)
+retriever = ShardedBM25(num_shards=4, corpus=corpus)
+retriever.index(corpus_tokens)
+retriever.save("index_dir")
+
+retriever = ShardedBM25.load("index_dir", mmap=True, load_corpus=True)
+results = retriever.retrieve(bm25s.tokenize(queries, return_ids=False), k=10)
+```
+
+The directory contains a `sharded.index.json` file and one sub-directory per shard, saved with
+`BM25.save` (the metadata of the shard, if any, is saved to `metadata.jsonl`).
+"""
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import itertools
+import multiprocessing
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+from . import BM25, Results, get_unique_tokens, scoring, selection, tokenization
+from .utils import json_functions
+
+SHARDED_PARAMS_NAME = "sharded.index.json"
+METADATA_NAME = "metadata.jsonl"
+
+# shards loaded by the worker processes, see `_retrieve_from_shard_dir`
+_PROCESS_SHARDS: Dict[Any, BM25] = {}
+
+
+def _shard_bounds(num_docs: int, num_shards: int) -> np.ndarray:
+    """
+    Offsets of the first document of each shard, followed by `num_docs`. The documents are
+    split in contiguous partitions of nearly equal size.
+    """
+    sizes = np.full(num_shards, num_docs // num_shards, dtype=np.int64)
+    sizes[: num_docs % num_shards] += 1
+    bounds = np.zeros(num_shards + 1, dtype=np.int64)
+    np.cumsum(sizes, out=bounds[1:])
+    return bounds
+
+
+def _object_array(arrays) -> np.ndarray:
+    # one array per query, even when all the arrays have the same length
+    out = np.empty(len(arrays), dtype=object)
+    out[:] = arrays
+    return out
+
+
+def _load_shard(shard_dir, mmap=False, load_corpus=False, metadata_name=METADATA_NAME) -> BM25:
+    shard = BM25.load(shard_dir, mmap=mmap, load_corpus=load_corpus)
+    metadata_path = Path(shard_dir) / metadata_name
+    if metadata_path.exists():
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            metadata = [json_functions.loads(line) for line in f]
+        shard._set_index(shard.scores, shard.vocab_dict, create_empty_token=False, metadata=metadata)
+    return shard
+
+
+def _retrieve_from_shard(shard: BM25, query_tokens, k: int, retrieve_kwargs: Dict[str, Any]):
+    k = min(k, shard.scores["num_docs"])
+    if k == 0:
+        empty = [np.array([], dtype=np.int64) for _ in query_tokens]
+        return empty, [np.array([], dtype=shard.dtype) for _ in query_tokens]
+
+    results = shard.retrieve(
+        query_tokens,
+        k=k,
+        corpus=False,
+        return_as="tuple",
+        show_progress=False,
+        **retrieve_kwargs,
+    )
+    return list(results.documents), list(results.scores)
+
+
+def _retrieve_from_shard_dir(shard_dir, mmap, query_tokens, k, retrieve_kwargs):
+    """
+    Function run by the worker processes: the shard is loaded from its directory on the first
+    call, and kept for the next calls.
+    """
+    key = (str(shard_dir), mmap)
+    if key not in _PROCESS_SHARDS:
+        _PROCESS_SHARDS[key] = _load_shard(shard_dir, mmap=mmap)
+    return _retrieve_from_shard(_PROCESS_SHARDS[key], query_tokens, k, retrieve_kwargs)
+
+
+class ShardedBM25:
+    def __init__(self, num_shards: int = 2, corpus=None, n_jobs: int = -1, **bm25_kwargs):
+        """
+        A BM25 index split into `num_shards` shards.
+
+        Parameters
+        ----------
+        num_shards : int
+            Number of shards the documents are split into.
+
+        corpus : Iterable
+            The corpus of documents, optional. Each shard holds its part of the corpus, which
+            is saved with the shard and returned by `retrieve`.
+
+        n_jobs : int
+            Number of threads (or processes) used to build the shards and to retrieve from
+            them. If -1, it will use one worker per shard, up to the number of CPUs.
+
+        bm25_kwargs
+            Parameters of the `BM25` shards (k1, b, delta, method, idf_method, dtype,
+            int_dtype, backend).
+        """
+        if num_shards < 1:
+            raise ValueError("`num_shards` must be a positive integer.")
+        if "metadata" in bm25_kwargs:
+            raise ValueError("The metadata must be passed to the `index` method.")
+
+        self.num_shards = num_shards
+        self.corpus = corpus
+        self.n_jobs = n_jobs
+        self.bm25_kwargs = bm25_kwargs
+        self.shards: List[BM25] = []
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.shard_dirs = None
+        self.shard_mmap = None
+
+    @property
+    def num_docs(self) -> int:
+        return int(self.offsets[-1])
+
+    def _get_num_workers(self) -> int:
+        n_jobs = self.n_jobs
+        if n_jobs == -1:
+            n_jobs = min(len(self.shards) or self.num_shards, os.cpu_count())
+        return max(n_jobs, 1)
+
+    def index(
+        self,
+        corpus: Union[List[List[str]], tokenization.Tokenized, tuple],
+        metadata: List[Dict[str, Any]] = None,
+        create_empty_token=True,
+        show_progress=True,
+        leave_progress=False,
+    ):
+        """
+        Build the shards. The vocabulary is shared by all the shards, and the document
+        frequencies, number of documents and average document length are computed on the
+        whole corpus before the shards are built in parallel.
+
+        Parameters
+        ----------
+        corpus : List[List[str]] or bm25s.tokenization.Tokenized or tuple
+            The tokenized corpus, in any of the formats accepted by `BM25.index`.
+
+        metadata : List[Dict[str, Any]], optional
+            List of metadata dictionaries, one for each document in the corpus.
+
+        create_empty_token : bool
+            If True, an empty token is added to the vocabulary, see `BM25.index`.
+
+        show_progress : bool
+            If True, a progress bar will be shown. If False, no progress bar will be shown.
+
+        leave_progress : bool
+            If True, the progress bars will remain after the function completes.
+        """
+        shard_factory = BM25(**self.bm25_kwargs)
+        inferred_corpus_obj = shard_factory._infer_corpus_object(corpus)
+
+        if inferred_corpus_obj == "tokens":
+            unique_tokens = get_unique_tokens(
+                corpus, show_progress=show_progress, leave_progress=leave_progress, desc="BM25S Create Vocab"
+            )
+            vocab_dict = {token: i for i, token in enumerate(unique_tokens)}
+            corpus_token_ids = [[vocab_dict[token] for token in doc] for doc in corpus]
+        elif inferred_corpus_obj == "tuple":
+            corpus_token_ids, vocab_dict = corpus
+        else:
+            corpus_token_ids, vocab_dict = corpus.ids, corpus.vocab
+
+        vocab_dict = dict(vocab_dict)
+        num_docs = len(corpus_token_ids)
+        if num_docs == 0:
+            raise ValueError("Cannot build an index from an empty corpus.")
+        if metadata is not None and len(metadata) != num_docs:
+            raise ValueError("The number of metadata entries must match the number of documents.")
+
+        n_vocab = max(vocab_dict.values()) + 1
+        self.offsets = _shard_bounds(num_docs, self.num_shards)
+        int_dtype = shard_factory.int_dtype
+
+        def count_shard(i):
+            docs = corpus_token_ids[self.offsets[i] : self.offsets[i + 1]]
+            doc_lengths = np.fromiter((len(doc) for doc in docs), dtype=np.int64, count=len(docs))
+            flat = np.fromiter(itertools.chain.from_iterable(docs), dtype=np.int64, count=int(doc_lengths.sum()))
+            counts = scoring._count_doc_term_pairs(flat, doc_lengths, int_dtype=int_dtype)
+            return counts, doc_lengths
+
+        with ThreadPoolExecutor(max_workers=self._get_num_workers()) as executor:
+            shard_counts = list(executor.map(count_shard, range(self.num_shards)))
+
+            # statistics of the whole collection, shared by all the shards
+            doc_frequencies = np.zeros(n_vocab, dtype=np.int64)
+            total_len = 0
+            for (_, voc_indices, _), doc_lengths in shard_counts:
+                doc_frequencies += np.bincount(voc_indices, minlength=n_vocab)
+                total_len += int(doc_lengths.sum())
+            avg_doc_len = total_len / num_docs
+
+            def build_shard(i):
+                (doc_indices, voc_indices, tf_array), doc_lengths = shard_counts[i]
+                start, end = self.offsets[i], self.offsets[i + 1]
+                shard = BM25(
+                    corpus=None if self.corpus is None else self.corpus[start:end],
+                    **self.bm25_kwargs,
+                )
+                scores = shard.build_index_from_counts(
+                    doc_indices=doc_indices,
+                    voc_indices=voc_indices,
+                    tf_array=tf_array,
+                    doc_lengths=doc_lengths,
+                    n_vocab=n_vocab,
+                    doc_frequencies=doc_frequencies,
+                    total_docs=num_docs,
+                    avg_doc_len=avg_doc_len,
+                )
+                shard._set_index(
+                    scores=scores,
+                    vocab_dict=dict(vocab_dict),
+                    create_empty_token=create_empty_token,
+                    metadata=None if metadata is None else metadata[start:end],
+                )
+                return shard
+
+            self.shards = list(executor.map(build_shard, range(self.num_shards)))
+
+        self.shard_dirs = None
+        self.shard_mmap = None
+
+    def retrieve(
+        self,
+        query_tokens: Union[List[List[str]], tokenization.Tokenized],
+        corpus=None,
+        k: int = 10,
+        return_as: str = "tuple",
+        executor: str = "thread",
+        return_metadata: bool = False,
+        show_progress: bool = False,
+        **kwargs,
+    ):
+        """
+        Retrieve the top-k documents for each query from all the shards, and merge them.
+
+        Parameters
+        ----------
+        query_tokens : List[List[str]] or bm25s.tokenization.Tokenized
+            The tokenized queries, see `BM25.retrieve`. Token IDs must come from the vocabulary
+            used to build the index.
+
+        corpus : List or bool
+            If None, the documents held by the shards are returned when all the shards have a
+            corpus, and the indices otherwise. If False, the indices are returned. Otherwise,
+            the documents are looked up in `corpus` by their (global) index.
+
+        k : int
+            Number of documents to retrieve for each query.
+
+        return_as : str
+            "tuple" to return a `Results` object, or "documents" to return the documents only.
+
+        executor : str
+            "thread" to query the shards in threads of this process, or "process" to query them
+            in worker processes, each of which loads the shards from their directory. "process"
+            requires the index to have been saved or loaded with `save` or `load`.
+
+        return_metadata : bool
+            If True and the shards have metadata, return the metadata of the retrieved documents.
+
+        show_progress : bool
+            Unused, kept for compatibility with `BM25.retrieve`: the shards are queried without
+            progress bars.
+
+        kwargs
+            Passed to `BM25.retrieve` on each shard (e.g. `filter`, `n_threads`,
+            `backend_selection`). A `weight_mask` covers all the documents of the index, and
+            each shard receives the slice of its documents.
+
+        Returns
+        -------
+        Results or np.ndarray
+            The documents (or indices) and scores. If the shards return fewer than k documents
+            for some of the queries (e.g. with a filter), the arrays are object arrays with one
+            array per query, like `BM25.retrieve` does when filtering.
+        """
+        if return_as not in ("tuple", "documents"):
+            raise ValueError("`return_as` must be either 'tuple' or 'documents'")
+        if executor not in ("thread", "process"):
+            raise ValueError("`executor` must be either 'thread' or 'process'")
+        if len(self.shards) == 0:
+            raise ValueError("The index is empty. Please run the `index` or `load` method first.")
+
+        # one set of arguments per shard, with the slice of the weight mask of its documents
+        weight_mask = kwargs.pop("weight_mask", None)
+        shard_kwargs = [kwargs] * len(self.shards)
+        if weight_mask is not None:
+            weight_mask = np.asarray(weight_mask)
+            if weight_mask.ndim != 1 or len(weight_mask) != self.num_docs:
+                raise ValueError(
+                    f"The weight mask must be a 1D array with one entry per document ({self.num_docs})."
+                )
+            shard_kwargs = [
+                dict(kwargs, weight_mask=weight_mask[self.offsets[i] : self.offsets[i + 1]])
+                for i in range(len(self.shards))
+            ]
+
+        # the token IDs of queries weighted with `query_weights` must stay aligned with the weights
+        query_tokens = self.shards[0]._normalize_query_tokens(
+            query_tokens, filter_ids=kwargs.get("query_weights") is None
+        )
+        shard_results = self._retrieve_from_shards(query_tokens, k, shard_kwargs, executor)
+        indices, scores = self._merge_results(shard_results, len(query_tokens), k)
+
+        if corpus is None and all(shard.corpus is not None for shard in self.shards):
+            documents = self._lookup(indices, lambda shard: shard.corpus)
+        elif corpus is None or corpus is False:
+            documents = indices
+        else:
+            documents = self._map_indices(indices, lambda i: corpus[i])
+
+        metadata = None
+        if return_metadata and all(shard.metadata is not None for shard in self.shards):
+            metadata = [list(q) for q in self._lookup(indices, lambda shard: shard.metadata)]
+
+        if return_as == "documents":
+            return documents
+        return Results(documents=documents, scores=scores, metadata=metadata)
+
+    def _retrieve_from_shards(self, query_tokens, k, shard_kwargs, executor):
+        if executor == "process":
+            if self.shard_dirs is None:
+                raise ValueError(
+                    "The shards must be saved (or loaded) with `save` or `load` to be queried in processes."
+                )
+            pool = self._get_process_pool()
+            futures = [
+                pool.submit(_retrieve_from_shard_dir, shard_dir, mmap, query_tokens, k, retrieve_kwargs)
+                for shard_dir, mmap, retrieve_kwargs in zip(self.shard_dirs, self.shard_mmap, shard_kwargs)
+            ]
+            return [future.result() for future in futures]
+
+        if len(self.shards) == 1 or self._get_num_workers() == 1:
+            return [
+                _retrieve_from_shard(shard, query_tokens, k, retrieve_kwargs)
+                for shard, retrieve_kwargs in zip(self.shards, shard_kwargs)
+            ]
+
+        with ThreadPoolExecutor(max_workers=self._get_num_workers()) as pool:
+            futures = [
+                pool.submit(_retrieve_from_shard, shard, query_tokens, k, retrieve_kwargs)
+                for shard, retrieve_kwargs in zip(self.shards, shard_kwargs)
+            ]
+            return [future.result() for future in futures]
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        # the pool is kept, so the worker processes keep the shards they have loaded
+        if getattr(self, "_process_pool", None) is None:
+            # spawn rather than fork, as the parent may be running threads (e.g. jax)
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self._get_num_workers(), mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._process_pool
+
+    def close(self):
+        """
+        Shut down the worker processes used by `retrieve(..., executor="process")`.
+        """
+        if getattr(self, "_process_pool", None) is not None:
+            self._process_pool.shutdown()
+            self._process_pool = None
+
+    def _merge_results(self, shard_results, num_queries, k):
+        """
+        Merge the top-k results of the shards with `selection.merge_topk`: the indices of each
+        shard are offset to global indices, and equal scores keep the order of the shards.
+        """
+        scores, indices = selection.merge_topk(
+            [shard_scores for _, shard_scores in shard_results],
+            [shard_indices for shard_indices, _ in shard_results],
+            k=k,
+            offsets=self.offsets[:-1],
+        )
+        scores = scores.astype(self.shards[0].dtype, copy=False)
+        counts = (indices >= 0).sum(axis=1)
+
+        if np.all(counts == k):
+            return indices, scores
+        return (
+            _object_array([row[:n] for row, n in zip(indices, counts)]),
+            _object_array([row[:n] for row, n in zip(scores, counts)]),
+        )
+
+    def _map_indices(self, indices, fn):
+        def map_query(query_indices):
+            mapped = np.empty(len(query_indices), dtype=object)
+            for j, i in enumerate(query_indices.tolist()):
+                mapped[j] = fn(i)
+            return mapped
+
+        if indices.dtype != object:
+            return np.stack([map_query(q) for q in indices]) if len(indices) > 0 else indices.astype(object)
+        return _object_array([map_query(q) for q in indices])
+
+    def _lookup(self, indices, get_items):
+        """
+        Look up the item of each global index in the shard that holds it.
+        """
+
+        def lookup(i):
+            s = int(np.searchsorted(self.offsets, i, side="right")) - 1
+            return get_items(self.shards[s])[i - int(self.offsets[s])]
+
+        return self._map_indices(indices, lookup)
+
+    def save(self, save_dir, shard_name="shard_{:04d}", metadata_name=METADATA_NAME, **save_kwargs):
+        """
+        Save each shard to its own sub-directory of `save_dir` with `BM25.save`, along with
+        its metadata, and the list of shards to `sharded.index.json`.
+
+        Parameters
+        ----------
+        save_dir : str
+            The directory where the shards will be saved.
+
+        shard_name : str
+            Format of the names of the shard directories, given the shard number.
+
+        metadata_name : str
+            Name of the file containing the metadata of a shard, one JSON object per line.
+
+        save_kwargs
+            Passed to `BM25.save` for each shard.
+        """
+        if len(self.shards) == 0:
+            raise ValueError("The index is empty. Please run the `index` method first.")
+
+        save_dir = Path(save_dir)
+        save_dir.mkdir(parents=True, exist_ok=True)
+
+        shard_dirs = []
+        for i, shard in enumerate(self.shards):
+            name = shard_name.format(i)
+            corpus = shard.corpus
+            if corpus is not None:
+                # the documents given as strings are saved with their index in the whole corpus
+                offset = int(self.offsets[i])
+                corpus = [
+                    {"id": offset + j, "text": doc} if isinstance(doc, str) else doc
+                    for j, doc in enumerate(corpus)
+                ]
+            shard.save(save_dir / name, corpus=corpus, **save_kwargs)
+            if shard.metadata is not None:
+                with open(save_dir / name / metadata_name, "w", encoding="utf-8") as f:
+                    for entry in shard.metadata:
+                        f.write(json_functions.dumps(entry) + "\n")
+            shard_dirs.append(name)
+
+        params = {
+            "num_shards": len(self.shards),
+            "offsets": self.offsets.tolist(),
+            "shard_dirs": shard_dirs,
+            "n_jobs": self.n_jobs,
+            "bm25_kwargs": self.bm25_kwargs,
+        }
+        with open(save_dir / SHARDED_PARAMS_NAME, "w") as f:
+            f.write(json_functions.dumps(params, indent=4))
+
+        self.shard_dirs = [str(save_dir / name) for name in shard_dirs]
+        self.shard_mmap = [False] * len(shard_dirs)
+
+    @classmethod
+    def load(
+        cls,
+        save_dir,
+        mmap: Union[bool, List[bool]] = False,
+        load_corpus: bool = False,
+        n_jobs: int = None,
+        metadata_name=METADATA_NAME,
+    ):
+        """
+        Load a sharded index saved with `save`.
+
+        Parameters
+        ----------
+        save_dir : str
+            The directory containing `sharded.index.json`. The shard directories listed in
+            this file are relative to `save_dir`, or absolute paths to local directories.
+
+        mmap : bool or List[bool]
+            Whether to memory-map the score arrays (and the corpus) of the shards, either for
+            all the shards or for each shard.
+
+        load_corpus : bool
+            If True, the corpus of each shard is loaded.
+
+        n_jobs : int
+            Number of workers used by `retrieve`. Defaults to the value used when saving.
+
+        metadata_name : str
+            Name of the file containing the metadata of a shard.
+        """
+        save_dir = Path(save_dir)
+        with open(save_dir / SHARDED_PARAMS_NAME, "r") as f:
+            params = json_functions.loads(f.read())
+
+        shard_dirs = [save_dir / name for name in params["shard_dirs"]]
+        shard_mmap = list(mmap) if isinstance(mmap, (list, tuple)) else [mmap] * len(shard_dirs)
+        if len(shard_mmap) != len(shard_dirs):
+            raise ValueError(f"Expected {len(shard_dirs)} values for `mmap`, found {len(shard_mmap)}.")
+
+        retriever = cls(
+            num_shards=params["num_shards"],
+            n_jobs=params["n_jobs"] if n_jobs is None else n_jobs,
+            **params["bm25_kwargs"],
+        )
+        retriever.shards = [
+            _load_shard(d, mmap=m, load_corpus=load_corpus, metadata_name=metadata_name)
+            for d, m in zip(shard_dirs, shard_mmap)
+        ]
+        retriever.offsets = np.asarray(params["offsets"], dtype=np.int64)
+        retriever.shard_dirs = [str(d) for d in shard_dirs]
+        retriever.shard_mmap = shard_mmap
+        return retriever
@@ -1,6 +1,9 @@
 from ast import Tuple
+from functools import partial
 from pathlib import Path
 import re
+import threading
+from types import MappingProxyType
 from typing import Any, Dict, List, Union, Callable, NamedTuple
 import typing
 
@@ -14,6 +17,11 @@ except ImportError:
     def tqdm(iterable, *args, **kwargs):
         return iterable
 
+try:
+    import Stemmer
+except ImportError:
+    Stemmer = None
+
 
 from .stopwords import (
     STOPWORDS_EN,
@@ -64,10 +72,12 @@ class Tokenizer:
         no stopwords will be removed. If a list of strings is provided, the tokenizer will
         use the list of strings as stopwords.
 
-    stemmer : Callable, optional
+    stemmer : Callable or str, optional
         The stemmer to use for stemming the tokens. It is recommended
         to use the PyStemmer library for stemming, but you can also any callable that
-        takes a list of strings and returns a list of strings.
+        takes a list of strings and returns a list of strings. If a string is provided,
+        it is the language of the PyStemmer stemmer to use (e.g. "english"), which also
+        lets `freeze` give each thread its own stemmer.
     """
 
     def __init__(
@@ -75,9 +85,15 @@ class Tokenizer:
         lower: bool = True,
         splitter: Union[str, Callable] = r"(?u)\b\w\w+\b",
         stopwords: Union[str, List[str]] = "english",
-        stemmer: Callable = None,  # type: ignore
+        stemmer: Union[Callable, str] = None,  # type: ignore
     ):
         self.lower = lower
+        self.stemmer_language = None
+        if isinstance(stemmer, str):
+            if Stemmer is None:
+                raise ImportError("Please install PyStemmer to use a stemmer: `pip install PyStemmer`.")
+            self.stemmer_language = stemmer
+            stemmer = Stemmer.Stemmer(stemmer)
         if isinstance(splitter, str):
             splitter = re.compile(splitter).findall
         if not callable(splitter):
@@ -438,6 +454,211 @@ class Tokenizer:
         reverse_vocab = {v: k for k, v in vocab.items()}
         return [[reverse_vocab[token_id] for token_id in doc] for doc in docs]
 
+    def freeze(self, stemmer_factory: Callable = None) -> "FrozenTokenizer":
+        """
+        Create a read-only query tokenizer from the current vocabulary. The returned
+        `FrozenTokenizer` never updates the vocabulary, which makes it safe to share
+        across threads (e.g. the threads used by `BM25.retrieve`) without any locks on
+        the vocabulary. For the stemmer, see `stemmer_factory`.
+
+        The vocabulary is copied at the time of the call, so further calls to
+        `tokenize` with `update_vocab=True` on this tokenizer will not be visible
+        to the frozen tokenizer.
+        凍結時点の語彙をコピーするため、その後の語彙更新は凍結トークナイザーに反映されません。
+
+        Parameters
+        ----------
+        stemmer_factory : Callable, optional
+            A function without arguments that creates a new stemmer (a PyStemmer object or a
+            callable), called once in each thread that stems words with the frozen tokenizer.
+            By default, if the tokenizer was created with the language of its stemmer (e.g.
+            `Tokenizer(stemmer="english")`), each thread gets its own PyStemmer stemmer of that
+            language. PyStemmer objects are not thread-safe: if a PyStemmer object was given
+            instead, and no factory, the calls to it are serialized.
+
+        Returns
+        -------
+        FrozenTokenizer
+            A tokenizer with the same behavior as `tokenize(..., update_vocab=False)`.
+        """
+        if stemmer_factory is None and self.stemmer_language is not None:
+            stemmer_factory = partial(Stemmer.Stemmer, self.stemmer_language)
+
+        return FrozenTokenizer(
+            lower=self.lower,
+            splitter=self.splitter,
+            stopwords=self.stopwords,
+            stemmer=self.stemmer,
+            word_to_id=self.word_to_id,
+            word_to_stem=self.word_to_stem,
+            stem_to_sid=self.stem_to_sid,
+            vocab_dict=self.get_vocab_dict(),
+            stemmer_factory=stemmer_factory,
+        )
+
+
+def _is_pystemmer(stemmer) -> bool:
+    # the `stemWord` method of a PyStemmer object, as stored by `Tokenizer`
+    return Stemmer is not None and isinstance(getattr(stemmer, "__self__", None), Stemmer.Stemmer)
+
+
+class FrozenTokenizer:
+    """
+    Immutable query tokenizer created by `Tokenizer.freeze`. It produces the same token IDs
+    as `Tokenizer.tokenize(..., update_vocab=False)`, but all lookup structures are built
+    once and never mutated afterwards: the stopwords are a frozenset, and the word -> id map
+    already contains every word whose stem was resolved during indexing. Unseen words are
+    stemmed on the fly and looked up in the stem -> id map without being cached.
+
+    `Tokenizer.freeze`で作成される読み取り専用のクエリトークナイザーです。内部の辞書は変更されないため、
+    ロックなしで複数スレッドから同時に呼び出すことができます。
+
+    Note
+    ----
+    PyStemmer objects are not thread-safe. With a `stemmer_factory`, each thread stems the
+    unseen words with its own stemmer, created on first use. Otherwise, the calls to a PyStemmer
+    stemmer are serialized, and other stemmer callables are assumed to be safe for concurrent use.
+    """
+
+    def __init__(
+        self,
+        lower: bool,
+        splitter: Callable,
+        stopwords: Union[List[str], tuple],
+        stemmer: Callable,
+        word_to_id: Dict[str, int],
+        word_to_stem: Dict[str, str],
+        stem_to_sid: Dict[str, int],
+        vocab_dict: Dict[str, int],
+        stemmer_factory: Callable = None,
+    ):
+        self.lower = lower
+        self.splitter = splitter
+        self.stemmer = stemmer
+        self.stemmer_factory = stemmer_factory
+        self._local = threading.local()
+        self._stemmer_lock = None
+        if stemmer_factory is None and _is_pystemmer(stemmer):
+            self._stemmer_lock = threading.Lock()
+        self.stopwords = frozenset(stopwords) if stopwords else frozenset()
+
+        # Resolve every stem we already know about, so that most query words only need
+        # a single dictionary lookup.
+        # 既知の語幹を事前に解決し、ほとんどのクエリ語を1回の辞書参照で処理できるようにします。
+        resolved = dict(word_to_id)
+        if stemmer is not None:
+            for word, stem in word_to_stem.items():
+                if word not in resolved and stem in stem_to_sid:
+                    resolved[word] = stem_to_sid[stem]
+
+        self.word_to_id = MappingProxyType(resolved)
+        self.stem_to_sid = MappingProxyType(dict(stem_to_sid))
+        self.vocab_dict = MappingProxyType(dict(vocab_dict))
+        self.empty_id = resolved.get("")
+
+    def _stem(self, word: str) -> str:
+        if self.stemmer_factory is not None:
+            stemmer = getattr(self._local, "stemmer", None)
+            if stemmer is None:
+                stemmer = self.stemmer_factory()
+                if hasattr(stemmer, "stemWord"):
+                    stemmer = stemmer.stemWord
+                self._local.stemmer = stemmer
+            return stemmer(word)
+
+        if self._stemmer_lock is not None:
+            with self._stemmer_lock:
+                return self.stemmer(word)
+
+        return self.stemmer(word)
+
+    def _token_ids(self, text: str, allow_empty: bool) -> List[int]:
+        if self.lower:
+            text = text.lower()
+
+        splitted_words = self.splitter(text)
+        word_to_id = self.word_to_id
+
+        doc_ids = []
+        for word in splitted_words:
+            wid = word_to_id.get(word)
+            if wid is not None:
+                doc_ids.append(wid)
+                continue
+
+            if word in self.stopwords:
+                continue
+
+            if self.stemmer is not None:
+                sid = self.stem_to_sid.get(self._stem(word))
+                if sid is not None:
+                    doc_ids.append(sid)
+
+        if len(doc_ids) == 0 and allow_empty is True and self.empty_id is not None:
+            doc_ids = [self.empty_id]
+
+        return doc_ids
+
+    def streaming_tokenize(self, texts: List[str], allow_empty: bool = True):
+        """
+        Tokenize a list of strings and return a generator of token IDs.
+        """
+        for text in texts:
+            yield self._token_ids(text, allow_empty=allow_empty)
+
+    def tokenize(
+        self,
+        texts: Union[str, List[str]],
+        return_as: str = "ids",
+        allow_empty: bool = True,
+    ) -> Union[List[List[int]], List[List[str]], typing.Generator, Tokenized]:
+        """
+        Tokenize a list of strings using the frozen vocabulary.
+
+        Parameters
+        ----------
+        texts : Union[str, List[str]]
+            A list of strings to tokenize. A single string is treated as a list with one element.
+
+        return_as : str, optional
+            One of "ids", "string", "tuple" or "stream", with the same meaning as in
+            `Tokenizer.tokenize`.
+
+        allow_empty : bool, optional
+            If True, queries without any known token are mapped to the empty token "",
+            if it exists in the vocabulary.
+        """
+        if return_as not in ["tuple", "string", "ids", "stream"]:
+            raise ValueError(
+                "return_as must be either 'tuple', 'string', 'ids', or 'stream'."
+            )
+
+        if isinstance(texts, str):
+            texts = [texts]
+
+        stream_fn = self.streaming_tokenize(texts, allow_empty=allow_empty)
+        if return_as == "stream":
+            return stream_fn
+
+        token_ids = list(stream_fn)
+
+        if return_as == "ids":
+            return token_ids
+        elif return_as == "string":
+            return self.decode(token_ids)
+        else:
+            return Tokenized(ids=token_ids, vocab=dict(self.vocab_dict))
+
+    def __call__(self, texts: Union[str, List[str]], **kwargs):
+        return self.tokenize(texts, **kwargs)
+
+    def decode(self, docs: List[List[int]]) -> List[List[str]]:
+        """
+        Convert word IDs (or stemmed IDs if a stemmer is used) back to strings.
+        """
+        reverse_vocab = {v: k for k, v in self.vocab_dict.items()}
+        return [[reverse_vocab[token_id] for token_id in doc] for doc in docs]
+
 
 def convert_tokenized_to_string_list(tokenized: Tokenized) -> List[List[str]]:
     """
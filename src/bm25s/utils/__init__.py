@@ -1 +1 @@
-from . import benchmark, beir, corpus, json_functions
\ No newline at end of file
+from . import benchmark, beir, corpus, evaluation, json_functions, memory, profiling
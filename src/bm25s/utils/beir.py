@@ -1,12 +1,19 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import itertools
 import logging
+import multiprocessing
+import os
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
 
 try:
     from tqdm.auto import tqdm
 except ImportError:
 
-    def tqdm(iterable, *args, **kwargs):
+    def tqdm(iterable=None, *args, **kwargs):
         return iterable
 
 
@@ -192,25 +199,30 @@ def load_jsonl(
         raise FileNotFoundError(f"Corpus file not found at {corpus_path}")
 
     corpus = []
-    with open(corpus_path, "r") as f:
-        # get the number of bytes in the file
-        num_lines = sum(1 for i in open(corpus_path, "rb"))
-        pbar = tqdm(
-            f,
-            desc="[{}] loading {}".format(dataset, fname),
-            leave=False,
-            disable=not show_progress,
-            total=num_lines,
-        )
-        for line in pbar:
+    # the file is read once, in binary mode, and the progress is tracked in bytes
+    pbar = tqdm(
+        total=os.path.getsize(corpus_path),
+        desc="[{}] loading {}".format(dataset, fname),
+        unit="B",
+        unit_scale=True,
+        leave=False,
+        disable=not show_progress,
+    )
+    with open(corpus_path, "rb") as f:
+        for line in f:
+            if pbar is not None:
+                pbar.update(len(line))
+            if not line.strip():
+                continue
             line = json_functions.loads(line)
             if force_title:
                 line["title"] = line.get("title")
             if remove is not None:
                 for key in remove:
-                    del line[key]
+                    line.pop(key, None)
             corpus.append(line)
-            # update the progress bar wrt the number of bytes read
+    if pbar is not None:
+        pbar.close()
 
     if return_dict:
         corpus = {doc.pop("_id"): doc for doc in corpus}
@@ -218,6 +230,159 @@ def load_jsonl(
     return corpus
 
 
+def _byte_ranges(path, num_ranges: int) -> List[Tuple[int, int]]:
+    # split the file in `num_ranges` ranges of about the same size, each ending after a newline
+    file_size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, "rb") as f:
+        for i in range(1, num_ranges):
+            position = file_size * i // num_ranges
+            if position <= boundaries[-1]:
+                continue
+            f.seek(position - 1)
+            f.readline()
+            boundaries.append(min(f.tell(), file_size))
+    boundaries.append(file_size)
+    return [(a, b) for a, b in zip(boundaries[:-1], boundaries[1:]) if b > a]
+
+
+def _parse_jsonl_range(path, start, end, fields, id_field, chunk_size=16 * 1024 * 1024):
+    """
+    Parse the lines of `path` between the byte offsets `start` and `end` (both at the start of a
+    line). Returns the ids, a list of values for each field, and the offset of each line.
+    """
+    ids = []
+    columns = {field: [] for field in fields}
+    line_starts = []
+    loads = json_functions.loads
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        position = start  # offset of `carry` in the file
+        remaining = end - start
+        carry = b""
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            data = carry + chunk if carry else chunk
+            if remaining > 0:
+                last_newline = data.rfind(b"\n")
+                if last_newline == -1:
+                    carry = data
+                    continue
+                data, carry = data[: last_newline + 1], data[last_newline + 1 :]
+            else:
+                carry = b""
+
+            newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord("\n"))
+            starts = np.concatenate([[0], newlines + 1]).astype(np.int64)
+            line_starts.append(starts[starts < len(data)] + position)
+            position += len(data)
+
+            for line in data.split(b"\n"):
+                if not line.strip():
+                    continue
+                doc = loads(line)
+                ids.append(str(doc.get(id_field)))
+                for field in fields:
+                    columns[field].append(doc.get(field))
+
+    line_starts = np.concatenate(line_starts) if line_starts else np.zeros(0, dtype=np.int64)
+    return ids, columns, line_starts
+
+
+def load_jsonl_columns(
+    path,
+    fields=("title", "text"),
+    id_field="_id",
+    n_jobs=1,
+    save_mmindex=False,
+    show_progress=True,
+) -> Dict[str, Union[np.ndarray, list]]:
+    """
+    Load a JSONL file (e.g. the corpus or the queries of a BEIR dataset) as columns: an array of
+    ids, and a list of values for each field. The file is read in binary chunks, parsed with
+    orjson when it is installed, and split in byte ranges parsed in parallel when `n_jobs > 1`.
+
+    Parameters
+    ----------
+    path : str or Path
+        The path of the JSONL file.
+
+    fields : Iterable[str]
+        The fields to load. A document without a field gets None.
+
+    id_field : str
+        The field with the ID of each document.
+
+    n_jobs : int
+        The number of processes parsing the file. If -1, all the CPUs are used.
+
+    save_mmindex : bool
+        If True, the offsets of the lines of the file, found while reading it, are saved to the
+        index used by `bm25s.utils.corpus.JsonlCorpus`, so that it can open the file without
+        scanning it again. The rows of the columns are the documents of the `JsonlCorpus` if
+        the file has no blank lines.
+
+    show_progress : bool
+        If True, a progress bar is shown.
+
+    Returns
+    -------
+    Dict[str, np.ndarray or list]
+        The ids under "ids" (an array of str), and a list of values for each field.
+    """
+    from .corpus import save_mmindex as _save_mmindex
+
+    path = str(path)
+    fields = list(fields)
+    if n_jobs == -1:
+        n_jobs = os.cpu_count() or 1
+
+    # ranges of at most 64MB, so that the progress bar moves
+    num_ranges = max(n_jobs * 4, -(-os.path.getsize(path) // (64 * 1024 * 1024)), 1)
+    ranges = _byte_ranges(path, num_ranges)
+
+    pbar = tqdm(
+        total=os.path.getsize(path),
+        desc=f"Loading {os.path.basename(path)}",
+        unit="B",
+        unit_scale=True,
+        leave=False,
+        disable=not show_progress,
+    )
+    parse = partial(_parse_jsonl_range, path, fields=fields, id_field=id_field)
+    parts = []
+    if n_jobs > 1 and len(ranges) > 1:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=context) as executor:
+            futures = [executor.submit(parse, start, end) for start, end in ranges]
+            for (start, end), future in zip(ranges, futures):
+                parts.append(future.result())
+                if pbar is not None:
+                    pbar.update(end - start)
+    else:
+        for start, end in ranges:
+            parts.append(parse(start, end))
+            if pbar is not None:
+                pbar.update(end - start)
+    if pbar is not None:
+        pbar.close()
+
+    ids = [i for part in parts for i in part[0]]
+    out = {"ids": np.array(ids, dtype=str)}
+    for field in fields:
+        out[field] = [value for part in parts for value in part[1][field]]
+
+    if save_mmindex:
+        line_starts = [part[2] for part in parts]
+        _save_mmindex(np.concatenate(line_starts) if line_starts else np.zeros(0, dtype=np.int64), path)
+
+    return out
+
+
 def load_corpus(dataset, save_dir="./datasets", show_progress=True, return_dict=True):
     return load_jsonl(
         dataset=dataset,
@@ -242,36 +407,80 @@ def load_queries(dataset, save_dir="./datasets", show_progress=True, return_dict
     )
 
 
-def load_qrels(
-    dataset, split="test", save_dir="./datasets", show_progress=True, return_dict=True
-):
+def load_corpus_columns(dataset, save_dir="./datasets", n_jobs=1, save_mmindex=False, show_progress=True):
     """
-    This is tsv files
+    Load the corpus of a BEIR dataset as columns "ids", "title" and "text". See `load_jsonl_columns`.
+    """
+    return load_jsonl_columns(
+        Path(save_dir) / dataset / "corpus.jsonl",
+        fields=("title", "text"),
+        n_jobs=n_jobs,
+        save_mmindex=save_mmindex,
+        show_progress=show_progress,
+    )
+
+
+def load_queries_columns(dataset, save_dir="./datasets", n_jobs=1, show_progress=True):
+    """
+    Load the queries of a BEIR dataset as columns "ids" and "text". See `load_jsonl_columns`.
+    """
+    return load_jsonl_columns(
+        Path(save_dir) / dataset / "queries.jsonl",
+        fields=("text",),
+        n_jobs=n_jobs,
+        show_progress=show_progress,
+    )
+
+
+def load_qrels_arrays(dataset, split="test", save_dir="./datasets") -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Load the qrels of a BEIR dataset (a TSV file with a header) as three arrays: the query ids,
+    the document ids, and the relevance scores (int64). The file is split in cells with a
+    single call to `bytes.split`, and the columns are decoded and converted by numpy.
     """
     if split not in ["train", "dev", "test"]:
         raise ValueError("split must be one of ['train', 'dev', 'test']")
 
-    dataset_path = Path(save_dir) / dataset
-    qrels_path = dataset_path / "qrels" / f"{split}.tsv"
-
+    qrels_path = Path(save_dir) / dataset / "qrels" / f"{split}.tsv"
     if not qrels_path.exists():
         raise FileNotFoundError(f"Qrels file not found at {qrels_path}")
 
-    qrels = []
-    with open(qrels_path, "r") as f:
+    with open(qrels_path, "rb") as f:
         # skip first line
-        next(f)
-        for line in tqdm(
-            f,
-            desc="Loading Qrels {}".format(dataset),
-            leave=False,
-            disable=not show_progress,
-        ):
-            qid, cid, score = line.strip().split("\t")
-            qrels.append((qid, cid, int(score)))
+        f.readline()
+        raw = f.read().replace(b"\r", b"").strip(b"\n")
+
+    if not raw:
+        return np.zeros(0, dtype=str), np.zeros(0, dtype=str), np.zeros(0, dtype=np.int64)
+
+    if b"\n\n" in raw:
+        # blank lines
+        raw = b"\n".join(line for line in raw.split(b"\n") if line)
+    cells = np.array(raw.replace(b"\n", b"\t").split(b"\t"))
+    if len(cells) % 3 != 0:
+        raise ValueError(f"The qrels file {qrels_path} must have 3 columns: query-id, corpus-id and score.")
+
+    query_ids = np.char.decode(np.char.strip(cells[0::3]), "utf-8")
+    doc_ids = np.char.decode(np.char.strip(cells[1::3]), "utf-8")
+    scores = cells[2::3].astype(np.int64)
+    return query_ids, doc_ids, scores
+
+
+def load_qrels(
+    dataset, split="test", save_dir="./datasets", show_progress=True, return_dict=True
+):
+    """
+    This is tsv files. Returns a dictionary {query_id: {doc_id: score}} if `return_dict`,
+    otherwise a list of (query_id, doc_id, score) tuples. See `load_qrels_arrays`.
+    """
+    query_ids, doc_ids, scores = load_qrels_arrays(dataset, split=split, save_dir=save_dir)
+    qrels = list(zip(query_ids.tolist(), doc_ids.tolist(), scores.tolist()))
 
     if return_dict:
-        qrels = {qid: {cid: score} for qid, cid, score in qrels}
+        qrels_dict = {}
+        for qid, cid, score in qrels:
+            qrels_dict.setdefault(qid, {})[cid] = score
+        qrels = qrels_dict
 
     return qrels
 
@@ -285,14 +494,13 @@ def evaluate(
     """
     Acknowledgement: This function is adapted from BEIR's EvaluateRetrieval class.
     License for this function: Apache-2.0
+
+    The metrics are computed with `bm25s.utils.evaluation.evaluate_results`, which follows the
+    definitions of trec_eval, so pytrec_eval is not needed. As in trec_eval, the documents of
+    each query are ranked by decreasing score, then by decreasing document ID, and only the
+    queries that have relevance judgments are evaluated.
     """
-    try:
-        import pytrec_eval
-    
-    except ImportError:
-        raise ImportError(
-            "Please install pytrec_eval to use this function. You can install it via `pip install pytrec_eval`."
-        )
+    from .evaluation import evaluate_results, qrels_to_matrix, rank_run
 
     if ignore_identical_ids:
         logging.info(
@@ -305,38 +513,35 @@ def evaluate(
                     results[qid].pop(pid)
                     popped.append(pid)
 
+    query_ids, ranked = rank_run({qid: docs for qid, docs in results.items() if qid in qrels})
+
+    doc_ids = {}
+    for qid, docs in zip(query_ids, ranked):
+        for did in itertools.chain(docs, qrels[qid]):
+            doc_ids.setdefault(did, len(doc_ids))
+
+    # the documents ranked after the largest cutoff do not change the metrics
+    width = min(max(k_values), max((len(docs) for docs in ranked), default=0))
+    indices = np.full((len(query_ids), width), -1, dtype=np.int64)
+    for i, docs in enumerate(ranked):
+        docs = docs[:width]
+        indices[i, : len(docs)] = [doc_ids[did] for did in docs]
+
+    qrels_matrix = qrels_to_matrix(qrels, query_ids, doc_ids)
+    scores = evaluate_results(
+        indices, qrels_matrix, k_values=k_values, metrics=["ndcg", "map", "recall", "precision"]
+    )
+
     ndcg = {}
     _map = {}
     recall = {}
     precision = {}
 
     for k in k_values:
-        ndcg[f"NDCG@{k}"] = 0.0
-        _map[f"MAP@{k}"] = 0.0
-        recall[f"Recall@{k}"] = 0.0
-        precision[f"P@{k}"] = 0.0
-
-    map_string = "map_cut." + ",".join([str(k) for k in k_values])
-    ndcg_string = "ndcg_cut." + ",".join([str(k) for k in k_values])
-    recall_string = "recall." + ",".join([str(k) for k in k_values])
-    precision_string = "P." + ",".join([str(k) for k in k_values])
-    evaluator = pytrec_eval.RelevanceEvaluator(
-        qrels, {map_string, ndcg_string, recall_string, precision_string}
-    )
-    scores = evaluator.evaluate(results)
-
-    for query_id in scores.keys():
-        for k in k_values:
-            ndcg[f"NDCG@{k}"] += scores[query_id]["ndcg_cut_" + str(k)]
-            _map[f"MAP@{k}"] += scores[query_id]["map_cut_" + str(k)]
-            recall[f"Recall@{k}"] += scores[query_id]["recall_" + str(k)]
-            precision[f"P@{k}"] += scores[query_id]["P_" + str(k)]
-
-    for k in k_values:
-        ndcg[f"NDCG@{k}"] = round(ndcg[f"NDCG@{k}"] / len(scores), 5)
-        _map[f"MAP@{k}"] = round(_map[f"MAP@{k}"] / len(scores), 5)
-        recall[f"Recall@{k}"] = round(recall[f"Recall@{k}"] / len(scores), 5)
-        precision[f"P@{k}"] = round(precision[f"P@{k}"] / len(scores), 5)
+        ndcg[f"NDCG@{k}"] = round(scores[f"NDCG@{k}"], 5)
+        _map[f"MAP@{k}"] = round(scores[f"MAP@{k}"], 5)
+        recall[f"Recall@{k}"] = round(scores[f"Recall@{k}"], 5)
+        precision[f"P@{k}"] = round(scores[f"P@{k}"], 5)
 
     for eval in [ndcg, _map, recall, precision]:
         logging.info("\n")
@@ -1,6 +1,14 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import logging
+import lzma
 import mmap
 import os
+import struct
+import threading
+from typing import List
+import zlib
 
 import numpy as np
 
@@ -24,45 +32,80 @@ def change_extension(path, new_extension):
     return path.rpartition(".")[0] + new_extension
 
 
-def find_newline_positions(path, show_progress=True, leave_progress=True, encoding="utf-8"):
+def find_newline_positions(
+    path, show_progress=True, leave_progress=True, encoding="utf-8", chunk_size=16 * 1024 * 1024
+) -> np.ndarray:
+    """
+    Return the byte offset of the start of each line of the file, as an int64 array. The file
+    is read in binary mode, in chunks of `chunk_size` bytes, and the newlines of each chunk
+    are found with numpy. `encoding` is unused: the offsets are the same for any ASCII-compatible
+    encoding, such as UTF-8.
+    """
     path = str(path)
-    indexes = []
-    with open(path, "r", encoding=encoding) as f:
-        indexes.append(f.tell())
-        pbar = tqdm(
-            total=os.path.getsize(path),
-            desc="Finding newlines for mmindex",
-            unit="B",
-            unit_scale=True,
-            disable=not show_progress,
-            leave=leave_progress,
-        )
-
-        while f.readline():
-            t = f.tell()
-            indexes.append(t)
-        
+    file_size = os.path.getsize(path)
+    starts = [np.zeros(1 if file_size > 0 else 0, dtype=np.int64)]
+    buffer = bytearray(chunk_size)
+
+    pbar = tqdm(
+        total=file_size,
+        desc="Finding newlines for mmindex",
+        unit="B",
+        unit_scale=True,
+        disable=not show_progress,
+        leave=leave_progress,
+    )
+    with open(path, "rb") as f:
+        position = 0
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            chunk = np.frombuffer(buffer, dtype=np.uint8, count=n)
+            starts.append(np.flatnonzero(chunk == ord("\n")).astype(np.int64) + position + 1)
+            position += n
             if pbar is not None:
-                pbar.update(t - indexes[-2])
-        
-        if pbar is not None:
-            pbar.close()
+                pbar.update(n)
 
-    return indexes[:-1]
+    if pbar is not None:
+        pbar.close()
+
+    starts = np.concatenate(starts)
+    # the position after the last newline is not the start of a line
+    if len(starts) > 0 and starts[-1] == file_size:
+        starts = starts[:-1]
+    return starts
 
 
 def save_mmindex(indexes, path, encoding="utf-8"):
+    """
+    Save the line offsets of the jsonl file `path` to a ".mmindex.npy" file (int64), which
+    `load_mmindex` memory-maps.
+    """
     path = str(path)
-    index_file = change_extension(path, ".mmindex.json")
-    with open(index_file, "w", encoding=encoding) as f:
-        f.write(json_functions.dumps(indexes))
+    index_file = change_extension(path, ".mmindex.npy")
+    np.save(index_file, np.asarray(indexes, dtype=np.int64))
 
 
-def load_mmindex(path, encoding="utf-8"):
+def mmindex_exists(path) -> bool:
+    path = str(path)
+    return os.path.exists(change_extension(path, ".mmindex.npy")) or os.path.exists(
+        change_extension(path, ".mmindex.json")
+    )
+
+
+def load_mmindex(path, encoding="utf-8", mmap=True) -> np.ndarray:
+    """
+    Load the line offsets of the jsonl file `path`, from the ".mmindex.npy" file (memory-mapped
+    if `mmap` is True), or from the ".mmindex.json" file written by older versions of bm25s.
+    """
     path = str(path)
+    index_file = change_extension(path, ".mmindex.npy")
+    if os.path.exists(index_file):
+        return np.load(index_file, mmap_mode="r" if mmap else None)
+
     index_file = change_extension(path, ".mmindex.json")
     with open(index_file, "r", encoding=encoding) as f:
-        return json_functions.loads(f.read())
+        return np.asarray(json_functions.loads(f.read()), dtype=np.int64)
 
 
 # now we can jump to any line in the file thanks to the index and mmap
@@ -87,7 +130,7 @@ def get_line(
     else:
         CLOSE_MMAP = False
 
-    mmap_obj.seek(mmindex[index])
+    mmap_obj.seek(int(mmindex[index]))
     result = mmap_obj.readline().decode(encoding)
 
     if CLOSE_MMAP:
@@ -99,6 +142,17 @@ def get_line(
     return result
 
 
+def documents_array(documents: list, shape) -> np.ndarray:
+    """
+    Put `documents` in an object array of the given shape. Unlike `np.array(documents)`, this
+    keeps each document as a single element, whatever its type (dict, str, list...).
+    """
+    out = np.empty(len(documents), dtype=object)
+    for i, doc in enumerate(documents):
+        out[i] = doc
+    return out.reshape(shape)
+
+
 class JsonlCorpus:
     """
     A class to read a jsonl file line by line using mmap, allowing extremely fast
@@ -126,13 +180,14 @@ class JsonlCorpus:
     Which only loads the line you need into memory, and is much faster.
     """
 
-    def __init__(self, path, show_progress=True, leave_progress=True, save_index=True, verbosity=1, encoding='utf-8'):
+    def __init__(self, path, show_progress=True, leave_progress=True, save_index=True, verbosity=1, encoding='utf-8', n_threads=0):
         self.path = path
         self.verbosity = verbosity
         self.encoding = encoding
+        self.n_threads = n_threads
 
         # if the index file does not exist, create it
-        if os.path.exists(change_extension(path, ".mmindex.json")):
+        if mmindex_exists(path):
             self.mmindex = load_mmindex(path, encoding=self.encoding)
         else:
             logging.info("Creating index file for jsonl corpus")
@@ -150,8 +205,62 @@ class JsonlCorpus:
     def __len__(self):
         return len(self.mmindex)
 
+    def get_documents(self, indices, n_threads=None) -> list:
+        """
+        Return the documents at `indices` (any iterable of ints) as a list. Each document is read
+        once even if its index is repeated, and the lines are read in the order of the file: they
+        are sliced from the mmap without copies and parsed with one `json_functions.loads_buffer`
+        call each.
+
+        Parameters
+        ----------
+        indices : Iterable[int]
+            The indices of the documents.
+
+        n_threads : int
+            If greater than 0, the lines are read with `os.pread` in a pool of `n_threads`
+            threads, which release the GIL while the pages are read from disk. This hides the
+            latency of page faults on a cold file. Defaults to `self.n_threads`.
+        """
+        n_threads = self.n_threads if n_threads is None else n_threads
+        indices = np.asarray(indices, dtype=np.int64).ravel()
+        if len(indices) == 0:
+            return []
+
+        num_docs = len(self.mmindex)
+        indices = np.where(indices < 0, indices + num_docs, indices)
+        if indices.min() < 0 or indices.max() >= num_docs:
+            raise IndexError("Document index out of range")
+
+        # the offsets increase with the index, so the unique indices are sorted by offset
+        unique, inverse = np.unique(indices, return_inverse=True)
+        starts = np.asarray(self.mmindex[unique], dtype=np.int64)
+        next_indices = np.minimum(unique + 1, num_docs - 1)
+        ends = np.where(unique + 1 < num_docs, np.asarray(self.mmindex[next_indices], dtype=np.int64), len(self.mmap_obj))
+
+        if n_threads and n_threads > 0:
+            fd = self.file_obj.fileno()
+
+            def read_lines(bounds):
+                return [os.pread(fd, end - start, start) for start, end in bounds]
+
+            # each thread reads a contiguous run of lines, the parsing is done by this thread
+            bounds = list(zip(starts.tolist(), ends.tolist()))
+            run = max(1, -(-len(bounds) // (4 * n_threads)))
+            with ThreadPoolExecutor(max_workers=n_threads) as executor:
+                runs = executor.map(read_lines, [bounds[i : i + run] for i in range(0, len(bounds), run)])
+                docs = [json_functions.loads_buffer(line) for lines in runs for line in lines]
+        else:
+            loads_buffer = json_functions.loads_buffer
+            with memoryview(self.mmap_obj) as view:
+                docs = [loads_buffer(view[start:end]) for start, end in zip(starts.tolist(), ends.tolist())]
+
+        return [docs[j] for j in inverse.ravel().tolist()]
+
     def __getitem__(self, index):
         # handle multiple indices
+        if isinstance(index, np.integer):
+            index = int(index)
         if isinstance(index, int):
             return json_functions.loads(
                 get_line(
@@ -165,17 +274,14 @@ class JsonlCorpus:
             )
 
         if isinstance(index, slice):
-            return [self.__getitem__(i) for i in range(*index.indices(len(self)))]
+            return self.get_documents(range(*index.indices(len(self))))
         if isinstance(index, (list, tuple)):
-            return [self.__getitem__(i) for i in index]
+            return self.get_documents(index)
         if isinstance(index, np.ndarray):
             # if it's an ndarray, this means each element is an index, and the array can
-            # be of any shape. thus, we should flatten it first, get the results as if it
-            # was a list, and then reshape it back to the original shape
-            index_flat = index.flatten().tolist()
-            results = [self.__getitem__(i) for i in index_flat]
-            reshaped = np.array(results).reshape(index.shape)
-            return reshaped
+            # be of any shape. thus, we fetch the documents of the flattened array in a
+            # single batch, and then reshape the results back to the original shape
+            return documents_array(self.get_documents(index), index.shape)
         
         raise TypeError("Invalid index type")
 
@@ -215,3 +321,356 @@ class JsonlCorpus:
     
     def __del__(self):
         self.close()
+
+
+# Block-compressed corpus: the documents are stored as JSON lines, grouped in blocks of
+# `docs_per_block` documents that are compressed independently, so that any document can be
+# read by decompressing a single block.
+#
+# Layout of the file (little-endian):
+#   header: magic (8 bytes), format version (uint32), codec id (uint32), docs per block (uint64),
+#           number of documents (uint64), number of blocks (uint64), offset of the block index (uint64)
+#   compressed blocks
+#   block index: int64 array of `num_blocks + 1` offsets of the blocks in the file
+BLOCKS_MAGIC = b"BM25SBLK"
+BLOCKS_FORMAT_VERSION = 1
+_BLOCKS_HEADER = struct.Struct("<8sIIQQQQ")
+BLOCK_CODECS = ("none", "zlib", "lzma", "zstd")
+
+
+def _get_block_codec(codec: str):
+    """
+    Return the (compress, decompress) functions of a codec.
+    """
+    if codec == "none":
+        return bytes, bytes
+    if codec == "zlib":
+        return partial(zlib.compress, level=6), zlib.decompress
+    if codec == "lzma":
+        return lzma.compress, lzma.decompress
+    if codec == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(
+                "The zstd codec requires the zstandard package. Install it with `pip install zstandard`."
+            )
+        return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+
+    raise ValueError(f"Unknown codec {codec}. Choose from {BLOCK_CODECS}.")
+
+
+def save_compressed_corpus(corpus, path, codec="zlib", docs_per_block=64, encoding="utf-8"):
+    """
+    Save an iterable of documents (dictionaries, lists or strings, saved as JSON) to a
+    block-compressed file that can be read with `CompressedCorpus`.
+
+    Parameters
+    ----------
+    corpus : Iterable
+        The documents.
+
+    path : str
+        The path of the file.
+
+    codec : str
+        The compression codec: "zlib" or "lzma" (standard library), "zstd" (requires the
+        zstandard package), or "none".
+
+    docs_per_block : int
+        Number of documents per block. Larger blocks compress better, but more bytes are
+        decompressed to read a single document.
+    """
+    if docs_per_block < 1:
+        raise ValueError("`docs_per_block` must be a positive integer.")
+    compress, _ = _get_block_codec(codec)
+
+    block_offsets = []
+    num_docs = 0
+    with open(path, "wb") as f:
+        f.write(b"\0" * _BLOCKS_HEADER.size)
+        block = []
+
+        def write_block():
+            block_offsets.append(f.tell())
+            f.write(compress(b"".join(block)))
+
+        for doc in corpus:
+            line = json_functions.dumps(doc, ensure_ascii=False).encode(encoding) + b"\n"
+            block.append(line)
+            num_docs += 1
+            if len(block) == docs_per_block:
+                write_block()
+                block = []
+        if block:
+            write_block()
+
+        index_offset = f.tell()
+        block_offsets.append(index_offset)
+        f.write(np.asarray(block_offsets, dtype="<i8").tobytes())
+
+        f.seek(0)
+        f.write(
+            _BLOCKS_HEADER.pack(
+                BLOCKS_MAGIC,
+                BLOCKS_FORMAT_VERSION,
+                BLOCK_CODECS.index(codec),
+                docs_per_block,
+                num_docs,
+                len(block_offsets) - 1,
+                index_offset,
+            )
+        )
+
+
+class CompressedCorpus:
+    """
+    Read-only corpus stored in a block-compressed file written by `save_compressed_corpus`.
+    The file is memory-mapped, and the decompressed blocks are kept in a LRU cache of
+    `cache_size` blocks. Indexing works like `JsonlCorpus`: an int returns a document, a slice
+    or list returns a list, and an ndarray of any shape returns an array of the same shape;
+    with a list or an ndarray, each block is decompressed at most once.
+
+    Example
+    --------
+
+    ```python
+    save_compressed_corpus(corpus, "corpus.blocks", codec="zlib")
+    corpus = CompressedCorpus("corpus.blocks")
+    print(corpus[1000])
+    ```
+    """
+
+    def __init__(self, path, cache_size=32, encoding="utf-8"):
+        self.path = path
+        self.cache_size = cache_size
+        self.encoding = encoding
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.file_obj = None
+        self.mmap_obj = None
+        self.load()
+
+    def load(self):
+        """
+        Open the file and read its header and block index.
+        """
+        self.close()
+        self.file_obj = open(self.path, "rb")
+        self.mmap_obj = mmap.mmap(self.file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = _BLOCKS_HEADER.unpack(self.mmap_obj[: _BLOCKS_HEADER.size])
+        magic, version, codec_id, docs_per_block, num_docs, num_blocks, index_offset = header
+        if magic != BLOCKS_MAGIC:
+            raise ValueError(f"{self.path} is not a block-compressed corpus.")
+        if version > BLOCKS_FORMAT_VERSION:
+            raise ValueError(f"Unsupported block-compressed corpus version {version}.")
+
+        self.codec = BLOCK_CODECS[codec_id]
+        _, self._decompress = _get_block_codec(self.codec)
+        self.docs_per_block = docs_per_block
+        self.num_docs = num_docs
+        self.block_offsets = np.frombuffer(
+            self.mmap_obj, dtype="<i8", count=num_blocks + 1, offset=index_offset
+        ).copy()
+        self._cache.clear()
+
+    def close(self):
+        """
+        Close the file and mmap objects, and clear the cache.
+        """
+        if getattr(self, "_cache", None) is not None:
+            self._cache.clear()
+        self.block_offsets = None
+        if getattr(self, "mmap_obj", None) is not None:
+            self.mmap_obj.close()
+            self.mmap_obj = None
+        if getattr(self, "file_obj", None) is not None:
+            self.file_obj.close()
+            self.file_obj = None
+
+    def __del__(self):
+        self.close()
+
+    def __len__(self):
+        return self.num_docs
+
+    def get_block(self, block_id: int) -> List[bytes]:
+        """
+        Return the JSON lines of a block, decompressing it if it is not in the cache.
+        """
+        with self._lock:
+            lines = self._cache.get(block_id)
+            if lines is not None:
+                self._cache.move_to_end(block_id)
+                return lines
+
+        start, end = int(self.block_offsets[block_id]), int(self.block_offsets[block_id + 1])
+        lines = self._decompress(self.mmap_obj[start:end]).split(b"\n")[:-1]
+
+        with self._lock:
+            self._cache[block_id] = lines
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return lines
+
+    def _check_index(self, i: int) -> int:
+        if i < 0:
+            i += self.num_docs
+        if not 0 <= i < self.num_docs:
+            raise IndexError("Document index out of range")
+        return i
+
+    def get_documents(self, indices) -> list:
+        """
+        Return the documents at `indices` (a flat list of ints), decompressing each block once.
+        """
+        indices = [self._check_index(int(i)) for i in indices]
+        results = [None] * len(indices)
+        by_block = {}
+        for pos, i in enumerate(indices):
+            by_block.setdefault(i // self.docs_per_block, []).append(pos)
+
+        for block_id in sorted(by_block):
+            lines = self.get_block(block_id)
+            base = block_id * self.docs_per_block
+            for pos in by_block[block_id]:
+                results[pos] = json_functions.loads(lines[indices[pos] - base])
+        return results
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self.get_documents([index])[0]
+        if isinstance(index, slice):
+            return self.get_documents(range(*index.indices(len(self))))
+        if isinstance(index, (list, tuple)):
+            return self.get_documents(index)
+        if isinstance(index, np.ndarray):
+            return documents_array(self.get_documents(index.flatten().tolist()), index.shape)
+
+        raise TypeError("Invalid index type")
+
+    def __iter__(self):
+        for block_id in range(len(self.block_offsets) - 1):
+            start, end = int(self.block_offsets[block_id]), int(self.block_offsets[block_id + 1])
+            for line in self._decompress(self.mmap_obj[start:end]).split(b"\n")[:-1]:
+                yield json_functions.loads(line)
+
+
+def fetch_documents(corpus, indices, fields=None) -> list:
+    """
+    Return the documents of `corpus` at `indices` (a flat list of ints) as a list, in a single
+    batch for corpora with a `get_documents` method (`JsonlCorpus`, `CompressedCorpus`). If
+    `fields` is given, each document (a dictionary) is replaced by a dictionary with only these
+    fields.
+    """
+    if hasattr(corpus, "get_documents"):
+        docs = corpus.get_documents(indices)
+    else:
+        docs = [corpus[i] for i in indices]
+
+    if fields is not None:
+        docs = [{field: doc[field] for field in fields if field in doc} for doc in docs]
+    return docs
+
+
+class LazyDocuments:
+    """
+    Documents of retrieval results, fetched from the corpus only when they are accessed. It
+    wraps the retrieved `indices` (a 2D array, or an object array of 1D arrays when the results
+    were filtered) and behaves like the array of documents that `BM25.retrieve` returns:
+
+    - `docs[q]` is a lazy view of the documents of the q-th query
+    - `docs[q, j]` or `docs[q][j]` fetches the j-th document of the q-th query
+    - `docs[q][:3]` or `docs[q, :3]` fetches the first 3 documents as an object array
+    - iterating over the documents of a query fetches them in a single batch
+    - `np.asarray(docs)` or `docs.materialize()` fetches all the documents
+
+    Parameters
+    ----------
+    corpus : list, np.ndarray, JsonlCorpus or CompressedCorpus
+        The corpus the documents are fetched from.
+
+    indices : np.ndarray
+        The indices of the retrieved documents.
+
+    fields : List[str]
+        If given, only these fields of each document (a dictionary) are returned.
+    """
+
+    def __init__(self, corpus, indices, fields=None):
+        if indices.dtype == object and indices.ndim > 1:
+            # filtered results where all the queries have the same number of results
+            indices = indices.astype(np.int64)
+        self.corpus = corpus
+        self.indices = indices
+        self.fields = fields
+
+    @property
+    def shape(self):
+        return self.indices.shape
+
+    @property
+    def ndim(self):
+        return self.indices.ndim
+
+    def __len__(self):
+        return len(self.indices)
+
+    def _is_flat(self):
+        # a 1D array of document indices
+        return self.indices.ndim == 1 and self.indices.dtype != object
+
+    def _fetch(self, indices) -> np.ndarray:
+        indices = np.asarray(indices, dtype=np.int64)
+        flat = indices.ravel()
+        # missing results of dense results (index -1) are None
+        found = np.flatnonzero(flat >= 0)
+        docs = fetch_documents(self.corpus, flat[found].tolist(), fields=self.fields)
+        out = np.full(len(flat), None, dtype=object)
+        for i, doc in zip(found.tolist(), docs):
+            out[i] = doc
+        return out.reshape(indices.shape)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple) and self.indices.dtype == object:
+            row, rest = key[0], key[1:]
+            view = self[row]
+            return view[rest[0] if len(rest) == 1 else rest] if rest else view
+
+        sub = self.indices[key]
+        if self._is_flat() or isinstance(key, tuple) or not isinstance(sub, np.ndarray):
+            if isinstance(sub, np.ndarray):
+                return self._fetch(sub)
+            return self._fetch([sub])[0]
+        # selecting queries: the rows of the results stay lazy
+        return LazyDocuments(self.corpus, sub, fields=self.fields)
+
+    def __iter__(self):
+        if self._is_flat():
+            yield from self._fetch(self.indices)
+        else:
+            for row in self.indices:
+                yield LazyDocuments(self.corpus, row, fields=self.fields)
+
+    def materialize(self) -> np.ndarray:
+        """
+        Fetch all the documents, as an array with the same layout as `BM25.retrieve`.
+        """
+        if self.indices.dtype != object:
+            return self._fetch(self.indices)
+
+        out = np.empty(len(self.indices), dtype=object)
+        for i, row in enumerate(self.indices):
+            out[i] = self._fetch(row)
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        docs = self.materialize()
+        return docs if dtype is None else docs.astype(dtype)
+
+    def tolist(self) -> list:
+        return self.materialize().tolist()
+
+    def __repr__(self):
+        return f"LazyDocuments(shape={self.shape}, fields={self.fields})"
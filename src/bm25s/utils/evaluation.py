@@ -0,0 +1,233 @@
+"""
+Vectorized evaluation of retrieval results, without dependencies beyond numpy and scipy. The
+metrics follow the definitions of trec_eval (and thus pytrec_eval, used by BEIR):
+
+- NDCG@k: the gain of a document is its relevance grade, discounted by log2(rank + 1), and the
+  ideal ranking is made of the k most relevant judged documents.
+- MAP@k: the sum of the precisions at the ranks of the relevant documents in the top k, divided
+  by the number of relevant documents of the query ("map_cut").
+- Recall@k: the number of relevant documents in the top k divided by the number of relevant
+  documents of the query.
+- P@k: the number of relevant documents in the top k divided by k, even if fewer than k
+  documents were retrieved.
+- MRR@k: the inverse of the rank of the first relevant document in the top k, 0 if there is none.
+
+A document is relevant if its grade is at least `relevance_level` (1 by default). The results
+are arrays of shape (n_queries, k) of document indices, ranked by score, where -1 marks missing
+results (see `BM25.retrieve(..., dense=True)`), and the relevance judgments ("qrels") are a
+sparse matrix of shape (n_queries, num_docs) of relevance grades.
+"""
+
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+import scipy.sparse as sp
+
+METRICS = ("ndcg", "map", "recall", "precision", "mrr")
+METRIC_NAMES = {"ndcg": "NDCG", "map": "MAP", "recall": "Recall", "precision": "P", "mrr": "MRR"}
+
+
+def qrels_to_matrix(qrels, query_ids: List, doc_ids: Union[List, Dict]) -> sp.csr_matrix:
+    """
+    Build the sparse matrix of relevance grades used by `evaluate_results`.
+
+    Parameters
+    ----------
+    qrels : Dict[str, Dict[str, int]] or Iterable[Tuple[str, str, int]]
+        The relevance judgments, as a dictionary {query_id: {doc_id: grade}} (BEIR format) or
+        as (query_id, doc_id, grade) triples.
+
+    query_ids : List
+        The ID of the query of each row of the results.
+
+    doc_ids : List or Dict
+        The ID of each document of the index (its position in the list is its index), or a
+        dictionary from document ID to document index. The judged documents that are not in
+        the index are ignored.
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        The matrix of shape (len(query_ids), num_docs). Queries without judgments have an empty
+        row; judgments with a grade of 0 are stored explicitly.
+    """
+    if isinstance(qrels, dict):
+        qrels = ((qid, did, grade) for qid, rels in qrels.items() for did, grade in rels.items())
+    if not isinstance(doc_ids, dict):
+        doc_ids = {did: i for i, did in enumerate(doc_ids)}
+    query_rows = {qid: i for i, qid in enumerate(query_ids)}
+
+    rows, cols, grades = [], [], []
+    for qid, did, grade in qrels:
+        row = query_rows.get(qid)
+        col = doc_ids.get(did)
+        if row is None or col is None:
+            continue
+        rows.append(row)
+        cols.append(col)
+        grades.append(grade)
+
+    matrix = sp.coo_matrix(
+        (np.asarray(grades, dtype=np.float64), (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+        shape=(len(query_ids), len(doc_ids)),
+    ).tocsr()
+    matrix.sum_duplicates()
+    return matrix
+
+
+def _dense_indices(indices) -> np.ndarray:
+    # object arrays of ragged results (filtered retrieval) are padded with -1
+    indices = np.asarray(indices)
+    if indices.dtype != object:
+        return indices.astype(np.int64, copy=False).reshape(len(indices), -1)
+
+    width = max((len(row) for row in indices), default=0)
+    dense = np.full((len(indices), width), -1, dtype=np.int64)
+    for i, row in enumerate(indices):
+        dense[i, : len(row)] = row
+    return dense
+
+
+def _ideal_gains(qrels: sp.csr_matrix, width: int) -> np.ndarray:
+    # the `width` largest (positive) grades of each query, in decreasing order
+    n_queries = qrels.shape[0]
+    rows = np.repeat(np.arange(n_queries), np.diff(qrels.indptr))
+    gains = np.maximum(qrels.data, 0)
+    order = np.lexsort((-gains, rows))
+    rank = np.arange(len(order)) - qrels.indptr[rows[order]]
+    keep = rank < width
+
+    ideal = np.zeros((n_queries, width), dtype=np.float64)
+    ideal[rows[order][keep], rank[keep]] = gains[order][keep]
+    return ideal
+
+
+def evaluate_results(
+    indices,
+    qrels: sp.spmatrix,
+    k_values: Iterable[int] = (1, 10, 100),
+    metrics: Iterable[str] = METRICS,
+    relevance_level: int = 1,
+    per_query: bool = False,
+) -> Dict[str, Union[float, np.ndarray]]:
+    """
+    Evaluate retrieval results against relevance judgments, for all queries at once.
+
+    Parameters
+    ----------
+    indices : np.ndarray
+        The indices of the retrieved documents, of shape (n_queries, k), in decreasing order of
+        score, e.g. `Results.documents` when no corpus is given to `BM25.retrieve`. Missing
+        results are marked with -1; ragged results (object arrays of 1D arrays) are accepted.
+
+    qrels : scipy.sparse.spmatrix
+        The relevance grades, of shape (n_queries, num_docs), see `qrels_to_matrix`. Only the
+        queries with at least one judgment (an explicitly stored entry, even of grade 0) are
+        evaluated, as in trec_eval.
+
+    k_values : Iterable[int]
+        The cutoffs at which the metrics are computed.
+
+    metrics : Iterable[str]
+        The metrics to compute, among "ndcg", "map", "recall", "precision" and "mrr".
+
+    relevance_level : int
+        The minimum grade of a relevant document.
+
+    per_query : bool
+        If True, the value of each metric for each evaluated query is returned (an array with
+        one value per evaluated query, in the order of the queries) instead of the mean.
+
+    Returns
+    -------
+    Dict[str, float or np.ndarray]
+        The metrics, with the keys of `bm25s.utils.beir.evaluate`: "NDCG@10", "MAP@10",
+        "Recall@10", "P@10" and "MRR@10".
+    """
+    metrics = list(metrics)
+    for metric in metrics:
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {METRICS}.")
+    k_values = sorted(set(int(k) for k in k_values))
+    if len(k_values) == 0 or k_values[0] < 1:
+        raise ValueError("`k_values` must contain positive integers.")
+
+    indices = _dense_indices(indices)
+    qrels = sp.csr_matrix(qrels)
+    if qrels.shape[0] != indices.shape[0]:
+        raise ValueError(
+            f"The qrels have {qrels.shape[0]} rows, but there are {indices.shape[0]} queries in the results."
+        )
+
+    evaluated = np.diff(qrels.indptr) > 0
+    indices = indices[evaluated]
+    qrels = qrels[evaluated]
+    n_queries = indices.shape[0]
+    width = k_values[-1]
+
+    # grades of the retrieved documents, truncated or padded (with missing results) to `width`
+    indices = indices[:, :width]
+    found = indices >= 0
+    grades = np.zeros((n_queries, width), dtype=np.float64)
+    if n_queries > 0 and indices.shape[1] > 0:
+        rows = np.broadcast_to(np.arange(n_queries)[:, None], indices.shape)
+        looked_up = np.asarray(qrels[rows[found], indices[found]]).ravel()
+        grades[:, : indices.shape[1]][found] = looked_up
+
+    relevant = grades >= relevance_level
+    rows_of_data = np.repeat(np.arange(n_queries), np.diff(qrels.indptr))
+    num_relevant = np.bincount(rows_of_data, weights=qrels.data >= relevance_level, minlength=n_queries)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inv_num_relevant = np.where(num_relevant > 0, 1.0 / num_relevant, 0.0)
+
+    ranks = np.arange(1, width + 1)
+    relevant_cumsum = np.cumsum(relevant, axis=1)
+    out = {}
+
+    if "ndcg" in metrics:
+        discounts = 1.0 / np.log2(ranks + 1)
+        dcg = np.cumsum(np.maximum(grades, 0) * discounts, axis=1)
+        idcg = np.cumsum(_ideal_gains(qrels, width) * discounts, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ndcg = np.where(idcg > 0, dcg / idcg, 0.0)
+    if "map" in metrics:
+        average_precision = np.cumsum(relevant * relevant_cumsum / ranks, axis=1) * inv_num_relevant[:, None]
+    if "mrr" in metrics:
+        first_relevant = np.where(relevant.any(axis=1), relevant.argmax(axis=1) + 1, width + 1)
+
+    for k in k_values:
+        values = {}
+        if "ndcg" in metrics:
+            values["ndcg"] = ndcg[:, k - 1]
+        if "map" in metrics:
+            values["map"] = average_precision[:, k - 1]
+        if "recall" in metrics:
+            values["recall"] = relevant_cumsum[:, k - 1] * inv_num_relevant
+        if "precision" in metrics:
+            values["precision"] = relevant_cumsum[:, k - 1] / k
+        if "mrr" in metrics:
+            values["mrr"] = np.where(first_relevant <= k, 1.0 / first_relevant, 0.0)
+
+        for metric in metrics:
+            name = f"{METRIC_NAMES[metric]}@{k}"
+            if per_query:
+                out[name] = values[metric]
+            else:
+                out[name] = float(values[metric].mean()) if n_queries > 0 else 0.0
+
+    return out
+
+
+def rank_run(run: Dict[str, Dict[str, float]]) -> Tuple[List[str], List[List[str]]]:
+    """
+    Order the documents of each query of a run {query_id: {doc_id: score}} (BEIR format) as
+    trec_eval does: by decreasing score, then by decreasing document ID. Returns the query IDs
+    and, for each query, the ranked document IDs.
+    """
+    query_ids = list(run)
+    ranked = []
+    for qid in query_ids:
+        docs = sorted(run[qid].items(), key=lambda item: item[0], reverse=True)
+        docs.sort(key=lambda item: item[1], reverse=True)
+        ranked.append([did for did, _ in docs])
+    return query_ids, ranked
@@ -17,13 +17,20 @@ def dumps_with_orjson(d: dict, **kwargs) -> str:
     # Ignore other kwargs not supported by orjson
     return orjson.dumps(d).decode("utf-8")
 
+def loads_buffer_with_builtin(buffer):
+    return json.loads(bytes(buffer))
+
+# `loads_buffer` parses a bytes-like object (e.g. a memoryview of a mmap); orjson reads it
+# without copying it
 if ORJSON_AVAILABLE:
     def dumps(d: dict, **kwargs) -> str:
         return dumps_with_orjson(d, **kwargs)
     loads = orjson.loads
+    loads_buffer = orjson.loads
 else:
     def dumps(d: dict, **kwargs) -> str:
         return dumps_with_builtin(d, **kwargs)
     loads = json.loads
+    loads_buffer = loads_buffer_with_builtin
 
 
@@ -0,0 +1,375 @@
+"""
+Memory accounting for BM25S indices. `index_memory_report` breaks down the memory used by a
+`BM25` object, and `saved_index_memory_report` estimates it for an index saved with
+`BM25.save`, from the file headers only (without loading the arrays).
+
+Both reports have the same structure:
+
+```python
+{
+    "components": {"scores.data": {"bytes": ..., "mmap": False, ...}, ...},
+    "total_bytes": ...,     # resident + mapped
+    "resident_bytes": ...,  # memory held by the process
+    "mapped_bytes": ...,    # memory-mapped files, paged in by the OS on demand
+    "recommendations": [{"action": ..., "savings_bytes": ..., "detail": ...}, ...],
+}
+```
+"""
+
+import mmap
+import os
+from pathlib import Path
+import sys
+from typing import Any, Dict, List
+
+import numpy as np
+
+from . import json_functions
+from .corpus import CompressedCorpus, JsonlCorpus, change_extension
+
+# Approximate CPython sizes, used to estimate the memory of the vocabulary of a saved index
+# (measured on 64-bit CPython 3.11)
+_DICT_ENTRY_BYTES = 40
+_SET_ENTRY_BYTES = 42
+_STR_OVERHEAD_BYTES = 49
+_INT_BYTES = 28
+
+_SCORES_ARRAYS = ("data", "indices", "indptr")
+
+
+def deep_getsizeof(obj) -> int:
+    """
+    Size in bytes of `obj` and of all the objects it contains (containers, strings, numbers
+    and numpy arrays). Objects referenced several times are only counted once.
+    """
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+
+        if isinstance(o, np.ndarray):
+            size += array_resident_bytes(o) + sys.getsizeof(np.empty(0))
+            continue
+
+        size += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+
+    return size
+
+
+def array_is_mapped(arr: np.ndarray) -> bool:
+    """
+    Whether the memory of `arr` comes from a memory-mapped file.
+    """
+    while arr is not None:
+        if isinstance(arr, np.memmap):
+            return True
+        base = arr.base
+        if isinstance(base, memoryview):
+            # arrays created with `np.frombuffer` on a mmap
+            base = base.obj
+        if isinstance(base, mmap.mmap):
+            return True
+        arr = base if isinstance(base, np.ndarray) else None
+    return False
+
+
+def array_resident_bytes(arr: np.ndarray) -> int:
+    return 0 if array_is_mapped(arr) else int(arr.nbytes)
+
+
+def _array_component(arr: np.ndarray) -> Dict[str, Any]:
+    return {
+        "bytes": int(arr.nbytes),
+        "mmap": array_is_mapped(arr),
+        "dtype": str(arr.dtype),
+        "shape": list(arr.shape),
+    }
+
+
+def _smallest_int_dtype(max_value: int) -> np.dtype:
+    return np.dtype("int32") if max_value < 2**31 else np.dtype("int64")
+
+
+def compact_vocab_bytes(num_entries: int, key_bytes: int) -> int:
+    """
+    Size of a compact vocabulary: the UTF-8 keys concatenated, with int32 offsets and ids.
+    """
+    return key_bytes + 8 * num_entries
+
+
+def _recommendations(components: Dict[str, Dict[str, Any]], num_docs: int, mmap_loaded: bool) -> List[Dict[str, Any]]:
+    recommendations = []
+
+    resident_scores = sum(
+        c["bytes"] for name, c in components.items() if name.startswith("scores.") and not c["mmap"]
+    )
+    if resident_scores > 0 and not mmap_loaded:
+        recommendations.append(
+            {
+                "action": "mmap",
+                "savings_bytes": resident_scores,
+                "detail": "Load the index with `BM25.load(..., mmap=True)`: the score arrays are then paged in on demand by the OS instead of being held in memory.",
+            }
+        )
+
+    data = components.get("scores.data")
+    if data is not None and np.dtype(data["dtype"]).itemsize > 2:
+        itemsize = np.dtype(data["dtype"]).itemsize
+        recommendations.append(
+            {
+                "action": "quantize_data",
+                "savings_bytes": data["bytes"] - data["bytes"] * 2 // itemsize,
+                "detail": f"Store the scores as float16 (`BM25(dtype='float16')`) instead of {data['dtype']}, at the cost of precision of the scores.",
+            }
+        )
+
+    num_postings = components["scores.data"]["shape"][0] if data is not None else 0
+    for name, max_value in [("scores.indices", num_docs), ("scores.indptr", num_postings)]:
+        c = components.get(name)
+        if c is None:
+            continue
+        smallest = _smallest_int_dtype(max_value)
+        if np.dtype(c["dtype"]).itemsize > smallest.itemsize:
+            recommendations.append(
+                {
+                    "action": f"downcast_{name.split('.')[1]}",
+                    "savings_bytes": c["bytes"] - c["bytes"] * smallest.itemsize // np.dtype(c["dtype"]).itemsize,
+                    "detail": f"The values of `{name}` fit in {smallest} (currently {c['dtype']}) and can be cast with `astype`.",
+                }
+            )
+
+    vocab = components.get("vocab_dict")
+    if vocab is not None and vocab["bytes"] > 0:
+        compact = compact_vocab_bytes(vocab["entries"], vocab.get("key_bytes", 0))
+        savings = vocab["bytes"] - compact
+        ids_set = components.get("unique_token_ids_set")
+        if ids_set is not None:
+            # the set of ids can be replaced by a range check when the ids are contiguous
+            savings += ids_set["bytes"]
+        if savings > 0:
+            recommendations.append(
+                {
+                    "action": "compact_vocab",
+                    "savings_bytes": int(savings),
+                    "detail": "Store the vocabulary as concatenated UTF-8 keys with integer offsets and ids (or a trie) instead of a Python dict, and drop `unique_token_ids_set`.",
+                }
+            )
+
+    corpus = components.get("corpus")
+    # a corpus loaded in memory from `corpus.blocks` has no `corpus.jsonl` to read from
+    if (
+        corpus is not None
+        and corpus.get("type") in ("list", "ndarray")
+        and not corpus["mmap"]
+        and corpus["bytes"] > 0
+        and corpus.get("source") != "corpus.blocks"
+    ):
+        recommendations.append(
+            {
+                "action": "mmap_corpus",
+                "savings_bytes": corpus["bytes"],
+                "detail": "Save the corpus with the index and load it with `BM25.load(..., load_corpus=True, mmap=True)` to read the documents from `corpus.jsonl` on demand.",
+            }
+        )
+
+    recommendations.sort(key=lambda r: r["savings_bytes"], reverse=True)
+    return recommendations
+
+
+def _summarize(components: Dict[str, Dict[str, Any]], num_docs: int, mmap_loaded: bool, **extra) -> Dict[str, Any]:
+    resident = sum(c["bytes"] for c in components.values() if not c.get("mmap", False))
+    mapped = sum(c["bytes"] for c in components.values() if c.get("mmap", False))
+    report = {
+        "components": components,
+        "total_bytes": resident + mapped,
+        "resident_bytes": resident,
+        "mapped_bytes": mapped,
+        "num_docs": int(num_docs),
+    }
+    report.update(extra)
+    report["recommendations"] = _recommendations(components, num_docs, mmap_loaded)
+    return report
+
+
+def _corpus_component(corpus) -> Dict[str, Any]:
+    if isinstance(corpus, JsonlCorpus):
+        return {
+            "type": "JsonlCorpus",
+            "bytes": os.path.getsize(corpus.path),
+            "mmap": True,
+            "index_bytes": int(np.asarray(corpus.mmindex).nbytes),
+            "index_mmap": isinstance(corpus.mmindex, np.ndarray) and array_is_mapped(corpus.mmindex),
+        }
+    from ..container import ContainerCorpus
+
+    if isinstance(corpus, ContainerCorpus):
+        # documents read from the index container, see `bm25s.container`
+        return {
+            "type": "ContainerCorpus",
+            "bytes": int(corpus.offsets[-1]),
+            "mmap": isinstance(corpus.buffer, mmap.mmap),
+        }
+    if isinstance(corpus, CompressedCorpus):
+        return {"type": "CompressedCorpus", "bytes": os.path.getsize(corpus.path), "mmap": True}
+    if isinstance(corpus, np.ndarray):
+        return {"type": "ndarray", "bytes": deep_getsizeof(corpus), "mmap": array_is_mapped(corpus)}
+    return {"type": type(corpus).__name__, "bytes": deep_getsizeof(corpus), "mmap": False}
+
+
+def index_memory_report(retriever) -> Dict[str, Any]:
+    """
+    Break down the memory used by a `BM25` object, see `BM25.memory_report`.
+    """
+    if not hasattr(retriever, "scores"):
+        raise ValueError("The retriever has no index. Please run the `index` or `load` method first.")
+
+    components = {}
+    for name in _SCORES_ARRAYS:
+        components[f"scores.{name}"] = _array_component(retriever.scores[name])
+
+    if retriever.nonoccurrence_array is not None:
+        components["nonoccurrence_array"] = _array_component(retriever.nonoccurrence_array)
+
+    vocab_dict = getattr(retriever, "vocab_dict", None)
+    if vocab_dict is not None:
+        components["vocab_dict"] = {
+            "bytes": deep_getsizeof(vocab_dict),
+            "mmap": False,
+            "entries": len(vocab_dict),
+            "key_bytes": sum(len(str(key).encode("utf-8")) for key in vocab_dict),
+        }
+
+    unique_token_ids_set = getattr(retriever, "unique_token_ids_set", None)
+    if unique_token_ids_set is not None:
+        components["unique_token_ids_set"] = {
+            "bytes": deep_getsizeof(unique_token_ids_set),
+            "mmap": False,
+            "entries": len(unique_token_ids_set),
+        }
+
+    if retriever.metadata is not None:
+        components["metadata"] = {"bytes": deep_getsizeof(retriever.metadata), "mmap": False}
+
+    if retriever.metadata_filter is not None:
+        components["metadata_filter.field_indices"] = {
+            "bytes": deep_getsizeof(retriever.metadata_filter.field_indices),
+            "mmap": False,
+        }
+
+    if retriever.corpus is not None:
+        corpus = _corpus_component(retriever.corpus)
+        if "index_bytes" in corpus:
+            components["corpus.mmindex"] = {"bytes": corpus.pop("index_bytes"), "mmap": corpus.pop("index_mmap")}
+        components["corpus"] = corpus
+
+    mmap_loaded = any(components[f"scores.{name}"]["mmap"] for name in _SCORES_ARRAYS)
+    return _summarize(components, retriever.scores["num_docs"], mmap_loaded, estimated=False)
+
+
+def _npy_component(path: Path, mmap: bool) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+
+    return {
+        "bytes": int(np.prod(shape, dtype=np.int64)) * dtype.itemsize,
+        "mmap": mmap,
+        "dtype": str(dtype),
+        "shape": list(shape),
+    }
+
+
+def saved_index_memory_report(
+    save_dir,
+    mmap: bool = False,
+    load_corpus: bool = False,
+    data_name="data.csc.index.npy",
+    indices_name="indices.csc.index.npy",
+    indptr_name="indptr.csc.index.npy",
+    vocab_name="vocab.index.json",
+    params_name="params.index.json",
+    nnoc_name="nonoccurrence_array.index.npy",
+    corpus_name="corpus.jsonl",
+) -> Dict[str, Any]:
+    """
+    Estimate the memory that `BM25.load(save_dir, mmap=mmap, load_corpus=load_corpus)` would
+    use, without loading the index. The sizes of the arrays are read from the headers of the
+    .npy files; the sizes of the Python objects (vocabulary, corpus loaded as a list) are
+    estimated from the size of their files.
+    """
+    save_dir = Path(save_dir)
+    with open(save_dir / params_name, "r") as f:
+        params = json_functions.loads(f.read())
+
+    components = {}
+    for name, file_name in zip(_SCORES_ARRAYS, (data_name, indices_name, indptr_name)):
+        components[f"scores.{name}"] = _npy_component(save_dir / file_name, mmap=mmap)
+
+    # the non-occurrence array is always loaded in memory by `BM25.load`
+    if (save_dir / nnoc_name).exists():
+        components["nonoccurrence_array"] = _npy_component(save_dir / nnoc_name, mmap=False)
+
+    num_docs = params.get("num_docs")
+    if num_docs is None:
+        num_docs = 0
+    n_vocab = components["scores.indptr"]["shape"][0] - 1
+
+    vocab_path = save_dir / vocab_name
+    if vocab_path.exists():
+        # each entry of the JSON file is `"key": id, `; the rest is the UTF-8 key
+        file_bytes = os.path.getsize(vocab_path)
+        n_entries = n_vocab + 1  # the empty token
+        id_chars = n_entries * (len(str(max(n_vocab, 1))) + 4)
+        key_bytes = max(file_bytes - id_chars, 0)
+        components["vocab_dict"] = {
+            "bytes": n_entries * (_DICT_ENTRY_BYTES + _STR_OVERHEAD_BYTES + _INT_BYTES) + key_bytes,
+            "mmap": False,
+            "entries": n_entries,
+            "key_bytes": key_bytes,
+        }
+        components["unique_token_ids_set"] = {
+            "bytes": n_entries * _SET_ENTRY_BYTES,
+            "mmap": False,
+            "entries": n_entries,
+        }
+
+    corpus_path = save_dir / corpus_name
+    if load_corpus and corpus_path.exists():
+        corpus_bytes = os.path.getsize(corpus_path)
+        if mmap:
+            components["corpus"] = {"type": "JsonlCorpus", "bytes": corpus_bytes, "mmap": True}
+            if Path(change_extension(corpus_path, ".mmindex.npy")).exists():
+                components["corpus.mmindex"] = {"bytes": num_docs * 8, "mmap": True}
+            elif Path(change_extension(corpus_path, ".mmindex.json")).exists():
+                # read into an int64 array
+                components["corpus.mmindex"] = {"bytes": num_docs * 8, "mmap": False}
+        else:
+            # parsed JSON objects take a few times the size of their text
+            components["corpus"] = {"type": "list", "bytes": corpus_bytes * 4, "mmap": False}
+
+    # otherwise, `BM25.load` reads the block-compressed corpus, if any
+    blocks_path = save_dir / change_extension(corpus_name, ".blocks")
+    if load_corpus and not corpus_path.exists() and blocks_path.exists():
+        if mmap:
+            components["corpus"] = {"type": "CompressedCorpus", "bytes": os.path.getsize(blocks_path), "mmap": True}
+        else:
+            corpus = CompressedCorpus(str(blocks_path), cache_size=0)
+            text_bytes = sum(
+                len(line) for block_id in range(len(corpus.block_offsets) - 1) for line in corpus.get_block(block_id)
+            )
+            corpus.close()
+            components["corpus"] = {"type": "list", "bytes": text_bytes * 4, "mmap": False, "source": "corpus.blocks"}
+
+    return _summarize(components, num_docs, mmap, estimated=True)
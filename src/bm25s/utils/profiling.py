@@ -0,0 +1,121 @@
+"""
+Per-stage profiling of `BM25.index` and `BM25.retrieve`.
+
+Pass a `Profiler` to `index` or `retrieve` to record the wall time of each stage (token to id
+mapping, metadata filter, scoring, top-k selection, corpus lookup, ...) and counters such as
+the number of postings touched or the number of candidate documents. When no profiler is
+passed, the stages are wrapped in a shared no-op context manager and the counters are not
+computed.
+
+```python
+from bm25s.utils.profiling import Profiler
+
+profiler = Profiler()
+retriever.retrieve(query_tokens, k=10, profiler=profiler)
+print(profiler.to_dict())
+print(profiler.to_prometheus())
+```
+"""
+
+from contextlib import contextmanager, nullcontext
+import threading
+import time
+from typing import Any, Dict
+
+from .benchmark import Timer
+
+_NULL_CONTEXT = nullcontext()
+
+
+def profile_stage(profiler, name: str):
+    """
+    Return a context manager that records the time spent in the stage `name` if `profiler`
+    is not None, and a no-op context manager otherwise.
+    """
+    if profiler is None:
+        return _NULL_CONTEXT
+    return profiler.stage(name)
+
+
+class Profiler:
+    """
+    Accumulate the wall time and the number of calls of named stages, and named counters.
+    It can be shared between calls (the values are summed) and between threads.
+
+    Stage and counter names are dotted, e.g. "retrieve.topk" or "retrieve.postings".
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stage = self.stages.setdefault(name, {"time_s": 0.0, "calls": 0})
+                stage["time_s"] += elapsed
+                stage["calls"] += 1
+
+    def add(self, name: str, value=1):
+        """
+        Add `value` to the counter `name`.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stages": {name: dict(stage) for name, stage in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+    def to_timer(self, prefix: str = "[bm25s]") -> Timer:
+        """
+        Return a `bm25s.utils.benchmark.Timer` holding the total time of each stage, so that
+        it can be shown with `Timer.show_all` or saved with `Timer.to_dict`.
+        """
+        timer = Timer(prefix=prefix)
+        with self._lock:
+            for name, stage in self.stages.items():
+                timer.results[name] = {"start": 0.0, "elapsed": stage["time_s"], "stopped": stage["time_s"]}
+        return timer
+
+    def to_prometheus(self, prefix: str = "bm25s") -> str:
+        """
+        Export the stages and counters in the Prometheus text exposition format.
+        """
+        data = self.to_dict()
+        lines = [
+            f"# HELP {prefix}_stage_seconds_total Time spent in each stage.",
+            f"# TYPE {prefix}_stage_seconds_total counter",
+        ]
+        for name, stage in sorted(data["stages"].items()):
+            lines.append(f'{prefix}_stage_seconds_total{{stage="{name}"}} {stage["time_s"]:.9f}')
+
+        lines += [
+            f"# HELP {prefix}_stage_calls_total Number of times each stage was run.",
+            f"# TYPE {prefix}_stage_calls_total counter",
+        ]
+        for name, stage in sorted(data["stages"].items()):
+            lines.append(f'{prefix}_stage_calls_total{{stage="{name}"}} {stage["calls"]}')
+
+        lines += [
+            f"# HELP {prefix}_events_total Counters recorded by the stages.",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        for name, value in sorted(data["counters"].items()):
+            lines.append(f'{prefix}_events_total{{name="{name}"}} {value}')
+
+        return "\n".join(lines) + "\n"
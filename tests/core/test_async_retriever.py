@@ -0,0 +1,112 @@
+"""
+Tests for `bm25s.async_retriever.AsyncRetriever`, which micro-batches concurrent queries.
+"""
+
+import asyncio
+from functools import partial
+import time
+import unittest
+
+import numpy as np
+
+import bm25s
+from bm25s.async_retriever import AsyncRetriever
+
+
+class TestAsyncRetriever(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = [
+            "a cat is a feline and likes to purr",
+            "a dog is the human's best friend and loves to play",
+            "a bird is a beautiful animal that can fly",
+            "a fish is a creature that lives in water and swims",
+            "the cat and the dog play in the garden",
+            "birds and fish are animals",
+        ]
+        cls.metadata = [{"type": "cat" if "cat" in doc else "other"} for doc in cls.corpus]
+        cls.queries = [
+            "does the fish purr like a cat?",
+            "a dog that can fly",
+            "animals in the water",
+            "birds fly over the water",
+            "the cat plays",
+        ] * 8
+
+        cls.tokenizer = partial(bm25s.tokenize, stopwords="en", show_progress=False)
+        cls.retriever = bm25s.BM25()
+        cls.retriever.index(cls.tokenizer(cls.corpus), metadata=cls.metadata, show_progress=False)
+        cls.expected = cls.retriever.retrieve(cls.tokenizer(cls.queries), k=3, show_progress=False)
+
+    def test_concurrent_searches_are_batched(self):
+        async def run():
+            async with AsyncRetriever(
+                self.retriever, tokenizer=self.tokenizer, k=3, max_batch_size=16, max_wait_ms=50
+            ) as searcher:
+                results = await asyncio.gather(*(searcher.search(q) for q in self.queries))
+            return results, searcher.stats
+
+        results, stats = asyncio.run(run())
+
+        documents = np.stack([r.documents for r in results])
+        scores = np.stack([r.scores for r in results])
+        self.assertTrue(np.array_equal(self.expected.documents, documents))
+        self.assertTrue(np.allclose(self.expected.scores, scores))
+
+        self.assertEqual(stats["num_queries"], len(self.queries))
+        self.assertEqual(stats["num_batches"], 3)
+
+    def test_batch_collected_while_retrieving(self):
+        def slow_tokenizer(queries):
+            time.sleep(0.3)
+            return self.tokenizer(queries)
+
+        async def run():
+            async with AsyncRetriever(self.retriever, tokenizer=slow_tokenizer, k=3, max_wait_ms=10) as searcher:
+                first = asyncio.ensure_future(searcher.search(self.queries[0]))
+                later = []
+                for query in self.queries[1:4]:
+                    await asyncio.sleep(0.05)
+                    later.append(asyncio.ensure_future(searcher.search(query)))
+                await asyncio.gather(first, *later)
+            return searcher.stats
+
+        # the queries arriving while the first batch is retrieved are retrieved together
+        stats = asyncio.run(run())
+        self.assertEqual(stats["num_queries"], 4)
+        self.assertEqual(stats["num_batches"], 2)
+
+    def test_per_query_k_and_filter(self):
+        async def run():
+            searcher = AsyncRetriever(self.retriever, tokenizer=self.tokenizer, corpus=self.corpus)
+            results = await asyncio.gather(
+                searcher.search(self.queries[0], k=1),
+                searcher.search(self.queries[0], k=4),
+                searcher.search(self.queries[0], k=4, filter={"type": "cat"}),
+            )
+            await searcher.close()
+            return results
+
+        top1, top4, filtered = asyncio.run(run())
+        self.assertEqual(len(top1.documents), 1)
+        self.assertEqual(len(top4.documents), 4)
+        self.assertEqual(top1.documents[0], top4.documents[0])
+        self.assertTrue(all("cat" in doc for doc in filtered.documents))
+
+    def test_errors_are_propagated(self):
+        async def run():
+            async with AsyncRetriever(self.retriever, k=3) as searcher:
+                # without a tokenizer, string queries cannot be retrieved
+                return await searcher.search("a cat")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(run())
+
+        with self.assertRaises(ValueError):
+            AsyncRetriever(self.retriever, max_batch_size=0)
+        with self.assertRaises(ValueError):
+            AsyncRetriever(self.retriever, filter={"type": "cat"})
+
+
+if __name__ == "__main__":
+    unittest.main()
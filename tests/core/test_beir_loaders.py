@@ -0,0 +1,104 @@
+"""
+Tests for the loaders of BEIR datasets in `bm25s.utils.beir`.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from bm25s.utils import beir
+from bm25s.utils.corpus import JsonlCorpus, find_newline_positions, load_mmindex
+from bm25s.utils import json_functions
+
+
+class TestBeirLoaders(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.save_dir = tempfile.mkdtemp()
+        dataset_dir = os.path.join(cls.save_dir, "toy")
+        os.makedirs(os.path.join(dataset_dir, "qrels"))
+
+        cls.docs = [
+            {"_id": f"doc{i}", "title": f"title {i}", "text": f"text of document {i} – ünïcode", "metadata": {}}
+            for i in range(200)
+        ]
+        del cls.docs[3]["title"]
+        with open(os.path.join(dataset_dir, "corpus.jsonl"), "w", encoding="utf-8") as f:
+            for doc in cls.docs:
+                f.write(json_functions.dumps(doc, ensure_ascii=False) + "\n")
+        with open(os.path.join(dataset_dir, "queries.jsonl"), "w", encoding="utf-8") as f:
+            for i in range(3):
+                f.write(json_functions.dumps({"_id": f"q{i}", "text": f"query {i}", "metadata": {}}) + "\n")
+        with open(os.path.join(dataset_dir, "qrels", "test.tsv"), "w") as f:
+            f.write("query-id\tcorpus-id\tscore\n")
+            f.write("q0\tdoc1\t1\nq0\tdoc2\t2\r\nq1\tdoc3\t0\n\n")
+
+        cls.corpus_path = os.path.join(dataset_dir, "corpus.jsonl")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.save_dir)
+
+    def test_load_corpus(self):
+        corpus = beir.load_corpus("toy", save_dir=self.save_dir, show_progress=False)
+        self.assertEqual(len(corpus), 200)
+        self.assertIsNone(corpus["doc3"]["title"])
+        self.assertNotIn("metadata", corpus["doc0"])
+
+    def test_load_corpus_columns(self):
+        for n_jobs in [1, 2]:
+            with self.subTest(n_jobs=n_jobs):
+                columns = beir.load_corpus_columns("toy", save_dir=self.save_dir, n_jobs=n_jobs, show_progress=False)
+                self.assertIsInstance(columns["ids"], np.ndarray)
+                self.assertEqual(columns["ids"].tolist(), [doc["_id"] for doc in self.docs])
+                self.assertEqual(columns["title"], [doc.get("title") for doc in self.docs])
+                self.assertEqual(columns["text"], [doc["text"] for doc in self.docs])
+
+        queries = beir.load_queries_columns("toy", save_dir=self.save_dir, show_progress=False)
+        self.assertEqual(queries["ids"].tolist(), ["q0", "q1", "q2"])
+        self.assertEqual(queries["text"], ["query 0", "query 1", "query 2"])
+
+    def test_byte_ranges(self):
+        ranges = beir._byte_ranges(self.corpus_path, 7)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], os.path.getsize(self.corpus_path))
+        line_starts = set(find_newline_positions(self.corpus_path, show_progress=False).tolist())
+        for (_, end), (start, _) in zip(ranges[:-1], ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertIn(start, line_starts)
+
+    def test_save_mmindex(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, "corpus.jsonl")
+        shutil.copy(self.corpus_path, path)
+
+        beir.load_jsonl_columns(path, fields=["text"], n_jobs=1, save_mmindex=True, show_progress=False)
+        np.testing.assert_array_equal(load_mmindex(path), find_newline_positions(path, show_progress=False))
+
+        corpus = JsonlCorpus(path, show_progress=False)
+        self.assertEqual(len(corpus), 200)
+        self.assertEqual(corpus[150]["_id"], "doc150")
+        corpus.close()
+
+    def test_load_qrels(self):
+        query_ids, doc_ids, scores = beir.load_qrels_arrays("toy", save_dir=self.save_dir)
+        self.assertEqual(query_ids.tolist(), ["q0", "q0", "q1"])
+        self.assertEqual(doc_ids.tolist(), ["doc1", "doc2", "doc3"])
+        self.assertEqual(scores.dtype, np.int64)
+        self.assertEqual(scores.tolist(), [1, 2, 0])
+
+        qrels = beir.load_qrels("toy", save_dir=self.save_dir, show_progress=False)
+        self.assertDictEqual(qrels, {"q0": {"doc1": 1, "doc2": 2}, "q1": {"doc3": 0}})
+        triples = beir.load_qrels("toy", save_dir=self.save_dir, return_dict=False)
+        self.assertEqual(triples[1], ("q0", "doc2", 2))
+
+        with self.assertRaises(ValueError):
+            beir.load_qrels_arrays("toy", split="validation", save_dir=self.save_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
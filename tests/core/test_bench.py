@@ -0,0 +1,71 @@
+"""
+Tests for the synthetic corpus generator and the benchmark suite in `bm25s.bench`.
+"""
+
+import json
+import unittest
+from collections import Counter
+
+import bm25s
+from bm25s.bench import generate_corpus, generate_queries, run_benchmark
+
+
+class TestSyntheticCorpus(unittest.TestCase):
+    def test_deterministic(self):
+        a = generate_corpus(200, vocab_size=2000, seed=3)
+        b = generate_corpus(200, vocab_size=2000, seed=3)
+        self.assertListEqual(a.texts, b.texts)
+        self.assertListEqual(a.metadata, b.metadata)
+        self.assertNotEqual(a.texts, generate_corpus(200, vocab_size=2000, seed=4).texts)
+
+    def test_zipfian_frequencies(self):
+        corpus = generate_corpus(2000, vocab_size=5000, mean_length=50)
+        counts = Counter(word for text in corpus.texts for word in text.split())
+
+        # the most frequent words are the first ones of the vocabulary, and the frequency of
+        # the word of rank r decreases roughly as 1 / r
+        top = [word for word, _ in counts.most_common(3)]
+        self.assertListEqual(corpus.vocabulary[:3], top)
+        ratio = counts[corpus.vocabulary[0]] / counts[corpus.vocabulary[99]]
+        self.assertGreater(ratio, 10)
+        self.assertLess(ratio, 60)
+
+        mean_length = sum(len(text.split()) for text in corpus.texts) / len(corpus.texts)
+        self.assertAlmostEqual(mean_length, 50, delta=5)
+
+    def test_japanese(self):
+        corpus = generate_corpus(50, vocab_size=1000, language="ja")
+        self.assertTrue(all(text.endswith("。") for text in corpus.texts))
+        self.assertTrue(any("の" in text.split() for text in corpus.texts))
+
+        unsegmented = generate_corpus(50, vocab_size=1000, language="ja", segmented=False)
+        self.assertNotIn(" ", unsegmented.texts[0])
+
+        queries = generate_queries(20, corpus.vocabulary)
+        self.assertEqual(len(queries), 20)
+        self.assertTrue(all(word in corpus.vocabulary for q in queries for word in q.split()))
+
+        with self.assertRaises(ValueError):
+            generate_corpus(10, language="fr")
+
+
+class TestRunBenchmark(unittest.TestCase):
+    def test_run_benchmark(self):
+        results = run_benchmark(
+            n_docs=500, n_queries=50, vocab_size=2000, backends=["numpy"], n_latency_queries=10
+        )
+        json.dumps(results)
+
+        self.assertEqual(results["config"]["n_docs"], 500)
+        self.assertIn("numpy", results["index"])
+        self.assertSetEqual(set(results["load"]), {"in_memory", "mmap"})
+        self.assertSetEqual(
+            set(results["retrieve"]), {"numpy", "numpy_filter", "numpy_mmap", "numpy_mmap_filter"}
+        )
+        for r in results["retrieve"].values():
+            self.assertGreater(r["qps"], 0)
+            self.assertLessEqual(r["latency_ms"]["p50"], r["latency_ms"]["p99"])
+
+
+if __name__ == "__main__":
+    unittest.main()
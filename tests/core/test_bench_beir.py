@@ -0,0 +1,102 @@
+"""
+Tests for the BEIR evaluation harness `bm25s.bench.beir`.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from bm25s.bench.beir import count_corpus, drop_identical_ids, main, run_beir, tokenize_corpus
+from bm25s.utils import json_functions
+
+
+class TestBeirHarness(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.save_dir = tempfile.mkdtemp()
+        dataset_dir = os.path.join(cls.save_dir, "toy")
+        os.makedirs(os.path.join(dataset_dir, "qrels"))
+
+        animals = ["cat", "dog", "bird", "fish", "horse", "cow", "sheep", "goat"]
+        with open(os.path.join(dataset_dir, "corpus.jsonl"), "w") as f:
+            for i, animal in enumerate(animals):
+                doc = {"_id": f"d{i}", "title": animal, "text": f"the {animal} lives on the farm with animal number {i}"}
+                f.write(json_functions.dumps(doc) + "\n")
+        with open(os.path.join(dataset_dir, "queries.jsonl"), "w") as f:
+            for i, animal in enumerate(animals[:4]):
+                f.write(json_functions.dumps({"_id": f"q{i}", "text": f"where does the {animal} live"}) + "\n")
+            # a query without judgments is not evaluated
+            f.write(json_functions.dumps({"_id": "q9", "text": "horse"}) + "\n")
+        with open(os.path.join(dataset_dir, "qrels", "test.tsv"), "w") as f:
+            f.write("query-id\tcorpus-id\tscore\n")
+            for i in range(4):
+                f.write(f"q{i}\td{i}\t1\n")
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.save_dir)
+
+    def test_run_beir_sweep(self):
+        result = run_beir(
+            "toy",
+            save_dir=self.save_dir,
+            methods=["lucene", "bm25+"],
+            k1_values=[0.9, 1.5],
+            b_values=[0.75],
+            k_values=[1, 5],
+            backend="numpy",
+        )
+        json.dumps(result)
+
+        self.assertEqual(result["n_docs"], 8)
+        self.assertEqual(result["n_queries"], 4)
+        self.assertSetEqual(set(result["stages"]), {"load", "tokenize", "count"})
+        self.assertEqual(len(result["runs"]), 4)
+        for run in result["runs"]:
+            self.assertSetEqual(set(run["stages"]), {"index", "retrieve", "evaluate"})
+            self.assertGreater(run["stages"]["retrieve"]["qps"], 0)
+            self.assertAlmostEqual(run["metrics"]["P@1"], 1.0)
+            self.assertAlmostEqual(run["metrics"]["Recall@5"], 1.0)
+
+    def test_missing_dataset(self):
+        with self.assertRaises(FileNotFoundError):
+            run_beir("unknown", save_dir=self.save_dir)
+
+    def test_main(self):
+        output_path = os.path.join(self.save_dir, "results.json")
+        main(["--datasets", "toy", "--save-dir", self.save_dir, "--backend", "numpy", "--k1", "1.2", "--b", "0.5", "0.8", "--output", output_path])
+        with open(output_path) as f:
+            output = json.load(f)
+        self.assertEqual([run["b"] for run in output["datasets"][0]["runs"]], [0.5, 0.8])
+        self.assertIn("environment", output)
+
+    def test_tokenize_and_count(self):
+        texts = ["a cat and a dog", "the dog barks", "", "cat cat cat"] * 3
+        sequential = tokenize_corpus(texts, stopwords=None)
+        parallel = tokenize_corpus(texts, stopwords=None, n_jobs=2, chunksize=5)
+
+        inverse = [{i: t for t, i in tokens.vocab.items()} for tokens in (sequential, parallel)]
+        self.assertEqual(
+            [[inverse[0][i] for i in doc] for doc in sequential.ids],
+            [[inverse[1][i] for i in doc] for doc in parallel.ids],
+        )
+
+        doc_indices, voc_indices, tf_array, doc_lengths = count_corpus(parallel.ids, n_jobs=2, chunksize=5)
+        self.assertEqual(doc_lengths.tolist(), [len(doc) for doc in parallel.ids])
+        cat = parallel.vocab["cat"]
+        self.assertEqual(tf_array[(doc_indices == 11) & (voc_indices == cat)].tolist(), [3])
+
+    def test_drop_identical_ids(self):
+        indices = np.array([[4, 2, 7], [1, 3, 5]])
+        scores = np.array([[3.0, 2.0, 1.0], [3.0, 2.0, 1.0]])
+        dropped, dropped_scores = drop_identical_ids(indices, scores, np.array([2, 9]), k=2)
+        self.assertEqual(dropped.tolist(), [[4, 7], [1, 3]])
+        self.assertEqual(dropped_scores.tolist(), [[3.0, 1.0], [3.0, 2.0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Tests for the block-compressed corpus (`bm25s.utils.corpus.CompressedCorpus`).
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import bm25s
+from bm25s.utils.corpus import CompressedCorpus, save_compressed_corpus
+
+
+class TestCompressedCorpus(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.docs = [{"id": i, "text": f"document number {i} " * (i % 5 + 1)} for i in range(103)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_indexing(self):
+        for codec in ["none", "zlib", "lzma"]:
+            path = os.path.join(self.tmpdir, f"corpus_{codec}.blocks")
+            save_compressed_corpus(self.docs, path, codec=codec, docs_per_block=10)
+            corpus = CompressedCorpus(path, cache_size=2)
+
+            self.assertEqual(corpus.codec, codec)
+            self.assertEqual(len(corpus), len(self.docs))
+            self.assertEqual(corpus[0], self.docs[0])
+            self.assertEqual(corpus[-1], self.docs[-1])
+            self.assertEqual(corpus[np.int64(57)], self.docs[57])
+            self.assertListEqual(corpus[5:25:4], self.docs[5:25:4])
+            self.assertListEqual(corpus[[102, 3, 3]], [self.docs[102], self.docs[3], self.docs[3]])
+            self.assertListEqual(list(corpus), self.docs)
+
+            indices = np.array([[1, 99, 15], [14, 2, 100]])
+            results = corpus[indices]
+            self.assertTupleEqual(results.shape, (2, 3))
+            self.assertEqual(results[1, 2], self.docs[100])
+
+            with self.assertRaises(IndexError):
+                corpus[103]
+            corpus.close()
+
+        self.assertLess(
+            os.path.getsize(os.path.join(self.tmpdir, "corpus_zlib.blocks")),
+            os.path.getsize(os.path.join(self.tmpdir, "corpus_none.blocks")),
+        )
+
+    def test_array_of_list_documents(self):
+        # documents that numpy would broadcast into extra dimensions, or of different types
+        docs = [["a", "b"], ["c", "d"], "text", {"id": 3}]
+        path = os.path.join(self.tmpdir, "corpus.blocks")
+        save_compressed_corpus(docs, path, docs_per_block=2)
+        corpus = CompressedCorpus(path)
+
+        results = corpus[np.array([[0, 1], [2, 3]])]
+        self.assertEqual(results.dtype, object)
+        self.assertTupleEqual(results.shape, (2, 2))
+        self.assertEqual(results[0, 1], ["c", "d"])
+        self.assertEqual(results[1, 1], {"id": 3})
+        self.assertTupleEqual(corpus[np.array([0, 1])].shape, (2,))
+        corpus.close()
+
+    def test_blocks_decompressed_once(self):
+        path = os.path.join(self.tmpdir, "corpus.blocks")
+        save_compressed_corpus(self.docs, path, docs_per_block=10)
+        corpus = CompressedCorpus(path, cache_size=1)
+
+        with mock.patch.object(corpus, "_decompress", wraps=corpus._decompress) as decompress:
+            corpus[np.array([[0, 50, 1, 51, 2, 52]])]
+            self.assertEqual(decompress.call_count, 2)
+
+            # the last block read is cached
+            corpus[55]
+            self.assertEqual(decompress.call_count, 2)
+            corpus[3]
+            self.assertEqual(decompress.call_count, 3)
+        corpus.close()
+
+    def test_save_load(self):
+        texts = [doc["text"] for doc in self.docs]
+        retriever = bm25s.BM25(corpus=texts)
+        retriever.index(bm25s.tokenize(texts, stopwords="en", show_progress=False), show_progress=False)
+        retriever.save(self.tmpdir, corpus_compression="zlib", docs_per_block=16)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, "corpus.jsonl")))
+
+        query = bm25s.tokenize(["number 42"], stopwords="en", return_ids=False, show_progress=False)
+        for mmap in [True, False]:
+            loaded = bm25s.BM25.load(self.tmpdir, load_corpus=True, mmap=mmap)
+            self.assertIsInstance(loaded.corpus, CompressedCorpus if mmap else list)
+            results = loaded.retrieve(query, k=3, show_progress=False)
+            self.assertEqual(results.documents[0][0], {"id": 42, "text": texts[42]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+Tests for the single-file index container (`BM25.save_container` and `BM25.load_container`).
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import bm25s
+from bm25s.container import ContainerCorpus, FORMAT_VERSION, read_container_table
+from bm25s.utils.memory import array_is_mapped
+
+
+class TestContainer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = [
+            "a cat is a feline and likes to purr",
+            "a dog is the human's best friend and loves to play",
+            "a bird is a beautiful animal that can fly",
+            "a fish is a creature that lives in water and swims",
+        ]
+        cls.metadata = [{"pet": True}, {"pet": True}, {"pet": False}, {"pet": False}]
+        cls.corpus_tokens = bm25s.tokenize(cls.corpus, stopwords="en", show_progress=False)
+        cls.query_tokens = bm25s.tokenize(
+            ["does the fish purr like a cat?", "a bird that can fly"],
+            stopwords="en",
+            return_ids=False,
+            show_progress=False,
+        )
+
+        cls.retriever = bm25s.BM25(method="bm25l", corpus=cls.corpus)
+        cls.retriever.index(cls.corpus_tokens, show_progress=False, metadata=cls.metadata)
+
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmpdir, "index.bm25s")
+        cls.retriever.save_container(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def test_roundtrip(self):
+        expected = self.retriever.retrieve(self.query_tokens, k=3, show_progress=False)
+        for mmap in [True, False]:
+            loaded = bm25s.BM25.load_container(self.path, mmap=mmap, load_corpus=True)
+            self.assertEqual(array_is_mapped(loaded.scores["data"]), mmap)
+            for name in ["data", "indices", "indptr"]:
+                np.testing.assert_array_equal(self.retriever.scores[name], loaded.scores[name])
+            np.testing.assert_array_equal(self.retriever.nonoccurrence_array, loaded.nonoccurrence_array)
+            self.assertDictEqual(self.retriever.vocab_dict, loaded.vocab_dict)
+            self.assertEqual(loaded.method, "bm25l")
+
+            results = loaded.retrieve(self.query_tokens, k=3, show_progress=False)
+            np.testing.assert_allclose(expected.scores, results.scores)
+            top = expected.documents[0][0]
+            self.assertDictEqual(results.documents[0][0], {"id": self.corpus.index(top), "text": top})
+
+            filtered = loaded.retrieve(self.query_tokens, k=2, filter={"pet": False}, show_progress=False)
+            self.assertTrue(all(doc["id"] >= 2 for docs in filtered.documents for doc in docs))
+
+    def test_corpus(self):
+        loaded = bm25s.BM25.load_container(self.path, load_corpus=True)
+        self.assertIsInstance(loaded.corpus, ContainerCorpus)
+        self.assertEqual(len(loaded.corpus), len(self.corpus))
+        self.assertEqual(loaded.corpus[-1]["text"], self.corpus[-1])
+        self.assertListEqual([d["id"] for d in loaded.corpus[1:3]], [1, 2])
+        self.assertTupleEqual(loaded.corpus[np.array([[0, 1]])].shape, (1, 2))
+
+        without = bm25s.BM25.load_container(self.path, load_metadata=False)
+        self.assertIsNone(without.corpus)
+        self.assertIsNone(without.metadata)
+
+    def test_list_documents_and_file_mode(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, "index.bm25s")
+        docs = [["a", "cat"], ["a", "dog"], "a bird", {"text": "a fish"}]
+
+        umask = os.umask(0o022)
+        try:
+            self.retriever.save_container(path, corpus=docs)
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o644)
+
+        # the mode of an existing file is kept when it is overwritten
+        os.chmod(path, 0o640)
+        self.retriever.save_container(path, corpus=docs)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+
+        corpus = bm25s.BM25.load_container(path, load_corpus=True).corpus
+        results = corpus[np.array([[0, 1], [2, 3]])]
+        self.assertEqual(results.dtype, object)
+        self.assertTupleEqual(results.shape, (2, 2))
+        self.assertEqual(results[0, 1], ["a", "dog"])
+        self.assertEqual(results[1, 0], {"id": 2, "text": "a bird"})
+
+    def test_table(self):
+        table = read_container_table(self.path)
+        self.assertEqual(table["format_version"], FORMAT_VERSION)
+        self.assertEqual(table["file_size"], os.path.getsize(self.path))
+        for entry in table["sections"].values():
+            self.assertEqual(entry["offset"] % 64, 0)
+
+        # no temporary file is left behind
+        self.assertListEqual(os.listdir(self.tmpdir), ["index.bm25s"])
+
+    def test_invalid_files(self):
+        truncated = os.path.join(self.tmpdir, "truncated.bm25s")
+        with open(self.path, "rb") as f, open(truncated, "wb") as out:
+            out.write(f.read()[:-10])
+        with self.assertRaises(ValueError):
+            bm25s.BM25.load_container(truncated)
+
+        newer = os.path.join(self.tmpdir, "newer.bm25s")
+        with open(self.path, "rb") as f, open(newer, "wb") as out:
+            content = bytearray(f.read())
+            content[8:12] = (FORMAT_VERSION + 1).to_bytes(4, "little")
+            out.write(content)
+        with self.assertRaises(ValueError):
+            bm25s.BM25.load_container(newer)
+
+        os.remove(truncated)
+        os.remove(newer)
+
+
+if __name__ == "__main__":
+    unittest.main()
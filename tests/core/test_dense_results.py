@@ -0,0 +1,134 @@
+"""
+Tests for the dense results of filtered retrieval, `BM25.retrieve(..., dense=True)`.
+"""
+
+import unittest
+
+import numpy as np
+
+import bm25s
+from bm25s.selection import fill_missing_batch
+
+try:
+    import numba  # noqa: F401
+
+    BACKENDS = ["numpy", "numba"]
+except ImportError:
+    BACKENDS = ["numpy"]
+
+
+class TestDenseResults(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = [
+            "a cat is a feline and likes to purr",
+            "a dog is the human's best friend and loves to play",
+            "a bird is a beautiful animal that can fly",
+            "a fish is a creature that lives in water and swims",
+            "a cat and a dog can be friends",
+            "the bird and the fish do not play together",
+        ]
+        cls.metadata = [{"pet": p} for p in [True, True, False, False, True, False]]
+        cls.corpus_tokens = bm25s.tokenize(cls.corpus, stopwords="en", show_progress=False)
+        cls.queries = bm25s.tokenize(
+            ["does the fish purr like a cat?", "a dog that can fly", "zebra"],
+            stopwords="en",
+            return_ids=False,
+            show_progress=False,
+        )
+
+    def _retriever(self, backend):
+        retriever = bm25s.BM25(backend=backend)
+        retriever.index(self.corpus_tokens, show_progress=False, metadata=self.metadata)
+        return retriever
+
+    def _check_against_ragged(self, retriever, k, **kwargs):
+        dense = retriever.retrieve(self.queries, k=k, show_progress=False, dense=True, **kwargs)
+        ragged = retriever.retrieve(self.queries, k=k, show_progress=False, **kwargs)
+
+        self.assertEqual(dense.documents.shape, (3, k))
+        self.assertEqual(dense.scores.shape, (3, k))
+        self.assertNotEqual(dense.documents.dtype, object)
+        self.assertEqual(dense.counts.tolist(), [len(row) for row in ragged.documents])
+        for q, count in enumerate(dense.counts):
+            # unsorted results are compared as sets, since the ragged results use a smaller k
+            order, ragged_order = np.argsort(dense.documents[q, :count]), np.argsort(ragged.documents[q])
+            np.testing.assert_array_equal(dense.documents[q, :count][order], ragged.documents[q][ragged_order])
+            np.testing.assert_allclose(dense.scores[q, :count][order], ragged.scores[q][ragged_order])
+            self.assertTrue(np.all(dense.documents[q, count:] == -1))
+            self.assertTrue(np.all(np.isneginf(dense.scores[q, count:])))
+        return dense
+
+    def test_filter(self):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                retriever = self._retriever(backend)
+                dense = self._check_against_ragged(retriever, k=4, filter={"pet": True})
+                # the "zebra" query matches no document
+                self.assertEqual(dense.counts[2], 0)
+
+    def test_weight_mask(self):
+        weight_mask = np.array([1, 0, 1, 0, 1, 1], dtype=np.float32)
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                retriever = self._retriever(backend)
+                self._check_against_ragged(retriever, k=5, weight_mask=weight_mask, sorted=False)
+
+    def test_no_match(self):
+        retriever = self._retriever("numpy")
+        results = retriever.retrieve(self.queries, k=2, show_progress=False, dense=True, filter={"pet": "unknown"})
+        self.assertEqual(results.counts.tolist(), [0, 0, 0])
+        self.assertTrue(np.all(results.documents == -1))
+
+    def test_documents_and_metadata(self):
+        retriever = self._retriever("numpy")
+        results = retriever.retrieve(
+            self.queries,
+            corpus=self.corpus,
+            k=4,
+            show_progress=False,
+            dense=True,
+            filter={"pet": True},
+            return_metadata=True,
+        )
+        indices = retriever.retrieve(
+            self.queries, k=4, show_progress=False, dense=True, filter={"pet": True}
+        ).documents
+
+        for q in range(3):
+            for j in range(4):
+                if j < results.counts[q]:
+                    self.assertEqual(results.documents[q, j], self.corpus[indices[q, j]])
+                    self.assertEqual(results.metadata[q][j], {"pet": True})
+                else:
+                    self.assertIsNone(results.documents[q, j])
+                    self.assertIsNone(results.metadata[q][j])
+
+        lazy = retriever.retrieve(
+            self.queries, corpus=self.corpus, k=4, show_progress=False, dense=True, filter={"pet": True}, lazy=True
+        )
+        self.assertEqual(lazy.documents.tolist(), results.documents.tolist())
+
+    def test_unfiltered_counts_and_merge(self):
+        retriever = self._retriever("numpy")
+        results = retriever.retrieve(self.queries, k=2, show_progress=False, dense=True)
+        self.assertEqual(results.counts.tolist(), [2, 2, 2])
+
+        merged = bm25s.Results.merge([results, results])
+        self.assertEqual(merged.documents.shape, (6, 2))
+        self.assertEqual(merged.counts.tolist(), [2] * 6)
+
+    def test_fill_missing_batch(self):
+        scores = np.array([[0.0, 2.0, 1.0], [0.0, 0.0, 0.0]], dtype=np.float32)
+        indices = np.array([[3, 1, 2], [0, 1, 2]], dtype=np.int32)
+        filled_scores, filled_indices, counts = fill_missing_batch(scores, indices, sorted=False)
+
+        np.testing.assert_array_equal(filled_indices, [[1, 2, -1], [-1, -1, -1]])
+        np.testing.assert_array_equal(filled_scores, [[2.0, 1.0, -np.inf], [-np.inf] * 3])
+        np.testing.assert_array_equal(counts, [2, 0])
+        self.assertEqual(filled_scores.dtype, np.float32)
+        self.assertEqual(filled_indices.dtype, np.int32)
+
+
+if __name__ == "__main__":
+    unittest.main()
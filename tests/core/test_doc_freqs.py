@@ -0,0 +1,86 @@
+"""
+Tests for the vectorized document frequency and idf computations in `bm25s.scoring`.
+"""
+
+import unittest
+
+import numpy as np
+
+import bm25s
+from bm25s import scoring
+
+
+class TestVectorizedDocFreqs(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(42)
+        cls.n_vocab = 50
+        cls.corpus_token_ids = [
+            rng.integers(0, cls.n_vocab - 5, size=rng.integers(1, 30)).tolist()
+            for _ in range(200)
+        ]
+
+    def test_doc_freqs_match_legacy(self):
+        expected = scoring._calculate_doc_freqs(
+            self.corpus_token_ids, range(self.n_vocab), show_progress=False
+        )
+        for chunksize in [7, 1000]:
+            df_array = scoring._calculate_doc_freqs_array(
+                self.corpus_token_ids, n_vocab=self.n_vocab, chunksize=chunksize
+            )
+            self.assertEqual(self.n_vocab, len(df_array))
+            self.assertListEqual([expected[i] for i in range(self.n_vocab)], df_array.tolist())
+
+    def test_idf_and_nonoccurrence_match_per_token(self):
+        df_array = scoring._calculate_doc_freqs_array(self.corpus_token_ids, n_vocab=self.n_vocab)
+        df_array = np.maximum(df_array, 1)  # avoid log(N / 0) for unused tokens
+        n_docs = len(self.corpus_token_ids)
+
+        for method in ["robertson", "lucene", "atire", "bm25l", "bm25+"]:
+            idf_fn = scoring._select_idf_scorer(method)
+            tfc_fn = scoring._select_tfc_scorer(method)
+
+            idf_array = scoring._build_idf_array(df_array, n_docs=n_docs, compute_idf_fn=idf_fn)
+            expected_idf = [idf_fn(int(df), N=n_docs) for df in df_array]
+            self.assertTrue(np.allclose(expected_idf, idf_array), method)
+
+            # a dictionary of document frequencies is still accepted
+            idf_from_dict = scoring._build_idf_array(
+                dict(enumerate(df_array.tolist())), n_docs=n_docs, compute_idf_fn=idf_fn
+            )
+            self.assertTrue(np.array_equal(idf_array, idf_from_dict), method)
+
+            nonoccurrence = scoring._build_nonoccurrence_array(
+                df_array, n_docs=n_docs, compute_idf_fn=idf_fn, calculate_tfc_fn=tfc_fn,
+                l_d=10.0, l_avg=10.0, k1=1.5, b=0.75, delta=0.5,
+            )
+            tfc = tfc_fn(tf_array=0, l_d=10.0, l_avg=10.0, k1=1.5, b=0.75, delta=0.5)
+            self.assertTrue(np.allclose(np.array(expected_idf) * tfc, nonoccurrence), method)
+
+    def test_unused_tokens_have_zero_idf(self):
+        df_array = np.array([0, 3, 10])
+        for method in ["atire", "bm25+"]:
+            idf_fn = scoring._select_idf_scorer(method)
+            idf_array = scoring._build_idf_array(df_array, n_docs=10, compute_idf_fn=idf_fn)
+            self.assertEqual(idf_array[0], 0, method)
+            self.assertTrue(np.all(np.isfinite(idf_array)), method)
+
+    def test_query_without_known_tokens(self):
+        # the empty token of the vocabulary occurs in no document
+        corpus = ["a cat purrs", "a dog barks"]
+        for method in ["atire", "bm25+"]:
+            for index_texts in [False, True]:
+                with self.subTest(method=method, index_texts=index_texts):
+                    tokenizer = bm25s.tokenization.Tokenizer()
+                    retriever = bm25s.BM25(method=method)
+                    if index_texts:
+                        retriever.index_texts(corpus, tokenizer, show_progress=False)
+                    else:
+                        corpus_tokens = tokenizer.tokenize(corpus, return_as="tuple", show_progress=False)
+                        retriever.index(corpus_tokens, show_progress=False)
+                    query = tokenizer.tokenize(["zebra"], update_vocab=False, show_progress=False)
+                    results = retriever.retrieve(query, k=2, show_progress=False)
+                    self.assertTrue(np.all(results.scores == 0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""
+Tests for the vectorized evaluation of retrieval results, `bm25s.utils.evaluation`.
+"""
+
+import random
+import unittest
+
+import numpy as np
+
+import bm25s
+from bm25s.utils.beir import evaluate
+from bm25s.utils.evaluation import evaluate_results, qrels_to_matrix, rank_run
+
+try:
+    import pytrec_eval
+except ImportError:
+    pytrec_eval = None
+
+
+class TestEvaluateResults(unittest.TestCase):
+    def setUp(self):
+        # q0: d1 (grade 2) and d3 (grade 1) are relevant, d0 is judged non-relevant
+        # q1: d2 is relevant; q2 has no judgment and is not evaluated
+        self.qrels = {"q0": {"d1": 2, "d3": 1, "d0": 0}, "q1": {"d2": 1}}
+        self.doc_ids = ["d0", "d1", "d2", "d3", "d4"]
+        self.matrix = qrels_to_matrix(self.qrels, ["q0", "q1", "q2"], self.doc_ids)
+        self.indices = np.array([[0, 1, 4, 3], [2, -1, -1, -1], [1, 2, 3, 4]])
+
+    def test_qrels_to_matrix(self):
+        self.assertEqual(self.matrix.shape, (3, 5))
+        self.assertEqual(self.matrix[0, 1], 2)
+        self.assertEqual(np.diff(self.matrix.indptr).tolist(), [3, 1, 0])
+
+        from_triples = qrels_to_matrix([("q1", "d2", 1), ("q1", "unknown", 1)], ["q0", "q1"], {"d2": 0})
+        self.assertEqual(from_triples.toarray().tolist(), [[0], [1]])
+
+    def test_metrics(self):
+        scores = evaluate_results(self.indices, self.matrix, k_values=[1, 4], per_query=True)
+
+        log2 = np.log2
+        dcg = 2 / log2(3) + 1 / log2(5)
+        idcg = 2 / log2(2) + 1 / log2(3)
+        np.testing.assert_allclose(scores["NDCG@4"], [dcg / idcg, 1.0])
+        np.testing.assert_allclose(scores["NDCG@1"], [0.0, 1.0])
+        np.testing.assert_allclose(scores["MAP@4"], [(1 / 2 + 2 / 4) / 2, 1.0])
+        np.testing.assert_allclose(scores["Recall@4"], [1.0, 1.0])
+        np.testing.assert_allclose(scores["P@4"], [0.5, 0.25])
+        np.testing.assert_allclose(scores["P@1"], [0.0, 1.0])
+        np.testing.assert_allclose(scores["MRR@4"], [0.5, 1.0])
+        np.testing.assert_allclose(scores["MRR@1"], [0.0, 1.0])
+
+        means = evaluate_results(self.indices, self.matrix, k_values=[4], metrics=["precision"])
+        self.assertDictEqual(means, {"P@4": 0.375})
+
+    def test_ragged_and_short_results(self):
+        ragged = np.empty(3, dtype=object)
+        ragged[:] = [np.array([0, 1]), np.array([2]), np.array([], dtype=int)]
+        scores = evaluate_results(ragged, self.matrix, k_values=[2, 10], per_query=True)
+        np.testing.assert_allclose(scores["P@10"], [0.1, 0.1])
+        np.testing.assert_allclose(scores["Recall@2"], [0.5, 1.0])
+
+        with self.assertRaises(ValueError):
+            evaluate_results(self.indices, self.matrix, metrics=["bpref"])
+        with self.assertRaises(ValueError):
+            evaluate_results(self.indices[:2], self.matrix)
+
+    def test_retrieve_results(self):
+        corpus = ["a cat purrs", "a dog barks", "a bird flies", "a fish swims"]
+        retriever = bm25s.BM25()
+        retriever.index(bm25s.tokenize(corpus, show_progress=False), show_progress=False)
+        queries = bm25s.tokenize(["cat", "fish swims", "dog"], show_progress=False)
+        results = retriever.retrieve(queries, k=2, show_progress=False)
+
+        qrels = qrels_to_matrix({"0": {"0": 1}, "1": {"3": 1}, "2": {"2": 1}}, ["0", "1", "2"], ["0", "1", "2", "3"])
+        scores = evaluate_results(results.documents, qrels, k_values=[1])
+        self.assertAlmostEqual(scores["P@1"], 2 / 3)
+
+    def test_rank_run_breaks_ties_by_decreasing_id(self):
+        query_ids, ranked = rank_run({"q": {"a": 1.0, "c": 2.0, "b": 1.0}})
+        self.assertEqual(query_ids, ["q"])
+        self.assertEqual(ranked, [["c", "b", "a"]])
+
+
+class TestBeirEvaluate(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        docs = [f"d{i}" for i in range(50)]
+        self.qrels, self.run = {}, {}
+        for q in range(60):
+            qid = f"q{q}"
+            if q % 7 != 0:
+                self.qrels[qid] = {rng.choice(docs): rng.choice([0, 1, 2]) for _ in range(rng.randint(1, 5))}
+            if q % 5 != 0:
+                self.run[qid] = {d: rng.randint(0, 8) / 4 for d in rng.sample(docs, rng.randint(0, 20))}
+        self.k_values = [1, 3, 10]
+
+    def test_without_pytrec_eval(self):
+        ndcg, _map, recall, precision = evaluate(self.qrels, self.run, self.k_values)
+        self.assertEqual(list(ndcg), ["NDCG@1", "NDCG@3", "NDCG@10"])
+        self.assertEqual(list(precision), ["P@1", "P@3", "P@10"])
+        for metrics in [ndcg, _map, recall, precision]:
+            for value in metrics.values():
+                self.assertTrue(0.0 <= value <= 1.0)
+
+    @unittest.skipIf(pytrec_eval is None, "pytrec_eval is not installed")
+    def test_matches_pytrec_eval(self):
+        measures = {m + ",".join(map(str, self.k_values)) for m in ["ndcg_cut.", "map_cut.", "recall.", "P."]}
+        reference = pytrec_eval.RelevanceEvaluator(self.qrels, measures).evaluate(self.run)
+        ndcg, _map, recall, precision = evaluate(self.qrels, self.run, self.k_values)
+
+        for k in self.k_values:
+            for ours, key in [(ndcg[f"NDCG@{k}"], "ndcg_cut_"), (_map[f"MAP@{k}"], "map_cut_"),
+                              (recall[f"Recall@{k}"], "recall_"), (precision[f"P@{k}"], "P_")]:
+                expected = sum(v[key + str(k)] for v in reference.values()) / len(reference)
+                self.assertAlmostEqual(ours, round(expected, 5), places=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Tests for the fused tokenize-and-index pipeline, `BM25.index_texts`.
+"""
+
+import unittest
+
+import numpy as np
+import Stemmer
+
+import bm25s
+
+
+class TestIndexTexts(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = [
+            "a cat is a feline and likes to purr",
+            "a dog is the human's best friend and loves to play",
+            "a bird is a beautiful animal that can fly",
+            "a fish is a creature that lives in water and swims",
+            "",
+        ] * 5
+
+    def _assert_same_index(self, method, stemmer, n_jobs, chunksize):
+        tokenizer = bm25s.Tokenizer(stemmer=stemmer)
+        corpus_tokens = tokenizer.tokenize(self.corpus, return_as="tuple", show_progress=False)
+        expected = bm25s.BM25(method=method)
+        expected.index(corpus_tokens, show_progress=False)
+
+        retriever = bm25s.BM25(method=method)
+        retriever.index_texts(
+            iter(self.corpus),
+            bm25s.Tokenizer(stemmer=stemmer),
+            n_jobs=n_jobs,
+            chunksize=chunksize,
+            show_progress=False,
+        )
+
+        self.assertDictEqual(expected.vocab_dict, retriever.vocab_dict)
+        self.assertTrue(np.array_equal(expected.scores["indptr"], retriever.scores["indptr"]))
+        self.assertTrue(np.array_equal(expected.scores["indices"], retriever.scores["indices"]))
+        self.assertTrue(np.allclose(expected.scores["data"], retriever.scores["data"], atol=1e-6))
+        self.assertEqual(expected.scores["num_docs"], retriever.scores["num_docs"])
+
+        if expected.nonoccurrence_array is not None:
+            self.assertTrue(np.allclose(expected.nonoccurrence_array, retriever.nonoccurrence_array))
+
+    def test_same_index_as_tokenize_then_index(self):
+        for method in ["robertson", "lucene", "atire", "bm25l", "bm25+"]:
+            with self.subTest(method=method):
+                self._assert_same_index(method, stemmer=None, n_jobs=1, chunksize=7)
+
+    def test_same_index_with_stemmer_and_threads(self):
+        stemmer = Stemmer.Stemmer("english")
+        self._assert_same_index("lucene", stemmer=stemmer, n_jobs=3, chunksize=4)
+        self._assert_same_index("bm25+", stemmer=stemmer, n_jobs=2, chunksize=100)
+
+    def test_retrieve_after_index_texts(self):
+        tokenizer = bm25s.Tokenizer(stemmer=Stemmer.Stemmer("english"))
+        retriever = bm25s.BM25()
+        retriever.index_texts(self.corpus[:4], tokenizer, show_progress=False)
+
+        query_tokens = tokenizer.tokenize(["does the fish purr like a cat?"], update_vocab=False)
+        results = retriever.retrieve(query_tokens, k=2, show_progress=False)
+        self.assertTrue(np.array_equal(np.array([[0, 3]]), results.documents))
+
+    def test_empty_texts(self):
+        with self.assertRaises(ValueError):
+            bm25s.BM25().index_texts([], bm25s.Tokenizer(), show_progress=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
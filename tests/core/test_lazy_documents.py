@@ -0,0 +1,127 @@
+"""
+Tests for the lazy documents of `BM25.retrieve(..., lazy=True)` and the projection of the
+documents on some fields.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import bm25s
+from bm25s.utils.corpus import LazyDocuments
+
+
+class CountingCorpus(list):
+    """A list that counts how many documents are read."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.reads = 0
+
+    def __getitem__(self, i):
+        self.reads += 1
+        return super().__getitem__(i)
+
+
+class TestLazyDocuments(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        texts = [
+            "a cat is a feline and likes to purr",
+            "a dog is the human's best friend and loves to play",
+            "a bird is a beautiful animal that can fly",
+            "a fish is a creature that lives in water and swims",
+        ]
+        cls.corpus = [{"id": i, "title": t.split()[1], "text": t} for i, t in enumerate(texts)]
+        cls.metadata = [{"pet": True}, {"pet": True}, {"pet": False}, {"pet": False}]
+        cls.retriever = bm25s.BM25()
+        cls.retriever.index(bm25s.tokenize(texts, show_progress=False), show_progress=False, metadata=cls.metadata)
+        cls.queries = bm25s.tokenize(
+            ["does the fish purr like a cat?", "a dog that can fly"], return_ids=False, show_progress=False
+        )
+
+    def test_lazy_matches_eager(self):
+        eager = self.retriever.retrieve(self.queries, corpus=self.corpus, k=3, show_progress=False)
+        lazy = self.retriever.retrieve(self.queries, corpus=self.corpus, k=3, show_progress=False, lazy=True)
+
+        self.assertIsInstance(lazy.documents, LazyDocuments)
+        self.assertEqual(lazy.documents.shape, (2, 3))
+        self.assertEqual(len(lazy.documents), 2)
+        self.assertEqual(lazy.documents[1, 0], eager.documents[1, 0])
+        self.assertEqual(lazy.documents[0][2], eager.documents[0][2])
+        self.assertEqual(list(lazy.documents[0, :2]), list(eager.documents[0, :2]))
+        self.assertEqual([list(row) for row in lazy.documents], eager.documents.tolist())
+        self.assertEqual(np.asarray(lazy.documents).tolist(), eager.documents.tolist())
+
+    def test_documents_are_fetched_on_access(self):
+        corpus = CountingCorpus(self.corpus)
+        results = self.retriever.retrieve(self.queries, corpus=corpus, k=3, show_progress=False, lazy=True)
+        self.assertEqual(corpus.reads, 0)
+
+        row = results.documents[0]
+        self.assertEqual(corpus.reads, 0)
+        row[0]
+        self.assertEqual(corpus.reads, 1)
+        results.documents.materialize()
+        self.assertEqual(corpus.reads, 7)
+
+    def test_fields(self):
+        results = self.retriever.retrieve(self.queries, corpus=self.corpus, k=2, show_progress=False, fields=["title"])
+        self.assertNotIsInstance(results.documents, LazyDocuments)
+        self.assertEqual(results.documents.shape, (2, 2))
+        for doc in results.documents.flatten():
+            self.assertEqual(list(doc), ["title"])
+
+    def test_filtered_results(self):
+        results = self.retriever.retrieve(
+            self.queries, corpus=self.corpus, k=3, show_progress=False, filter={"pet": True}, lazy=True, fields=["id"]
+        )
+        eager = self.retriever.retrieve(self.queries, corpus=False, k=3, show_progress=False, filter={"pet": True})
+
+        for q in range(2):
+            ids = [doc["id"] for doc in results.documents[q]]
+            self.assertEqual(ids, list(eager.documents[q]))
+            self.assertTrue(all(self.metadata[i]["pet"] for i in ids))
+        self.assertEqual(results.documents[1, 0], {"id": int(eager.documents[1][0])})
+
+    def test_jsonl_corpus(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, "corpus.jsonl")
+        with open(path, "w") as f:
+            for doc in self.corpus:
+                f.write(bm25s.utils.json_functions.dumps(doc) + "\n")
+        corpus = bm25s.utils.corpus.JsonlCorpus(path, show_progress=False)
+
+        eager = self.retriever.retrieve(self.queries, corpus=self.corpus, k=3, show_progress=False)
+        lazy = self.retriever.retrieve(
+            self.queries, corpus=corpus, k=3, show_progress=False, lazy=True, fields=["title"]
+        )
+        self.assertEqual(
+            [[doc["title"] for doc in row] for row in lazy.documents],
+            [[doc["title"] for doc in row] for row in eager.documents],
+        )
+
+    def test_retrieve_iter(self):
+        queries = [["fish", "purr", "cat"], ["dog", "fly"]] * 3
+        corpus = CountingCorpus(self.corpus)
+        batches = list(
+            self.retriever.retrieve_iter(queries, batch_size=4, corpus=corpus, k=2, lazy=True, fields=["id"])
+        )
+        self.assertEqual(corpus.reads, 0)
+        self.assertIsInstance(batches[0].documents, LazyDocuments)
+
+        eager = self.retriever.retrieve(queries, corpus=False, k=2, show_progress=False)
+        ids = [[doc["id"] for doc in row] for batch in batches for row in batch.documents]
+        self.assertEqual(ids, eager.documents.tolist())
+
+        batches = list(self.retriever.retrieve_iter(queries, batch_size=4, corpus=self.corpus, k=2, fields=["title"]))
+        self.assertNotIsInstance(batches[0].documents, LazyDocuments)
+        self.assertEqual(list(batches[0].documents[0, 0]), ["title"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Tests for `BM25.memory_report` and `bm25s.utils.memory.saved_index_memory_report`.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import bm25s
+from bm25s.utils.memory import deep_getsizeof, saved_index_memory_report
+
+
+class TestMemoryReport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = [
+            "a cat is a feline and likes to purr",
+            "a dog is the human's best friend and loves to play",
+            "a bird is a beautiful animal that can fly",
+            "a fish is a creature that lives in water and swims",
+        ]
+        cls.metadata = [{"pet": True}, {"pet": True}, {"pet": False}, {"pet": False}]
+        cls.corpus_tokens = bm25s.tokenize(cls.corpus, stopwords="en", show_progress=False)
+
+        cls.retriever = bm25s.BM25(corpus=cls.corpus)
+        cls.retriever.index(cls.corpus_tokens, show_progress=False, metadata=cls.metadata)
+
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.retriever.save(cls.tmpdir, corpus=cls.corpus)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def test_components(self):
+        report = self.retriever.memory_report()
+        components = report["components"]
+
+        for name in ["data", "indices", "indptr"]:
+            c = components[f"scores.{name}"]
+            self.assertEqual(c["bytes"], self.retriever.scores[name].nbytes)
+            self.assertFalse(c["mmap"])
+
+        for name in ["vocab_dict", "unique_token_ids_set", "metadata", "metadata_filter.field_indices", "corpus"]:
+            self.assertGreater(components[name]["bytes"], 0)
+
+        self.assertEqual(report["mapped_bytes"], 0)
+        self.assertEqual(report["total_bytes"], sum(c["bytes"] for c in components.values()))
+
+        actions = {r["action"] for r in report["recommendations"]}
+        self.assertTrue({"mmap", "quantize_data", "compact_vocab"} <= actions)
+        self.assertNotIn("downcast_indices", actions)
+        savings = [r["savings_bytes"] for r in report["recommendations"]]
+        self.assertListEqual(savings, sorted(savings, reverse=True))
+
+    def test_downcast(self):
+        retriever = bm25s.BM25()
+        retriever.index(self.corpus_tokens, show_progress=False)
+        for name in ["indices", "indptr"]:
+            retriever.scores[name] = retriever.scores[name].astype(np.int64)
+
+        recommendations = {r["action"]: r for r in retriever.memory_report()["recommendations"]}
+        for name in ["indices", "indptr"]:
+            expected = retriever.scores[name].nbytes // 2
+            self.assertEqual(recommendations[f"downcast_{name}"]["savings_bytes"], expected)
+
+    def test_mmap(self):
+        retriever = bm25s.BM25.load(self.tmpdir, mmap=True, load_corpus=True)
+        report = retriever.memory_report()
+
+        self.assertTrue(report["components"]["scores.data"]["mmap"])
+        self.assertEqual(report["components"]["corpus"]["type"], "JsonlCorpus")
+        self.assertGreater(report["mapped_bytes"], 0)
+        self.assertNotIn("mmap", {r["action"] for r in report["recommendations"]})
+        retriever.corpus.close()
+
+    def test_saved_index(self):
+        for mmap in [False, True]:
+            retriever = bm25s.BM25.load(self.tmpdir, mmap=mmap)
+            loaded = retriever.memory_report()["components"]
+            offline = saved_index_memory_report(self.tmpdir, mmap=mmap)
+
+            for name in ["scores.data", "scores.indices", "scores.indptr"]:
+                self.assertEqual(offline["components"][name]["bytes"], loaded[name]["bytes"])
+                self.assertEqual(offline["components"][name]["dtype"], loaded[name]["dtype"])
+                self.assertEqual(offline["components"][name]["mmap"], mmap)
+            self.assertEqual(offline["components"]["vocab_dict"]["entries"], loaded["vocab_dict"]["entries"])
+            self.assertTrue(offline["estimated"])
+
+        with_corpus = saved_index_memory_report(self.tmpdir, load_corpus=True)
+        self.assertGreater(
+            with_corpus["components"]["corpus"]["bytes"],
+            os.path.getsize(os.path.join(self.tmpdir, "corpus.jsonl")),
+        )
+
+    def test_saved_compressed_corpus(self):
+        save_dir = os.path.join(self.tmpdir, "blocks")
+        self.retriever.save(save_dir, corpus=self.corpus, corpus_compression="zlib")
+
+        mapped = saved_index_memory_report(save_dir, mmap=True, load_corpus=True)
+        corpus = mapped["components"]["corpus"]
+        self.assertEqual(corpus["type"], "CompressedCorpus")
+        self.assertEqual(corpus["bytes"], os.path.getsize(os.path.join(save_dir, "corpus.blocks")))
+        self.assertTrue(corpus["mmap"])
+
+        # loaded as a list, the corpus cannot be read from a `corpus.jsonl` file instead
+        in_memory = saved_index_memory_report(save_dir, load_corpus=True)
+        self.assertEqual(in_memory["components"]["corpus"]["type"], "list")
+        self.assertGreater(in_memory["components"]["corpus"]["bytes"], sum(len(doc) for doc in self.corpus))
+        self.assertNotIn("mmap_corpus", {r["action"] for r in in_memory["recommendations"]})
+
+    def test_deep_getsizeof(self):
+        shared = "x" * 100
+        self.assertLess(deep_getsizeof([shared, shared]), deep_getsizeof(["x" * 100, "y" * 100]))
+        self.assertGreaterEqual(deep_getsizeof({"a": np.zeros(1000)}), 8000)
+
+
+if __name__ == "__main__":
+    unittest.main()
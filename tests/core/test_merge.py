@@ -0,0 +1,151 @@
+"""
+Tests for `bm25s.merge_indexes`.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import bm25s
+from bm25s.sharded import ShardedBM25, _load_shard
+
+
+class TestMergeIndexes(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = [
+            "a cat is a feline and likes to purr",
+            "a dog is the human's best friend and loves to play",
+            "a bird is a beautiful animal that can fly",
+            "a fish is a creature that lives in water and swims",
+            "the cat and the dog play in the garden",
+            "birds and fish are animals",
+            "a cat can swim but does not like water",
+        ]
+        cls.corpus_tokens = bm25s.tokenize(cls.corpus, stopwords="en", return_ids=False, show_progress=False)
+        cls.query_tokens = bm25s.tokenize(
+            ["does the fish purr like a cat?", "a dog that can fly", "water garden"],
+            stopwords="en",
+            return_ids=False,
+            show_progress=False,
+        )
+        cls.tmpdir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir)
+
+    def save_parts(self, name, bounds, stats=True, compression=None, **kwargs):
+        dirs = []
+        for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+            retriever = bm25s.BM25(**kwargs)
+            retriever.index(self.corpus_tokens[start:end], show_progress=False)
+            d = os.path.join(self.tmpdir, f"{name}_{i}")
+            codec = compression[i] if compression else None
+            retriever.save(d, corpus=self.corpus[start:end], corpus_compression=codec)
+            if stats:
+                bm25s.save_term_statistics(d, self.corpus_tokens[start:end])
+            dirs.append(d)
+        return dirs
+
+    def retrieve_both(self, out_dir, k=4, **kwargs):
+        single = bm25s.BM25(**kwargs)
+        single.index(self.corpus_tokens, show_progress=False)
+        merged = bm25s.BM25.load(out_dir, load_corpus=True)
+        return (
+            single.retrieve(self.query_tokens, k=k, show_progress=False),
+            merged.retrieve(self.query_tokens, k=k, show_progress=False),
+            merged,
+        )
+
+    def test_exact(self):
+        for method in ["lucene", "bm25+"]:
+            dirs = self.save_parts(f"exact_{method}", [0, 3, 5, 7], method=method)
+            out_dir = os.path.join(self.tmpdir, f"exact_{method}_merged")
+            info = bm25s.merge_indexes(dirs, out_dir, chunksize=5)
+            self.assertTrue(info["exact"])
+            self.assertEqual(info["num_docs"], len(self.corpus))
+
+            expected, results, merged = self.retrieve_both(out_dir, method=method)
+            np.testing.assert_allclose(expected.scores, results.scores, rtol=1e-5)
+            self.assertEqual(results.documents[0][0]["text"], self.corpus[expected.documents[0][0]])
+            self.assertEqual(len(merged.corpus), len(self.corpus))
+
+            # the vocabulary of the first index is kept
+            with open(os.path.join(dirs[0], "vocab.index.json")) as f:
+                first_vocab = json.load(f)
+            for token, token_id in first_vocab.items():
+                if token != "":
+                    self.assertEqual(merged.vocab_dict[token], token_id)
+
+    def test_approximate(self):
+        # without length normalization (b=0), rescaling the idf is exact
+        dirs = self.save_parts("approx_b0", [0, 4, 7], stats=False, b=0.0)
+        out_dir = os.path.join(self.tmpdir, "approx_b0_merged")
+        self.assertFalse(bm25s.merge_indexes(dirs, out_dir)["exact"])
+        expected, results, _ = self.retrieve_both(out_dir, b=0.0)
+        np.testing.assert_allclose(expected.scores, results.scores, rtol=1e-5)
+
+        with self.assertRaises(FileNotFoundError):
+            bm25s.merge_indexes(dirs, out_dir, exact=True)
+
+    def test_compressed_corpus(self):
+        # a block-compressed corpus is merged into a block-compressed corpus
+        dirs = self.save_parts("blocks", [0, 3, 7], stats=False, compression=[None, "zlib"])
+        out_dir = os.path.join(self.tmpdir, "blocks_merged")
+        bm25s.merge_indexes(dirs, out_dir)
+        self.assertFalse(os.path.exists(os.path.join(out_dir, "corpus.jsonl")))
+
+        merged = bm25s.BM25.load(out_dir, load_corpus=True, mmap=True)
+        self.assertIsInstance(merged.corpus, bm25s.utils.corpus.CompressedCorpus)
+        self.assertEqual([doc["text"] for doc in merged.corpus], self.corpus)
+        merged.corpus.close()
+
+    def test_missing_corpus(self):
+        dirs = self.save_parts("missing", [0, 3, 7], stats=False)
+        os.remove(os.path.join(dirs[1], "corpus.jsonl"))
+        out_dir = os.path.join(self.tmpdir, "missing_merged")
+        with self.assertRaises(ValueError):
+            bm25s.merge_indexes(dirs, out_dir)
+
+        bm25s.merge_indexes(dirs, out_dir, merge_corpus=False)
+        self.assertFalse(os.path.exists(os.path.join(out_dir, "corpus.jsonl")))
+
+    def test_sharded_metadata(self):
+        # `ShardedBM25.save` writes the metadata of each shard to `metadata.jsonl`
+        metadata = [{"pet": "cat" in doc or "dog" in doc, "id": i} for i, doc in enumerate(self.corpus)]
+        sharded = ShardedBM25(num_shards=3, corpus=self.corpus, n_jobs=1)
+        sharded.index(self.corpus_tokens, metadata=metadata, show_progress=False)
+        sharded_dir = os.path.join(self.tmpdir, "sharded")
+        sharded.save(sharded_dir)
+        dirs = sorted(os.path.join(sharded_dir, d) for d in os.listdir(sharded_dir) if d.startswith("shard_"))
+        self.assertEqual(len(dirs), 3)
+
+        out_dir = os.path.join(self.tmpdir, "sharded_merged")
+        bm25s.merge_indexes(dirs, out_dir)
+        merged = _load_shard(out_dir)
+        self.assertListEqual(list(merged.metadata), metadata)
+
+        pets = {i for i, entry in enumerate(metadata) if entry["pet"]}
+        results = merged.retrieve(self.query_tokens, k=2, show_progress=False, filter={"pet": True})
+        for docs in results.documents:
+            self.assertTrue(set(np.asarray(docs).tolist()) <= pets)
+
+        # the metadata is merged only if all the indices have it
+        os.remove(os.path.join(dirs[1], "metadata.jsonl"))
+        with self.assertRaises(ValueError):
+            bm25s.merge_indexes(dirs, os.path.join(self.tmpdir, "sharded_missing"))
+
+    def test_different_parameters(self):
+        dirs = self.save_parts("k1_a", [0, 7], stats=False, k1=1.2)
+        dirs += self.save_parts("k1_b", [0, 7], stats=False, k1=1.5)
+        with self.assertRaises(ValueError):
+            bm25s.merge_indexes(dirs, os.path.join(self.tmpdir, "k1_merged"))
+
+
+if __name__ == "__main__":
+    unittest.main()
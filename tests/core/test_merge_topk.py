@@ -0,0 +1,133 @@
+"""
+Tests for the k-way merge of top-k results, `bm25s.selection.merge_topk` and
+`bm25s.Results.merge_topk`.
+"""
+
+import unittest
+
+import numpy as np
+
+import bm25s
+from bm25s.selection import merge_topk
+
+try:
+    import numba  # noqa: F401
+
+    BACKENDS = ["numpy", "numba"]
+except ImportError:
+    BACKENDS = ["numpy"]
+
+
+def reference_merge(scores_list, indices_list, k, offsets, dedupe, tie_break):
+    merged_scores, merged_indices = [], []
+    for q in range(len(scores_list[0])):
+        candidates = []
+        position = 0
+        for source, (scores, indices) in enumerate(zip(scores_list, indices_list)):
+            for score, index in zip(scores[q], indices[q]):
+                if index >= 0:
+                    candidates.append((float(score), int(index) + offsets[source], position))
+                position += 1
+        if dedupe:
+            best = {}
+            for c in candidates:
+                if c[1] not in best or c[0] > best[c[1]][0]:
+                    best[c[1]] = c
+            candidates = list(best.values())
+        tie = (lambda c: c[2]) if tie_break == "source" else (lambda c: (c[1], c[2]))
+        candidates.sort(key=lambda c: (-c[0], tie(c)))
+        candidates = candidates[:k]
+        merged_scores.append([c[0] for c in candidates] + [-np.inf] * (k - len(candidates)))
+        merged_indices.append([c[1] for c in candidates] + [-1] * (k - len(candidates)))
+    return np.array(merged_scores), np.array(merged_indices)
+
+
+class TestMergeTopK(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.scores_list, self.indices_list = [], []
+        for width in [4, 6, 3]:
+            # few distinct scores and documents, so there are ties and duplicates
+            scores = -np.sort(-rng.integers(0, 5, (20, width)).astype(np.float32), axis=1)
+            indices = rng.integers(0, 8, (20, width))
+            indices[rng.random((20, width)) < 0.1] = -1
+            self.scores_list.append(scores)
+            self.indices_list.append(indices)
+
+    def test_against_reference(self):
+        for backend in BACKENDS:
+            for dedupe in [False, True]:
+                for tie_break in ["source", "index"]:
+                    for offsets in [None, [0, 100, 200]]:
+                        with self.subTest(backend=backend, dedupe=dedupe, tie_break=tie_break, offsets=offsets):
+                            scores, indices = merge_topk(
+                                self.scores_list,
+                                self.indices_list,
+                                k=7,
+                                offsets=offsets,
+                                dedupe=dedupe,
+                                tie_break=tie_break,
+                                backend=backend,
+                            )
+                            expected_scores, expected_indices = reference_merge(
+                                self.scores_list, self.indices_list, 7, offsets or [0, 0, 0], dedupe, tie_break
+                            )
+                            np.testing.assert_array_equal(indices, expected_indices)
+                            np.testing.assert_array_equal(scores, expected_scores)
+                            self.assertEqual(scores.dtype, np.float32)
+
+    def test_padding_and_ragged_sources(self):
+        ragged_scores = [np.array([3.0, 1.0]), np.array([], dtype=np.float32)]
+        ragged_indices = [np.array([5, 2]), np.array([], dtype=np.int64)]
+        for backend in BACKENDS:
+            scores, indices = merge_topk(
+                [ragged_scores, np.array([[2.0], [0.5]], dtype=np.float32)],
+                [ragged_indices, np.array([[9], [4]])],
+                k=4,
+                backend=backend,
+            )
+            np.testing.assert_array_equal(indices, [[5, 9, 2, -1], [4, -1, -1, -1]])
+            np.testing.assert_array_equal(scores[1], [0.5, -np.inf, -np.inf, -np.inf])
+
+    def test_errors(self):
+        scores, indices = self.scores_list[0], self.indices_list[0]
+        with self.assertRaises(ValueError):
+            merge_topk([scores], [indices], tie_break="random")
+        with self.assertRaises(ValueError):
+            merge_topk([scores, scores[:3]], [indices, indices[:3]])
+        with self.assertRaises(ValueError):
+            merge_topk([scores], [indices], offsets=[0, 1])
+
+    def test_results_merge_topk(self):
+        corpus = [
+            "a cat is a feline and likes to purr",
+            "a dog is the human's best friend and loves to play",
+            "a bird is a beautiful animal that can fly",
+            "a fish is a creature that lives in water and swims",
+        ]
+        queries = bm25s.tokenize(["cat and dog", "fish that can fly"], stopwords="en", return_ids=False, show_progress=False)
+
+        # the same index twice: with dedupe, the merge gives back the results of one index
+        retriever = bm25s.BM25()
+        retriever.index(bm25s.tokenize(corpus, stopwords="en", show_progress=False), show_progress=False)
+        results = retriever.retrieve(queries, k=3, show_progress=False)
+        merged = bm25s.Results.merge_topk([results, results], k=3, dedupe=True)
+        np.testing.assert_array_equal(merged.documents, results.documents)
+        np.testing.assert_allclose(merged.scores, results.scores)
+        self.assertEqual(merged.counts.tolist(), [3, 3])
+
+        # two halves of the corpus, with offsets
+        halves = []
+        for part in [corpus[:2], corpus[2:]]:
+            half = bm25s.BM25()
+            half.index(bm25s.tokenize(part, stopwords="en", show_progress=False), show_progress=False)
+            halves.append(half.retrieve(queries, k=2, show_progress=False))
+        merged = bm25s.Results.merge_topk(halves, k=4, offsets=[0, 2])
+        self.assertEqual(sorted(merged.documents[0].tolist()), [0, 1, 2, 3])
+
+        with self.assertRaises(ValueError):
+            bm25s.Results.merge_topk([retriever.retrieve(queries, corpus=corpus, k=2, show_progress=False)])
+
+
+if __name__ == "__main__":
+    unittest.main()
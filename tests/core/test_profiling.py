@@ -0,0 +1,104 @@
+"""
+Tests for the per-stage profiling of `BM25.index` and `BM25.retrieve`.
+"""
+
+import unittest
+
+import numpy as np
+
+import bm25s
+from bm25s.utils.benchmark import Timer
+from bm25s.utils.profiling import Profiler
+
+
+class TestProfiler(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = [
+            "a cat is a feline and likes to purr",
+            "a dog is the human's best friend and loves to play",
+            "a bird is a beautiful animal that can fly",
+            "a fish is a creature that lives in water and swims",
+        ]
+        cls.metadata = [{"pet": True}, {"pet": True}, {"pet": False}, {"pet": False}]
+        cls.corpus_tokens = bm25s.tokenize(cls.corpus, stopwords="en", show_progress=False)
+        cls.query_tokens = bm25s.tokenize(
+            ["does the fish purr like a cat?", "a dog that can fly"],
+            stopwords="en",
+            return_ids=False,
+            show_progress=False,
+        )
+
+    def test_index_stages(self):
+        profiler = Profiler()
+        retriever = bm25s.BM25()
+        retriever.index(self.corpus_tokens, show_progress=False, profiler=profiler)
+
+        stages = profiler.to_dict()["stages"]
+        for name in ["index.doc_freqs", "index.idf", "index.scores", "index.csc", "index.set_index"]:
+            self.assertIn(name, stages)
+            self.assertEqual(stages[name]["calls"], 1)
+
+        counters = profiler.counters
+        self.assertEqual(counters["index.documents"], len(self.corpus))
+        self.assertEqual(counters["index.postings"], len(retriever.scores["data"]))
+        self.assertGreater(counters["index.bytes"], 0)
+
+    def test_retrieve_stages_and_counters(self):
+        retriever = bm25s.BM25(corpus=self.corpus)
+        retriever.index(self.corpus_tokens, show_progress=False, metadata=self.metadata)
+
+        profiler = Profiler()
+        results = retriever.retrieve(
+            self.query_tokens, k=2, filter={"pet": True}, show_progress=False, profiler=profiler
+        )
+        expected = retriever.retrieve(self.query_tokens, k=2, filter={"pet": True}, show_progress=False)
+        self.assertTrue(np.array_equal(expected.documents, results.documents))
+
+        stages = profiler.to_dict()["stages"]
+        for name in [
+            "retrieve.tokens_to_ids",
+            "retrieve.metadata_filter",
+            "retrieve.scoring",
+            "retrieve.topk",
+            "retrieve.filter_results",
+            "retrieve.corpus_lookup",
+        ]:
+            self.assertIn(name, stages)
+
+        # the postings of each query token are read once per query
+        indptr = retriever.scores["indptr"]
+        expected_postings = sum(
+            indptr[i + 1] - indptr[i] for q in self.query_tokens for i in retriever.get_tokens_ids(q)
+        )
+        self.assertEqual(profiler.counters["retrieve.queries"], 2)
+        self.assertEqual(profiler.counters["retrieve.postings"], expected_postings)
+        self.assertGreater(profiler.counters["retrieve.candidates"], 0)
+
+        # calls are accumulated
+        retriever.retrieve(self.query_tokens, k=2, show_progress=False, profiler=profiler)
+        self.assertEqual(profiler.counters["retrieve.queries"], 4)
+        self.assertEqual(profiler.stages["retrieve.topk"]["calls"], 2)
+
+        profiler.reset()
+        self.assertDictEqual({"stages": {}, "counters": {}}, profiler.to_dict())
+
+    def test_exports(self):
+        profiler = Profiler()
+        with profiler.stage("retrieve.topk"):
+            pass
+        profiler.add("retrieve.postings", 12)
+
+        text = profiler.to_prometheus()
+        self.assertIn("# TYPE bm25s_stage_seconds_total counter", text)
+        self.assertIn('bm25s_stage_calls_total{stage="retrieve.topk"} 1', text)
+        self.assertIn('bm25s_events_total{name="retrieve.postings"} 12', text)
+
+        timer = profiler.to_timer()
+        self.assertIsInstance(timer, Timer)
+        self.assertTrue(timer.has_stopped("retrieve.topk"))
+        self.assertGreaterEqual(timer.elapsed("retrieve.topk"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+"""
+Tests for the scoring of repeated query tokens: the tokens are collapsed into (token, weight)
+pairs before scoring, with the "weighted" and "set" query term modes, and for weighted queries.
+"""
+
+import unittest
+
+import numpy as np
+
+import bm25s
+from bm25s.scoring import _dedupe_query_tokens
+
+try:
+    import numba  # noqa: F401
+
+    BACKENDS = ["numpy", "numba"]
+except ImportError:
+    BACKENDS = ["numpy"]
+
+
+class TestDedupeQueryTokens(unittest.TestCase):
+    def test_weighted(self):
+        ids, pointers, weights = _dedupe_query_tokens(
+            np.array([3, 1, 3, 3, 2, 2, 5]), np.array([0, 4, 4, 7])
+        )
+        self.assertEqual(ids.tolist(), [1, 3, 2, 5])
+        self.assertEqual(pointers.tolist(), [0, 2, 2, 4])
+        self.assertEqual(weights.tolist(), [1, 3, 2, 1])
+        self.assertEqual(weights.dtype, np.float32)
+
+    def test_set(self):
+        ids, pointers, weights = _dedupe_query_tokens(
+            np.array([3, 1, 3, 3, 2, 2, 5]), np.array([0, 4, 4, 7]), mode="set"
+        )
+        self.assertEqual(ids.tolist(), [1, 3, 2, 5])
+        self.assertEqual(pointers.tolist(), [0, 2, 2, 4])
+        self.assertEqual(weights.tolist(), [1, 1, 1, 1])
+
+    def test_explicit_weights(self):
+        ids = np.array([4, 0, 4])
+        weights = np.array([0.5, 2.0, 1.5])
+        _, _, summed = _dedupe_query_tokens(ids, [0, 3], weights, mode="weighted")
+        _, _, largest = _dedupe_query_tokens(ids, [0, 3], weights, mode="set")
+        self.assertEqual(summed.tolist(), [2.0, 2.0])
+        self.assertEqual(largest.tolist(), [2.0, 1.5])
+
+    def test_empty(self):
+        ids, pointers, weights = _dedupe_query_tokens(
+            np.array([], dtype=np.int32), np.array([0, 0]), np.array([])
+        )
+        self.assertEqual(len(ids), 0)
+        self.assertEqual(pointers.tolist(), [0, 0])
+        self.assertEqual(len(weights), 0)
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            _dedupe_query_tokens(np.array([1]), np.array([0, 1]), mode="bag")
+
+
+class TestQueryTermModes(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = [
+            "a cat is a feline and likes to purr",
+            "a dog is the human's best friend and loves to play",
+            "a bird is a beautiful animal that can fly",
+            "a fish is a creature that lives in water and swims",
+            "a cat and a dog can be friends",
+            "the bird and the fish do not play together",
+        ]
+        cls.corpus_tokens = bm25s.tokenize(cls.corpus, stopwords="en", show_progress=False)
+        cls.queries = [
+            ["cat", "cat", "cat", "fish", "purr", "cat"],
+            ["dog", "fly", "dog"],
+            ["bird"],
+        ]
+
+    def _retriever(self, method, backend="numpy"):
+        retriever = bm25s.BM25(method=method, backend=backend)
+        retriever.index(self.corpus_tokens, show_progress=False)
+        return retriever
+
+    def test_weighted_matches_repeated_tokens(self):
+        for method in ["robertson", "bm25l", "bm25+"]:
+            with self.subTest(method=method):
+                retriever = self._retriever(method)
+                for query in self.queries:
+                    ids = retriever.get_tokens_ids(query)
+                    # each occurrence scored separately (the non-occurrence term included)
+                    expected = sum(retriever.get_scores_from_ids([i]) for i in ids)
+                    np.testing.assert_allclose(retriever.get_scores(query), expected, rtol=1e-6)
+
+    def test_set_matches_distinct_tokens(self):
+        for method in ["robertson", "bm25l"]:
+            with self.subTest(method=method):
+                retriever = self._retriever(method)
+                for query in self.queries:
+                    distinct = list(dict.fromkeys(query))
+                    np.testing.assert_allclose(
+                        retriever.get_scores(query, query_term_mode="set"),
+                        retriever.get_scores(distinct),
+                        rtol=1e-6,
+                    )
+
+    @unittest.skipUnless("numba" in BACKENDS, "numba is not installed")
+    def test_numba_scorer(self):
+        retriever = self._retriever("bm25l")
+        expected = [retriever.get_scores(q) for q in self.queries]
+        retriever.activate_numba_scorer()
+        for query, scores in zip(self.queries, expected):
+            np.testing.assert_allclose(retriever.get_scores(query), scores, rtol=1e-6)
+
+    def test_retrieve_backends(self):
+        for method in ["robertson", "bm25+"]:
+            for mode in ["weighted", "set"]:
+                reference = self._retriever(method)
+                expected = np.stack(
+                    [reference.get_scores(q, query_term_mode=mode) for q in self.queries]
+                )
+                expected = -np.sort(-expected, axis=1)[:, :3]
+                for backend in BACKENDS:
+                    with self.subTest(method=method, mode=mode, backend=backend):
+                        retriever = self._retriever(method, backend=backend)
+                        results = retriever.retrieve(
+                            self.queries, k=3, show_progress=False, query_term_mode=mode
+                        )
+                        np.testing.assert_allclose(results.scores, expected, rtol=1e-6)
+
+    def test_retrieve_invalid_mode(self):
+        retriever = self._retriever("robertson")
+        with self.assertRaises(ValueError):
+            retriever.retrieve(self.queries, k=2, show_progress=False, query_term_mode="bag")
+
+
+class TestWeightedQueries(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus_tokens = TestQueryTermModes.corpus_tokens
+        cls.queries = [
+            {"cat": 2.0, "purr": 0.5, "zebra": 3.0},
+            {"dog": 1.0, "fly": -0.25},
+            {"bird": 0.1},
+        ]
+
+    def _retriever(self, method, backend="numpy"):
+        retriever = bm25s.BM25(method=method, backend=backend)
+        retriever.index(self.corpus_tokens, show_progress=False)
+        return retriever
+
+    def _expected_scores(self, retriever, query):
+        # a weighted query scores as the weighted sum of the scores of its tokens
+        scores = np.zeros(retriever.scores["num_docs"])
+        for token, weight in query.items():
+            if token in retriever.vocab_dict:
+                scores += weight * retriever.get_scores([token])
+        return scores
+
+    def test_get_scores(self):
+        for method in ["robertson", "bm25l", "bm25+"]:
+            with self.subTest(method=method):
+                retriever = self._retriever(method)
+                for query in self.queries:
+                    expected = self._expected_scores(retriever, query)
+                    np.testing.assert_allclose(retriever.get_scores(query), expected, rtol=1e-5, atol=1e-6)
+
+                    ids = {retriever.vocab_dict[t]: w for t, w in query.items() if t in retriever.vocab_dict}
+                    np.testing.assert_allclose(retriever.get_scores_from_ids(ids), expected, rtol=1e-5, atol=1e-6)
+                    np.testing.assert_allclose(
+                        retriever.get_scores_from_ids(list(ids), query_tokens_weights=list(ids.values())),
+                        expected,
+                        rtol=1e-5,
+                        atol=1e-6,
+                    )
+
+    def test_unit_weights_match_unweighted(self):
+        retriever = self._retriever("bm25+")
+        tokens = ["cat", "dog", "cat"]
+        np.testing.assert_allclose(
+            retriever.get_scores(tokens, query_tokens_weights=[1.0, 1.0, 1.0]),
+            retriever.get_scores(tokens),
+        )
+
+    def test_retrieve(self):
+        for method in ["robertson", "bm25l"]:
+            reference = self._retriever(method)
+            expected = np.stack([self._expected_scores(reference, q) for q in self.queries])
+            expected = -np.sort(-expected, axis=1)[:, :3]
+            for backend in BACKENDS:
+                with self.subTest(method=method, backend=backend):
+                    retriever = self._retriever(method, backend=backend)
+                    results = retriever.retrieve(self.queries, k=3, show_progress=False)
+                    np.testing.assert_allclose(results.scores, expected, rtol=1e-5, atol=1e-6)
+
+                    # the same queries as parallel lists of tokens and weights
+                    tokens = [list(q.keys()) for q in self.queries]
+                    weights = [list(q.values()) for q in self.queries]
+                    results = retriever.retrieve(tokens, k=3, show_progress=False, query_weights=weights)
+                    np.testing.assert_allclose(results.scores, expected, rtol=1e-5, atol=1e-6)
+
+                    # and as token IDs, including one not in the vocabulary
+                    ids = [[retriever.vocab_dict.get(t, 10**6) for t in q] for q in tokens]
+                    results = retriever.retrieve(ids, k=3, show_progress=False, query_weights=weights)
+                    np.testing.assert_allclose(results.scores, expected, rtol=1e-5, atol=1e-6)
+
+    def test_invalid_weights(self):
+        retriever = self._retriever("robertson")
+        with self.assertRaises(ValueError):
+            retriever.retrieve([["cat", "dog"]], k=2, show_progress=False, query_weights=[[1.0]])
+        with self.assertRaises(ValueError):
+            retriever.retrieve([["cat"]], k=2, show_progress=False, query_weights=[[1.0], [2.0]])
+        with self.assertRaises(ValueError):
+            retriever.get_scores_from_ids({0: 1.0}, query_tokens_weights=[1.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Tests for `BM25.retrieve_iter`, which retrieves documents for a stream of queries in batches.
+"""
+
+from functools import partial
+import unittest
+
+import numpy as np
+
+import bm25s
+
+
+class TestRetrieveIter(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = [
+            "a cat is a feline and likes to purr",
+            "a dog is the human's best friend and loves to play",
+            "a bird is a beautiful animal that can fly",
+            "a fish is a creature that lives in water and swims",
+            "the cat and the dog play in the garden",
+            "birds and fish are animals",
+        ]
+        cls.queries = [
+            "does the fish purr like a cat?",
+            "a dog that can fly",
+            "animals in the water",
+            "birds fly over the water",
+            "the cat plays",
+        ] * 7
+
+        corpus_tokens = bm25s.tokenize(cls.corpus, stopwords="en", show_progress=False)
+        cls.retriever = bm25s.BM25()
+        cls.retriever.index(corpus_tokens, show_progress=False)
+
+        cls.query_tokens = bm25s.tokenize(
+            cls.queries, stopwords="en", return_ids=False, show_progress=False
+        )
+        cls.expected = cls.retriever.retrieve(cls.query_tokens, k=3, show_progress=False)
+
+    def test_same_results_as_retrieve(self):
+        for batch_size in [1, 4, 100]:
+            batches = list(
+                self.retriever.retrieve_iter(iter(self.query_tokens), batch_size=batch_size, k=3)
+            )
+            self.assertEqual(len(batches), -(-len(self.queries) // batch_size))
+            self.assertTrue(all(len(batch) <= batch_size for batch in batches))
+
+            merged = bm25s.Results.merge(batches)
+            self.assertTrue(np.array_equal(self.expected.documents, merged.documents))
+            self.assertTrue(np.allclose(self.expected.scores, merged.scores))
+
+    def test_tokenizer_and_corpus(self):
+        texts = (query for query in self.queries)
+        tokenizer = partial(bm25s.tokenize, stopwords="en", show_progress=False)
+        batches = list(
+            self.retriever.retrieve_iter(
+                texts, batch_size=3, tokenizer=tokenizer, corpus=self.corpus, k=3
+            )
+        )
+        documents = np.concatenate([batch.documents for batch in batches], axis=0)
+        expected = np.array(self.corpus)[self.expected.documents]
+        self.assertTrue(np.array_equal(expected, documents))
+
+    def test_retriever_corpus_is_used(self):
+        retriever = bm25s.BM25(corpus=self.corpus)
+        retriever.index(bm25s.tokenize(self.corpus, stopwords="en", show_progress=False), show_progress=False)
+
+        batches = list(retriever.retrieve_iter(self.query_tokens, batch_size=5, k=3))
+        documents = np.concatenate([batch.documents for batch in batches], axis=0)
+        expected = np.array(self.corpus)[self.expected.documents]
+        self.assertTrue(np.array_equal(expected, documents))
+
+        # corpus=False returns the indices even if the retriever has a corpus
+        indices = retriever.retrieve(self.query_tokens, corpus=False, k=3, show_progress=False).documents
+        self.assertTrue(np.array_equal(self.expected.documents, indices))
+
+    def test_filter_is_passed_to_retrieve(self):
+        weight_mask = np.array([1, 0, 1, 0, 1, 0], dtype=np.float32)
+        batches = list(
+            self.retriever.retrieve_iter(self.query_tokens, batch_size=4, k=3, weight_mask=weight_mask)
+        )
+        for batch in batches:
+            for query_docs in batch.documents:
+                self.assertTrue(np.all(weight_mask[query_docs] == 1))
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            list(self.retriever.retrieve_iter(self.queries, batch_size=2))
+        with self.assertRaises(ValueError):
+            list(self.retriever.retrieve_iter(self.query_tokens, batch_size=0))
+        with self.assertRaises(ValueError):
+            list(self.retriever.retrieve_iter(self.query_tokens, return_as="documents"))
+
+    def test_empty_input(self):
+        self.assertListEqual([], list(self.retriever.retrieve_iter([], batch_size=4)))
+
+
+if __name__ == "__main__":
+    unittest.main()
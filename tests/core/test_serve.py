@@ -0,0 +1,94 @@
+"""
+Tests for the local HTTP search server in `bm25s.serve`.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+import bm25s
+from bm25s.serve import load_app, make_server
+
+
+class TestServe(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = [
+            {"text": "a cat is a feline and likes to purr"},
+            {"text": "a dog is the human's best friend and loves to play"},
+            {"text": "a bird is a beautiful animal that can fly"},
+            {"text": "a fish is a creature that lives in water and swims"},
+            {"text": "the cat and the dog play in the garden"},
+        ]
+        texts = [doc["text"] for doc in cls.corpus]
+
+        cls.index_dir = tempfile.mkdtemp()
+        retriever = bm25s.BM25()
+        retriever.index(bm25s.tokenize(texts, stopwords="en", show_progress=False), show_progress=False)
+        retriever.save(cls.index_dir, corpus=cls.corpus)
+        with open(f"{cls.index_dir}/metadata.jsonl", "w") as f:
+            for text in texts:
+                f.write(json.dumps({"pet": "cat" in text or "dog" in text}) + "\n")
+
+        cls.expected = retriever.retrieve(
+            bm25s.tokenize(["a cat that purrs", "fish in water"], stopwords="en", show_progress=False),
+            k=2,
+            show_progress=False,
+        )
+
+        cls.app = load_app(cls.index_dir, mmap=True, stopwords="en", max_wait_ms=20)
+        cls.server = make_server(cls.app, port=0)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.app.close()
+        shutil.rmtree(cls.index_dir)
+
+    def _request(self, path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        with urllib.request.urlopen(self.url + path, data=data) as response:
+            return json.loads(response.read())
+
+    def test_search(self):
+        out = self._request("/search", {"query": "a cat that purrs", "k": 2})
+        expected_docs = [self.corpus[i] for i in self.expected.documents[0]]
+        self.assertListEqual(expected_docs, out["documents"])
+        self.assertEqual(len(out["scores"]), 2)
+
+    def test_batch_search(self):
+        out = self._request("/batch_search", {"queries": ["a cat that purrs", "fish in water"], "k": 2})
+        for results, expected_ids in zip(out["results"], self.expected.documents):
+            self.assertListEqual([self.corpus[i] for i in expected_ids], results["documents"])
+
+    def test_filtered_search(self):
+        out = self._request("/filtered_search", {"query": "animal that can fly", "filter": {"pet": True}})
+        self.assertTrue(all("cat" in d["text"] or "dog" in d["text"] for d in out["documents"]))
+
+        with self.assertRaises(urllib.error.HTTPError) as ctx:
+            self._request("/filtered_search", {"query": "cats"})
+        self.assertEqual(ctx.exception.code, 400)
+
+    def test_concurrent_requests_and_stats(self):
+        queries = ["a cat that purrs", "fish in water", "dogs play"] * 10
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            outs = list(executor.map(lambda q: self._request("/search", {"query": q, "k": 1}), queries))
+        self.assertEqual(len(outs), len(queries))
+
+        stats = self._request("/stats")
+        self.assertGreaterEqual(stats["num_queries"], len(queries))
+        self.assertLess(stats["batching"]["num_batches"], stats["batching"]["num_queries"])
+        self.assertIn("p99", stats["latency_ms"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+Tests for `bm25s.sharded.ShardedBM25`.
+"""
+
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import bm25s
+from bm25s.sharded import ShardedBM25
+
+
+class TestShardedBM25(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = [
+            "a cat is a feline and likes to purr",
+            "a dog is the human's best friend and loves to play",
+            "a bird is a beautiful animal that can fly",
+            "a fish is a creature that lives in water and swims",
+            "the cat and the dog play in the garden",
+            "birds and fish are animals",
+            "a cat can swim but does not like water",
+        ]
+        cls.metadata = [{"pet": i % 2 == 0, "id": i} for i in range(len(cls.corpus))]
+        cls.corpus_tokens = bm25s.tokenize(cls.corpus, stopwords="en", return_ids=False, show_progress=False)
+        cls.query_tokens = bm25s.tokenize(
+            ["does the fish purr like a cat?", "a dog that can fly", "water"],
+            stopwords="en",
+            return_ids=False,
+            show_progress=False,
+        )
+
+        cls.single = bm25s.BM25()
+        cls.single.index(cls.corpus_tokens, show_progress=False, metadata=cls.metadata)
+
+        cls.sharded = ShardedBM25(num_shards=3, corpus=cls.corpus)
+        cls.sharded.index(cls.corpus_tokens, show_progress=False, metadata=cls.metadata)
+
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.sharded.save(cls.tmpdir)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sharded.close()
+        shutil.rmtree(cls.tmpdir)
+
+    def assert_same_results(self, expected, results, k):
+        # compare the scores, and the sets of documents above the k-th score (ties may be
+        # ordered differently)
+        np.testing.assert_allclose(expected.scores, results.scores, rtol=1e-5)
+        for e_docs, e_scores, docs in zip(expected.documents, expected.scores, results.documents):
+            strict = e_scores > e_scores[-1] + 1e-5
+            self.assertSetEqual(set(e_docs[strict].tolist()), set(docs[strict].tolist()))
+
+    def test_global_statistics(self):
+        self.assertListEqual(self.sharded.offsets.tolist(), [0, 3, 5, 7])
+        self.assertEqual(self.sharded.num_docs, len(self.corpus))
+        for k in [1, 3, 7]:
+            expected = self.single.retrieve(self.query_tokens, k=k, show_progress=False)
+            results = self.sharded.retrieve(self.query_tokens, k=k, corpus=False)
+            self.assertTupleEqual(results.documents.shape, (3, k))
+            self.assert_same_results(expected, results, k)
+
+    def test_nonoccurrence_method(self):
+        single = bm25s.BM25(method="bm25+")
+        single.index(self.corpus_tokens, show_progress=False)
+        sharded = ShardedBM25(num_shards=2, method="bm25+")
+        sharded.index(self.corpus_tokens, show_progress=False)
+
+        expected = single.retrieve(self.query_tokens, k=4, show_progress=False)
+        self.assert_same_results(expected, sharded.retrieve(self.query_tokens, k=4), k=4)
+
+    def test_corpus_and_metadata(self):
+        results = self.sharded.retrieve(self.query_tokens, k=2, return_metadata=True)
+        indices = self.sharded.retrieve(self.query_tokens, k=2, corpus=False).documents
+        for q in range(len(self.query_tokens)):
+            self.assertListEqual(list(results.documents[q]), [self.corpus[i] for i in indices[q]])
+            self.assertListEqual(results.metadata[q], [self.metadata[i] for i in indices[q]])
+
+    def test_filter(self):
+        results = self.sharded.retrieve(self.query_tokens, k=7, corpus=False, filter={"pet": True})
+        expected = self.single.retrieve(self.query_tokens, k=7, filter={"pet": True}, show_progress=False)
+        self.assertEqual(results.documents.dtype, object)
+        for e_docs, docs in zip(expected.documents, results.documents):
+            self.assertSetEqual(set(e_docs.tolist()), set(docs.tolist()))
+            self.assertTrue(all(i % 2 == 0 for i in docs))
+
+    def test_weight_mask(self):
+        # the mask covers all the documents, and each shard uses the slice of its documents
+        weight_mask = np.array([0, 0, 0, 1, 1, 0, 1], dtype=np.float32)
+        results = self.sharded.retrieve(self.query_tokens, k=3, corpus=False, weight_mask=weight_mask)
+        expected = self.single.retrieve(self.query_tokens, k=3, weight_mask=weight_mask, show_progress=False)
+        for e_docs, docs in zip(expected.documents, results.documents):
+            self.assertSetEqual(set(e_docs.tolist()), set(docs.tolist()))
+            self.assertTrue(all(weight_mask[i] == 1 for i in docs))
+
+        with self.assertRaises(ValueError):
+            self.sharded.retrieve(self.query_tokens, k=3, weight_mask=weight_mask[:3])
+
+    def test_save_load(self):
+        expected = self.sharded.retrieve(self.query_tokens, k=3, corpus=False)
+        for mmap in [False, [True, False, True]]:
+            loaded = ShardedBM25.load(self.tmpdir, mmap=mmap, load_corpus=True)
+            results = loaded.retrieve(self.query_tokens, k=3)
+            np.testing.assert_allclose(expected.scores, results.scores)
+            top = expected.documents[0][0]
+            self.assertDictEqual(results.documents[0][0], {"id": top, "text": self.corpus[top]})
+
+        with self.assertRaises(ValueError):
+            ShardedBM25.load(self.tmpdir, mmap=[True])
+
+    def test_process_executor(self):
+        expected = self.sharded.retrieve(self.query_tokens, k=3, corpus=False)
+        results = self.sharded.retrieve(self.query_tokens, k=3, corpus=False, executor="process")
+        np.testing.assert_allclose(expected.scores, results.scores)
+        np.testing.assert_array_equal(expected.documents, results.documents)
+
+        unsaved = ShardedBM25(num_shards=2)
+        unsaved.index(self.corpus_tokens, show_progress=False)
+        with self.assertRaises(ValueError):
+            unsaved.retrieve(self.query_tokens, executor="process")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+Tests for the read-only query tokenizer created by `Tokenizer.freeze`.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import unittest
+
+import numpy as np
+import Stemmer
+
+import bm25s
+from bm25s.tokenization import Tokenizer, FrozenTokenizer
+
+
+class TestFrozenTokenizer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = [
+            "a cat is a feline and likes to purr",
+            "a dog is the human's best friend and loves to play",
+            "a bird is a beautiful animal that can fly",
+            "a fish is a creature that lives in water and swims",
+        ]
+        cls.queries = [
+            "What is a flying bird?",
+            "cats purring",
+            "unknownword",
+            "",
+            "does the fish swim in water?",
+        ]
+
+    def _check_same_as_update_vocab_false(self, stemmer):
+        tokenizer = Tokenizer(stemmer=stemmer, stopwords="en")
+        tokenizer.tokenize(self.corpus, show_progress=False)
+
+        frozen = tokenizer.freeze()
+        frozen_ids = frozen.tokenize(self.queries)
+
+        expected_ids = tokenizer.tokenize(
+            self.queries, update_vocab=False, show_progress=False
+        )
+        self.assertListEqual(expected_ids, frozen_ids)
+
+    def test_same_ids_without_stemmer(self):
+        self._check_same_as_update_vocab_false(stemmer=None)
+
+    def test_same_ids_with_stemmer(self):
+        self._check_same_as_update_vocab_false(stemmer=Stemmer.Stemmer("english"))
+
+    def test_vocab_is_not_mutated(self):
+        tokenizer = Tokenizer(stemmer=Stemmer.Stemmer("english"), stopwords="en")
+        tokenizer.tokenize(self.corpus, show_progress=False)
+        frozen = tokenizer.freeze()
+
+        n_words = len(frozen.word_to_id)
+        frozen.tokenize(["purring kittens and flying birds"])
+        self.assertEqual(n_words, len(frozen.word_to_id))
+
+        with self.assertRaises(TypeError):
+            frozen.word_to_id["new"] = 0
+
+        # later vocab updates on the tokenizer are not visible to the frozen copy
+        tokenizer.tokenize(["zebra"], update_vocab=True, show_progress=False)
+        self.assertNotIn("zebra", frozen.word_to_id)
+        self.assertListEqual([[frozen.word_to_id[""]]], frozen.tokenize(["zebra"]))
+
+    def test_return_types(self):
+        tokenizer = Tokenizer(stopwords="en")
+        tokenizer.tokenize(self.corpus, show_progress=False)
+        frozen = tokenizer.freeze()
+
+        self.assertIsInstance(frozen, FrozenTokenizer)
+        self.assertListEqual([["cat", "purr"]], frozen.tokenize("cat purr", return_as="string"))
+        tokenized = frozen.tokenize(["cat purr"], return_as="tuple")
+        self.assertIsInstance(tokenized, bm25s.tokenization.Tokenized)
+        self.assertListEqual(frozen.tokenize(["cat purr"]), list(frozen.tokenize(["cat purr"], return_as="stream")))
+
+        with self.assertRaises(ValueError):
+            frozen.tokenize(["cat"], return_as="invalid")
+
+    def test_concurrent_retrieve(self):
+        tokenizer = Tokenizer(stopwords="en")
+        corpus_tokens = tokenizer.tokenize(self.corpus, show_progress=False)
+        retriever = bm25s.BM25()
+        retriever.index(corpus_tokens, show_progress=False)
+
+        frozen = tokenizer.freeze()
+        queries = self.queries * 50
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            concurrent_ids = list(executor.map(lambda q: frozen.tokenize([q])[0], queries))
+
+        self.assertListEqual(frozen.tokenize(queries), concurrent_ids)
+
+        results = retriever.retrieve(concurrent_ids, k=2, n_threads=4, show_progress=False).documents
+        expected = retriever.retrieve(frozen.tokenize(queries), k=2, show_progress=False).documents
+        self.assertTrue(np.array_equal(expected, results))
+
+    def _check_concurrent_stemming(self, tokenizer, **freeze_kwargs):
+        tokenizer.tokenize(self.corpus, show_progress=False)
+        frozen = tokenizer.freeze(**freeze_kwargs)
+        # unseen words are stemmed on the fly
+        queries = [f"{q} purrings swimmers flies {i}" for i, q in enumerate(self.queries * 40)]
+        expected = tokenizer.tokenize(queries, update_vocab=False, show_progress=False)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            concurrent_ids = list(executor.map(lambda q: frozen.tokenize([q])[0], queries))
+
+        self.assertListEqual(expected, concurrent_ids)
+        return frozen
+
+    def test_concurrent_stemmer_language(self):
+        frozen = self._check_concurrent_stemming(Tokenizer(stemmer="english", stopwords="en"))
+        self.assertIsNotNone(frozen.stemmer_factory)
+
+    def test_concurrent_stemmer_factory(self):
+        created = []
+
+        def factory():
+            created.append(threading.get_ident())
+            return Stemmer.Stemmer("english")
+
+        self._check_concurrent_stemming(
+            Tokenizer(stemmer=Stemmer.Stemmer("english"), stopwords="en"), stemmer_factory=factory
+        )
+        # one stemmer per thread
+        self.assertEqual(len(created), len(set(created)))
+
+    def test_concurrent_stemmer_object(self):
+        self._check_concurrent_stemming(Tokenizer(stemmer=Stemmer.Stemmer("english"), stopwords="en"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import numpy as np
+
+JAX_IS_AVAILABLE = False
+try:
+    import jax
+    JAX_IS_AVAILABLE = True
+except ImportError:
+    pass
+
+import bm25s
+from bm25s.selection import topk, topk_batch
+
+
+class TestTopKBatch(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.k = 5
+        self.scores_2d = rng.uniform(-10, 10, (8, 2000)).astype(np.float32)
+
+    def check_results(self, result_scores, result_indices, k=None, sorted=True):
+        k = self.k if k is None else k
+        self.assertEqual((len(self.scores_2d), k), result_scores.shape)
+        self.assertEqual((len(self.scores_2d), k), result_indices.shape)
+
+        for row, row_scores, row_indices in zip(self.scores_2d, result_scores, result_indices):
+            expected_indices = np.argsort(row)[-k:][::-1]
+            if sorted:
+                np.testing.assert_allclose(row_scores, row[expected_indices])
+                np.testing.assert_array_equal(row_indices, expected_indices)
+            else:
+                self.assertSetEqual(set(expected_indices.tolist()), set(row_indices.tolist()))
+                np.testing.assert_allclose(row_scores, row[row_indices])
+
+    def test_topk_batch_numpy_sorted(self):
+        self.check_results(*topk_batch(self.scores_2d, self.k, backend="numpy", sorted=True))
+
+    def test_topk_batch_numpy_unsorted(self):
+        self.check_results(*topk_batch(self.scores_2d, self.k, backend="numpy", sorted=False), sorted=False)
+
+    def test_topk_batch_matches_single_query(self):
+        batch_scores, batch_indices = topk_batch(self.scores_2d, self.k, backend="numpy")
+        for i, row in enumerate(self.scores_2d):
+            single_scores, single_indices = topk(row, self.k, backend="numpy")
+            np.testing.assert_array_equal(batch_scores[i], single_scores)
+            np.testing.assert_array_equal(batch_indices[i], single_indices)
+
+    @unittest.skipUnless(JAX_IS_AVAILABLE, "JAX is not available")
+    def test_topk_batch_jax(self):
+        self.check_results(*topk_batch(self.scores_2d, self.k, backend="jax"))
+
+    def test_topk_batch_auto_backend(self):
+        self.check_results(*topk_batch(self.scores_2d, self.k, backend="auto"))
+
+    def test_k_larger_than_num_docs(self):
+        scores, indices = topk_batch(self.scores_2d[:, :3], 10, backend="numpy")
+        self.assertEqual((8, 3), scores.shape)
+        self.assertEqual((8, 3), indices.shape)
+
+    def test_invalid_input(self):
+        with self.assertRaises(ValueError):
+            topk_batch(self.scores_2d[0], self.k)
+        with self.assertRaises(ValueError):
+            topk_batch(self.scores_2d, self.k, backend="invalid")
+
+
+class TestQueryBlocks(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        corpus = [f"document {i} about topic {i % 7} and subject {i % 3}" for i in range(60)]
+        cls.retriever = bm25s.BM25(backend="numpy")
+        cls.retriever.index(bm25s.tokenize(corpus, show_progress=False), show_progress=False)
+        cls.queries = [["topic", str(i % 7)] for i in range(10)]
+
+    def test_block_size_split_across_threads(self):
+        self.assertEqual(self.retriever._get_query_block_size(50), 50)
+        self.assertEqual(self.retriever._get_query_block_size(50, n_queries=10, n_threads=4), 3)
+        self.assertEqual(self.retriever._get_query_block_size(2, n_queries=10, n_threads=4), 2)
+        self.assertEqual(self.retriever._get_query_block_size(50, n_queries=0, n_threads=4), 50)
+
+    def test_threads_match_sequential(self):
+        expected = self.retriever.retrieve(self.queries, k=5, show_progress=False)
+        results = self.retriever.retrieve(self.queries, k=5, show_progress=False, n_threads=3)
+        np.testing.assert_array_equal(results.documents, expected.documents)
+        np.testing.assert_allclose(results.scores, expected.scores)
+
+
+if __name__ == '__main__':
+    unittest.main()
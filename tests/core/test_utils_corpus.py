@@ -7,6 +7,8 @@ import unittest.mock
 import Stemmer  # optional: for stemming
 import json
 
+import numpy as np
+
 import bm25s
 from bm25s.utils import json_functions
 
@@ -54,6 +56,72 @@ class TestUtilsCorpus(unittest.TestCase):
         self.assertEqual(json_functions.loads, json.loads)
         self.test_load_and_save_mmindex()
     
+    def test_find_newline_positions_chunked(self):
+        expected = []
+        position = 0
+        for line in self.strings:
+            expected.append(position)
+            position += len(line.encode("utf-8"))
+
+        # chunks smaller than a line, and a file without a final newline
+        for chunk_size in [7, 64, 1 << 20]:
+            positions = bm25s.utils.corpus.find_newline_positions(self.file, show_progress=False, chunk_size=chunk_size)
+            self.assertListEqual(positions.tolist(), expected)
+
+        path = os.path.join(self.tmpdirname, "no_final_newline.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"a": "é"}\n{"b": 2}')
+        self.assertListEqual(bm25s.utils.corpus.find_newline_positions(path, show_progress=False).tolist(), [0, 12])
+
+        empty = os.path.join(self.tmpdirname, "empty.jsonl")
+        open(empty, "w").close()
+        self.assertEqual(len(bm25s.utils.corpus.find_newline_positions(empty, show_progress=False)), 0)
+
+    def test_binary_mmindex(self):
+        bm25s.utils.corpus.JsonlCorpus(self.file, show_progress=False).close()
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdirname, "file.mmindex.npy")))
+
+        # the index is memory-mapped when the corpus is opened again
+        corpus = bm25s.utils.corpus.JsonlCorpus(self.file, show_progress=False)
+        self.assertIsInstance(corpus.mmindex, np.memmap)
+        self.assertEqual(len(corpus), 500)
+        self.assertEqual(corpus[499], json.loads(self.strings[499]))
+        corpus.close()
+
+    def test_json_mmindex_fallback(self):
+        mmindex = bm25s.utils.corpus.find_newline_positions(self.file, show_progress=False)
+        with open(os.path.join(self.tmpdirname, "file.mmindex.json"), "w") as f:
+            f.write(json.dumps(mmindex.tolist()))
+
+        corpus = bm25s.utils.corpus.JsonlCorpus(self.file, show_progress=False)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdirname, "file.mmindex.npy")))
+        self.assertEqual(corpus[250], json.loads(self.strings[250]))
+        corpus.close()
+
+    def test_batched_fetch(self):
+        corpus = bm25s.utils.corpus.JsonlCorpus(self.file, show_progress=False)
+        expected = [json.loads(line) for line in self.strings]
+
+        indices = np.array([[499, 3, 3], [0, -1, 250]])
+        for n_threads in [0, 4]:
+            results = corpus.get_documents(indices, n_threads=n_threads)
+            self.assertListEqual(results, [expected[i] for i in indices.ravel()])
+
+        reshaped = corpus[indices]
+        self.assertTupleEqual(reshaped.shape, (2, 3))
+        self.assertEqual(reshaped[1, 2], expected[250])
+        self.assertListEqual(corpus[[4, 2]], [expected[4], expected[2]])
+        self.assertListEqual(corpus[10:20:3], expected[10:20:3])
+        self.assertEqual(corpus[np.int64(7)], expected[7])
+
+        with self.assertRaises(IndexError):
+            corpus.get_documents([500])
+        corpus.close()
+
+    @unittest.mock.patch("bm25s.utils.json_functions.loads_buffer", json_functions.loads_buffer_with_builtin)
+    def test_batched_fetch_no_orjson(self):
+        self.test_batched_fetch()
+
     def tearDown(self):
         # remove the temp dir with rmtree
         shutil.rmtree(self.tmpdirname)
\ No newline at end of file
@@ -0,0 +1,55 @@
+import unittest
+
+import numpy as np
+import bm25s
+import Stemmer  # optional: for stemming
+
+
+class TestNumbaBackendIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(0)
+        words = [f"w{i}" for i in range(500)]
+        cls.corpus = [
+            " ".join(rng.choice(words, size=rng.integers(1, 50))) for _ in range(1000)
+        ] + [
+            "a cat is a feline and likes to purr",
+            "a dog is the human's best friend and loves to play",
+        ]
+        cls.stemmer = Stemmer.Stemmer("english")
+
+    def test_same_index_as_numpy_backend(self):
+        for method in ["robertson", "lucene", "atire", "bm25l", "bm25+"]:
+            with self.subTest(method=method):
+                numpy_retriever = bm25s.BM25(method=method, backend="numpy")
+                numpy_retriever.index(
+                    bm25s.tokenize(self.corpus, stopwords="en", stemmer=self.stemmer, show_progress=False),
+                    show_progress=False,
+                )
+
+                numba_retriever = bm25s.BM25(method=method, backend="numba")
+                numba_retriever.index(
+                    bm25s.tokenize(self.corpus, stopwords="en", stemmer=self.stemmer, show_progress=False),
+                    show_progress=False,
+                )
+
+                for name in ["indptr", "indices"]:
+                    self.assertEqual(numpy_retriever.scores[name].dtype, numba_retriever.scores[name].dtype)
+                    self.assertTrue(np.array_equal(numpy_retriever.scores[name], numba_retriever.scores[name]))
+
+                self.assertTrue(np.allclose(numpy_retriever.scores["data"], numba_retriever.scores["data"], atol=1e-6))
+                self.assertEqual(numpy_retriever.scores["num_docs"], numba_retriever.scores["num_docs"])
+
+                if method in ("bm25l", "bm25+"):
+                    self.assertTrue(np.allclose(numpy_retriever.nonoccurrence_array, numba_retriever.nonoccurrence_array))
+                else:
+                    self.assertIsNone(numba_retriever.nonoccurrence_array)
+
+    def test_invalid_method(self):
+        retriever = bm25s.BM25(method="invalid", backend="numba")
+        with self.assertRaises(ValueError):
+            retriever.index(bm25s.tokenize(self.corpus[:10], stopwords="en", show_progress=False), show_progress=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
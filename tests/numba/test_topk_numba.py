@@ -39,5 +39,31 @@ class TestTopKSingleQuery(unittest.TestCase):
         result_scores, result_indices = topk(self.scores, self.k, backend="numba", sorted=False)
         self.check_results(result_scores, result_indices, sorted=False)
 
+
+class TestTopKBatchNumba(unittest.TestCase):
+    def test_topk_batch_numba(self):
+        from bm25s.numba.selection import topk_batch
+
+        rng = np.random.default_rng(42)
+        k = 5
+        scores_2d = rng.uniform(-10, 10, (8, 2000))
+        result_scores, result_indices = topk_batch(scores_2d, k, sorted=True)
+
+        for row, row_scores, row_indices in zip(scores_2d, result_scores, result_indices):
+            expected_indices = np.argsort(row)[-k:][::-1]
+            np.testing.assert_allclose(row_scores, row[expected_indices])
+            np.testing.assert_array_equal(row_indices, expected_indices)
+
+    def test_topk_batch_numba_serial(self):
+        from bm25s.numba.selection import topk_batch
+
+        rng = np.random.default_rng(0)
+        scores_2d = rng.uniform(-10, 10, (8, 2000))
+        parallel = topk_batch(scores_2d, 5, sorted=True)
+        serial = topk_batch(scores_2d, 5, sorted=True, parallel=False)
+        np.testing.assert_array_equal(parallel[0], serial[0])
+        np.testing.assert_array_equal(parallel[1], serial[1])
+
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()